@@ -1,6 +1,7 @@
 # api_handler.py
 import google.generativeai as genai
 import base64
+import contextlib
 import json
 import pathlib
 import traceback
@@ -9,6 +10,9 @@ import urllib.request
 import urllib.error
 import time
 import re
+import os
+import threading
+import datetime
 from pathlib import Path
 import xml.etree.ElementTree as ET
 
@@ -164,6 +168,19 @@ ATURAN NARASI (SANGAT PENTING):
 Keluarkan HANYA JSON tanpa penjelasan lain.
 """
 
+def _ensure_segment_minimal_fields(seg: dict, language: str) -> dict:
+    seg.setdefault("vo_language", language)
+    # Tidak menambahkan effects_pool apapun; efek dihandle di tahap editing
+    vr = seg.get("vo_meta") or {}
+    vr.setdefault("speech_rate_wpm", 160)
+    vr.setdefault("fit", "OK")
+    seg["vo_meta"] = vr
+    # Beats-only mode: jangan paksa field source_timeblocks
+    if "target_vo_duration_sec" not in seg:
+        # default ringan 180s
+        seg["target_vo_duration_sec"] = 180
+    return seg
+
 def _ensure_storyboard_minimal_fields(sb: dict, film_duration: int, language: str, secs_map: dict | None = None) -> dict:
     sb = sb or {}
     fm = sb.get("film_meta") or {}
@@ -174,16 +191,7 @@ def _ensure_storyboard_minimal_fields(sb: dict, film_duration: int, language: st
     if not isinstance(segs, list):
         segs = []
     for seg in segs:
-        seg.setdefault("vo_language", language)
-        # Tidak menambahkan effects_pool apapun; efek dihandle di tahap editing
-        vr = seg.get("vo_meta") or {}
-        vr.setdefault("speech_rate_wpm", 160)
-        vr.setdefault("fit", "OK")
-        seg["vo_meta"] = vr
-        # Beats-only mode: jangan paksa field source_timeblocks
-        if "target_vo_duration_sec" not in seg:
-            # default ringan 180s
-            seg["target_vo_duration_sec"] = 180
+        _ensure_segment_minimal_fields(seg, language)
     if not segs:
         labels = ["Intro","Rising","Mid-conflict","Climax","Ending"]
         if secs_map:
@@ -202,6 +210,721 @@ def _ensure_storyboard_minimal_fields(sb: dict, film_duration: int, language: st
     sb["segments"] = segs
     return sb
 
+# Endpoint override (mis. server lokal tiruan untuk pengujian). Kosong = endpoint resmi.
+GEMINI_ENDPOINT_ENV = "GEMINI_API_ENDPOINT"
+
+def _client_options(api_key: str) -> dict:
+    opts = {"api_key": api_key}
+    endpoint = os.environ.get(GEMINI_ENDPOINT_ENV, "").strip()
+    if endpoint:
+        opts["api_endpoint"] = endpoint
+    return opts
+
+
+class _PublicModel:
+    """GenerativeModel stand-in for the public-API fallback of _GeminiClientPool.
+
+    The SDK binds a model to the global client on its first call, so a fresh model is built
+    per call, right after genai.configure() for this key and under the same lock.
+    """
+
+    def __init__(self, pool, api_key: str, transport, factory):
+        self._pool, self._api_key, self._transport, self._factory = pool, api_key, transport, factory
+
+    def generate_content(self, *args, **kwargs):
+        with self._pool._configured(self._api_key, self._transport):
+            return self._factory().generate_content(*args, **kwargs)
+
+    def count_tokens(self, *args, **kwargs):
+        with self._pool._configured(self._api_key, self._transport):
+            return self._factory().count_tokens(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._factory(), name)
+
+
+# Versi google-generativeai yang internalnya (_ClientManager dkk.) sudah diverifikasi untuk pool per key
+GENAI_INTERNALS_VERSION = "0.8.6"
+
+class _GeminiClientPool:
+    """Keeps one configured SDK client set per (API key, transport).
+
+    Callers borrow clients by key instead of calling genai.configure(), so requests on
+    different keys can run in parallel threads. The underlying gRPC channels / HTTP
+    sessions stay open and are reused across calls.
+
+    Per-key clients rely on SDK internals (client._ClientManager, GenerativeModel._client,
+    CachedContent._prepare_create_request/_from_obj/_update), so they are only used on the pinned
+    SDK version (GENAI_INTERNALS_VERSION). On any other version, or when one of them is missing
+    (checked once), the pool falls back to the public API:
+    genai.configure() for the key followed by the call, under one lock. Calls on different
+    keys are then serialized, but still work.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._public_lock = threading.RLock()
+        self._managers = {}
+        self._internals = None
+
+    def uses_internals(self) -> bool:
+        if self._internals is None:
+            version = getattr(genai, "__version__", "")
+            if version != GENAI_INTERNALS_VERSION:
+                print(f"[Gemini] google-generativeai {version or '?'} (bukan {GENAI_INTERNALS_VERSION}); "
+                      "memakai API publik (genai.configure per panggilan, serial).")
+                self._internals = False
+                return False
+            try:
+                from google.generativeai import caching
+                from google.generativeai.client import _ClientManager
+                ok = (hasattr(_ClientManager, "configure") and hasattr(_ClientManager, "get_default_client")
+                      and all(hasattr(caching.CachedContent, a) for a in ("_prepare_create_request", "_from_obj", "_update"))
+                      and "_client" in vars(genai.GenerativeModel("gemini-2.5-flash")))
+            except Exception:
+                ok = False
+            if not ok:
+                print("[Gemini] Internal SDK tidak tersedia; memakai API publik (genai.configure per panggilan, serial).")
+            self._internals = ok
+        return self._internals
+
+    @staticmethod
+    def _transport(transport):
+        if os.environ.get(GEMINI_ENDPOINT_ENV, "").strip():
+            return transport or "rest"  # endpoint lokal hanya berbicara REST
+        return transport
+
+    @contextlib.contextmanager
+    def _configured(self, api_key: str, transport=None):
+        """Public-API fallback: the global SDK configuration belongs to this key while the block runs."""
+        with self._public_lock:
+            genai.configure(transport=self._transport(transport), client_options=_client_options(api_key))
+            yield
+
+    def client(self, api_key: str, service: str, transport: str | None = None):
+        from google.generativeai.client import _ClientManager
+        transport = self._transport(transport)
+        with self._lock:
+            cm = self._managers.get((api_key, transport))
+            if cm is None:
+                cm = _ClientManager()
+                cm.configure(transport=transport, client_options=_client_options(api_key))
+                self._managers[(api_key, transport)] = cm
+            return cm.get_default_client(service)
+
+    def model(self, api_key: str, model_name: str, transport: str | None = None, **kwargs):
+        if not self.uses_internals():
+            return _PublicModel(self, api_key, transport, lambda: genai.GenerativeModel(model_name=model_name, **kwargs))
+        m = genai.GenerativeModel(model_name=model_name, **kwargs)
+        m._client = self.client(api_key, "generative", transport)
+        return m
+
+    def cached_model(self, api_key: str, cache, **kwargs):
+        if not self.uses_internals():
+            return _PublicModel(self, api_key, None,
+                                lambda: genai.GenerativeModel.from_cached_content(cached_content=cache, **kwargs))
+        m = genai.GenerativeModel.from_cached_content(cached_content=cache, **kwargs)
+        m._client = self.client(api_key, "generative")
+        return m
+
+    def upload_file(self, api_key: str, path: str):
+        import mimetypes
+        mime_type, _ = mimetypes.guess_type(path)
+        if not self.uses_internals():
+            with self._configured(api_key):
+                return genai.upload_file(path, mime_type=mime_type or "text/plain", display_name=Path(path).name)
+        from google.generativeai.types import file_types
+        proto = self.client(api_key, "file").create_file(
+            path=path, mime_type=mime_type or "text/plain", display_name=Path(path).name
+        )
+        return file_types.File(proto)
+
+    def create_cache(self, api_key: str, model_name: str, **kwargs):
+        from google.generativeai import caching
+        if not self.uses_internals():
+            with self._configured(api_key):
+                return caching.CachedContent.create(model=model_name, **kwargs)
+        request = caching.CachedContent._prepare_create_request(model=model_name, **kwargs)
+        response = self.client(api_key, "cache").create_cached_content(request)
+        return caching.CachedContent._from_obj(response)
+
+    def update_cache_ttl(self, api_key: str, cache, ttl_sec: int):
+        if not self.uses_internals():
+            with self._configured(api_key):
+                cache.update(ttl=datetime.timedelta(seconds=ttl_sec))
+            return
+        from google.generativeai import protos
+        from google.protobuf import field_mask_pb2
+        updates = protos.CachedContent(name=cache.name, ttl=datetime.timedelta(seconds=ttl_sec))
+        mask = field_mask_pb2.FieldMask(paths=["ttl"])
+        response = self.client(api_key, "cache").update_cached_content(
+            protos.UpdateCachedContentRequest(cached_content=updates, update_mask=mask)
+        )
+        cache._update(response)
+
+    def delete_cache(self, api_key: str, name: str):
+        if not self.uses_internals():
+            from google.generativeai import caching
+            with self._configured(api_key):
+                caching.CachedContent.get(name).delete()
+            return
+        from google.generativeai import protos
+        self.client(api_key, "cache").delete_cached_content(protos.DeleteCachedContentRequest(name=name))
+
+
+_client_pool = _GeminiClientPool()
+
+def _get_srt_file_part(api_key: str, srt_path: str, log=None):
+    """Returns a file part for srt_path usable by api_key.
+    Reuses a live upload from the registry; uploads only when none is recorded."""
+    import upload_registry as _ur
+    reg = _ur.get_registry()
+    content_hash = _ur.file_sha256(srt_path)
+    entry = reg.get(api_key, content_hash)
+    if entry:
+        if log: log(f"Memakai ulang SRT terunggah: {entry['name']}")
+        return {"file_data": {"mime_type": entry["mime_type"], "file_uri": entry["uri"]}}
+    uf = _client_pool.upload_file(api_key, srt_path)
+    expires_at = None
+    try:
+        expires_at = uf.expiration_time.timestamp()
+    except Exception:
+        pass
+    reg.put(api_key, content_hash, uf.name, uf.uri, getattr(uf, "mime_type", None), expires_at)
+    if log: log(f"Upload sukses: {uf.name}")
+    return uf
+
+def _forget_srt_upload_on_error(api_key: str, srt_path: str, exc: Exception):
+    """Drops the registry entry when the error says the remote file is gone or not ours."""
+    msg = str(exc); low = msg.lower()
+    if ("file" in low) and (("403" in msg) or ("404" in msg) or ("not found" in low) or ("permission" in low)):
+        try:
+            import upload_registry as _ur
+            _ur.get_registry().forget(api_key, _ur.file_sha256(srt_path))
+        except Exception:
+            pass
+
+def _estimate_tokens(*parts) -> int:
+    """Rough input-token estimate (~4 chars per token). Path parts are measured by file size."""
+    total = 0
+    for p in parts:
+        if isinstance(p, (str, bytes)) and len(p) < 1024 and os.path.isfile(p):
+            try:
+                total += os.path.getsize(p)
+                continue
+            except OSError:
+                pass
+        if isinstance(p, (str, bytes)):
+            total += len(p)
+    return max(1, total // 4)
+
+def _usage_tokens(resp) -> int | None:
+    try:
+        return int(resp.usage_metadata.total_token_count) or None
+    except Exception:
+        return None
+
+def _scheduled_keys(api_key: str | None, est_tokens: int = 0, max_wait: float = 90.0, pool: str = "text",
+                    model: str | None = None):
+    """Yields (attempt_no, total_keys, key, scheduler) from the shared KeyScheduler.
+    Each key is handed out at most once per loop; the caller must call scheduler.release()
+    on success or scheduler.report_error() on failure for every yielded key."""
+    import api_manager as _am
+    sched = _am.get_scheduler(pool, model)
+    tried = set()
+    while True:
+        k = sched.acquire(preferred=api_key, est_tokens=est_tokens, exclude=tried, max_wait=max_wait)
+        if not k:
+            return
+        tried.add(k)
+        yield len(tried), max(len(tried), sched.key_count()), k, sched
+
+# Subtitle ringkas untuk prompt: satu baris per kalimat, timestamp detik; dipetakan balik ke ms asli
+COMPACT_SRT_NOTE = (
+    "\n\nFORMAT SUBTITLE INPUT:\n"
+    "- Subtitle sudah diringkas: satu baris per kalimat `[m:ss] teks` (atau `[h:mm:ss] teks`); timestamp = waktu mulai kalimat di film.\n"
+    "- Hitung src_at_ms dari timestamp tersebut: ((jam*60 + menit)*60 + detik) * 1000.\n"
+    "- Jika menulis source_timeblocks, tetap gunakan format HH:MM:SS.mmm.\n"
+)
+
+def _prepare_prompt_srt(srt_path: str, log=None):
+    """Returns (path_to_send, CompactSrt|None). Falls back to the raw SRT if compaction fails."""
+    try:
+        import subtitle_utils as _su
+        path, compact = _su.compact_srt_file(srt_path)
+        if not compact.lines:
+            return srt_path, None
+        if log:
+            log(f"SRT diringkas untuk prompt: {compact.reduction_summary()}")
+        return path, compact
+    except Exception as e:
+        if log:
+            log(f"Peringatan: gagal meringkas SRT ({e}); memakai SRT asli.")
+        return srt_path, None
+
+EXCERPT_TOKEN_BUDGET = 3000
+
+def _build_srt_excerpt(srt_path: str, compact=None, token_budget: int = EXCERPT_TOKEN_BUDGET) -> str:
+    """Stratified whole-cue excerpt ('[m:ss] teks') for prompts that cannot use the uploaded file."""
+    try:
+        import subtitle_utils as _su
+        if compact is not None:
+            lines = compact.lines
+        else:
+            lines = _su.merge_sentences(_su.dedupe_rolling(_su.load_srt(srt_path)))
+        return _su.stratified_excerpt(lines, token_budget)
+    except Exception:
+        return ""
+
+# Perbaikan panjang VO: kirim vo_script + selisih kata saja, beats diskalakan lokal
+VO_LENGTH_TOLERANCE = 0.10
+VO_REPAIR_ATTEMPTS = 2
+BEAT_MIN_MS, BEAT_MAX_MS = 600, 4000
+
+def _vo_stats(text: str, wpm: float, target_sec: float | None = None, rate=None) -> dict:
+    """vo_meta numbers using the storyboard prompt's duration formula (or a calibrated speech_rate model)."""
+    import speech_rate as _sr
+    words, sentences, commas = _sr.text_counts(text)
+    if rate is not None and rate.calibrated:
+        pred = rate.predict(words, sentences, commas)
+    else:
+        pred = words / (max(1.0, float(wpm)) / 60.0) + sentences * 0.30 + commas * 0.12
+    out = {"words_actual": words, "sentences": sentences, "commas": commas, "predicted_duration_sec": round(pred, 2)}
+    if target_sec:
+        out["delta_sec"] = round(pred - float(target_sec), 2)
+    return out
+
+def _rescale_beats(beats: list, factor: float, ranges=None, target_ms: int | None = None) -> list:
+    """Stretches/compresses a beat timeline by factor and keeps it gapless.
+
+    Clip lengths are scaled and clamped to BEAT_MIN_MS-BEAT_MAX_MS and to the end of the source
+    range ({start, end}) the clip starts in; at_ms is then recomputed cumulatively from those
+    lengths. What still differs from the target (old timeline end * factor, or target_ms) is
+    spread over the clips within their limits; beyond that a clip continuing the last one is
+    added, or trailing clips are dropped.
+    """
+    if not beats or not factor or (abs(factor - 1.0) < 1e-3 and target_ms is None):
+        return beats
+    import subtitle_utils as _su
+    spans = []
+    for r in ranges or []:
+        if isinstance(r, dict):
+            st, en = _su.parse_timestamp(r.get('start', '')), _su.parse_timestamp(r.get('end', ''))
+            if st is not None and en is not None and en > st:
+                spans.append((st, en))
+    spans.sort()
+
+    def room(src):
+        # Sisa rentang sumber yang memuat src (None = tidak dibatasi)
+        for st, en in spans:
+            if st <= src < en:
+                return en - src
+        return None
+
+    rows = []
+    for b in beats:
+        if not isinstance(b, dict):
+            continue
+        try:
+            rows.append((float(b.get("at_ms", 0) or 0), float(b.get("src_at_ms", 0) or 0),
+                         float(b.get("src_length_ms", 0) or 0), b))
+        except (TypeError, ValueError):
+            continue
+    if not rows:
+        return beats
+    rows.sort(key=lambda r: r[0])
+    start = int(round(rows[0][0] * factor))
+    end_old = max(at + ln for at, _, ln, _ in rows)
+    target = int(round(target_ms if target_ms is not None else end_old * factor))
+
+    out, lens, lo, hi = [], [], [], []
+    for _, src, ln, b in rows:
+        r = room(src)
+        h = float(BEAT_MAX_MS) if r is None else float(min(BEAT_MAX_MS, r))
+        l = float(min(BEAT_MIN_MS, h))
+        out.append(dict(b))
+        lens.append(min(h, max(l, ln * factor)))
+        lo.append(l); hi.append(h)
+
+    # Sebarkan selisih ke target secara proporsional terhadap ruang tiap klip
+    diff = target - start - sum(lens)
+    slack = [(h - x) if diff > 0 else (x - l) for x, l, h in zip(lens, lo, hi)]
+    total = sum(slack)
+    if total > 0 and abs(diff) > 0.5:
+        take = min(1.0, abs(diff) / total)
+        lens = [x + (1 if diff > 0 else -1) * s * take for x, s in zip(lens, slack)]
+        diff = target - start - sum(lens)
+
+    if diff >= BEAT_MIN_MS / 2:
+        # Semua klip sudah maksimal: tambah klip yang melanjutkan klip terakhir di sumber
+        while diff >= BEAT_MIN_MS / 2:
+            src = float(out[-1].get("src_at_ms", 0) or 0) + lens[-1]
+            r = room(src)
+            if spans and (r is None or r < BEAT_MIN_MS):
+                # Rentang ini habis (atau di luar semua rentang): lanjut di rentang berikutnya
+                nxt = [st for st, en in spans if st >= src and en - st >= BEAT_MIN_MS]
+                if not nxt:
+                    break
+                src, r = float(nxt[0]), room(float(nxt[0]))
+            ln = min(float(BEAT_MAX_MS), max(float(BEAT_MIN_MS), diff), float(r) if r is not None else float(BEAT_MAX_MS))
+            nb = dict(out[-1])
+            nb["src_at_ms"] = int(round(src))
+            nb["note"] = "auto (perpanjangan VO)"
+            out.append(nb); lens.append(ln); lo.append(float(BEAT_MIN_MS)); hi.append(ln)
+            diff -= ln
+    elif diff <= -BEAT_MIN_MS / 2:
+        # Semua klip sudah minimal: buang klip di akhir yang seluruhnya melewati target
+        while len(out) > 1 and start + sum(lens[:-1]) >= target:
+            out.pop(); lens.pop(); lo.pop(); hi.pop()
+        rest = target - start - sum(lens[:-1])
+        if rest < lo[-1] and len(out) > 1:
+            # Sisa terlalu pendek untuk satu klip: buang klip terakhir, sisanya ke klip sebelumnya
+            out.pop(); lens.pop(); lo.pop(); hi.pop()
+            for i in range(len(lens) - 1, -1, -1):
+                add = min(rest, hi[i] - lens[i])
+                lens[i] += add
+                rest -= add
+                if rest <= 0.5:
+                    break
+        else:
+            lens[-1] = max(lo[-1], rest)
+
+    at = start
+    for nb, ln in zip(out, lens):
+        ln = int(round(ln))
+        nb["at_ms"] = at
+        nb["src_length_ms"] = ln
+        at += ln
+    return out
+
+def _vo_repair_prompt(label: str, language: str, vo_script: str, words_actual: int, words_target: int) -> str:
+    delta = words_target - words_actual
+    action = f"PERPANJANG sekitar {delta} kata" if delta > 0 else f"RINGKAS sekitar {-delta} kata"
+    return (
+        "# Perbaiki panjang VO (JSON saja)\n"
+        f"Label: {label}\n"
+        f"Bahasa VO: {language}\n"
+        f"VO saat ini {words_actual} kata; target {words_target} kata (toleransi ±5%). {action}.\n"
+        "Pertahankan alur, fakta, urutan kejadian, gaya narasi, dan HOOK di kalimat pertama.\n"
+        "Jangan menambah karakter atau kejadian baru. Jangan copy dialog asli.\n"
+        "Keluarkan JSON: {\"vo_script\": \"...\"}\n\n"
+        "VO SAAT INI:\n" + (vo_script or "") + "\n"
+    )
+
+# Planner lokal (tanpa API): pembagian 5 babak + beats dari timing & kepadatan cue
+NAIVE_ACT_BOUNDS = {"Intro": 0.12, "Rising": 0.45, "Mid-conflict": 0.70, "Climax": 0.90, "Ending": 1.0}
+NAIVE_SCENE_GAP_MS = 4000
+NAIVE_CLIP_PATTERN_MS = (3200, 3600, 4000, 3400, 3800)
+
+def _naive_plan_from_srt(srt_path: str, secs_map: dict | None = None, film_duration: int | None = None, cues=None) -> dict:
+    """Deterministic five-act plan with source_timeblocks and beats-only timelines, in ms.
+
+    Act boundaries start at fixed proportions of the film and snap to the longest dialogue
+    pause within +-5% (scene breaks). Inside each act, cues are grouped into scenes at
+    pauses > NAIVE_SCENE_GAP_MS; the densest/most informative scenes become timeblocks and
+    are cut into 3.2-4.0 s beats until the segment's VO duration is covered.
+    Returns {"segments": []} when the SRT has no cues.
+    """
+    import numpy as np
+    import subtitle_utils as _su
+    try:
+        if cues is None:
+            cues = _su.merge_sentences(_su.dedupe_rolling(_su.load_srt(srt_path)))
+    except Exception:
+        cues = []
+    if not cues:
+        return {"segments": []}
+    secs_map = secs_map or {"Intro": 180, "Rising": 480, "Mid-conflict": 360, "Climax": 360, "Ending": 240}
+    starts = np.array([c.start_ms for c in cues], dtype=np.int64)
+    ends = np.array([c.end_ms for c in cues], dtype=np.int64)
+    total_ms = int(max(int(ends.max()), int(film_duration or 0) * 1000))
+    scores = _su.score_cues(cues)
+    gaps = np.append(starts[1:] - ends[:-1], 0)  # jeda setelah cue i
+
+    # Batas babak: cari jeda terpanjang di sekitar proporsi nominal
+    bounds = [0]
+    win = int(0.05 * total_ms)
+    for lab in SEGMENT_ORDER[:-1]:
+        nominal = int(NAIVE_ACT_BOUNDS[lab] * total_ms)
+        cand = np.nonzero((ends >= nominal - win) & (ends <= nominal + win) & (ends > bounds[-1]))[0]
+        if len(cand):
+            i = cand[np.argmax(gaps[cand])]
+            bounds.append(int(ends[i]) + int(gaps[i]) // 2)
+        else:
+            bounds.append(max(bounds[-1] + 1, nominal))
+    bounds.append(total_ms)
+
+    segments = []
+    for ai, lab in enumerate(SEGMENT_ORDER):
+        a0, a1 = bounds[ai], bounds[ai + 1]
+        idx = np.nonzero((starts >= a0) & (starts < a1))[0]
+        need_ms = int(secs_map.get(lab, 180)) * 1000
+        scenes = []
+        if len(idx):
+            cut = np.nonzero(gaps[idx[:-1]] > NAIVE_SCENE_GAP_MS)[0] + 1
+            for grp in np.split(idx, cut):
+                scenes.append((float(scores[grp].sum()), int(starts[grp[0]]), int(ends[grp[-1]]), int(len(grp))))
+        # Pilih scene terbaik sampai total durasinya menutup kebutuhan VO, lalu urutkan kronologis
+        picked, covered = [], 0
+        for sc in sorted(scenes, key=lambda x: (-x[0], x[1])):
+            if covered >= need_ms:
+                break
+            picked.append(sc)
+            covered += max(1, sc[2] - sc[1])
+        picked.sort(key=lambda x: x[1])
+        blocks = [(st, max(st + 1000, et)) for _, st, et, _ in picked] or [(a0, max(a0 + 1000, a1))]
+
+        beats, at, k = [], 0, 0
+        while at < need_ms:
+            progressed = False
+            for st, et in blocks:
+                pos = st
+                while pos < et and at < need_ms:
+                    ln = min(NAIVE_CLIP_PATTERN_MS[k % len(NAIVE_CLIP_PATTERN_MS)], need_ms - at)
+                    # Klip tidak melewati akhir blok; sisa blok yang terlalu pendek tidak dijadikan klip sendiri
+                    room = et - pos
+                    if room - ln < BEAT_MIN_MS:
+                        ln = min(room if room <= BEAT_MAX_MS else room - BEAT_MIN_MS, need_ms - at)
+                    beats.append({"at_ms": at, "src_at_ms": int(pos), "src_length_ms": int(ln), "note": "auto (planner lokal)"})
+                    at += ln; pos += ln; k += 1; progressed = True
+                if at >= need_ms:
+                    break
+            if not progressed:
+                break
+            if at < need_ms:
+                # Scene terpilih habis: lanjut dengan scene berikutnya yang belum dipakai (kronologis)
+                rest = [(st, max(st + 1000, et)) for _, st, et, _ in sorted(scenes, key=lambda x: x[1]) if (st, max(st + 1000, et)) not in blocks]
+                blocks = rest or blocks
+        segments.append({
+            "label": lab,
+            "act_range_ms": [int(a0), int(a1)],
+            "source_timeblocks": [
+                {"start": _su.format_srt_time(st).replace(",", "."), "end": _su.format_srt_time(et).replace(",", "."),
+                 "reason": f"dialog padat ({n} kalimat)"}
+                for _, st, et, n in picked
+            ],
+            "beats": beats,
+        })
+    return {"segments": segments}
+
+def _snap_segment_times(seg: dict, compact) -> dict:
+    """Maps second-resolution times from the compact prompt back to exact source ms (in place)."""
+    if compact is None or not isinstance(seg, dict):
+        return seg
+    import subtitle_utils as _su
+    for b in seg.get("beats") or []:
+        if isinstance(b, dict) and b.get("src_at_ms") is not None:
+            b["src_at_ms"] = compact.to_source_ms(b["src_at_ms"])
+    for tb in seg.get("source_timeblocks") or []:
+        if not isinstance(tb, dict):
+            continue
+        for fld in ("start", "end"):
+            ms = _su.parse_timestamp(tb.get(fld, ""))
+            if ms is not None:
+                tb[fld] = _su.format_srt_time(compact.to_source_ms(ms)).replace(",", ".")
+    return seg
+
+# Hedged request: jika panggilan belum selesai setelah persentil latensi yang teramati,
+# kirim permintaan yang sama ke key sehat kedua; respons pertama yang menang.
+HEDGE_MIN_SAMPLES = 5
+HEDGE_MIN_DELAY_SEC = 3.0
+HEDGE_BUDGET_RATIO = 0.10  # maks. ~10% panggilan boleh di-hedge (plus 1 jatah awal)
+
+class _LatencyStats:
+    """Process-wide latency samples per call type plus the hedge budget."""
+
+    def __init__(self, max_samples: int = 50):
+        from collections import deque
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._deque = deque
+        self._max = max_samples
+        self.calls = 0
+        self.hedges = 0
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            d = self._samples.get(name)
+            if d is None:
+                d = self._samples[name] = self._deque(maxlen=self._max)
+            d.append(float(seconds))
+
+    def count_call(self):
+        with self._lock:
+            self.calls += 1
+
+    def percentile(self, name: str, pct: float) -> float | None:
+        with self._lock:
+            vals = sorted(self._samples.get(name) or ())
+        if len(vals) < HEDGE_MIN_SAMPLES:
+            return None
+        idx = min(len(vals) - 1, max(0, int(round((pct / 100.0) * (len(vals) - 1)))))
+        return max(HEDGE_MIN_DELAY_SEC, vals[idx])
+
+    def take_hedge(self) -> bool:
+        with self._lock:
+            if self.hedges + 1 > HEDGE_BUDGET_RATIO * self.calls + 1:
+                return False
+            self.hedges += 1
+            return True
+
+    def give_back_hedge(self):
+        with self._lock:
+            self.hedges = max(0, self.hedges - 1)
+
+_latency_stats = _LatencyStats()
+
+def _run_in_daemon(fn, *args):
+    """Runs fn in a daemon thread and returns a Future (abandoned calls never block exit)."""
+    from concurrent.futures import Future
+    fut = Future()
+    def run():
+        try:
+            fut.set_result(fn(*args))
+        except BaseException as e:
+            fut.set_exception(e)
+    threading.Thread(target=run, daemon=True).start()
+    return fut
+
+def _hedged_generate(sched, key: str, make_model, prompt, timeout_s: int, est_tokens: int,
+                     stats_name: str, hedge_percentile: float | None = None, on_error=None, log=None):
+    """generate_content on `key`, optionally hedged onto a second idle key.
+
+    Returns (response, winning_key, seconds). Every launched key is settled with the
+    scheduler (release / report_error); on_error(key, exc) is called for each failure.
+    The losing call cannot be aborted by the SDK, so it is abandoned: its result is
+    discarded and its reservation settled when it returns.
+    """
+    def attempt(k):
+        model = make_model(k)
+        t0 = time.time()
+        resp = model.generate_content(prompt, request_options={"timeout": timeout_s})
+        return resp, k, time.time() - t0
+
+    def fail(k, e):
+        sched.report_error(k, e)
+        if on_error:
+            try:
+                on_error(k, e)
+            except Exception:
+                pass
+
+    _latency_stats.count_call()
+    delay = _latency_stats.percentile(stats_name, hedge_percentile) if hedge_percentile else None
+    if delay is None or delay >= timeout_s:
+        try:
+            resp, k, dt = attempt(key)
+        except Exception as e:
+            fail(key, e)
+            raise
+        sched.release(key, _usage_tokens(resp), est_tokens)
+        _latency_stats.record(stats_name, dt)
+        return resp, key, dt
+
+    from concurrent.futures import wait, FIRST_COMPLETED
+    pending = {_run_in_daemon(attempt, key): key}
+    t_start = time.time()
+    done, _ = wait(list(pending), timeout=delay)
+    if not done and _latency_stats.take_hedge():
+        k2 = sched.acquire(est_tokens=est_tokens, exclude={key}, max_wait=0)
+        if k2:
+            if log:
+                log(f"[API] Belum ada respons setelah {delay:.1f}s (p{hedge_percentile:g}); hedge ke key lain...")
+            pending[_run_in_daemon(attempt, k2)] = k2
+        else:
+            _latency_stats.give_back_hedge()  # tidak ada key sehat
+    last_exc = None
+    while pending:
+        done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+        for fut in done:
+            k = pending.pop(fut)
+            try:
+                resp, _, dt = fut.result()
+            except Exception as e:
+                last_exc = e
+                fail(k, e)
+                continue
+            sched.release(k, _usage_tokens(resp), est_tokens)
+            _latency_stats.record(stats_name, dt)
+            for loser, lk in pending.items():
+                def settle(f, lk=lk):
+                    try:
+                        r = f.result()[0]
+                        sched.release(lk, _usage_tokens(r), est_tokens)
+                    except Exception as e:
+                        sched.report_error(lk, e)
+                loser.add_done_callback(settle)
+            return resp, k, time.time() - t_start
+    raise last_exc or RuntimeError("Hedged request failed")
+
+# Context cache (Gemini cached content) untuk system prompt + SRT, satu per job per key
+SRT_CACHE_TTL_SEC = 30 * 60
+SRT_CACHE_REFRESH_SEC = 5 * 60
+
+def _create_srt_context_cache(api_key: str, model_name: str, system_prompt: str, srt_path: str, log=None):
+    """Creates a cached context holding system_prompt + SRT for api_key.
+    Returns the CachedContent, or None when caching is unavailable (model, size minimum, endpoint)."""
+    try:
+        part = _get_srt_file_part(api_key, srt_path, log)
+        if not isinstance(part, dict):
+            part = {"file_data": {"mime_type": part.mime_type, "file_uri": part.uri}}
+        cache = _client_pool.create_cache(
+            api_key,
+            model_name,
+            display_name=f"restory-srt-{Path(srt_path).stem}"[:120],
+            system_instruction=system_prompt,
+            contents=[{"role": "user", "parts": [part]}],
+            ttl=datetime.timedelta(seconds=SRT_CACHE_TTL_SEC),
+        )
+        if log: log(f"Context cache dibuat: {cache.name} (TTL {SRT_CACHE_TTL_SEC//60} menit)")
+        return cache
+    except Exception as e:
+        _forget_srt_upload_on_error(api_key, srt_path, e)
+        if log: log(f"Context cache tidak tersedia, pakai prompt penuh: {e}")
+        return None
+
+def _refresh_srt_context_cache(api_key: str, cache):
+    """Extends the cache TTL when it is close to expiring (job masih berjalan)."""
+    try:
+        remaining = cache.expire_time.timestamp() - time.time()
+    except Exception:
+        return
+    if remaining < SRT_CACHE_REFRESH_SEC:
+        _client_pool.update_cache_ttl(api_key, cache, SRT_CACHE_TTL_SEC)
+
+SEGMENT_ORDER = ["Intro", "Rising", "Mid-conflict", "Climax", "Ending"]
+
+def _stream_json_segments(model, contents, timeout_s: int, parser, emit):
+    """Runs a streamed generate_content call, feeding text into parser and emitting closed segments."""
+    resp = model.generate_content(contents, stream=True, request_options={"timeout": timeout_s})
+    for chunk in resp:
+        try:
+            txt = chunk.text
+        except Exception:
+            continue  # chunk tanpa teks (mis. hanya metadata)
+        for seg in parser.feed(txt):
+            emit(seg)
+    return resp
+
+def _merge_streamed_segments(data: dict, emitted: dict) -> dict:
+    """Segments already handed downstream win over later versions so results stay consistent."""
+    segs = [s for s in (data.get("segments") or []) if isinstance(s, dict)]
+    seen = set()
+    merged = []
+    for seg in segs:
+        lab = seg.get("label")
+        if lab in seen:
+            continue
+        seen.add(lab)
+        merged.append(emitted.get(lab, seg))
+    for lab, seg in emitted.items():
+        if lab not in seen:
+            merged.append(seg)
+    rank = {lab: i for i, lab in enumerate(SEGMENT_ORDER)}
+    merged.sort(key=lambda sg: rank.get(sg.get("label"), len(rank)))
+    data["segments"] = merged
+    return data
+
 def get_storyboard_from_srt_fast(
     srt_path: str,
     api_key: str,
@@ -211,24 +934,20 @@ def get_storyboard_from_srt_fast(
     progress_callback=None,
     recap_minutes: int | None = None,
     timeout_s: int = 180,
+    on_segment=None,
+    voice_key: str | None = None,
 ):
+    """Storyboard satu panggilan (Flash) yang di-stream.
+
+    on_segment(seg) dipanggil sekali per label begitu objek segmen selesai di-stream,
+    sebelum segmen berikutnya selesai dibuat. Jika stream terpotong, segmen yang sudah
+    lengkap tetap dipakai dan hanya sisanya yang dicoba ulang. voice_key: lihat
+    get_storyboard_from_srt (target kata dari model kecepatan bicara terkalibrasi).
+    """
     def log(msg):
         if progress_callback: progress_callback(msg)
-
-    # Siapkan rotasi key
-    try:
-        import api_manager as _am
-        am = _am.APIManager()
-        available_keys = am.get_available_keys()
-        if api_key and api_key in available_keys:
-            available_keys = [api_key] + [k for k in available_keys if k != api_key]
-        elif api_key and not am.is_key_on_cooldown(api_key):
-            available_keys = [api_key] + available_keys
-        if not available_keys:
-            available_keys = [api_key] if api_key else []
-    except Exception:
-        am = None
-        available_keys = [api_key] if api_key else []
+    import storyboard_schema as _sbs
+    import speech_rate as _sr
 
     # Hitung porsi durasi per segmen berdasarkan recap_minutes (default 10 menit)
     total_target_sec = int((recap_minutes or 10) * 60)
@@ -244,112 +963,146 @@ def get_storyboard_from_srt_fast(
         .replace("{mid_vo_sec}", str(secs_map["Mid-conflict"])) \
         .replace("{climax_vo_sec}", str(secs_map["Climax"])) \
         .replace("{ending_vo_sec}", str(secs_map["Ending"]))
+    rate = _sr.get_store().model(voice_key) if voice_key else None
+    if rate is not None and rate.calibrated:
+        words_line = ", ".join(f"{k}={rate.words_for(secs_map[k])}" for k in SEGMENT_ORDER)
+        sys_prompt += f"\nTARGET KATA VO (dikalibrasi dari durasi TTS nyata, ±5%): {words_line}\n"
+        log(f"[FAST] Speech-rate terkalibrasi untuk '{voice_key}' ({rate.samples} chunk): {words_line}")
+    prompt_srt, compact = _prepare_prompt_srt(srt_path, log)
+    if compact is not None:
+        sys_prompt += COMPACT_SRT_NOTE
+
+    emitted: dict[str, dict] = {}
+    film_meta: dict = {}
+
+    def emit(seg: dict):
+        seg, issues = _sbs.validate_segment(seg, language=language)
+        seg = _ensure_segment_minimal_fields(_snap_segment_times(seg, compact), language)
+        lab = seg.get("label")
+        if not lab or lab in emitted:
+            return
+        if issues:
+            log(f"[FAST] Validasi segmen '{lab}':\n{_sbs.format_issues(issues)}")
+        emitted[lab] = seg
+        log(f"[FAST] Segmen '{lab}' selesai di-stream ({len(emitted)}/{len(SEGMENT_ORDER)}).")
+        if on_segment:
+            try:
+                on_segment(seg)
+            except Exception as e:
+                log(f"[FAST] on_segment '{lab}' error: {e}")
+
+    def finish(data: dict | None, tag: str = ""):
+        if data is not None:
+            data, issues = _sbs.validate_storyboard(data, language)
+            if issues:
+                log(f"[FAST] Validasi storyboard:\n{_sbs.format_issues(issues)}")
+        for seg in (data or {}).get("segments") or []:
+            if isinstance(seg, dict) and seg.get("label") not in emitted:
+                _snap_segment_times(seg, compact)
+        data = _merge_streamed_segments(data or {"film_meta": film_meta}, emitted)
+        data = _ensure_storyboard_minimal_fields(data, film_duration, language, secs_map)
+        out = Path(output_folder) / "storyboard_output.json"
+        with open(out, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        log(f"[FAST] {tag}Menyimpan storyboard JSON ke {out}")
+        return data
+
+    def run_stream(model, contents):
+        from json_stream import SegmentStreamParser
+        parser = SegmentStreamParser("segments")
+        try:
+            resp = _stream_json_segments(model, contents, timeout_s, parser, emit)
+        finally:
+            if isinstance(parser.fields.get("film_meta"), dict):
+                film_meta.update(parser.fields["film_meta"])
+        return resp, parser
 
     last_exc = None
-    uploaded_per_key = {}
-    for ki, k in enumerate(available_keys, 1):
+    est_tokens = _estimate_tokens(sys_prompt, prompt_srt)
+    for ki, nkeys, k, sched in _scheduled_keys(api_key, est_tokens, model="gemini-2.5-flash"):
+        reserved = True
         try:
-            genai.configure(api_key=k)
-            log(f"[FAST] Upload SRT untuk key#{ki}/{len(available_keys)}...")
-            uf = genai.upload_file(path=srt_path)
-            uploaded_per_key[k] = uf
-            model = genai.GenerativeModel(
+            log(f"[FAST] Siapkan SRT untuk key#{ki}/{nkeys}...")
+            uf = _get_srt_file_part(k, prompt_srt, log)
+            model = _client_pool.model(
+                k,
                 model_name="gemini-2.5-flash",
                 generation_config={
                     "temperature": 0.5,
                     "top_p": 0.8,
                     "response_mime_type": "application/json",
+                    "response_schema": _sbs.STORYBOARD_SCHEMA,
                 },
                 safety_settings=[{"category": c, "threshold": "BLOCK_NONE"} for c in [
                     "HARM_CATEGORY_HARASSMENT","HARM_CATEGORY_HATE_SPEECH",
                     "HARM_CATEGORY_SEXUALLY_EXPLICIT","HARM_CATEGORY_DANGEROUS_CONTENT"]]
             )
             t0 = time.time()
-            resp = model.generate_content([sys_prompt, "\n\n---\n\n## SRT FILE INPUT:\n", uf], request_options={"timeout": timeout_s})
+            resp, parser = run_stream(model, [sys_prompt, "\n\n---\n\n## SRT FILE INPUT:\n", uf])
             log(f"[FAST] Storyboard via key#{ki} selesai dalam {time.time()-t0:.1f}s")
+            sched.release(k, _usage_tokens(resp), est_tokens); reserved = False
             if not resp.candidates or resp.candidates[0].finish_reason.name != "STOP":
                 raise RuntimeError("FAST: candidate kosong atau tidak STOP")
-            txt = (resp.text or "").strip()
-            txt = txt.removeprefix("```json").removeprefix("```").removesuffix("```").strip()
-            try:
-                data = json.loads(txt)
-            except Exception:
-                m = re.search(r"\{[\s\S]*\}$", txt)
-                if not m:
-                    raise
-                data = json.loads(m.group(0))
-            data = _ensure_storyboard_minimal_fields(data, film_duration, language, secs_map)
-            out = Path(output_folder) / "storyboard_output.json"
-            with open(out, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            log(f"[FAST] Menyimpan storyboard JSON ke {out}")
-            return data
+            data = parser.result()
+            if data is None:
+                raise ValueError("FAST: respons bukan JSON storyboard")
+            return finish(data)
         except Exception as e:
             last_exc = e
-            msg = str(e); low = msg.lower()
-            if ("429" in msg) or ("toomanyrequests" in low) or ("quota" in low):
-                if am:
-                    try:
-                        am.set_key_cooldown(k, 24*3600)
-                        log(f"[FAST] key#{ki} quota/429. Cooldown & coba key lain...")
-                    except Exception:
-                        pass
-                time.sleep(1.2)
-                continue
-            elif ("deadline" in low) or ("504" in msg):
-                log(f"[FAST] key#{ki} timeout/504. Coba key lain...")
-                time.sleep(0.8)
+            _forget_srt_upload_on_error(k, prompt_srt, e)
+            if emitted:
+                log(f"[FAST] Stream terhenti; {len(emitted)} segmen lengkap disimpan: {', '.join(emitted)}")
+            if not reserved:
+                # Respons sudah diterima; ini kegagalan isi, bukan key
+                log(f"[FAST] key#{ki} gagal: {e}")
                 continue
+            kind, cd = sched.report_error(k, e)
+            if kind in ("quota", "daily"):
+                log(f"[FAST] key#{ki} quota/429. Cooldown {cd:.0f}s & coba key lain...")
+            elif kind == "transient":
+                log(f"[FAST] key#{ki} timeout/5xx. Coba key lain...")
             else:
                 log(f"[FAST] key#{ki} gagal: {e}")
-                time.sleep(0.6)
-                continue
-        finally:
-            try:
-                uf = uploaded_per_key.get(k)
-                if uf:
-                    genai.configure(api_key=k)
-                    genai.delete_file(name=getattr(uf, 'name', None))
-            except Exception:
-                pass
+            continue
 
     # Fallback: excerpt teks tanpa upload
     try:
-        excerpt = ""
-        with open(srt_path, "r", encoding="utf-8", errors="ignore") as f:
-            text = f.read()
-        if len(text) > 6000:
-            one = 2000
-            excerpt = text[:one] + "\n\n...\n\n" + text[len(text)//2:len(text)//2+one] + "\n\n...\n\n" + text[-one:]
-        else:
-            excerpt = text
-        for ki, k in enumerate(available_keys, 1):
+        excerpt = _build_srt_excerpt(srt_path, compact)
+        if not excerpt:
+            raise RuntimeError("SRT tidak berisi cue yang bisa dikutip")
+        est_tokens = _estimate_tokens(sys_prompt, excerpt)
+        for ki, nkeys, k, sched in _scheduled_keys(api_key, est_tokens, model="gemini-2.5-flash"):
             try:
-                genai.configure(api_key=k)
-                model = genai.GenerativeModel(
+                model = _client_pool.model(
+                    k,
                     model_name="gemini-2.5-flash",
-                    generation_config={"temperature": 0.5, "top_p": 0.8, "response_mime_type": "application/json"},
+                    generation_config={"temperature": 0.5, "top_p": 0.8, "response_mime_type": "application/json",
+                                       "response_schema": _sbs.STORYBOARD_SCHEMA},
                     safety_settings=[{"category": c, "threshold": "BLOCK_NONE"} for c in [
                         "HARM_CATEGORY_HARASSMENT","HARM_CATEGORY_HATE_SPEECH",
                         "HARM_CATEGORY_SEXUALLY_EXPLICIT","HARM_CATEGORY_DANGEROUS_CONTENT"]]
                 )
-                resp = model.generate_content([sys_prompt, "\n\n## SRT EXCERPT:\n", excerpt], request_options={"timeout": timeout_s})
+                try:
+                    resp, parser = run_stream(model, [sys_prompt, "\n\n## SRT EXCERPT (cuplikan merata sepanjang film, [m:ss] teks):\n", excerpt])
+                except Exception as e:
+                    sched.report_error(k, e)
+                    raise
+                sched.release(k, _usage_tokens(resp), est_tokens)
                 if not resp.candidates or resp.candidates[0].finish_reason.name != "STOP":
                     raise RuntimeError("FAST(excerpt): gagal")
-                txt = (resp.text or "").strip()
-                txt = txt.removeprefix("```json").removeprefix("```").removesuffix("```").strip()
-                data = json.loads(txt)
-                data = _ensure_storyboard_minimal_fields(data, film_duration, language, secs_map)
-                out = Path(output_folder) / "storyboard_output.json"
-                with open(out, "w", encoding="utf-8") as f:
-                    json.dump(data, f, ensure_ascii=False, indent=2)
-                log(f"[FAST] (excerpt) Menyimpan storyboard JSON ke {out}")
-                return data
+                data = parser.result()
+                if data is None:
+                    raise ValueError("FAST(excerpt): respons bukan JSON storyboard")
+                return finish(data, "(excerpt) ")
             except Exception as e:
                 log(f"[FAST] excerpt via key#{ki} gagal: {e}")
                 continue
     except Exception as e:
         log(f"[FAST] fallback excerpt error: {e}")
+    if emitted:
+        # Semua percobaan gagal, tapi segmen yang sudah lengkap tetap berguna
+        log(f"[FAST] Memakai {len(emitted)} segmen hasil stream parsial.")
+        return finish(None, "(parsial) ")
     return None
 
 def get_storyboard_from_srt(
@@ -362,16 +1115,24 @@ def get_storyboard_from_srt(
     recap_minutes: int | None = None,
     fast_mode: bool = False,
     storyboard_model: str | None = None,
+    hedge_percentile: float | None = None,
+    local_planner: bool = False,
+    voice_key: str | None = None,
 ):
+    """hedge_percentile (mis. 90): aktifkan hedged request setelah persentil latensi tsb; None = mati.
+    local_planner=True: lewati panggilan planner remote dan pakai _naive_plan_from_srt.
+    voice_key (speech_rate.voice_key): words_target dihitung dari model kecepatan bicara voice tsb bila terkalibrasi."""
     def log(msg):
         if progress_callback: progress_callback(msg)
+    import storyboard_schema as _sbs
+    import speech_rate as _sr
 
-    uploaded_file = None  # deprecated single-file usage
     uploaded_files: dict[str, object] = {}
+    srt_caches: dict[str, object] = {}
+    cache_unavailable: set[str] = set()
     try:
-        genai.configure(api_key=api_key)
-        # Jangan upload di sini. Kita akan upload per-key saat memanggil model agar file dapat diakses oleh key tsb.
-        log("Menyiapkan unggah SRT per-key untuk akses file yang konsisten...")
+        # Jangan upload di sini. File per-key diambil dari registry (upload hanya jika belum ada yang hidup).
+        log("Menyiapkan SRT per-key untuk akses file yang konsisten...")
 
         safety_settings = [{"category": c, "threshold": "BLOCK_NONE"} for c in ["HARM_CATEGORY_HARASSMENT", "HARM_CATEGORY_HATE_SPEECH", "HARM_CATEGORY_SEXUALLY_EXPLICIT", "HARM_CATEGORY_DANGEROUS_CONTENT"]]
         # Mode cepat menggunakan model flash dengan output JSON dan batas token lebih kecil
@@ -391,25 +1152,6 @@ def get_storyboard_from_srt(
             "response_mime_type": "application/json",
         }
 
-        model = genai.GenerativeModel(
-            model_name=model_name,
-            generation_config=generation_config,
-            safety_settings=safety_settings
-        )
-        # Siapkan rotasi key untuk menghindari TooManyRequests/Quota
-        try:
-            import api_manager as _am
-            am = _am.APIManager()
-            available_keys = am.get_available_keys()
-            if api_key and api_key in available_keys:
-                available_keys = [api_key] + [k for k in available_keys if k != api_key]
-            elif api_key and not am.is_key_on_cooldown(api_key):
-                available_keys = [api_key] + available_keys
-            if not available_keys:
-                available_keys = [api_key] if api_key else []
-        except Exception:
-            am = None
-            available_keys = [api_key] if api_key else []
         # Hitung parameter VO konkret di luar prompt
         # Target total recap berdasarkan pilihan pengguna (default 22 menit)
         total_target_sec = int((recap_minutes or 22) * 60)
@@ -432,6 +1174,14 @@ def get_storyboard_from_srt(
         fill_ratio = 0.90
         secs_map = {k: round(v * total_target_sec) for k, v in dist.items()}
         words_map = {k: round(secs_map[k] * (wpm_map[k] / 60.0) * fill_ratio) for k in dist.keys()}
+        # Model kecepatan bicara terkalibrasi (durasi TTS nyata voice ini) menggantikan WPM tetap
+        rate = _sr.get_store().model(voice_key) if voice_key else None
+        if rate is not None and rate.calibrated:
+            wpm_map = {k: int(round(rate.effective_wpm)) for k in wpm_map}
+            words_map = {k: rate.words_for(secs_map[k]) for k in dist.keys()}
+            log(f"Speech-rate terkalibrasi untuk '{voice_key}' ({rate.samples} chunk): ~{rate.effective_wpm:.0f} wpm efektif.")
+        else:
+            rate = None
         vo_lines = []
         vo_dw_lines = []
         order = ["Intro", "Rising", "Mid-conflict", "Climax", "Ending"]
@@ -502,135 +1252,173 @@ def get_storyboard_from_srt(
             .replace("{mid_vo_sec}", str(secs_map["Mid-conflict"])) \
             .replace("{climax_vo_sec}", str(secs_map["Climax"])) \
             .replace("{ending_vo_sec}", str(secs_map["Ending"]))
+        prompt_srt, compact = _prepare_prompt_srt(srt_path, log)
+        if compact is not None:
+            system_prompt += COMPACT_SRT_NOTE
+
+        # Context cache per key: system prompt + SRT dibayar sekali per job, lalu direferensikan
+        def config_for(schema: dict | None):
+            # Structured output: skema dari storyboard_schema dikirim sebagai response_schema
+            return dict(generation_config, response_schema=schema) if schema else generation_config
+
+        def cached_model_for(k: str, schema: dict | None = None):
+            if k in cache_unavailable:
+                return None
+            cache = srt_caches.get(k)
+            if cache is None:
+                cache = _create_srt_context_cache(k, model_name, system_prompt, prompt_srt, log)
+                if cache is None:
+                    cache_unavailable.add(k)
+                    return None
+                srt_caches[k] = cache
+            else:
+                try:
+                    _refresh_srt_context_cache(k, cache)
+                except Exception:
+                    pass
+            return _client_pool.cached_model(
+                k,
+                cache,
+                generation_config=config_for(schema),
+                safety_settings=safety_settings,
+            )
+
+        def drop_cache(k: str, e: Exception):
+            # Cache kedaluwarsa/ditolak: lanjut tanpa cache untuk key ini
+            low = str(e).lower()
+            if k in srt_caches and ("cached" in low or "cache" in low):
+                srt_caches.pop(k, None)
+                cache_unavailable.add(k)
 
         # Aktifkan PLANNER: bangun story per segmen untuk memastikan kepatuhan words_target (±10%)
         # Wrapper pemanggilan model dengan timeout adaptif + logging durasi
-        def call_model(prompt, lbl: str = "", timeout_s: int | None = None):
+        def call_model(prompt, lbl: str = "", timeout_s: int | None = None, use_cache: bool = False, schema: dict | None = None):
             # Timeout lebih singkat untuk flash, lebih longgar untuk pro
             if timeout_s is None:
                 timeout_s = 120 if "flash" in (model_name or "") else 300
             last_exc = None
-            for ki, k in enumerate(available_keys, 1):
-                try:
-                    genai.configure(api_key=k)
-                    model_k = genai.GenerativeModel(
+            est_tokens = _estimate_tokens(prompt if isinstance(prompt, str) else "")
+
+            def make_model(k: str):
+                model_k = cached_model_for(k, schema) if use_cache else None
+                if model_k is None:
+                    model_k = _client_pool.model(
+                        k,
                         model_name=model_name,
-                        generation_config=generation_config,
+                        generation_config=config_for(schema),
                         safety_settings=safety_settings
                     )
-                    t0 = time.time()
-                    resp = model_k.generate_content(prompt, request_options={'timeout': timeout_s})
-                    dt = time.time() - t0
+                return model_k
+
+            def on_error(k: str, e: Exception):
+                if use_cache:
+                    drop_cache(k, e)
+                import api_manager as _am
+                if _am.classify_error(str(e)) in ("quota", "daily"):
+                    log(f"[API] {lbl}: key dibatasi (429/quota). Cooldown dan coba key berikutnya...")
+                else:
+                    log(f"[API] {lbl} gagal: {e}")
+
+            stats_name = f"{model_name}{':cache' if use_cache else ''}"
+            for ki, nkeys, k, sched in _scheduled_keys(api_key, est_tokens, model=model_name):
+                try:
+                    resp, kw, dt = _hedged_generate(
+                        sched, k, make_model, prompt, timeout_s, est_tokens, stats_name,
+                        hedge_percentile=hedge_percentile, on_error=on_error, log=log,
+                    )
                     try:
                         if lbl:
-                            log(f"[API] {lbl} via key#{ki}/{len(available_keys)} selesai dalam {dt:.1f}s")
+                            via = f"key#{ki}/{nkeys}" if kw == k else "key hedge"
+                            log(f"[API] {lbl} via {via} selesai dalam {dt:.1f}s")
                     except Exception:
                         pass
                     return resp
                 except Exception as e:
                     last_exc = e
-                    msg = str(e)
-                    low = msg.lower()
-                    if ('429' in msg) or ('toomanyrequests' in low) or ('quota' in low):
-                        if am:
-                            try:
-                                am.set_key_cooldown(k, 24*3600)
-                                log(f"[API] key dibatasi (429/quota). Tandai cooldown dan coba key berikutnya...")
-                            except Exception:
-                                pass
-                        time.sleep(1.5)
-                        continue
-                    else:
-                        try:
-                            log(f"[API] {lbl} gagal pada key#{ki}: {e}")
-                        except Exception:
-                            pass
-                        time.sleep(1.0)
-                        continue
+                    continue
             raise last_exc or RuntimeError("All API keys failed")
 
         # Selalu gunakan file upload untuk planner utama (tetap fallback ke excerpt jika gagal)
         use_upload = True
 
         # Planner nonaktif untuk timeblocks; fokus pada BEATS
-        plan_prompt = (
-            system_prompt + "\n\n# Planner Timeblocks (JSON saja)\n"
+        plan_task = (
+            "# Planner Timeblocks (JSON saja)\n"
             "Instruksi: Keluarkan JSON dengan array 'segments' berisi 5 item (Intro, Rising, Mid-conflict, Climax, Ending).\n"
             "Setiap item wajib berisi: label saja. (Beats akan dihasilkan di tahap berikutnya).\n"
             "Jangan keluarkan VO, beats, atau bidang lain. JSON minimal saja.\n"
         )
-        # Planner dengan retry + fallback excerpt jika timeout
-        def _build_srt_excerpt_all(path: str, max_chars: int = 8000) -> str:
-            try:
-                with open(path, 'r', encoding='utf-8', errors='ignore') as f:
-                    text = f.read()
-                # Ringkas: ambil setiap N karakter secara berkala untuk meratakan sampling
-                if len(text) <= max_chars:
-                    return text
-                step = max(1, len(text) // max_chars)
-                sampled = text[::step][:max_chars]
-                return sampled
-            except Exception:
-                return ''
+        plan_prompt = system_prompt + "\n\n" + plan_task
+        # Rencana lokal selalu dihitung (murah, tanpa API): dipakai sebagai mode planner,
+        # fallback, dan pengisi timeblocks/beats yang tidak dikembalikan planner remote.
+        local_plan = _naive_plan_from_srt(srt_path, secs_map, film_duration, cues=(compact.lines if compact is not None else None))
+        if local_planner:
+            log("Planner lokal aktif: membagi 5 babak & beats dari timing SRT (tanpa panggilan planner).")
 
         tries_plan = 0; plan_resp = None
-        while tries_plan < 3:
+        while not local_planner and tries_plan < 3:
             tries_plan += 1
             log(f"Meminta planner (beats-only) ... (try {tries_plan}/3)")
             plan_resp = None
             # Coba dengan upload file per-key agar tidak ada 403 (permission)
-            for ki, k in enumerate(available_keys, 1):
+            for ki, nkeys, k, sched in _scheduled_keys(api_key, _estimate_tokens(plan_prompt, prompt_srt), model=model_name):
                 try:
-                    genai.configure(api_key=k)
-                    model_k = genai.GenerativeModel(
+                    model_k = _client_pool.model(
+                        k,
                         model_name=model_name,
-                        generation_config=generation_config,
+                        generation_config=config_for(_sbs.PLAN_SCHEMA),
                         safety_settings=safety_settings
                     )
-                    uf = uploaded_files.get(k)
-                    if not uf:
-                        log(f"Mengunggah SRT untuk key #{ki}/{len(available_keys)}...")
-                        uf = genai.upload_file(path=srt_path)
-                        uploaded_files[k] = uf
-                        log(f"Upload sukses (key#{ki}): {uf.name}")
-                    plan_resp = model_k.generate_content([plan_prompt, "\n\n---\n\n## SRT FILE INPUT:\n", uf], request_options={'timeout': 120 if 'flash' in model_name else 300})
+                    cached_k = cached_model_for(k, _sbs.PLAN_SCHEMA)
+                    if cached_k is not None:
+                        # System prompt + SRT sudah ada di cache; kirim instruksi planner saja
+                        plan_resp = cached_k.generate_content(plan_task, request_options={'timeout': 120 if 'flash' in model_name else 300})
+                    else:
+                        uf = uploaded_files.get(k)
+                        if not uf:
+                            log(f"Menyiapkan SRT untuk key #{ki}/{nkeys}...")
+                            uf = _get_srt_file_part(k, prompt_srt, log)
+                            uploaded_files[k] = uf
+                        plan_resp = model_k.generate_content([plan_prompt, "\n\n---\n\n## SRT FILE INPUT:\n", uf], request_options={'timeout': 120 if 'flash' in model_name else 300})
+                    sched.release(k, _usage_tokens(plan_resp), _estimate_tokens(plan_prompt, prompt_srt))
                     if plan_resp.candidates and plan_resp.candidates[0].finish_reason.name == "STOP":
-                        log(f"Planner(upload) via key#{ki}/{len(available_keys)} OK")
+                        log(f"Planner(upload) via key#{ki}/{nkeys} OK")
                         break
                     else:
                         log(f"Planner tidak STOP via key#{ki}. Coba key lain...")
                         continue
                 except Exception as e:
-                    msg = str(e); low = msg.lower()
-                    if ('429' in msg) or ('toomanyrequests' in low) or ('quota' in low):
-                        try:
-                            am.set_key_cooldown(k, 24*3600)  # type: ignore[name-defined]
-                            log(f"Planner: key#{ki} 429/quota. Cooldown & coba key berikutnya...")
-                        except Exception:
-                            pass
-                        time.sleep(1.2)
-                        continue
+                    _forget_srt_upload_on_error(k, prompt_srt, e)
+                    uploaded_files.pop(k, None)
+                    drop_cache(k, e)
+                    kind, cd = sched.report_error(k, e)
+                    if kind in ("quota", "daily"):
+                        log(f"Planner: key#{ki} 429/quota. Cooldown {cd:.0f}s & coba key berikutnya...")
                     else:
                         log(f"Planner error via key#{ki}: {e}")
-                        time.sleep(0.8)
-                        continue
+                    continue
 
             if plan_resp and plan_resp.candidates and plan_resp.candidates[0].finish_reason.name == "STOP":
                 break
 
             # Fallback: gunakan excerpt teks SRT (tanpa upload file)
-            excerpt_all = _build_srt_excerpt_all(srt_path, max_chars=8000)
+            excerpt_all = _build_srt_excerpt(srt_path, compact)
             if excerpt_all:
                 try:
                     log("Planner fallback dengan excerpt teks SRT...")
-                    plan_resp = call_model(plan_prompt + "\n\n## SRT EXCERPT (RINGKAS):\n" + excerpt_all, lbl=f"Planner(excerpt) try-{tries_plan}")
+                    plan_resp = call_model(plan_prompt + "\n\n## SRT EXCERPT (cuplikan merata sepanjang film, [m:ss] teks):\n" + excerpt_all, lbl=f"Planner(excerpt) try-{tries_plan}", schema=_sbs.PLAN_SCHEMA)
                     if plan_resp.candidates and plan_resp.candidates[0].finish_reason.name == "STOP":
                         break
                 except Exception as e2:
                     log(f"Planner fallback error: {e2}")
-        if not plan_resp or not plan_resp.candidates or plan_resp.candidates[0].finish_reason.name != "STOP":
+        if local_planner:
+            plan_obj = local_plan
+            if not plan_obj.get('segments'):
+                log("Gagal membuat rencana lokal: SRT tidak berisi cue.")
+                return None
+        elif not plan_resp or not plan_resp.candidates or plan_resp.candidates[0].finish_reason.name != "STOP":
             log("ERROR: Planner gagal setelah retry. Menggunakan rencana minimal lokal dari SRT...")
-            plan_obj = _naive_plan_from_srt(srt_path)
+            plan_obj = local_plan
             if not plan_obj.get('segments'):
                 log("Gagal membuat rencana lokal minimal.")
                 return None
@@ -638,10 +1426,13 @@ def get_storyboard_from_srt(
             plan_txt = plan_resp.text.strip().removeprefix("```json").removeprefix("```").removesuffix("```").strip()
             try:
                 plan_obj = json.loads(plan_txt)
+                # Timeblocks planner remote memakai detik dari prompt ringkas; ranges segmen dipakai dalam ms asli
+                for seg in (plan_obj.get('segments') or []) if isinstance(plan_obj, dict) else []:
+                    _snap_segment_times(seg, compact)
             except Exception as e:
                 log(f"ERROR parse JSON planner: {e}"); log(plan_txt[:500])
                 log("Coba rencana minimal lokal dari SRT...")
-                plan_obj = _naive_plan_from_srt(srt_path)
+                plan_obj = local_plan
                 if not plan_obj.get('segments'):
                     return None
 
@@ -651,7 +1442,8 @@ def get_storyboard_from_srt(
             "segments": []
         }
 
-        seg_map = {seg.get('label', ''): seg for seg in (plan_obj.get('segments') or [])}
+        seg_map = {seg.get('label', ''): seg for seg in (plan_obj.get('segments') or []) if isinstance(seg, dict)}
+        local_map = {seg['label']: seg for seg in (local_plan.get('segments') or [])}
 
         # Per segmen: generate JSON lengkap + validasi words_actual ±10%, retry max 2x
         def build_segment_prompt(label: str, vo_sec: int, wpm: int, words: int, ranges_sample: str) -> str:
@@ -693,21 +1485,35 @@ def get_storyboard_from_srt(
                 "}\n"
             )
 
+        import subtitle_utils as _su
+        try:
+            import cue_store
+            store = cue_store.load(srt_path)
+        except Exception:
+            store = None
+
         def describe_ranges(ranges: list) -> str:
             lines = []
             for r in (ranges or [])[:8]:
-                lines.append(f"- {r.get('start','')} --> {r.get('end','')}: {r.get('reason','')}")
+                line = f"- {r.get('start','')} --> {r.get('end','')}: {r.get('reason','')}"
+                st, en = _su.parse_timestamp(r.get('start', '')), _su.parse_timestamp(r.get('end', ''))
+                if store is not None and st is not None and en is not None and en > st:
+                    # Cuplikan dialog di rentang ini (binary search di cue store)
+                    snippet = store.text_between(st, en, max_chars=160)
+                    if snippet:
+                        line += f" | \"{snippet}\""
+                lines.append(line)
             return "\n".join(lines)
 
         for label in order:
-            ranges = (seg_map.get(label) or {}).get('source_timeblocks') or []
+            ranges = (seg_map.get(label) or {}).get('source_timeblocks') or (local_map.get(label) or {}).get('source_timeblocks') or []
             ranges_sample = describe_ranges(ranges)
             tries = 0
             while tries < 3:
                 tries += 1
                 prompt = build_segment_prompt(label, secs_map[label], wpm_map[label], words_map[label], ranges_sample)
                 log(f"Generate segmen: {label} (try {tries}/3, target {secs_map[label]}s, ~{words_map[label]} kata)")
-                resp = call_model(prompt, lbl=f"Segmen {label} try-{tries}")
+                resp = call_model(prompt, lbl=f"Segmen {label} try-{tries}", use_cache=True, schema=_sbs.SEGMENT_SCHEMA)
                 if not resp.candidates or resp.candidates[0].finish_reason.name != "STOP":
                     log(f"ERROR: gagal segmen {label} pada try {tries}")
                     continue
@@ -717,13 +1523,62 @@ def get_storyboard_from_srt(
                 except Exception as e:
                     log(f"ERROR parse segmen {label}: {e}")
                     continue
+                if isinstance(seg_obj, dict) and seg_obj.get('label') != label:
+                    seg_obj['label'] = label
+                seg_obj, issues = _sbs.validate_segment(seg_obj, language=language)
+                errs = _sbs.errors_only(issues)
+                if any(e.path.startswith("beats") for e in errs) and (local_map.get(label) or {}).get('beats'):
+                    # Beats rusak tidak perlu generate ulang: ganti dengan beats planner lokal
+                    log(f"Segmen {label}: beats tidak valid; memakai beats planner lokal.")
+                    seg_obj['beats'] = []
+                    seg_obj, issues = _sbs.validate_segment(seg_obj, language=language)
+                    errs = _sbs.errors_only(issues)
+                if issues:
+                    log(f"Validasi segmen {label}:\n{_sbs.format_issues(issues)}")
+                if errs:
+                    continue
+                # Waktu dari prompt ringkas (detik) -> ms sumber asli sebelum beats diskalakan terhadap ranges (ms)
+                seg_obj = _snap_segment_times(seg_obj, compact)
                 # Validasi words_actual vs words_target (±10%)
                 vo = seg_obj.get('vo_script', '')
                 words_actual = len((vo or '').split())
                 target = words_map[label]
-                if target and abs(words_actual - target) / target > 0.10 and tries < 3:
-                    log(f"WARNING: segmen {label} words_actual={words_actual} target={target} (dev>10%). retry...")
+                repairs = 0
+                while target and abs(words_actual - target) / target > VO_LENGTH_TOLERANCE and repairs < VO_REPAIR_ATTEMPTS:
+                    # Perbaikan terarah: hanya VO + selisih kata (beats dipertahankan & diskalakan lokal)
+                    repairs += 1
+                    log(f"WARNING: segmen {label} words_actual={words_actual} target={target} (dev>10%). Perbaikan panjang VO {repairs}/{VO_REPAIR_ATTEMPTS}...")
+                    try:
+                        # Memperpanjang butuh konteks film (cache SRT); meringkas cukup dari VO itu sendiri
+                        rresp = call_model(
+                            _vo_repair_prompt(label, language, vo, words_actual, target),
+                            lbl=f"Repair VO {label} #{repairs}", use_cache=(words_actual < target),
+                            schema=_sbs.VO_REPAIR_SCHEMA,
+                        )
+                        new_vo = json.loads(rresp.text.strip().removeprefix("```json").removeprefix("```").removesuffix("```").strip()).get("vo_script") or ""
+                    except Exception as e:
+                        log(f"Perbaikan VO {label} gagal: {e}")
+                        break
+                    new_words = len(new_vo.split())
+                    if not new_words or abs(new_words - target) >= abs(words_actual - target):
+                        log(f"Perbaikan VO {label} tidak mendekati target ({new_words} kata).")
+                        continue
+                    wpm = float((seg_obj.get('vo_meta') or {}).get('speech_rate_wpm') or wpm_map[label])
+                    factor = _vo_stats(new_vo, wpm, rate=rate)["predicted_duration_sec"] / max(0.1, _vo_stats(vo, wpm, rate=rate)["predicted_duration_sec"])
+                    seg_obj['beats'] = _rescale_beats(seg_obj.get('beats') or [], factor, ranges)
+                    seg_obj['vo_script'] = vo = new_vo
+                    words_actual = new_words
+                vm = seg_obj.get('vo_meta') if isinstance(seg_obj.get('vo_meta'), dict) else {}
+                vm.update(_vo_stats(vo, float(vm.get('speech_rate_wpm') or wpm_map[label]), seg_obj.get('target_vo_duration_sec') or secs_map[label], rate=rate))
+                vm['words_target'] = target
+                vm['fit'] = "OK" if not target or abs(words_actual - target) / target <= VO_LENGTH_TOLERANCE else "REWRITE"
+                seg_obj['vo_meta'] = vm
+                if vm['fit'] != "OK" and tries < 3:
+                    log(f"WARNING: segmen {label} masih words_actual={words_actual} target={target} setelah perbaikan. Generate ulang...")
                     continue
+                if not seg_obj.get('beats') and (local_map.get(label) or {}).get('beats'):
+                    log(f"Segmen {label} tanpa beats; memakai beats planner lokal.")
+                    seg_obj['beats'] = local_map[label]['beats']
                 storyboard['segments'].append(seg_obj)
                 break
             else:
@@ -740,15 +1595,82 @@ def get_storyboard_from_srt(
         log(traceback.format_exc())
         return None
     finally:
-        # Hapus semua file terunggah per-key
-        if uploaded_files:
-            for k, uf in list(uploaded_files.items()):
-                try:
-                    genai.configure(api_key=k)
-                    log(f"Menghapus file yang diunggah (key): {getattr(uf, 'name', '?')}")
-                    genai.delete_file(name=getattr(uf, 'name', None))
-                except Exception:
-                    pass
+        # Context cache hanya untuk job ini: hapus agar tidak ditagih sampai TTL habis.
+        # File terunggah tidak dihapus: registry memakainya ulang sampai kedaluwarsa.
+        for k, cache in list(srt_caches.items()):
+            try:
+                _client_pool.delete_cache(k, cache.name)
+                log(f"Context cache dihapus: {getattr(cache, 'name', '?')}")
+            except Exception:
+                pass
+
+def translate_vo_scripts(storyboard: dict, target_language: str, api_key: str, progress_callback=None,
+                        model_name: str = "gemini-2.5-flash", labels=None) -> dict:
+    """{label: vo_script} in target_language for the multi-language mode.
+
+    Scripts already present in segment["vo_scripts"][target_language] are used as-is;
+    the rest are translated in one structured call, keeping the word count close to the
+    original so the VO lands on (nearly) the same duration and the video can be reused.
+    """
+    import storyboard_schema as _sbs
+    def log(msg):
+        if progress_callback:
+            progress_callback(msg)
+        else:
+            print(msg)
+    lang = (target_language or "").strip().lower()
+    out, todo = {}, []
+    for seg in storyboard.get('segments', []):
+        label = seg.get('label')
+        if not label or (labels is not None and label not in labels):
+            continue
+        given = (seg.get('vo_scripts') or {}).get(lang) if isinstance(seg.get('vo_scripts'), dict) else None
+        if given:
+            out[label] = given
+        elif (seg.get('vo_language') or "").split("-")[0].lower() == lang.split("-")[0]:
+            out[label] = seg.get('vo_script') or ""
+        elif seg.get('vo_script'):
+            todo.append(seg)
+    if not todo:
+        return out
+    body = "\n\n".join(
+        f"### {seg['label']} ({len(seg['vo_script'].split())} kata)\n{seg['vo_script']}" for seg in todo)
+    prompt = (
+        "# Terjemahkan naskah VO recap film (JSON saja)\n"
+        f"Bahasa tujuan: {lang}\n"
+        "Untuk setiap segmen, terjemahkan vo_script dengan gaya narasi yang sama.\n"
+        "Jumlah kata hasil harus setara dengan aslinya (±5%) agar durasi VO tetap sama.\n"
+        "Pertahankan urutan kejadian, nama tokoh, dan HOOK di kalimat pertama. Jangan menambah kejadian.\n"
+        "Keluarkan JSON: {\"segments\": [{\"label\": \"...\", \"vo_script\": \"...\"}]}\n\n"
+        + body + "\n"
+    )
+    est_tokens = _estimate_tokens(prompt) * 3
+    last_exc = None
+    for ki, nkeys, k, sched in _scheduled_keys(api_key, est_tokens, model=model_name):
+        try:
+            t0 = time.time()
+            model = _client_pool.model(k, model_name=model_name, generation_config={
+                "temperature": 0.4, "response_mime_type": "application/json",
+                "response_schema": _sbs.VO_TRANSLATION_SCHEMA})
+            resp = model.generate_content(prompt, request_options={"timeout": 300})
+            sched.release(k, _usage_tokens(resp), est_tokens)
+            data = json.loads(resp.text.strip().removeprefix("```json").removeprefix("```").removesuffix("```").strip())
+            got = {s.get('label'): s.get('vo_script') for s in data.get('segments') or [] if s.get('vo_script')}
+            missing = [seg['label'] for seg in todo if seg['label'] not in got]
+            if missing:
+                raise ValueError(f"terjemahan tidak lengkap: {', '.join(missing)}")
+            for seg in todo:
+                out[seg['label']] = got[seg['label']]
+            log(f"[API] Terjemahan VO ({lang}) {len(todo)} segmen via key#{ki}/{nkeys} dalam {time.time()-t0:.1f}s")
+            return out
+        except Exception as e:
+            last_exc = e
+            kind, cd = sched.report_error(k, e)
+            if kind in ("quota", "daily"):
+                log(f"[API] Terjemahan VO: key#{ki} dibatasi (429/quota). Cooldown {cd:.0f}s & coba key berikutnya...")
+            else:
+                log(f"[API] Terjemahan VO gagal via key#{ki}: {e}")
+    raise RuntimeError(f"Terjemahan VO ke '{lang}' gagal: {last_exc}")
 
 def generate_vo_audio(
     vo_script: str,
@@ -761,38 +1683,47 @@ def generate_vo_audio(
     voice_prompt_path: str = "",
     speech_rate_wpm: int | None = None,
     max_chunk_sec: int | None = None,
+    backend: str = "auto",
+    gain: float = 1.0,
 ):
+    """backend: "gemini", "local" (Chatterbox, offline) atau "auto" (Gemini, lalu lokal jika semua key habis).
+
+    Chunk disimpan sebagai PCM numpy di memori dan disambung dengan crossfade pendek;
+    gain + resample ke profil output (48 kHz stereo) dilakukan sekali, lalu VO ditulis
+    satu kali ke output_path (.wav = lossless, ekstensi lain di-encode langsung dari PCM).
+    """
     def log(msg):
         if progress_callback: progress_callback(msg)
 
     # Pilih backend: gemini (default) atau lokal (Chatterbox)
-    # Pakai Gemini TTS selalu (hapus backend lokal)
+    backend = (backend or "auto").lower()
+    import local_tts
+    local_ok = local_tts.is_available()
+    use_local = backend == "local"
+    if use_local and not local_ok:
+        log("FATAL: backend TTS lokal dipilih tetapi chatterbox-tts/torch tidak terpasang.")
+        return False
 
-    # Backend: Gemini 2.5 Flash Preview TTS dan pecah per ~3 menit
+    # Backend: Gemini 2.5 Flash Preview TTS / Chatterbox lokal, dipecah per ~3 menit
     try:
-        import os, time, re, wave, tempfile
-        import api_manager as _am
-        genai.configure(api_key=api_key, transport='rest')
-
-        # Gunakan model TTS pratinjau yang mendukung audio output
-        model = genai.GenerativeModel("gemini-2.5-flash-preview-tts")
+        # Model kecepatan bicara per voice: ukuran chunk dari durasi nyata bila terkalibrasi
+        import speech_rate
+        rate_store = speech_rate.get_store()
+        def rate_key():
+            return speech_rate.voice_key("local" if use_local else "gemini", voice_prompt_path if use_local else voice_name, language_code)
+        rate = rate_store.model(rate_key(), speech_rate_wpm or speech_rate.DEFAULT_WPM)
 
         # Bagi teks menjadi chunk ~3 menit berdasarkan WPM jika tersedia; fallback ke panjang karakter
-        chunks = _split_text_for_tts_by_duration(vo_script, speech_rate_wpm or 195, max_sec=(max_chunk_sec or 180))
+        chunks = _split_text_for_tts_by_duration(
+            vo_script, speech_rate_wpm or 195, max_sec=(max_chunk_sec or 180),
+            words_per_sec=(rate.effective_wpm / 60.0 if rate.calibrated else None),
+        )
         total = len(chunks)
-        log(f"Menyiapkan TTS Gemini Flash: {total} potongan (~3 menit per potong)...")
-
-        # Temp folder untuk WAV chunk
-        tmp_dir = pathlib.Path(output_path).with_suffix('').with_name(pathlib.Path(output_path).stem + "_tts_chunks")
-        try:
-            if tmp_dir.exists():
-                for f in tmp_dir.glob("*"): f.unlink()
-            else:
-                tmp_dir.mkdir(parents=True, exist_ok=True)
-        except Exception:
-            pass
+        log(f"Menyiapkan TTS {'lokal (Chatterbox)' if use_local else 'Gemini Flash'}: {total} potongan (~3 menit per potong)...")
 
-        wav_paths = []
+        import audio_utils
+        pieces = []          # PCM float32 mono per chunk (urut)
+        pieces_sr = 24000    # sample rate PCM chunk (Gemini TTS: 24 kHz)
         generation_config_base = {"response_modalities": ["AUDIO"]}
         if voice_name:
             # Struktur voice_config untuk prebuilt voice (SDK pratinjau TTS)
@@ -800,56 +1731,64 @@ def generate_vo_audio(
                 "voice_config": {"prebuilt_voice_config": {"voice_name": voice_name}}
             }
 
-        # Prepare key rotation (exclude cooldown keys)
-        am = _am.APIManager()
-        for idx, chunk in enumerate(chunks, 1):
+        def synth_local(idx: int, chunk: str):
+            # Worker hangat; kalimat dipaketkan per panggilan generate
+            sr, packs = local_tts.get_pool(tts_device or "cpu").synthesize(
+                chunk, voice_prompt_path=voice_prompt_path, language=language_code, progress_callback=log
+            )
+            pcm = audio_utils.crossfade_join(packs, sr)
+            log(f"[Local TTS] Chunk {idx}/{total} selesai ({len(pcm) / float(sr):.1f}s)")
+            return sr, pcm
+
+        # Rotasi key via scheduler bersama (pool TTS)
+        idx = 0
+        while idx < total:
+            idx += 1
+            chunk = chunks[idx - 1]
             if not chunk.strip():
                 continue
+            if use_local:
+                pieces_sr, pcm = synth_local(idx, chunk)
+                pieces.append(pcm)
+                rate_store.record(rate_key(), chunk, len(pcm) / float(pieces_sr))
+                continue
             _preview = chunk[:50].replace("\n", " ").replace("\r", " ")
             log(f"[Gemini TTS] Chunk {idx}/{total}: {min(50, len(chunk))} chars preview → '{_preview}' ...")
 
-            # Rotate across available keys (skip cooldown). Prioritize provided api_key first if available
-            available_keys = am.get_available_keys()
-            if api_key and api_key in available_keys:
-                # put in front
-                available_keys = [api_key] + [k for k in available_keys if k != api_key]
-            elif api_key and not am.is_key_on_cooldown(api_key):
-                available_keys = [api_key] + available_keys
-            if not available_keys:
-                log("[Gemini TTS] ERROR: Tidak ada API key yang tersedia (semua cooldown).")
-                return False
-
             response = None
             last_exc = None
-            for ki, k in enumerate(available_keys, 1):
+            est_tokens = _estimate_tokens(chunk)
+            for ki, nkeys, k, sched in _scheduled_keys(api_key, est_tokens, max_wait=120.0, pool="tts",
+                                                         model="gemini-2.5-flash-preview-tts"):
                 try:
-                    genai.configure(api_key=k, transport='rest')
-                    log(f"[Gemini TTS]   menggunakan API key #{ki}/{len(available_keys)}...")
-                    # Buat model baru agar binding client mengikuti key terbaru
-                    model_k = genai.GenerativeModel("gemini-2.5-flash-preview-tts")
+                    log(f"[Gemini TTS]   menggunakan API key #{ki}/{nkeys}...")
+                    # Model ringan; client per-key dipinjam dari pool (tanpa state global)
+                    model_k = _client_pool.model(k, "gemini-2.5-flash-preview-tts", transport='rest')
                     response = model_k.generate_content(
                         chunk,
                         generation_config=generation_config_base,
                         request_options={"timeout": 600}
                     )
+                    sched.release(k, _usage_tokens(response), est_tokens)
                     # Success on this key
                     break
                 except Exception as e:
                     last_exc = e
-                    msg = str(e)
-                    lower = msg.lower()
-                    if ("toomanyrequests" in msg or " 429" in msg or "quota" in lower):
-                        # Set 24h cooldown on this key and continue to next
-                        am.set_key_cooldown(k, 24*3600)
-                        log(f"[Gemini TTS]   key dibatasi (429/quota). Tandai cooldown 24 jam dan ganti key...")
-                        time.sleep(1.5)
-                        continue
+                    kind, cd = sched.report_error(k, e)
+                    if kind in ("quota", "daily"):
+                        log(f"[Gemini TTS]   key dibatasi (429/quota). Cooldown {cd:.0f}s dan ganti key...")
                     else:
                         log(f"[Gemini TTS]   key gagal: {e}")
-                        time.sleep(1.0)
-                        continue
+                    continue
             if response is None:
                 log(f"[Gemini TTS] ERROR: Semua API key gagal untuk chunk {idx}. Pesan terakhir: {last_exc}")
+                if backend == "auto" and local_ok:
+                    # Ulang seluruh segmen secara lokal agar suara tetap konsisten
+                    log("[TTS] Key habis/gagal; beralih ke TTS lokal (Chatterbox) untuk segmen ini...")
+                    use_local = True
+                    pieces = []
+                    idx = 0
+                    continue
                 return False
 
             if not response.candidates or not response.candidates[0].content.parts:
@@ -863,50 +1802,41 @@ def generate_vo_audio(
             raw = part.inline_data.data
             mime = getattr(part.inline_data, "mime_type", None)
             audio_bytes = raw if isinstance(raw, (bytes, bytearray)) else base64.b64decode(raw)
-            # Simpan sesuai mime: jika mp3 -> .mp3, selain itu -> .wav (PCM/WAV container)
+            # Decode di memori: mp3 -> lewat pipe ffmpeg, selain itu PCM s16le 24 kHz mentah
             if mime and ("mp3" in mime or "mpeg" in mime):
-                out_path = tmp_dir / f"chunk_{idx:03d}.mp3"
-                with open(out_path, "wb") as outf:
-                    outf.write(audio_bytes)
-                wav_paths.append(out_path)
+                pcm = audio_utils.decode_audio(audio_bytes, pieces_sr)
             else:
-                out_path = tmp_dir / f"chunk_{idx:03d}.wav"
-                with wave.open(str(out_path), "wb") as wf:
-                    wf.setnchannels(1)
-                    wf.setsampwidth(2)
-                    wf.setframerate(24000)
-                    wf.writeframes(audio_bytes)
-                wav_paths.append(out_path)
-            log(f"[Gemini TTS] Chunk {idx}/{total} selesai: {out_path.name} ({mime or 'pcm'})")
-
-        if not wav_paths:
+                pcm = audio_utils.pcm16_to_float(audio_bytes)
+            pieces.append(pcm)
+            rate_store.record(rate_key(), chunk, len(pcm) / float(pieces_sr))
+            log(f"[Gemini TTS] Chunk {idx}/{total} selesai ({len(pcm) / float(pieces_sr):.1f}s, {mime or 'pcm'})")
+
+        if not pieces:
             log("FATAL: Tidak ada chunk audio yang berhasil dibuat.")
             return False
 
-        # Gabungkan chunk WAV menjadi satu MP3 akhir untuk segmen ini
-        concat_list = tmp_dir / "concat.txt"
-        with open(concat_list, "w", encoding="utf-8") as f:
-            for p in wav_paths:
-                f.write(f"file '{p.as_posix()}'\n")
-        cmd = f"ffmpeg -y -f concat -safe 0 -i \"{concat_list}\" -c:a libmp3lame -q:a 3 \"{output_path}\""
-        subprocess.run(cmd, shell=True, check=True, capture_output=True, text=True)
-        log(f"[Gemini TTS] Penggabungan selesai → {output_path}")
+        # Sambung chunk (crossfade di sambungan), gain + resample ke profil output, tulis sekali
+        pcm = audio_utils.crossfade_join(pieces, pieces_sr)
+        frames = audio_utils.to_output_profile(pcm, pieces_sr, gain=gain)
+        audio_utils.write_audio(output_path, frames)
+        log(f"[TTS] Penggabungan selesai → {output_path}")
         return True
     except Exception as e:
-        log(f"FATAL: Terjadi error saat generasi TTS Gemini: {e}")
+        log(f"FATAL: Terjadi error saat generasi TTS: {e}")
         log(traceback.format_exc())
         return False
 
 
-def _split_text_for_tts_by_duration(text: str, wpm: int, max_sec: int = 180) -> list[str]:
+def _split_text_for_tts_by_duration(text: str, wpm: int, max_sec: int = 180, words_per_sec: float | None = None) -> list[str]:
     """Split text by sentence, targeting chunks up to ~max_sec based on words per minute.
+    words_per_sec (measured, pauses included) overrides the wpm estimate when given.
     Falls back to char-based splitting if needed."""
     import re
     t = (text or "").strip()
     if not t:
         return [""]
     # Rough calculation: usable words per second (assume 90% speaking, 10% pause)
-    words_per_sec = max(1.0, (wpm / 60.0) * 0.9)
+    words_per_sec = max(1.0, words_per_sec or (wpm / 60.0) * 0.9)
     max_words = int(words_per_sec * max_sec)
     # Tokenize by sentences
     parts = re.split(r"([.!?]\s)", t)
@@ -1117,105 +2047,6 @@ def _srv3_to_word_srt(xml_path: str, srt_out: str, log=print) -> bool:
         return False
 
 
-def _json3_to_srt(json_path: str, srt_out: str, log=print) -> bool:
-    try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        events = data.get('events') or []
-        idx = 1
-        out = []
-        def fmt(ms: int) -> str:
-            ms = max(0, int(ms))
-            h = ms // 3600000; ms %= 3600000
-            m = ms // 60000; ms %= 60000
-            s = ms // 1000; ms %= 1000
-            return f"{h:02d}:{m:02d}:{s:02d},{ms:03d}"
-        for ev in events:
-            t0 = int(ev.get('tStartMs') or 0)
-            dur = int(ev.get('dDurationMs') or 0)
-            segs = ev.get('segs') or []
-            words = []
-            for sg in segs:
-                w = (sg.get('utf8') or '').replace('\n', ' ').strip()
-                if w:
-                    words.append(w)
-            if not words:
-                continue
-            text = ' '.join(words).strip()
-            if not text:
-                continue
-            if dur <= 0:
-                dur = max(1000, 200 * len(words))
-            st = t0
-            et = t0 + dur
-            if et <= st:
-                et = st + 500
-            out.extend([str(idx), f"{fmt(st)} --> {fmt(et)}", text, ""]) ; idx += 1
-        if not out:
-            return False
-        with open(srt_out, 'w', encoding='utf-8', newline='\r\n') as f:
-            f.write('\r\n'.join(out))
-        return True
-    except Exception as e:
-        try:
-            log(f"JSON3->SRT(simple) error: {e}")
-        except Exception:
-            pass
-        return False
-
-
-def _srv3_to_srt(xml_path: str, srt_out: str, log=print) -> bool:
-    try:
-        tree = ET.parse(xml_path)
-        root = tree.getroot()
-        idx = 1
-        out = []
-        def fmt(ms: int) -> str:
-            ms = max(0, int(ms))
-            h = ms // 3600000; ms %= 3600000
-            m = ms // 60000; ms %= 60000
-            s = ms // 1000; ms %= 1000
-            return f"{h:02d}:{m:02d}:{s:02d},{ms:03d}"
-        for p in root.findall('.//p'):
-            t0 = int(p.attrib.get('t', '0'))
-            dur = int(p.attrib.get('d', '0'))
-            # Concatenate inner text
-            text = ''.join(p.itertext()).replace('\n', ' ').strip()
-            if not text:
-                continue
-            if dur <= 0:
-                tokens = [t for t in text.split() if t]
-                dur = max(1000, 200 * len(tokens))
-            st = t0; et = t0 + dur
-            if et <= st:
-                et = st + 500
-            out.extend([str(idx), f"{fmt(st)} --> {fmt(et)}", text, ""]) ; idx += 1
-        if not out:
-            return False
-        with open(srt_out, 'w', encoding='utf-8', newline='\r\n') as f:
-            f.write('\r\n'.join(out))
-        return True
-    except Exception as e:
-        try:
-            log(f"SRV3->SRT(simple) error: {e}")
-        except Exception:
-            pass
-        return False
-
-
-def _vtt_to_srt(vtt_path: str, srt_out: str, log=print) -> bool:
-    try:
-        cmd = f"ffmpeg -y -i \"{vtt_path}\" \"{srt_out}\""
-        subprocess.run(cmd, shell=True, check=True, capture_output=True, text=True)
-        return True
-    except Exception as e:
-        try:
-            log(f"VTT->SRT error: {e}")
-        except Exception:
-            pass
-        return False
-
-
 # ============ NEW: YouTube transcription to word-level SRT via Gemini ============
 def transcribe_youtube_to_srt(
     youtube_url: str,
@@ -1224,38 +2055,34 @@ def transcribe_youtube_to_srt(
     language: str = "auto",
     progress_callback=None,
     model_name: str = "gemini-2.5-flash",
+    chunked: bool = False,
 ) -> tuple[str | None, dict]:
     """Download audio from YouTube, transcribe with Gemini to word-level, write .srt.
     Returns (srt_path, info_dict). info_dict may contain duration, title, lang.
+    chunked=True: unduh audio, transkripsi per jendela bertumpuk secara paralel (lihat
+    transcribe_audio_to_srt_chunked); cocok untuk film panjang.
     """
     def log(msg):
         if progress_callback: progress_callback(msg)
 
     info = {}
     srt_path = None
+    if chunked:
+        try:
+            import youtube_utils
+            log(f"Mengunduh audio untuk transkripsi per jendela: {youtube_url}")
+            audio_path = youtube_utils.download_audio(youtube_url, output_folder, progress_callback=progress_callback)
+        except Exception as e:
+            log(f"Unduh audio gagal: {e}")
+            return None, info
+        return transcribe_audio_to_srt_chunked(audio_path, api_key, output_folder, language, progress_callback, model_name), info
     try:
         log(f"Transkripsi dari YouTube link (tanpa unduh awal): {youtube_url}")
 
-        genai.configure(api_key=api_key)
         safety_settings = [{"category": c, "threshold": "BLOCK_NONE"} for c in [
             "HARM_CATEGORY_HARASSMENT", "HARM_CATEGORY_HATE_SPEECH",
             "HARM_CATEGORY_SEXUALLY_EXPLICIT", "HARM_CATEGORY_DANGEROUS_CONTENT"
         ]]
-        # Siapkan rotasi key agar tidak menembak satu key terus-menerus
-        try:
-            import api_manager as _am
-            am = _am.APIManager()
-            available_keys = am.get_available_keys()
-            if api_key and api_key in available_keys:
-                available_keys = [api_key] + [k for k in available_keys if k != api_key]
-            elif api_key and not am.is_key_on_cooldown(api_key):
-                available_keys = [api_key] + available_keys
-            if not available_keys:
-                available_keys = [api_key] if api_key else []
-        except Exception:
-            am = None
-            available_keys = [api_key] if api_key else []
-
         # Prompt SRT langsung agar menghindari parsing JSON yang rawan noise
         prompt = (
             "Buatkan transkrip dari video YouTube ini, dan beri timestamp word level untuk setiap kata.\n\n"
@@ -1291,48 +2118,28 @@ def transcribe_youtube_to_srt(
         t0 = time.time()
         resp = None
         last_exc = None
-        for ki, k in enumerate(available_keys, 1):
+        # Isi video dari link tidak bisa diukur di sini; pakai estimasi konservatif
+        est_tokens = 50_000
+        for ki, nkeys, k, sched in _scheduled_keys(api_key, est_tokens, model=model_name):
             try:
-                # Inisialisasi client per-key
-                try:
-                    from google.generativeai import Client as _GenClient  # type: ignore
-                    client = _GenClient(api_key=k)
-                except Exception:
-                    client = None
-                genai.configure(api_key=k)
+                # Client per-key dari pool (aman dipakai paralel)
                 t0 = time.time()
-                if client is not None:
-                    resp = client.models.generate_content(
-                        model=model_name,
-                        contents=content_payload,
-                        generation_config={"temperature": 0.2, "response_mime_type": "text/plain"},
-                        safety_settings=safety_settings,
-                        request_options={"timeout": 300}
-                    )
-                else:
-                    model = genai.GenerativeModel(model_name=model_name,
-                        generation_config={"temperature": 0.2, "response_mime_type": "text/plain"},
-                        safety_settings=safety_settings)
-                    resp = model.generate_content(content_payload, request_options={"timeout": 300})
-                log(f"[API] Transkripsi selesai via key#{ki}/{len(available_keys)} dalam {time.time()-t0:.1f}s")
+                model = _client_pool.model(k, model_name=model_name,
+                    generation_config={"temperature": 0.2, "response_mime_type": "text/plain"},
+                    safety_settings=safety_settings)
+                resp = model.generate_content(content_payload, request_options={"timeout": 300})
+                sched.release(k, _usage_tokens(resp), est_tokens)
+                log(f"[API] Transkripsi selesai via key#{ki}/{nkeys} dalam {time.time()-t0:.1f}s")
                 break
             except Exception as e:
                 last_exc = e
-                msg = str(e)
-                low = msg.lower()
-                if ('429' in msg) or ('toomanyrequests' in low) or ('quota' in low):
-                    if am:
-                        try:
-                            am.set_key_cooldown(k, 24*3600)
-                            log(f"[API] Transkrip: key#{ki} dibatasi (429/quota). Cooldown & coba key berikutnya...")
-                        except Exception:
-                            pass
-                    time.sleep(1.5)
-                    continue
+                resp = None
+                kind, cd = sched.report_error(k, e)
+                if kind in ("quota", "daily"):
+                    log(f"[API] Transkrip: key#{ki} dibatasi (429/quota). Cooldown {cd:.0f}s & coba key berikutnya...")
                 else:
                     log(f"[API] Transkrip gagal via key#{ki}: {e}")
-                    time.sleep(1.0)
-                    continue
+                continue
         if resp is None:
             log(f"[API] Transkripsi gagal pada semua key: {last_exc}")
             return None, info
@@ -1348,75 +2155,14 @@ def transcribe_youtube_to_srt(
             txt = txt.strip()
 
         # Normalisasi SRT: pastikan penomoran berurutan, times valid, CRLF
-        import re as _re
-        def _parse_time(s: str) -> int | None:
-            m = _re.match(r"^(\d\d):(\d\d):(\d\d),(\d\d\d)$", s.strip())
-            if not m:
-                return None
-            h, mi, se, ms = map(int, m.groups())
-            return ((h*60+mi)*60+se)*1000 + ms
-        def _fmt_time_ms(ms: int) -> str:
-            ms = max(0, int(ms))
-            h = ms // 3600000; ms %= 3600000
-            m = ms // 60000; ms %= 60000
-            s = ms // 1000; ms %= 1000
-            return f"{h:02d}:{m:02d}:{s:02d},{ms:03d}"
-        lines = [l.rstrip("\r") for l in txt.splitlines()]
-        cues = []
-        i = 0
-        time_re = _re.compile(r"^(\d\d:\d\d:\d\d,\d\d\d)\s+-->\s+(\d\d:\d\d:\d\d,\d\d\d)$")
-        while i < len(lines):
-            line = lines[i].strip()
-            if not line:
-                i += 1; continue
-            # optional index line
-            idx_line = None
-            if line.isdigit():
-                idx_line = int(line)
-                i += 1
-                if i >= len(lines): break
-                line = lines[i].strip()
-            m = time_re.match(line)
-            if not m:
-                i += 1
-                continue
-            start_s, end_s = m.group(1), m.group(2)
-            i += 1
-            # collect text lines until blank
-            text_lines = []
-            while i < len(lines) and lines[i].strip():
-                text_lines.append(lines[i].strip())
-                i += 1
-            # skip blank separator
-            while i < len(lines) and not lines[i].strip():
-                i += 1
-            text = " ".join(text_lines).strip()
-            if not text:
-                continue
-            st = _parse_time(start_s)
-            et = _parse_time(end_s)
-            if st is None or et is None:
-                continue
-            if et <= st:
-                et = st + 200
-            cues.append((st, et, text))
-
+        import subtitle_utils as _su
+        cues = [c if c.end_ms > c.start_ms else c._replace(end_ms=c.start_ms + 200) for c in _su.parse_srt(txt)]
         if not cues:
             log("Transkrip SRT kosong atau tidak dikenali.")
             return None, info
 
-        # Bangun ulang SRT dengan penomoran berurutan
-        cues.sort(key=lambda x: (x[0], x[1]))
-        out_lines = []
-        for n, (st, et, text) in enumerate(cues, start=1):
-            out_lines.append(str(n))
-            out_lines.append(f"{_fmt_time_ms(st)} --> {_fmt_time_ms(et)}")
-            out_lines.append(text)
-            out_lines.append("")
-
         srt_path = str(Path(output_folder) / "youtube_transcript_wordlevel.srt")
-        with open(srt_path, "w", encoding="utf-8", newline="\r\n") as f:
-            f.write("\r\n".join(out_lines))
+        _su.write_srt(cues, srt_path)
         log(f"SRT word-level tersimpan: {srt_path}")
 
         return srt_path, info
@@ -1428,5 +2174,146 @@ def transcribe_youtube_to_srt(
         pass
 
 
+# Transkripsi per jendela audio bertumpuk (paralel lintas key, retry per jendela)
+TRANSCRIBE_WINDOW_SEC = 600
+TRANSCRIBE_OVERLAP_SEC = 15
+TRANSCRIBE_WINDOW_RETRIES = 3
+TRANSCRIBE_MAX_PARALLEL = 4
+
+def _audio_window_bytes(audio_path: str, start_sec: float, dur_sec: float) -> bytes:
+    """One window re-encoded in memory (mono 16 kHz MP3, small enough for inline data)."""
+    cmd = ["ffmpeg", "-v", "error", "-ss", f"{start_sec:.3f}", "-t", f"{dur_sec:.3f}", "-i", str(audio_path),
+           "-vn", "-ac", "1", "-ar", "16000", "-c:a", "libmp3lame", "-b:a", "32k", "-f", "mp3", "pipe:1"]
+    return subprocess.run(cmd, capture_output=True, check=True).stdout
+
+def _transcribe_window(audio_bytes: bytes, api_key: str, language: str, model_name: str, label: str, log):
+    """Word-level cues for one window (times relative to the window). Raises when every key fails."""
+    import subtitle_utils as _su
+    lang_line = f"- Bahasa audio: {language}.\n" if language and language != "auto" else ""
+    prompt = (
+        "Buatkan transkrip audio ini dengan timestamp word level untuk setiap kata.\n\n"
+        "Keluarkan HANYA file SRT valid (tanpa code fence, tanpa penjelasan).\n"
+        "Format SRT setiap cue:\n"
+        "<index>\n"
+        "HH:MM:SS,mmm --> HH:MM:SS,mmm\n"
+        "<teks satu kata (boleh termasuk tanda baca)>\n\n"
+        "Aturan:\n"
+        "- Timestamp dihitung dari awal audio ini (00:00:00,000).\n"
+        "- Setiap kata menjadi satu cue terpisah.\n"
+        "- Gunakan milidetik (mmm). Pastikan end >= start.\n"
+        + lang_line +
+        "- Jangan keluarkan teks selain isi SRT.\n"
+    )
+    safety_settings = [{"category": c, "threshold": "BLOCK_NONE"} for c in [
+        "HARM_CATEGORY_HARASSMENT", "HARM_CATEGORY_HATE_SPEECH",
+        "HARM_CATEGORY_SEXUALLY_EXPLICIT", "HARM_CATEGORY_DANGEROUS_CONTENT"
+    ]]
+    contents = [{"parts": [{"inline_data": {"mime_type": "audio/mp3", "data": audio_bytes}}, {"text": prompt}]}]
+    # MP3 32 kbps = 4000 byte/detik; input ~32 token/detik, keluaran SRT word-level ~30 token/detik
+    secs = len(audio_bytes) / 4000.0
+    est_tokens = int(secs * (32 + 30)) + 500
+    last_exc = None
+    for ki, nkeys, k, sched in _scheduled_keys(api_key, est_tokens, model=model_name):
+        try:
+            t0 = time.time()
+            model = _client_pool.model(k, model_name=model_name,
+                generation_config={"temperature": 0.2, "response_mime_type": "text/plain"},
+                safety_settings=safety_settings)
+            resp = model.generate_content(contents, request_options={"timeout": 300})
+            sched.release(k, _usage_tokens(resp), est_tokens)
+            txt = re.sub(r"^```(?:srt)?\s*|\s*```$", "", (resp.text or "").strip(), flags=re.IGNORECASE)
+            cues = _su.parse_srt(txt)
+            if not cues:
+                raise ValueError("SRT kosong atau tidak dikenali")
+            log(f"[API] {label}: {len(cues)} kata via key#{ki}/{nkeys} dalam {time.time()-t0:.1f}s")
+            return cues
+        except Exception as e:
+            last_exc = e
+            kind, cd = sched.report_error(k, e)
+            if kind in ("quota", "daily"):
+                log(f"[API] {label}: key#{ki} dibatasi (429/quota). Cooldown {cd:.0f}s & coba key berikutnya...")
+            else:
+                log(f"[API] {label} gagal via key#{ki}: {e}")
+    raise RuntimeError(f"{label}: semua key gagal ({last_exc})")
 
+def transcribe_audio_to_srt_chunked(
+    audio_path: str,
+    api_key: str,
+    output_folder: str,
+    language: str = "auto",
+    progress_callback=None,
+    model_name: str = "gemini-2.5-flash",
+    window_sec: int = TRANSCRIBE_WINDOW_SEC,
+    overlap_sec: int = TRANSCRIBE_OVERLAP_SEC,
+) -> str | None:
+    """Transcribes a local audio file to word-level SRT in overlapping windows.
+
+    Windows run concurrently across keys (shared scheduler); a failed window is retried on
+    its own, and overlaps are stitched with word-level de-duplication. Returns the SRT path.
+    """
+    def log(msg):
+        if progress_callback: progress_callback(msg)
+    import subtitle_utils as _su
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    from ffmpeg_utils import get_duration
+    try:
+        total = get_duration(audio_path)
+        if not total:
+            log(f"Durasi audio tidak terbaca: {audio_path}")
+            return None
+        step = max(30, int(window_sec) - int(overlap_sec))
+        windows = []
+        start = 0.0
+        while start < total:
+            end = min(total, start + window_sec)
+            windows.append((start, end))
+            if end >= total:
+                break
+            start += step
+        log(f"Transkripsi per jendela: {len(windows)} jendela x {window_sec}s (tumpang tindih {overlap_sec}s)")
+
+        import api_manager as _am
+        workers = max(1, min(len(windows), TRANSCRIBE_MAX_PARALLEL, _am.get_scheduler("text", model_name).key_count() or 1))
+
+        def run(i):
+            st, en = windows[i]
+            label = f"Jendela {i+1}/{len(windows)} [{_su.format_compact_time(st*1000)}-{_su.format_compact_time(en*1000)}]"
+            data = _audio_window_bytes(audio_path, st, en - st)
+            cues = _transcribe_window(data, api_key, language, model_name, label, log)
+            offset = int(round(st * 1000))
+            return (offset, int(round(en * 1000)), _su.shift_cues(cues, offset))
+
+        done: dict[int, tuple] = {}
+        pending = list(range(len(windows)))
+        attempt = 0
+        while pending and attempt < TRANSCRIBE_WINDOW_RETRIES:
+            attempt += 1
+            if attempt > 1:
+                log(f"Mengulang {len(pending)} jendela yang gagal (percobaan {attempt}/{TRANSCRIBE_WINDOW_RETRIES})...")
+            failed = []
+            with ThreadPoolExecutor(max_workers=workers) as ex:
+                futs = {ex.submit(run, i): i for i in pending}
+                for fut in as_completed(futs):
+                    i = futs[fut]
+                    try:
+                        done[i] = fut.result()
+                    except Exception as e:
+                        log(f"Jendela {i+1} gagal: {e}")
+                        failed.append(i)
+            pending = sorted(failed)
+        if pending:
+            log(f"Transkripsi gagal untuk jendela: {', '.join(str(i+1) for i in pending)}")
+            return None
 
+        cues = _su.stitch_windows([done[i] for i in sorted(done)])
+        if not cues:
+            log("Transkrip SRT kosong atau tidak dikenali.")
+            return None
+        srt_path = str(Path(output_folder) / "youtube_transcript_wordlevel.srt")
+        _su.write_srt(cues, srt_path)
+        log(f"SRT word-level tersimpan: {srt_path} ({len(cues)} kata dari {len(windows)} jendela)")
+        return srt_path
+    except Exception as e:
+        log(f"Transkripsi per jendela gagal: {e}")
+        log(traceback.format_exc())
+        return None
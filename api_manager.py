@@ -2,9 +2,21 @@
 # Handles storage, retrieval, and management of Google API keys.
 
 import json
+import re
+import threading
 import time
 from pathlib import Path
 
+# Dinaikkan setiap kali daftar key disimpan di proses ini (GUI), agar scheduler memuat ulang
+# tanpa harus mengandalkan resolusi mtime file.
+_keys_version = 0
+
+
+def notify_keys_changed():
+    global _keys_version
+    _keys_version += 1
+
+
 class APIManager:
     def __init__(self, filename: str = 'api_keys.json', status_filename: str = 'api_keys_status.json'):
         # Store the config file in the user's home directory for cross-platform compatibility
@@ -12,12 +24,25 @@ class APIManager:
         self.filepath = Path.home() / filename
         self.status_path = Path.home() / status_filename
         self.keys = []
-        self.status = {"cooldowns": {}}  # key -> epoch_until
+        # cooldowns: key -> epoch_until (semua model); model_cooldowns: model -> key -> epoch_until
+        self.status = {"cooldowns": {}, "model_cooldowns": {}}
+        self._lock = threading.RLock()
+        self._keys_sig = None
+        self._keys_version = _keys_version
         self.load_keys()
         self.load_status()
 
+    def _file_sig(self):
+        try:
+            st = self.filepath.stat()
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
     def load_keys(self):
         """Loads API keys from the JSON file."""
+        self._keys_sig = self._file_sig()
+        self._keys_version = _keys_version
         if self.filepath.exists():
             try:
                 with open(self.filepath, 'r') as f:
@@ -32,6 +57,15 @@ class APIManager:
         """Saves the current list of API keys to the JSON file."""
         with open(self.filepath, 'w') as f:
             json.dump(self.keys, f, indent=2)
+        notify_keys_changed()
+        self._keys_sig = self._file_sig()
+        self._keys_version = _keys_version
+
+    def reload_if_changed(self):
+        """Reloads the keys only when the file changed on disk or notify_keys_changed() was called."""
+        if self._keys_version != _keys_version or self._file_sig() != self._keys_sig:
+            self.load_keys()
+        return self.keys
 
     def load_status(self):
         if self.status_path.exists():
@@ -39,15 +73,16 @@ class APIManager:
                 with open(self.status_path, 'r') as f:
                     self.status = json.load(f)
             except json.JSONDecodeError:
-                self.status = {"cooldowns": {}}
+                self.status = {"cooldowns": {}, "model_cooldowns": {}}
         else:
-            self.status = {"cooldowns": {}}
+            self.status = {"cooldowns": {}, "model_cooldowns": {}}
         # Clean expired on load
         self._cleanup_expired_cooldowns()
 
     def save_status(self):
-        with open(self.status_path, 'w') as f:
-            json.dump(self.status, f, indent=2)
+        with self._lock:
+            with open(self.status_path, 'w') as f:
+                json.dump(self.status, f, indent=2)
 
     def add_key(self, key: str):
         """Adds a new key to the list if it's not already there."""
@@ -83,47 +118,336 @@ class APIManager:
     # New methods for cooldown management
     def _cleanup_expired_cooldowns(self):
         now = int(time.time())
-        cds = self.status.get("cooldowns", {})
-        expired = [k for k, until in cds.items() if not isinstance(until, int) or until <= now]
-        for k in expired:
-            cds.pop(k, None)
-        self.status["cooldowns"] = cds
+        with self._lock:
+            def _clean(cds):
+                for k in [k for k, until in cds.items() if not isinstance(until, int) or until <= now]:
+                    cds.pop(k, None)
+                return cds
+            self.status["cooldowns"] = _clean(self.status.get("cooldowns") or {})
+            per_model = {}
+            for m, cds in (self.status.get("model_cooldowns") or {}).items():
+                if isinstance(cds, dict) and _clean(cds):
+                    per_model[m] = cds
+            self.status["model_cooldowns"] = per_model
+
+    def _cooldown_until(self, key: str, model: str | None = None) -> int:
+        """Cooldown untuk semua model, atau yang terpanjang bila model diberikan dan punya cooldown sendiri."""
+        until = self.status.get("cooldowns", {}).get(key, 0)
+        if model:
+            until = max(until, self.status.get("model_cooldowns", {}).get(model, {}).get(key, 0))
+        return until
 
-    def set_key_cooldown(self, key: str, seconds: int = 24 * 3600):
+    def set_key_cooldown(self, key: str, seconds: int = 24 * 3600, model: str | None = None):
+        """Benches a key for `seconds`. With `model`, only that model's quota is benched (quotas are per key and model)."""
         if not key:
             return
         now = int(time.time())
         until = now + max(0, int(seconds))
-        self.status.setdefault("cooldowns", {})[key] = until
-        self.save_status()
+        with self._lock:
+            if model:
+                self.status.setdefault("model_cooldowns", {}).setdefault(model, {})[key] = until
+            else:
+                self.status.setdefault("cooldowns", {})[key] = until
+            self.save_status()
 
-    def is_key_on_cooldown(self, key: str) -> bool:
+    def is_key_on_cooldown(self, key: str, model: str | None = None) -> bool:
         self._cleanup_expired_cooldowns()
-        cds = self.status.get("cooldowns", {})
-        until = cds.get(key)
-        return bool(until and until > int(time.time()))
+        return self._cooldown_until(key, model) > int(time.time())
 
-    def get_available_keys(self) -> list:
-        """Returns keys that are not on cooldown (or cooldown expired)."""
+    def get_available_keys(self, model: str | None = None) -> list:
+        """Returns keys that are not on cooldown (or cooldown expired), for `model` when given."""
         self._cleanup_expired_cooldowns()
-        cds = self.status.get("cooldowns", {})
         now = int(time.time())
-        return [k for k in self.keys if (cds.get(k, 0) <= now)]
+        return [k for k in self.keys if self._cooldown_until(k, model) <= now]
 
     def get_cooldowns(self) -> dict:
-        """Returns a dict of key -> epoch_until for active cooldowns (expired removed)."""
+        """Returns a dict of key -> epoch_until for active all-model cooldowns (expired removed)."""
         self._cleanup_expired_cooldowns()
         return dict(self.status.get("cooldowns", {}))
 
-    def get_cooldown_remaining(self, key: str) -> int:
-        """Returns remaining cooldown seconds for a key (0 if available)."""
+    def get_cooldown_remaining(self, key: str, model: str | None = None) -> int:
+        """Returns remaining cooldown seconds for a key (0 if available), for `model` when given."""
         self._cleanup_expired_cooldowns()
-        until = self.status.get("cooldowns", {}).get(key)
-        if not isinstance(until, int):
-            return 0
-        rem = until - int(time.time())
+        rem = self._cooldown_until(key, model) - int(time.time())
         return rem if rem > 0 else 0
 
     def get_status_list(self) -> list[tuple[str, int]]:
-        """Returns list of (key, remaining_seconds). 0 means available."""
-        return [(k, self.get_cooldown_remaining(k)) for k in self.keys]
+        """Returns list of (key, remaining_seconds) using the longest cooldown of any model. 0 means available."""
+        self._cleanup_expired_cooldowns()
+        models = list(self.status.get("model_cooldowns", {}))
+        return [(k, max([self.get_cooldown_remaining(k)] + [self.get_cooldown_remaining(k, m) for m in models]))
+                for k in self.keys]
+
+
+# Rate-aware scheduling shared by all Gemini call sites.
+# Default budgets follow the free-tier limits for Gemini 2.5 Flash; override per deployment.
+DEFAULT_LIMITS = {"rpm": 10, "tpm": 250_000, "rpd": 250}
+# Quotas are per key *and* model: each model gets its own scheduler and budgets.
+MODEL_LIMITS = {
+    "gemini-2.5-flash": DEFAULT_LIMITS,
+    "gemini-2.5-pro": {"rpm": 5, "tpm": 250_000, "rpd": 100},
+    "gemini-2.5-flash-lite": {"rpm": 15, "tpm": 250_000, "rpd": 1000},
+    "gemini-2.5-flash-preview-tts": {"rpm": 3, "tpm": 10_000, "rpd": 15},
+}
+# Fallback per pool when the model is unknown or not given
+POOL_LIMITS = {
+    "text": DEFAULT_LIMITS,
+    "tts": MODEL_LIMITS["gemini-2.5-flash-preview-tts"],
+}
+DEFAULT_TEXT_MODEL = "gemini-2.5-flash"
+POOL_DEFAULT_MODEL = {"text": DEFAULT_TEXT_MODEL, "tts": "gemini-2.5-flash-preview-tts"}
+SHORT_COOLDOWN_BASE_SEC = 5.0
+SHORT_COOLDOWN_MAX_SEC = 15 * 60
+TRANSIENT_COOLDOWN_BASE_SEC = 2.0
+TRANSIENT_COOLDOWN_MAX_SEC = 60.0
+# Consecutive 429s before a key is benched for the day
+DAILY_COOLDOWN_AFTER = 5
+DAILY_COOLDOWN_SEC = 24 * 3600
+
+
+class _TokenBucket:
+    def __init__(self, capacity: float, period_sec: float):
+        self.capacity = float(capacity)
+        self.rate = float(capacity) / float(period_sec)
+        self.tokens = float(capacity)
+        self.last = time.monotonic()
+
+    def _refill(self, now: float):
+        if now > self.last:
+            self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+
+    def wait_time(self, n: float, now: float) -> float:
+        """Seconds until n tokens are available (0 if already available)."""
+        self._refill(now)
+        n = min(float(n), self.capacity)
+        if self.tokens >= n:
+            return 0.0
+        return (n - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+    def take(self, n: float, now: float):
+        self._refill(now)
+        self.tokens -= float(n)  # may go negative when actual usage exceeds the estimate
+
+    def give_back(self, n: float):
+        self.tokens = min(self.capacity, self.tokens + float(n))
+
+    def fill_ratio(self, now: float) -> float:
+        self._refill(now)
+        return max(0.0, self.tokens) / self.capacity if self.capacity else 0.0
+
+
+class _KeyState:
+    def __init__(self, limits: dict):
+        self.rpm = _TokenBucket(limits["rpm"], 60.0)
+        self.tpm = _TokenBucket(limits["tpm"], 60.0)
+        self.rpd = _TokenBucket(limits["rpd"], 24 * 3600.0)
+        self.in_flight = 0
+        self.quota_failures = 0
+        self.transient_failures = 0
+        self.cooldown_until = 0.0  # monotonic
+
+
+_RETRY_PATTERNS = (
+    re.compile(r"retry_delay\s*\{\s*seconds:\s*(\d+)", re.I),
+    re.compile(r"\"retryDelay\"\s*:\s*\"([\d.]+)s\"", re.I),
+    re.compile(r"retry[- ]after[:\s]+([\d.]+)", re.I),
+    re.compile(r"retry in\s+([\d.]+)\s*s", re.I),
+)
+
+
+def parse_retry_delay(message: str) -> float | None:
+    """Extracts the server-suggested retry delay (seconds) from an error message."""
+    for pat in _RETRY_PATTERNS:
+        m = pat.search(message or "")
+        if m:
+            try:
+                return float(m.group(1))
+            except ValueError:
+                continue
+    return None
+
+
+def classify_error(message: str) -> str:
+    """Returns 'daily', 'quota', 'transient' or 'other' for an API error message."""
+    msg = message or ""
+    low = msg.lower()
+    if ("perday" in low) or ("per day" in low) or ("per_day" in low):
+        return "daily"
+    if ("429" in msg) or ("toomanyrequests" in low) or ("quota" in low) or ("resource_exhausted" in low) or ("resource exhausted" in low):
+        return "quota"
+    if ("deadline" in low) or ("timeout" in low) or ("timed out" in low) or ("503" in msg) or ("504" in msg) or ("500" in msg) or ("unavailable" in low):
+        return "transient"
+    return "other"
+
+
+class KeyScheduler:
+    """Hands out the least-loaded API key that has budget left.
+
+    Tracks RPM/TPM/RPD token buckets per key, applies short exponential cooldowns on
+    429/transient errors (honouring server retry delays) and only falls back to the
+    24h APIManager cooldown (scoped to `model`) after repeated or explicitly daily quota errors.
+    Thread-safe: one instance per model is shared by every caller in the process.
+    """
+
+    def __init__(self, api_manager: APIManager, limits: dict | None = None, model: str | None = None):
+        self.am = api_manager
+        self.limits = dict(DEFAULT_LIMITS, **(limits or {}))
+        # Cooldown harian di disk berlaku per (model, key): kuota model lain pada key yang sama tetap terpakai
+        self.model = model
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._state: dict[str, _KeyState] = {}
+
+    def _st(self, key: str) -> _KeyState:
+        st = self._state.get(key)
+        if st is None:
+            st = _KeyState(self.limits)
+            self._state[key] = st
+        return st
+
+    def key_count(self) -> int:
+        return len(self.am.get_keys())
+
+    def _candidates(self, preferred: str | None) -> list:
+        keys = list(self.am.get_available_keys(self.model))
+        if preferred and preferred not in keys and preferred not in self.am.get_keys() and not self.am.is_key_on_cooldown(preferred, self.model):
+            # Key dari luar daftar tersimpan (mis. diberikan langsung)
+            keys.insert(0, preferred)
+        return keys
+
+    def _wait_for(self, st: _KeyState, est_tokens: int, now: float) -> float:
+        return max(
+            st.cooldown_until - now,
+            st.rpm.wait_time(1, now),
+            st.tpm.wait_time(est_tokens, now),
+            st.rpd.wait_time(1, now),
+            0.0,
+        )
+
+    def acquire(self, preferred: str | None = None, est_tokens: int = 0, exclude=(), max_wait: float = 90.0) -> str | None:
+        """Reserves budget on the best key and returns it, waiting up to max_wait seconds.
+        Returns None when no key (outside `exclude`) can serve within max_wait."""
+        exclude = set(exclude or ())
+        deadline = time.monotonic() + max(0.0, max_wait)
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                best = None
+                for k in self._candidates(preferred):
+                    if k in exclude:
+                        continue
+                    st = self._st(k)
+                    wait = self._wait_for(st, est_tokens, now)
+                    # Urutan: siap dulu, lalu paling sedikit beban, lalu sisa kuota harian terbesar
+                    score = (round(wait, 1), st.in_flight, -st.rpd.fill_ratio(now), k != preferred)
+                    if best is None or score < best[0]:
+                        best = (score, k, wait)
+                if best is None:
+                    return None
+                _, k, wait = best
+                if wait <= 0.0:
+                    st = self._st(k)
+                    st.rpm.take(1, now)
+                    st.tpm.take(est_tokens, now)
+                    st.rpd.take(1, now)
+                    st.in_flight += 1
+                    return k
+                if now + wait > deadline:
+                    return None
+                self._cond.wait(timeout=min(wait, max(0.05, deadline - now)))
+
+    def release(self, key: str, tokens_used: int | None = None, est_tokens: int = 0):
+        """Marks a successful call. tokens_used corrects the TPM estimate when known."""
+        with self._cond:
+            st = self._st(key)
+            st.in_flight = max(0, st.in_flight - 1)
+            st.quota_failures = 0
+            st.transient_failures = 0
+            if tokens_used is not None:
+                delta = float(tokens_used) - float(est_tokens)
+                if delta > 0:
+                    st.tpm.take(delta, time.monotonic())
+                else:
+                    st.tpm.give_back(-delta)
+            self._cond.notify_all()
+
+    def cancel(self, key: str):
+        """Releases a reservation whose request never reached the server (or whose result was discarded)."""
+        with self._cond:
+            st = self._st(key)
+            st.in_flight = max(0, st.in_flight - 1)
+            self._cond.notify_all()
+
+    def report_error(self, key: str, exc: Exception | str) -> tuple[str, float]:
+        """Releases the reservation and applies the cooldown policy.
+        Returns (kind, cooldown_seconds) where kind is from classify_error()."""
+        msg = str(exc)
+        kind = classify_error(msg)
+        cooldown = 0.0
+        daily = False
+        with self._cond:
+            st = self._st(key)
+            st.in_flight = max(0, st.in_flight - 1)
+            now = time.monotonic()
+            if kind in ("quota", "daily"):
+                st.quota_failures += 1
+                if kind == "daily" or st.quota_failures >= DAILY_COOLDOWN_AFTER:
+                    daily = True
+                else:
+                    suggested = parse_retry_delay(msg) or 0.0
+                    backoff = SHORT_COOLDOWN_BASE_SEC * (2 ** (st.quota_failures - 1))
+                    cooldown = min(SHORT_COOLDOWN_MAX_SEC, max(suggested, backoff))
+            elif kind == "transient":
+                st.transient_failures += 1
+                cooldown = min(TRANSIENT_COOLDOWN_MAX_SEC, TRANSIENT_COOLDOWN_BASE_SEC * (2 ** (st.transient_failures - 1)))
+            if cooldown:
+                st.cooldown_until = max(st.cooldown_until, now + cooldown)
+            self._cond.notify_all()
+        if daily:
+            cooldown = float(DAILY_COOLDOWN_SEC)
+            self.am.set_key_cooldown(key, DAILY_COOLDOWN_SEC, model=self.model)
+            with self._cond:
+                # Juga di memori: key dari luar daftar tersimpan tidak disaring oleh get_available_keys()
+                st.cooldown_until = max(st.cooldown_until, time.monotonic() + cooldown)
+        return kind, cooldown
+
+    def snapshot(self) -> list[dict]:
+        """Per-key load/budget view for logs or UI."""
+        now = time.monotonic()
+        with self._cond:
+            out = []
+            for k in self.am.get_keys():
+                st = self._st(k)
+                out.append({
+                    "key": k,
+                    "in_flight": st.in_flight,
+                    "cooldown_sec": max(0.0, st.cooldown_until - now),
+                    "daily_cooldown_sec": self.am.get_cooldown_remaining(k, self.model),
+                    "rpd_left": int(max(0.0, st.rpd.fill_ratio(now)) * st.rpd.capacity),
+                })
+            return out
+
+
+_schedulers: dict[str, KeyScheduler] = {}
+_shared_am: APIManager | None = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler(pool: str = "text", model: str | None = None) -> KeyScheduler:
+    """Process-wide scheduler per quota pool and model so concurrent callers share key budgets.
+    All schedulers share one APIManager (key list and cooldown file)."""
+    global _shared_am
+    name = model or POOL_DEFAULT_MODEL.get(pool, pool)
+    with _scheduler_lock:
+        if _shared_am is None:
+            _shared_am = APIManager()
+        else:
+            # Pick up keys added/removed via the GUI (only when the keys file changed)
+            _shared_am.reload_if_changed()
+        sched = _schedulers.get(name)
+        if sched is None:
+            limits = MODEL_LIMITS.get(name) or POOL_LIMITS.get(pool)
+            sched = KeyScheduler(_shared_am, limits, model=name)
+            _schedulers[name] = sched
+        return sched
@@ -0,0 +1,341 @@
+# audio_utils.py
+# Perakitan audio VO di memori (numpy PCM float32).
+# Chunk TTS tidak lagi ditulis ke WAV lalu di-concat ke MP3: potongan disambung
+# dengan crossfade pendek di sambungan, lalu gain + resample + upmix ke profil
+# output dilakukan sekali, dan VO segmen ditulis satu kali sebagai WAV (lossless).
+
+import os
+import subprocess
+import tempfile
+import wave
+
+import numpy as np
+
+# Profil audio output (sama dengan encode akhir di video_processor: 48 kHz stereo)
+OUTPUT_SAMPLE_RATE = 48000
+OUTPUT_CHANNELS = 2
+SEAM_CROSSFADE_MS = 30
+
+
+def pcm16_to_float(data: bytes) -> np.ndarray:
+    """Raw little-endian s16 mono PCM -> float32 in [-1, 1]."""
+    return np.frombuffer(bytes(data), dtype="<i2").astype(np.float32) / 32768.0
+
+
+def decode_audio(data: bytes, sample_rate: int) -> np.ndarray:
+    """Decodes a compressed audio blob (e.g. MP3) to mono float32 at sample_rate via an ffmpeg pipe."""
+    cmd = ["ffmpeg", "-v", "error", "-i", "pipe:0", "-f", "f32le", "-ac", "1", "-ar", str(int(sample_rate)), "pipe:1"]
+    proc = subprocess.run(cmd, input=bytes(data), capture_output=True, check=True)
+    return np.frombuffer(proc.stdout, dtype="<f4").copy()
+
+
+def crossfade_join(pieces: list, sample_rate: int, fade_ms: int = SEAM_CROSSFADE_MS) -> np.ndarray:
+    """Concatenates mono pieces, overlapping each seam with an equal-power crossfade."""
+    pieces = [np.asarray(p, dtype=np.float32).reshape(-1) for p in pieces if p is not None and len(p)]
+    if not pieces:
+        return np.zeros(0, dtype=np.float32)
+    fade = int(sample_rate * fade_ms / 1000.0)
+    total = sum(len(p) for p in pieces)
+    out = np.empty(total, dtype=np.float32)
+    pos = 0
+    for p in pieces:
+        n = min(fade, pos, len(p) // 2)
+        if n > 0:
+            t = np.linspace(0.0, np.pi / 2, n, dtype=np.float32)
+            out[pos - n:pos] = out[pos - n:pos] * np.cos(t) + p[:n] * np.sin(t)
+            p = p[n:]
+        out[pos:pos + len(p)] = p
+        pos += len(p)
+    return out[:pos]
+
+
+def resample(pcm: np.ndarray, src_rate: int, dst_rate: int) -> np.ndarray:
+    """Band-limited resampling (FFT) of a mono buffer; identity when the rates match."""
+    if int(src_rate) == int(dst_rate) or not len(pcm):
+        return np.asarray(pcm, dtype=np.float32)
+    n_out = int(round(len(pcm) * float(dst_rate) / float(src_rate)))
+    # Padding kecil di ujung agar wrap-around FFT tidak terdengar di awal/akhir
+    pad = min(len(pcm), int(src_rate) // 20)
+    x = np.concatenate([pcm, np.zeros(pad, dtype=np.float32)]).astype(np.float64)
+    n_pad_out = int(round(len(x) * float(dst_rate) / float(src_rate)))
+    spec = np.fft.rfft(x)
+    bins = n_pad_out // 2 + 1
+    if bins > len(spec):
+        spec = np.concatenate([spec, np.zeros(bins - len(spec), dtype=spec.dtype)])
+    else:
+        spec = spec[:bins]
+    y = np.fft.irfft(spec, n_pad_out) * (float(n_pad_out) / len(x))
+    return y[:n_out].astype(np.float32)
+
+
+def to_output_profile(pcm: np.ndarray, src_rate: int, gain: float = 1.0,
+                      dst_rate: int = OUTPUT_SAMPLE_RATE, channels: int = OUTPUT_CHANNELS) -> np.ndarray:
+    """Gain, resample and upmix in one pass; returns float32 frames x channels, clipped to [-1, 1]."""
+    y = resample(pcm, src_rate, dst_rate)
+    if gain is not None and float(gain) != 1.0:
+        y = y * np.float32(gain)
+    np.clip(y, -1.0, 1.0, out=y)
+    return np.repeat(y[:, None], max(1, int(channels)), axis=1)
+
+
+def write_wav(path: str, frames: np.ndarray, sample_rate: int = OUTPUT_SAMPLE_RATE):
+    """Writes float32 frames (n or n x channels) as 16-bit PCM WAV."""
+    frames = np.asarray(frames, dtype=np.float32)
+    if frames.ndim == 1:
+        frames = frames[:, None]
+    with wave.open(str(path), "wb") as wf:
+        wf.setnchannels(frames.shape[1])
+        wf.setsampwidth(2)
+        wf.setframerate(int(sample_rate))
+        wf.writeframes((np.clip(frames, -1.0, 1.0) * 32767.0).astype("<i2").tobytes())
+
+
+def write_audio(path: str, frames: np.ndarray, sample_rate: int = OUTPUT_SAMPLE_RATE):
+    """Writes frames once: WAV directly, any other extension encoded from a PCM pipe."""
+    frames = np.asarray(frames, dtype=np.float32)
+    if frames.ndim == 1:
+        frames = frames[:, None]
+    if str(path).lower().endswith(".wav"):
+        write_wav(path, frames, sample_rate)
+        return
+    cmd = ["ffmpeg", "-y", "-v", "error", "-f", "f32le", "-ar", str(int(sample_rate)), "-ac", str(frames.shape[1]),
+           "-i", "pipe:0", str(path)]
+    subprocess.run(cmd, input=np.ascontiguousarray(frames).tobytes(), capture_output=True, check=True)
+
+
+# ---- Mixer streaming: VO + BGM (loop/seek, gain, ducking) + limiter, memori dibatasi ukuran chunk ----
+MIX_CHUNK_SEC = 2.0
+DUCK_DEPTH_DB = 8.0          # BGM diturunkan sebanyak ini saat ada narasi
+DUCK_THRESHOLD_DB = -38.0    # level VO (RMS per frame) yang dianggap narasi
+DUCK_ATTACK_MS = 40
+DUCK_RELEASE_MS = 450
+LIMITER_CEILING_DB = -1.0
+LIMITER_RELEASE_MS = 150
+
+
+class PcmReader:
+    """Streams a media file's first audio stream as float32 frames (n x channels) from an ffmpeg pipe."""
+
+    def __init__(self, path: str, sample_rate: int = OUTPUT_SAMPLE_RATE, channels: int = OUTPUT_CHANNELS,
+                 seek_sec: float = 0.0, loop: bool = False):
+        cmd = ["ffmpeg", "-v", "error", "-nostdin"]
+        if loop:
+            cmd += ["-stream_loop", "-1"]
+        if seek_sec and seek_sec > 0:
+            cmd += ["-ss", f"{float(seek_sec):.3f}"]
+        cmd += ["-i", str(path), "-map", "0:a:0", "-f", "f32le", "-ac", str(int(channels)),
+                "-ar", str(int(sample_rate)), "pipe:1"]
+        self.channels = int(channels)
+        self.path = str(path)
+        # stderr ke file sementara (bukan pipe): tidak bisa macet, dan pesan error ffmpeg tetap terbaca
+        self._err = tempfile.TemporaryFile()
+        self._proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=self._err)
+
+    def read(self, frames: int) -> np.ndarray:
+        """Up to frames frames; fewer only at end of stream.
+        Raises RuntimeError when ffmpeg ended with an error (missing or undecodable file)."""
+        width = 4 * self.channels
+        buf = self._proc.stdout.read(int(frames) * width) or b""
+        n = len(buf) // width
+        if n < int(frames):
+            # Baca pendek = EOF: ffmpeg harus keluar normal, bukan gagal decode
+            rc = self._proc.wait()
+            if rc != 0:
+                raise RuntimeError(f"ffmpeg gagal membaca audio {self.path} (kode {rc}): {_stderr_tail(self._err)}")
+        return np.frombuffer(buf[:n * width], dtype="<f4").reshape(n, self.channels).copy()
+
+    def close(self):
+        if self._proc.poll() is None:
+            self._proc.kill()
+        self._proc.stdout.close()
+        self._proc.wait()
+        self._err.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PcmWriter:
+    """Writes float32 frames incrementally: WAV directly, other extensions encoded through an ffmpeg pipe."""
+
+    def __init__(self, path: str, sample_rate: int = OUTPUT_SAMPLE_RATE, channels: int = OUTPUT_CHANNELS,
+                 bitrate: str = "128k"):
+        self.channels = int(channels)
+        self._wav = None
+        self._proc = None
+        if str(path).lower().endswith(".wav"):
+            self._wav = wave.open(str(path), "wb")
+            self._wav.setnchannels(self.channels)
+            self._wav.setsampwidth(2)
+            self._wav.setframerate(int(sample_rate))
+        else:
+            cmd = ["ffmpeg", "-y", "-v", "error", "-f", "f32le", "-ar", str(int(sample_rate)), "-ac", str(self.channels),
+                   "-i", "pipe:0", "-c:a", "aac", "-b:a", bitrate, str(path)]
+            self._err = tempfile.TemporaryFile()
+            self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=self._err)
+        self.path = str(path)
+        self.error = None
+
+    def write(self, frames: np.ndarray):
+        frames = np.clip(np.asarray(frames, dtype=np.float32), -1.0, 1.0)
+        if self._wav is not None:
+            self._wav.writeframes((frames * 32767.0).astype("<i2").tobytes())
+        else:
+            self._proc.stdin.write(np.ascontiguousarray(frames, dtype="<f4").tobytes())
+
+    def close(self) -> bool:
+        """False (with the reason in .error) when the encoder failed."""
+        if self._wav is not None:
+            self._wav.close()
+            return True
+        try:
+            self._proc.stdin.close()
+        except OSError:
+            pass
+        rc = self._proc.wait()
+        if rc != 0:
+            self.error = f"ffmpeg gagal menulis {self.path} (kode {rc}): {_stderr_tail(self._err)}"
+        self._err.close()
+        return rc == 0
+
+
+def _stderr_tail(f, limit: int = 400) -> str:
+    try:
+        f.seek(0)
+        text = f.read().decode("utf-8", errors="replace").strip()
+    except (OSError, ValueError):
+        return ""
+    return text[-limit:] or "(tanpa pesan)"
+
+
+def _smooth_frames(target: np.ndarray, g: float, attack: float, release: float) -> np.ndarray:
+    """One-pole smoothing of per-frame gains (attack coefficient when falling, release when rising)."""
+    out = np.empty(len(target), dtype=np.float32)
+    for i, t in enumerate(target.tolist()):
+        g = t + (attack if t < g else release) * (g - t)
+        out[i] = g
+    return out
+
+
+def _frames_to_samples(frame_gains: np.ndarray, prev: float, hop: int, n: int) -> np.ndarray:
+    """Linear interpolation of frame gains (at frame centres) to n samples, starting from prev."""
+    centres = np.arange(len(frame_gains)) * hop + hop / 2.0
+    return np.interp(np.arange(n), np.concatenate([[-1.0], centres]),
+                     np.concatenate([[prev], frame_gains])).astype(np.float32)
+
+
+class Ducker:
+    """Sidechain gain for BGM from the narration level, computed per 10 ms frame; state carries across chunks."""
+
+    def __init__(self, sample_rate: int = OUTPUT_SAMPLE_RATE, depth_db: float = DUCK_DEPTH_DB,
+                 threshold_db: float = DUCK_THRESHOLD_DB, attack_ms: float = DUCK_ATTACK_MS,
+                 release_ms: float = DUCK_RELEASE_MS, frame_ms: float = 10.0):
+        self.hop = max(1, int(sample_rate * frame_ms / 1000.0))
+        self.floor = 10.0 ** (-abs(float(depth_db)) / 20.0)
+        self.threshold = 10.0 ** (float(threshold_db) / 20.0)
+        self.attack = float(np.exp(-frame_ms / max(1.0, attack_ms)))
+        self.release = float(np.exp(-frame_ms / max(1.0, release_ms)))
+        self.g = 1.0
+
+    def gains(self, voice: np.ndarray) -> np.ndarray:
+        mono = voice.mean(axis=1) if voice.ndim == 2 else voice
+        n = len(mono)
+        if not n:
+            return np.zeros(0, dtype=np.float32)
+        nf = -(-n // self.hop)
+        padded = np.zeros(nf * self.hop, dtype=np.float32)
+        padded[:n] = mono
+        rms = np.sqrt((padded.reshape(nf, self.hop) ** 2).mean(axis=1))
+        target = np.where(rms > self.threshold, self.floor, 1.0)
+        prev = self.g
+        fg = _smooth_frames(target, self.g, self.attack, self.release)
+        self.g = float(fg[-1])
+        return _frames_to_samples(fg, prev, self.hop, n)
+
+
+class Limiter:
+    """Peak limiter: instant attack with one-frame lookahead, smooth release, hard ceiling as safety."""
+
+    def __init__(self, sample_rate: int = OUTPUT_SAMPLE_RATE, ceiling_db: float = LIMITER_CEILING_DB,
+                 release_ms: float = LIMITER_RELEASE_MS, frame_ms: float = 5.0):
+        self.hop = max(1, int(sample_rate * frame_ms / 1000.0))
+        self.ceiling = 10.0 ** (float(ceiling_db) / 20.0)
+        self.release = float(np.exp(-frame_ms / max(1.0, release_ms)))
+        self.g = 1.0
+
+    def process(self, x: np.ndarray) -> np.ndarray:
+        n = len(x)
+        if not n:
+            return x
+        nf = -(-n // self.hop)
+        peak = np.zeros(nf * self.hop, dtype=np.float32)
+        peak[:n] = np.abs(x).max(axis=1) if x.ndim == 2 else np.abs(x)
+        need = np.minimum(1.0, self.ceiling / np.maximum(peak.reshape(nf, self.hop).max(axis=1), 1e-9))
+        need[:-1] = np.minimum(need[:-1], need[1:])
+        prev = self.g
+        fg = _smooth_frames(need, self.g, 0.0, self.release)
+        self.g = float(fg[-1])
+        g = _frames_to_samples(fg, prev, self.hop, n)
+        y = x * (g[:, None] if x.ndim == 2 else g)
+        return np.clip(y, -self.ceiling, self.ceiling, out=y)
+
+
+def mix_to_file(voice_path: str, output_path: str, voice_gain: float = 1.0, bgm_path: str | None = None,
+                bgm_gain: float = 0.1, bgm_start_sec: float = 0.0, bgm_duration_sec: float | None = None,
+                bgm_seek_sec: float = 0.0, bgm_loop: bool = True, duck_db: float = DUCK_DEPTH_DB,
+                limit_db: float = LIMITER_CEILING_DB, chunk_sec: float = MIX_CHUNK_SEC,
+                sample_rate: int = OUTPUT_SAMPLE_RATE, channels: int = OUTPUT_CHANNELS) -> float:
+    """Mixes the narration track with BGM in one streaming pass and writes output_path.
+
+    The narration (first audio stream of voice_path) sets the length. BGM plays from
+    bgm_start_sec for bgm_duration_sec (None = to the end), starting bgm_seek_sec into
+    the BGM file and looping when bgm_loop; it is ducked by duck_db under narration.
+    The sum goes through a peak limiter. Memory is bounded by chunk_sec. Returns seconds written.
+    """
+    if bgm_path and not os.path.isfile(str(bgm_path)):
+        raise FileNotFoundError(f"File BGM tidak ditemukan: {bgm_path}")
+    ducker = Ducker(sample_rate, depth_db=duck_db) if duck_db else None
+    limiter = Limiter(sample_rate, ceiling_db=limit_db)
+    hop = ducker.hop if ducker else 1
+    chunk = max(hop, int(sample_rate * chunk_sec) // hop * hop)
+    b_start = int(round(max(0.0, float(bgm_start_sec or 0.0)) * sample_rate))
+    b_end = None if bgm_duration_sec is None else b_start + int(round(max(0.0, float(bgm_duration_sec)) * sample_rate))
+    writer = PcmWriter(output_path, sample_rate, channels)
+    bgm = None
+    pos = 0
+    ok = False
+    try:
+        with PcmReader(voice_path, sample_rate, channels) as voice:
+            while True:
+                v = voice.read(chunk)
+                n = len(v)
+                if not n:
+                    break
+                if voice_gain != 1.0:
+                    v *= np.float32(voice_gain)
+                out = v.copy()
+                if bgm_path:
+                    s0 = max(pos, b_start)
+                    e0 = pos + n if b_end is None else min(pos + n, b_end)
+                    if e0 > s0:
+                        if bgm is None:
+                            bgm = PcmReader(bgm_path, sample_rate, channels, seek_sec=bgm_seek_sec, loop=bgm_loop)
+                        b = bgm.read(e0 - s0)
+                        if len(b):
+                            b = b * np.float32(bgm_gain)
+                            if ducker is not None:
+                                b *= ducker.gains(v[s0 - pos:s0 - pos + len(b)])[:, None]
+                            out[s0 - pos:s0 - pos + len(b)] += b
+                writer.write(limiter.process(out))
+                pos += n
+        ok = True
+    finally:
+        if bgm is not None:
+            bgm.close()
+        ok = writer.close() and ok
+    if not ok:
+        raise RuntimeError(writer.error or f"Gagal menulis audio mix: {output_path}")
+    return pos / float(sample_rate)
@@ -0,0 +1,167 @@
+# caption_stream.py
+# Parser caption YouTube (json3 / srv3 / vtt / srt) yang di-stream langsung dari
+# respons HTTP ke model Cue (subtitle_utils) tanpa file sementara, tanpa ffmpeg.
+# Setiap parser menerima potongan bytes lewat feed() dan mengembalikan cue yang
+# sudah lengkap; close() mengosongkan sisa buffer.
+
+import codecs
+import xml.etree.ElementTree as ET
+
+from json_stream import SegmentStreamParser
+from subtitle_utils import Cue, _TIME_RE, _ms, clean_cue_text, parse_srt
+
+# Urutan preferensi format track (json3/srv3 punya timing paling rapi)
+CAPTION_FORMATS = ("json3", "srv3", "vtt", "srt")
+
+
+def _cue(start_ms: int, dur_ms: int, text: str, words: int) -> Cue | None:
+    text = clean_cue_text(text)
+    if not text:
+        return None
+    if dur_ms <= 0:
+        dur_ms = max(1000, 200 * max(1, words))
+    return Cue(int(start_ms), int(start_ms) + int(dur_ms), text)
+
+
+class _TextFeed:
+    """Incremental UTF-8 decoding shared by the text-based parsers."""
+
+    def __init__(self):
+        self._dec = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    def decode(self, chunk, final: bool = False) -> str:
+        if isinstance(chunk, str):
+            return chunk
+        return self._dec.decode(chunk or b"", final)
+
+
+class Json3Parser(_TextFeed):
+    """YouTube json3: one cue per event in the top-level "events" array."""
+
+    def __init__(self):
+        super().__init__()
+        self._stream = SegmentStreamParser(array_key="events")
+
+    def feed(self, chunk) -> list[Cue]:
+        return self._cues(self._stream.feed(self.decode(chunk)))
+
+    def close(self) -> list[Cue]:
+        return self._cues(self._stream.feed(self.decode(b"", final=True)))
+
+    @staticmethod
+    def _cues(events: list) -> list[Cue]:
+        out = []
+        for ev in events:
+            words = [(sg.get("utf8") or "").replace("\n", " ").strip() for sg in (ev.get("segs") or [])]
+            words = [w for w in words if w]
+            c = _cue(int(ev.get("tStartMs") or 0), int(ev.get("dDurationMs") or 0), " ".join(words), len(words))
+            if c:
+                out.append(c)
+        return out
+
+
+class Srv3Parser:
+    """YouTube srv3 (timedtext XML): one cue per <p t= d=> paragraph, parsed with a pull parser."""
+
+    def __init__(self):
+        self._xml = ET.XMLPullParser(events=("end",))
+
+    def feed(self, chunk) -> list[Cue]:
+        self._xml.feed(chunk.encode("utf-8") if isinstance(chunk, str) else (chunk or b""))
+        return self._drain()
+
+    def close(self) -> list[Cue]:
+        try:
+            self._xml.close()
+        except ET.ParseError:
+            pass
+        return self._drain()
+
+    def _drain(self) -> list[Cue]:
+        out = []
+        try:
+            for _, el in self._xml.read_events():
+                if el.tag != "p":
+                    continue
+                text = "".join(el.itertext()).replace("\n", " ").strip()
+                c = _cue(int(el.attrib.get("t", "0") or 0), int(el.attrib.get("d", "0") or 0), text, len(text.split()))
+                if c:
+                    out.append(c)
+                el.clear()
+        except ET.ParseError:
+            pass
+        return out
+
+
+class VttParser(_TextFeed):
+    """WebVTT: blocks separated by blank lines; NOTE/STYLE/REGION blocks and the header are skipped."""
+
+    def __init__(self):
+        super().__init__()
+        self._buf = ""
+
+    def feed(self, chunk) -> list[Cue]:
+        self._buf += self.decode(chunk).replace("\r\n", "\n").replace("\r", "\n")
+        head, sep, tail = self._buf.rpartition("\n\n")
+        if not sep:
+            return []
+        self._buf = tail
+        return self._blocks(head)
+
+    def close(self) -> list[Cue]:
+        rest, self._buf = self._buf + self.decode(b"", final=True), ""
+        return self._blocks(rest)
+
+    @staticmethod
+    def _blocks(text: str) -> list[Cue]:
+        out = []
+        for block in text.split("\n\n"):
+            lines = [ln for ln in block.split("\n") if ln.strip()]
+            for i, ln in enumerate(lines[:2]):
+                m = _TIME_RE.search(ln)
+                if not m:
+                    continue
+                g = m.groups()
+                st, et = _ms(*g[:4]), _ms(*g[4:])
+                text_ = clean_cue_text(" ".join(lines[i + 1:]))
+                if text_:
+                    out.append(Cue(st, max(st, et), text_))
+                break
+        return out
+
+
+class SrtParser(_TextFeed):
+    """Plain SRT track; small enough to parse once the body is complete."""
+
+    def __init__(self):
+        super().__init__()
+        self._parts = []
+
+    def feed(self, chunk) -> list[Cue]:
+        self._parts.append(self.decode(chunk))
+        return []
+
+    def close(self) -> list[Cue]:
+        self._parts.append(self.decode(b"", final=True))
+        return parse_srt("".join(self._parts))
+
+
+_PARSERS = {"json3": Json3Parser, "srv3": Srv3Parser, "vtt": VttParser, "srt": SrtParser}
+
+
+def parser_for(ext: str):
+    cls = _PARSERS.get((ext or "").lower())
+    if cls is None:
+        raise ValueError(f"Format caption tidak didukung: {ext}")
+    return cls()
+
+
+def parse_caption_stream(chunks, ext: str) -> list[Cue]:
+    """Feeds an iterable of bytes/str chunks through the parser for ext; returns cues sorted by start."""
+    parser = parser_for(ext)
+    cues = []
+    for chunk in chunks:
+        cues.extend(parser.feed(chunk))
+    cues.extend(parser.close())
+    cues.sort(key=lambda c: c.start_ms)
+    return cues
@@ -0,0 +1,158 @@
+# cue_store.py
+# Penyimpanan cue terindeks yang dipakai bersama oleh semua pembaca SRT.
+# start/end (ms) disimpan di array numpy int64, teks di satu buffer UTF-8 dengan
+# offset; query rentang waktu memakai binary search (searchsorted). Hasil parse
+# di-cache sebagai file biner di samping SRT ("<nama>.srt.cues") dan di memori,
+# sehingga SRT word-level berjam-jam cukup di-parse sekali.
+
+import os
+import struct
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from subtitle_utils import Cue, parse_srt
+
+CACHE_SUFFIX = ".cues"
+_MAGIC = b"RSCUES01"
+# magic, jumlah cue, panjang buffer teks, ukuran SRT sumber, mtime_ns SRT sumber
+_HEADER = struct.Struct("<8sqqqq")
+
+
+class CueStore:
+    """Immutable cue table sorted by start time."""
+
+    def __init__(self, starts, ends, offsets, text_buf: bytes, source_size: int = 0, source_mtime_ns: int = 0):
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.ends = np.asarray(ends, dtype=np.int64)
+        self.offsets = np.asarray(offsets, dtype=np.int64)   # len n+1, ke dalam text_buf
+        self.text_buf = bytes(text_buf)
+        self.source_size = int(source_size)
+        self.source_mtime_ns = int(source_mtime_ns)
+        # Cue terpanjang: batas bawah pencarian untuk cue yang mulai sebelum rentang tapi masih overlap
+        self.max_len_ms = int((self.ends - self.starts).max()) if len(self.starts) else 0
+
+    @classmethod
+    def from_cues(cls, cues: list, source_size: int = 0, source_mtime_ns: int = 0) -> "CueStore":
+        cues = sorted(cues, key=lambda c: c.start_ms)
+        encoded = [c.text.encode("utf-8") for c in cues]
+        offsets = np.zeros(len(cues) + 1, dtype=np.int64)
+        if encoded:
+            np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        return cls(
+            np.fromiter((c.start_ms for c in cues), dtype=np.int64, count=len(cues)),
+            np.fromiter((max(c.end_ms, c.start_ms) for c in cues), dtype=np.int64, count=len(cues)),
+            offsets, b"".join(encoded), source_size, source_mtime_ns,
+        )
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def text(self, i: int) -> str:
+        return self.text_buf[self.offsets[i]:self.offsets[i + 1]].decode("utf-8", errors="replace")
+
+    def __getitem__(self, i: int) -> Cue:
+        return Cue(int(self.starts[i]), int(self.ends[i]), self.text(i))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def cues(self, lo: int = 0, hi: int | None = None) -> list:
+        hi = len(self) if hi is None else hi
+        return [self[i] for i in range(lo, hi)]
+
+    @property
+    def duration_ms(self) -> int:
+        return int(self.ends.max()) if len(self) else 0
+
+    def index_range(self, start_ms: int, end_ms: int) -> np.ndarray:
+        """Indices of cues overlapping [start_ms, end_ms), in start order."""
+        lo = int(np.searchsorted(self.starts, int(start_ms) - self.max_len_ms, side="left"))
+        hi = int(np.searchsorted(self.starts, int(end_ms), side="left"))
+        idx = np.arange(lo, hi)
+        return idx[self.ends[lo:hi] > int(start_ms)]
+
+    def range(self, start_ms: int, end_ms: int) -> list:
+        return [self[i] for i in self.index_range(start_ms, end_ms)]
+
+    def text_between(self, start_ms: int, end_ms: int, max_chars: int | None = None) -> str:
+        parts, total = [], 0
+        for i in self.index_range(start_ms, end_ms):
+            t = self.text(i)
+            parts.append(t)
+            total += len(t) + 1
+            if max_chars and total >= max_chars:
+                break
+        out = " ".join(parts)
+        return out[:max_chars] if max_chars else out
+
+    def sample_text(self, max_chars: int = 2000) -> str:
+        """Leading cue text (for language detection and similar quick checks)."""
+        n = int(np.searchsorted(self.offsets, max_chars, side="right"))
+        return " ".join(self.text(i) for i in range(min(max(1, n), len(self))))
+
+    # ---- cache biner ----
+    def save(self, path: str):
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, len(self), len(self.text_buf), self.source_size, self.source_mtime_ns))
+            f.write(self.starts.astype("<i8").tobytes())
+            f.write(self.ends.astype("<i8").tobytes())
+            f.write(self.offsets.astype("<i8").tobytes())
+            f.write(self.text_buf)
+        os.replace(tmp, path)
+
+    @classmethod
+    def read(cls, path: str) -> "CueStore":
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, n, nbuf, size, mtime_ns = _HEADER.unpack_from(data, 0)
+        if magic != _MAGIC:
+            raise ValueError("bukan cache cue")
+        pos = _HEADER.size
+        arrays = []
+        for count in (n, n, n + 1):
+            arrays.append(np.frombuffer(data, dtype="<i8", count=count, offset=pos))
+            pos += 8 * count
+        text_buf = data[pos:pos + nbuf]
+        if len(text_buf) != nbuf:
+            raise ValueError("cache cue terpotong")
+        return cls(*arrays, text_buf, size, mtime_ns)
+
+
+def cache_path(srt_path: str) -> Path:
+    return Path(str(srt_path) + CACHE_SUFFIX)
+
+
+_memo: dict = {}
+_memo_lock = threading.Lock()
+
+
+def load(srt_path: str) -> CueStore:
+    """CueStore for an SRT: from memory, else the binary cache beside it, else parsed once (and cached)."""
+    st = os.stat(srt_path)
+    ident = (os.path.abspath(srt_path), st.st_size, st.st_mtime_ns)
+    with _memo_lock:
+        store = _memo.get(ident[0])
+        if store is not None and (store.source_size, store.source_mtime_ns) == ident[1:]:
+            return store
+    cpath = cache_path(srt_path)
+    store = None
+    try:
+        cached = CueStore.read(str(cpath))
+        if (cached.source_size, cached.source_mtime_ns) == ident[1:]:
+            store = cached
+    except (OSError, ValueError, struct.error):
+        store = None
+    if store is None:
+        with open(srt_path, "r", encoding="utf-8", errors="ignore") as f:
+            store = CueStore.from_cues(parse_srt(f.read()), st.st_size, st.st_mtime_ns)
+        try:
+            store.save(str(cpath))
+        except OSError:
+            pass
+    with _memo_lock:
+        _memo[ident[0]] = store
+    return store
@@ -0,0 +1,115 @@
+# delivery.py
+# Tahap delivery opsional setelah video akhir jadi: satu decode, di-split & di-scale
+# ke beberapa rendisi (ladder) dengan GOP yang sejajar (keyframe tiap SEGMENT_SEC),
+# lalu (opsional) dipaketkan menjadi HLS/DASH dari rendisi MP4 itu dengan -c copy,
+# sehingga tidak ada encode ulang per format.
+
+import pathlib
+
+from ffmpeg_utils import run_ffmpeg_command, get_video_size
+
+SEGMENT_SEC = 4
+FRAME_RATE = 25
+DEFAULT_LADDER = [
+    {"name": "1080p", "height": 1080, "video_bitrate": "5000k", "audio_bitrate": "160k"},
+    {"name": "720p", "height": 720, "video_bitrate": "2800k", "audio_bitrate": "128k"},
+    {"name": "480p", "height": 480, "video_bitrate": "1400k", "audio_bitrate": "96k"},
+]
+FORMATS = ("mp4", "hls", "dash")
+
+
+def _kbps(rate) -> int:
+    r = str(rate).strip().lower()
+    if r.endswith("m"):
+        return int(float(r[:-1]) * 1000)
+    return int(float(r[:-1])) if r.endswith("k") else int(float(r)) // 1000
+
+
+def _ladder_for(ladder, source_height: int | None) -> list:
+    """Ladder sorted high to low, without renditions taller than the source (one is always kept)."""
+    rungs = sorted((dict(r) for r in (ladder or DEFAULT_LADDER)), key=lambda r: -int(r["height"]))
+    if source_height:
+        fit = [r for r in rungs if int(r["height"]) <= int(source_height)]
+        rungs = fit or rungs[-1:]
+    return rungs
+
+
+def encode_ladder(input_path: str, out_dir: str, ladder=None, progress_callback=None) -> list:
+    """Encodes every rendition from one decode of input_path. Returns [(rung, mp4_path)] or []."""
+    out = pathlib.Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    size = get_video_size(str(input_path))
+    rungs = _ladder_for(ladder, size[1] if size else None)
+    stem = pathlib.Path(input_path).stem
+    gop = SEGMENT_SEC * FRAME_RATE
+    n = len(rungs)
+    graph = "[0:v]split=" + str(n) + "".join(f"[s{i}]" for i in range(n)) + ";" + ";".join(
+        f"[s{i}]scale=-2:{int(r['height'])},setsar=1[v{i}]" for i, r in enumerate(rungs))
+    outputs, paths = [], []
+    for i, r in enumerate(rungs):
+        path = out / f"{stem}_{r['name']}.mp4"
+        vb = _kbps(r.get("video_bitrate", "2000k"))
+        # GOP tertutup & sejajar di semua rendisi: keyframe tepat tiap SEGMENT_SEC, tanpa scenecut
+        outputs.append(
+            f'-map "[v{i}]" -map 0:a? -r {FRAME_RATE} -c:v libx264 -preset veryfast -profile:v high '
+            f'-b:v {vb}k -maxrate {int(vb * 1.07)}k -bufsize {vb * 2}k '
+            f'-g {gop} -keyint_min {gop} -sc_threshold 0 -force_key_frames "expr:gte(t,n_forced*{SEGMENT_SEC})" '
+            f'-c:a aac -b:a {r.get("audio_bitrate", "128k")} -ar 48000 -ac 2 -movflags +faststart "{path}"'
+        )
+        paths.append((r, path))
+    if progress_callback:
+        try:
+            progress_callback(f"[Delivery] Ladder: {', '.join(r['name'] for r in rungs)} (GOP {gop} frame)")
+        except Exception:
+            pass
+    command = f'ffmpeg -i "{input_path}" -filter_complex "{graph}" {" ".join(outputs)}'
+    return paths if run_ffmpeg_command(command, progress_callback=progress_callback) else []
+
+
+def package_hls(renditions: list, out_dir: str, progress_callback=None) -> str | None:
+    """HLS (VOD) master playlist + one variant per rendition, remuxed without re-encoding."""
+    out = pathlib.Path(out_dir) / "hls"
+    out.mkdir(parents=True, exist_ok=True)
+    inputs = " ".join(f'-i "{p}"' for _, p in renditions)
+    maps = " ".join(f"-map {i}:v -map {i}:a?" for i in range(len(renditions)))
+    var_map = " ".join(f"v:{i},a:{i},name:{r['name']}" for i, (r, _) in enumerate(renditions))
+    command = (f'ffmpeg {inputs} {maps} -c copy -f hls -hls_time {SEGMENT_SEC} -hls_playlist_type vod '
+               f'-hls_flags independent_segments -hls_segment_filename "{out}/%v/seg_%05d.ts" '
+               f'-master_pl_name master.m3u8 -var_stream_map "{var_map}" "{out}/%v/index.m3u8"')
+    ok = run_ffmpeg_command(command, progress_callback=progress_callback)
+    return str(out / "master.m3u8") if ok else None
+
+
+def package_dash(renditions: list, out_dir: str, progress_callback=None) -> str | None:
+    """DASH manifest with all video renditions in one adaptation set and one audio track, remuxed."""
+    out = pathlib.Path(out_dir) / "dash"
+    out.mkdir(parents=True, exist_ok=True)
+    inputs = " ".join(f'-i "{p}"' for _, p in renditions)
+    maps = " ".join(f"-map {i}:v" for i in range(len(renditions))) + " -map 0:a?"
+    manifest = out / "manifest.mpd"
+    command = (f'ffmpeg {inputs} {maps} -c copy -f dash -seg_duration {SEGMENT_SEC} -use_template 1 -use_timeline 1 '
+               f'-adaptation_sets "id=0,streams=v id=1,streams=a" "{manifest}"')
+    ok = run_ffmpeg_command(command, progress_callback=progress_callback)
+    return str(manifest) if ok else None
+
+
+def deliver(input_path: str, out_dir: str, ladder=None, formats=("mp4",), progress_callback=None) -> dict:
+    """Runs the delivery stage. Returns {"mp4": [paths], "hls": master, "dash": manifest} for what succeeded."""
+    formats = [f for f in (formats or ("mp4",)) if f in FORMATS]
+    renditions = encode_ladder(input_path, out_dir, ladder, progress_callback)
+    if not renditions:
+        raise RuntimeError("Encode ladder gagal.")
+    result = {"mp4": [str(p) for _, p in renditions]}
+    if "hls" in formats:
+        result["hls"] = package_hls(renditions, out_dir, progress_callback)
+    if "dash" in formats:
+        result["dash"] = package_dash(renditions, out_dir, progress_callback)
+    if "mp4" not in formats:
+        # MP4 hanya sumber paket; hapus jika tidak diminta
+        for _, p in renditions:
+            try:
+                p.unlink()
+            except OSError:
+                pass
+        result.pop("mp4")
+    return result
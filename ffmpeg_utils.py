@@ -20,6 +20,19 @@ def get_duration(media_path: str):
         print(f"Error getting duration for {media_path}: {e}")
         return None
 
+def get_video_size(media_path: str):
+    """
+    Returns (width, height) of the first video stream using ffprobe, or None.
+    """
+    command = f'ffprobe -v error -select_streams v:0 -show_entries stream=width,height -of csv=p=0:s=x "{media_path}"'
+    try:
+        result = subprocess.check_output(command, stderr=subprocess.STDOUT, shell=True)
+        w, h = result.decode().strip().splitlines()[0].split("x")[:2]
+        return int(w), int(h)
+    except Exception as e:
+        print(f"Error getting video size for {media_path}: {e}")
+        return None
+
 def run_ffmpeg_command(command: str, **kwargs):
     """
     Executes an FFmpeg command using subprocess.
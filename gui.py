@@ -5,13 +5,8 @@ import customtkinter as ctk
 from tkinter import filedialog, messagebox
 import os
 import threading
-import json
-import api_handler
-import video_processor
-import ffmpeg_utils
-from pathlib import Path
 import api_manager
-import language_detector # New import
+import job_runner
 
 class App(ctk.CTk):
     def __init__(self):
@@ -85,6 +80,11 @@ class App(ctk.CTk):
         ]
         self.story_lang_menu = ctk.CTkOptionMenu(sb_lang_frame, values=sb_lang_values, variable=self.story_lang_var)
         self.story_lang_menu.pack(fill="x", padx=10, pady=5)
+        # Bahasa tambahan: VO diterjemahkan & disintesis per bahasa, video dirender sekali
+        ctk.CTkLabel(sb_lang_frame, text="Bahasa tambahan (mis. en,ms)").pack(anchor="w", padx=10, pady=(6, 0))
+        self.extra_langs_entry = ctk.CTkEntry(sb_lang_frame); self.extra_langs_entry.pack(fill="x", padx=10, pady=5)
+        self.multi_audio_var = ctk.BooleanVar(value=False)
+        ctk.CTkCheckBox(sb_lang_frame, text="Satu file multi-audio", variable=self.multi_audio_var).pack(anchor="w", padx=10, pady=5)
         # Subtitle language preference removed; auto-detect/priority handled internally
         audio_frame = ctk.CTkFrame(right_col); audio_frame.pack(padx=10, pady=10, fill="x", pady_=(10,10))
         ctk.CTkLabel(audio_frame, text="Audio Settings", font=ctk.CTkFont(weight="bold")).pack(anchor="w", padx=10)
@@ -99,9 +99,17 @@ class App(ctk.CTk):
         ctk.CTkLabel(audio_frame, text="Voice Name (opsional)").pack(anchor="w", padx=10, pady=(6, 0))
         self.voice_name_entry = ctk.CTkEntry(audio_frame); self.voice_name_entry.pack(fill="x", padx=10, pady=5)
         # TTS language mengikuti storyboard (vo_language); tidak ada override di UI
-        # TTS Device (diabaikan untuk Gemini; sembunyikan opsi)
+        # Backend TTS: auto = Gemini lalu lokal (Chatterbox) jika semua key habis
+        ctk.CTkLabel(audio_frame, text="TTS Backend").pack(anchor="w", padx=10, pady=(6, 0))
+        self.tts_backend_var = ctk.StringVar(value="auto")
+        ctk.CTkOptionMenu(audio_frame, values=["auto", "gemini", "local"], variable=self.tts_backend_var).pack(fill="x", padx=10, pady=5)
+        # TTS Device (hanya untuk backend lokal)
         self.tts_device_var = ctk.StringVar(value="cpu")
-        # Voice Prompt Audio dihapus (tidak diperlukan)
+        ctk.CTkOptionMenu(audio_frame, values=["cpu", "cuda", "mps"], variable=self.tts_device_var).pack(fill="x", padx=10, pady=5)
+        # Voice prompt (referensi suara untuk backend lokal)
+        self.voice_prompt_path = ctk.StringVar()
+        ctk.CTkButton(audio_frame, text="Voice Prompt (lokal)...", command=self._select_voice_prompt_file).pack(fill="x", padx=10, pady=5)
+        self.voice_prompt_label = ctk.CTkLabel(audio_frame, text="No voice prompt selected.", text_color="gray", wraplength=250); self.voice_prompt_label.pack(anchor="w", padx=10)
         ctk.CTkButton(audio_frame, text="Add Background Music...", command=self._select_bgm_file).pack(fill="x", padx=10, pady=10)
         self.bgm_label = ctk.CTkLabel(audio_frame, text="No BGM file selected.", text_color="gray", wraplength=250); self.bgm_label.pack(anchor="w", padx=10)
         ctk.CTkLabel(audio_frame, text="BGM Volume (%)").pack(anchor="w", padx=10, pady=(10, 0))
@@ -113,6 +121,12 @@ class App(ctk.CTk):
         segment_frame = ctk.CTkFrame(right_col); segment_frame.pack(padx=10, pady=10, fill="x")
         ctk.CTkLabel(segment_frame, text="Segment Processing", font=ctk.CTkFont(weight="bold")).pack(anchor="w", padx=10)
         ctk.CTkCheckBox(segment_frame, text="Process All Segments", variable=self.process_all_segments, command=self._toggle_all_segments).pack(anchor="w", padx=10, pady=5)
+        # Profil output tambahan: versi vertikal 9:16 dari decode yang sama
+        self.vertical_output_var = ctk.BooleanVar(value=False)
+        ctk.CTkCheckBox(segment_frame, text="Juga buat versi vertikal 9:16", variable=self.vertical_output_var).pack(anchor="w", padx=10, pady=5)
+        # Delivery: ladder 1080p/720p/480p (GOP sejajar) + paket HLS
+        self.delivery_var = ctk.BooleanVar(value=False)
+        ctk.CTkCheckBox(segment_frame, text="Delivery ladder (1080/720/480 + HLS)", variable=self.delivery_var).pack(anchor="w", padx=10, pady=5)
         self.segment_checkboxes = {}
         for name in self.segment_vars:
             cb = ctk.CTkCheckBox(segment_frame, text=name, variable=self.segment_vars[name]); cb.pack(anchor="w", padx=30, pady=2); self.segment_checkboxes[name] = cb
@@ -165,6 +179,11 @@ class App(ctk.CTk):
             self.vo_override_files[name].set("")
             self.vo_override_labels[name].configure(text="No file selected.", text_color="gray")
     # Voice Prompt handler dihapus
+    def _select_voice_prompt_file(self):
+        path = filedialog.askopenfilename(filetypes=[("Audio", "*.wav *.mp3 *.flac")])
+        if path:
+            self.voice_prompt_path.set(path); self.voice_prompt_label.configure(text=os.path.basename(path), text_color="white")
+
     def _select_bgm_file(self):
         path = filedialog.askopenfilename(filetypes=[("Audio", "*.mp3 *.wav")]);
         if path:
@@ -189,47 +208,54 @@ class App(ctk.CTk):
     def _log_message_thread_safe(self, msg):
         self.log_box.configure(state="normal"); self.log_box.insert("end", str(msg) + "\n"); self.log_box.configure(state="disabled"); self.log_box.see("end")
 
-    def _start_processing(self):
-        api_key_to_use = self.api_manager.get_key()
-        mp4 = self.mp4_path.get()
-        srt = self.srt_path.get()
-        yt = self.youtube_url.get().strip()
-        storyboard_json = self.storyboard_path.get()
-        use_existing_storyboard = bool(storyboard_json and os.path.isfile(storyboard_json))
-
-        # Validasi minimal: Output folder wajib
-        if not self.output_folder.get():
-            self.log_message("ERROR: Silakan pilih Folder Output."); return
-
-        use_youtube = bool(yt)
-        if not use_youtube:
-            # Alur lama: butuh MP4; SRT atau Storyboard JSON
-            if not mp4:
-                self.log_message("ERROR: Silakan pilih file MP4 atau gunakan YouTube URL."); return
-            any_override = any(self.vo_override_enabled[n].get() and self.vo_override_files[n].get() for n in self.segment_order)
-            if any_override and not use_existing_storyboard:
-                self.log_message("ERROR: Jika menggunakan VO Override, wajib memilih Storyboard JSON terlebih dahulu."); return
-            if not use_existing_storyboard:
-                if not srt:
-                    self.log_message("ERROR: Tidak ada SRT. Pilih SRT atau berikan Storyboard JSON, atau gunakan YouTube URL."); return
-                if not api_key_to_use:
-                    self.log_message("ERROR: Tambahkan API Key untuk generate storyboard dari Gemini, atau berikan Storyboard JSON."); return
-
-        # Lanjut ke thread dengan parameter YouTube jika ada
-        film_duration_sec = 0
-        detected_lang = "en"
-
-        self.start_button.configure(state="disabled"); self.stop_button.configure(state="normal"); self.stop_event.clear()
-        # Pass selected recap duration (int)
+    def _build_job(self) -> dict:
+        """Job dict (see job_runner.JOB_DEFAULTS) from the editor widgets."""
         try:
             recap_minutes = int(self.recap_minutes_var.get())
         except Exception:
             recap_minutes = 10
-        self.fast_storyboard_var = getattr(self, 'fast_storyboard_var', None)
-        if self.fast_storyboard_var is None:
-            self.fast_storyboard_var = ctk.BooleanVar(value=True)
-        model_choice = getattr(self, 'storyboard_model_var', None).get() if hasattr(self, 'storyboard_model_var') else "gemini-2.5-flash"
-        self.processing_thread = threading.Thread(target=self._processing_thread_target, args=(film_duration_sec, api_key_to_use, detected_lang, recap_minutes, model_choice, yt)); self.processing_thread.start()
+        try:
+            tts_chunk_sec = int(self.tts_chunk_entry.get().strip() or 180)
+        except Exception:
+            tts_chunk_sec = 180
+        return {
+            "video": self.mp4_path.get(),
+            "srt": self.srt_path.get(),
+            "youtube_url": self.youtube_url.get().strip(),
+            "download_video": self.download_video_var.get(),
+            "output_folder": self.output_folder.get(),
+            "storyboard": self.storyboard_path.get(),
+            "language": (self.story_lang_var.get() or "auto").strip().lower(),
+            "extra_languages": self.extra_langs_entry.get() or "",
+            "multi_audio_tracks": bool(self.multi_audio_var.get()),
+            "recap_minutes": recap_minutes,
+            "model": self.storyboard_model_var.get() if hasattr(self, 'storyboard_model_var') else "gemini-2.5-flash",
+            "segments": [name for name, var in self.segment_vars.items() if var.get()],
+            "process_all": self.process_all_segments.get(),
+            "main_vo_volume": self.main_vol_slider.get() / 100.0,
+            "bgm_path": self.bgm_path.get(),
+            "bgm_volume": self.bgm_vol_slider.get() / 100.0,
+            "bgm_segment": self.bgm_segment_var.get(),
+            "tts_backend": self.tts_backend_var.get(),
+            "tts_device": self.tts_device_var.get(),
+            "voice_name": self.voice_name_entry.get().strip(),
+            "voice_prompt": self.voice_prompt_path.get(),
+            "tts_chunk_sec": tts_chunk_sec,
+            "vo_overrides": {n: self.vo_override_files[n].get() for n in self.segment_order
+                             if self.vo_override_enabled[n].get() and self.vo_override_files[n].get()},
+            "vertical": self.vertical_output_var.get(),
+            "delivery": {"formats": ["mp4", "hls"]} if self.delivery_var.get() else None,
+        }
+
+    def _start_processing(self):
+        job = job_runner.normalize_job(self._build_job())
+        # Validasi sama dengan CLI (job_runner.validate_job)
+        err = job_runner.validate_job(job, self.api_manager.get_key())
+        if err:
+            self.log_message(f"ERROR: {err}"); return
+
+        self.start_button.configure(state="disabled"); self.stop_button.configure(state="normal"); self.stop_event.clear()
+        self.processing_thread = threading.Thread(target=self._processing_thread_target, args=(job,)); self.processing_thread.start()
 
     def _stop_processing(self): self.log_message("STOP signal sent..."); self.stop_event.set()
 
@@ -251,277 +277,14 @@ class App(ctk.CTk):
         except Exception:
             pass
 
-    def _processing_thread_target(self, film_duration_sec, api_key, language_code, recap_minutes, model_choice, youtube_url=""):
+    def _processing_thread_target(self, job):
         try:
-            use_youtube = bool(youtube_url)
-            # Jika YouTube digunakan: coba ambil subtitle via yt-dlp dulu; jika tidak ada, transkrip via Gemini
-            if use_youtube:
-                # 1) Coba yt-dlp subtitle (json3/srv3/vtt/srt)
-                srt_path = None
-                yinfo = {}
-                try:
-                    self.log_message("Mencoba mengunduh subtitle dari YouTube (json3/srv3/vtt/srt)...")
-                    from youtube_utils import download_subtitles
-                    # Use internal default preference (id,id-*,en,en-*)
-                    sub_path, sub_ext = download_subtitles(youtube_url, self.output_folder.get(), progress_callback=self.log_message)
-                    if sub_path:
-                        self.log_message(f"Subtitle ditemukan: {os.path.basename(sub_path)} ({sub_ext})")
-                        # Konversi ke SRT standar (tidak harus word-level)
-                        target_srt = str(Path(self.output_folder.get()) / "youtube_transcript_wordlevel.srt")
-                        ok = False
-                        if sub_ext == 'json3':
-                            from api_handler import _json3_to_srt
-                            ok = _json3_to_srt(sub_path, target_srt, log=self.log_message)
-                        elif sub_ext == 'srv3':
-                            from api_handler import _srv3_to_srt
-                            ok = _srv3_to_srt(sub_path, target_srt, log=self.log_message)
-                        elif sub_ext == 'vtt':
-                            from api_handler import _vtt_to_srt
-                            ok = _vtt_to_srt(sub_path, target_srt, log=self.log_message)
-                        elif sub_ext == 'srt':
-                            try:
-                                import shutil
-                                shutil.copyfile(sub_path, target_srt)
-                                ok = True
-                            except Exception:
-                                ok = False
-                        if ok:
-                            srt_path = target_srt
-                            self.log_message("Subtitle siap digunakan (word-level bila didukung).")
-                        else:
-                            self.log_message("Gagal konversi subtitle ke word-level SRT. Akan coba transkrip via Gemini.")
-                except Exception as e:
-                    self.log_message(f"Subtitle YouTube tidak tersedia atau gagal: {e}")
-
-                # 2) Fallback ke Gemini jika tidak ada
-                yt_info = {}
-                if not srt_path:
-                    self.log_message("Memulai transkripsi YouTube (word-level SRT) via Gemini...")
-                    from api_handler import transcribe_youtube_to_srt
-                    srt_path, yt_info = transcribe_youtube_to_srt(youtube_url, api_key, self.output_folder.get(), progress_callback=self.log_message)
-                    if not srt_path:
-                        raise Exception("Gagal membuat SRT dari YouTube.")
-                self.srt_path.set(srt_path)
-                # Deteksi bahasa dari SRT hasil (sebagai fallback jika 'auto')
-                language_code = language_detector.detect_language_from_srt(srt_path)
-                # Override jika user memilih storyboard language tertentu
-                try:
-                    chosen_story_lang = self.story_lang_var.get().strip().lower() if self.story_lang_var else "auto"
-                    if chosen_story_lang and chosen_story_lang != "auto":
-                        language_code = chosen_story_lang
-                except Exception:
-                    pass
-                self.log_message(f"Storyboard language: '{language_code}'.")
-
-                # Download video jika diminta; jika tidak, kita akan coba ambil durasi dari metadata
-                mp4 = None
-                if self.download_video_var.get():
-                    try:
-                        self.log_message("Mengunduh video kualitas terbaik...")
-                        from youtube_utils import download_video_best
-                        mp4 = download_video_best(youtube_url, self.output_folder.get(), progress_callback=self.log_message)
-                        self.mp4_path.set(mp4)
-                    except Exception as e:
-                        raise Exception(f"Gagal mengunduh video: {e}")
-
-                # Durasi film: dari file jika ada, kalau tidak gunakan info yt
-                if mp4:
-                    dur = ffmpeg_utils.get_duration(mp4)
-                    if not dur:
-                        raise Exception(f"Tidak dapat membaca durasi dari video: {mp4}")
-                    film_duration_sec = dur
-                else:
-                    try:
-                        from youtube_utils import get_video_info
-                        yinfo = get_video_info(youtube_url) or {}
-                        film_duration_sec = int(yinfo.get("duration") or 0)
-                    except Exception:
-                        film_duration_sec = 0
-                    if not film_duration_sec:
-                        self.log_message("Peringatan: Durasi video tidak tersedia dari metadata. Sebaiknya aktifkan download video untuk akurasi.")
-
-            selected_segments = [name for name, var in self.segment_vars.items() if var.get()]
-            if not selected_segments: raise Exception("No segments selected for processing.")
-
-            # Validasi BGM segment: hanya izinkan dari segmen yang dipilih
-            chosen_bgm_segment = self.bgm_segment_var.get()
-            if chosen_bgm_segment and chosen_bgm_segment not in selected_segments:
-                # Jika user memilih segmen yang tidak aktif, fallback ke segmen pertama aktif
-                chosen_bgm_segment = selected_segments[0]
-
-            user_settings = {
-                "main_vo_volume": self.main_vol_slider.get() / 100.0,
-                "bgm_path": self.bgm_path.get(),
-                "bgm_volume": self.bgm_vol_slider.get() / 100.0,
-                "bgm_segment": chosen_bgm_segment,
-                "output_path": str(Path(self.output_folder.get()) / f"{Path(self.mp4_path.get()).stem}_recap.mp4"),
-                "selected_segments": selected_segments,
-                "process_all": self.process_all_segments.get()
-            }
-
-            storyboard_file = self.storyboard_path.get()
-            if storyboard_file and os.path.isfile(storyboard_file):
-                self.log_message(f"Memuat storyboard dari file: {os.path.basename(storyboard_file)} (melewati Gemini)")
-                # Robust JSON loader: tangani code fences dan teks non-JSON murni
-                raw = ""
-                with open(storyboard_file, "r", encoding="utf-8", errors="ignore") as f:
-                    raw = f.read()
-                txt = raw.lstrip("\ufeff").strip()
-                if not txt:
-                    raise Exception("File storyboard kosong atau tidak dapat dibaca.")
-                # Hilangkan code fence markdown jika ada
-                for fence in ("```json", "```JSON", "```", "\u0060\u0060\u0060json"):
-                    if txt.startswith(fence):
-                        txt = txt[len(fence):].strip()
-                if txt.endswith("```"):
-                    txt = txt[:-3].strip()
-                # Coba parse langsung (JSON) atau JSON5 jika tersedia
-                try:
-                    storyboard = json.loads(txt)
-                except Exception:
-                    try:
-                        import json5  # type: ignore
-                        storyboard = json5.loads(txt)
-                    except Exception:
-                        # Normalisasi: hapus komentar // ... atau /* ... */ dan trailing commas, lalu quote key tak ber-quote, dan ubah string single-quote -> double-quote jika aman
-                        import re
-                        cand_full = txt
-                        # Hapus tag citation khusus dari model (di luar/di dalam string)
-                        cand_full = re.sub(r"\[cite_start\]", "", cand_full)
-                        cand_full = re.sub(r"\[cite_end\]", "", cand_full)
-                        cand_full = re.sub(r"\[cite:[^\]]+\]", "", cand_full)
-                        # Hapus komentar blok /* ... */
-                        cand_full = re.sub(r"/\*.*?\*/", "", cand_full, flags=re.S)
-                        # Hapus komentar single-line //...
-                        cand_full = re.sub(r"(^|\s)//.*$", "", cand_full, flags=re.M)
-                        # Hapus trailing comma sebelum } atau ]
-                        cand_full = re.sub(r",\s*([}\]])", r"\1", cand_full)
-                        # Quote key yang tak ber-quote: cari setelah { atau ,
-                        cand_full = re.sub(r'([\{,]\s*)([A-Za-z_][\w\-]*)\s*:', r'\1"\2":', cand_full)
-                        # Ubah string single-quoted menjadi double-quoted (hindari yang sudah dalam tanda kutip ganda)
-                        cand_full = re.sub(r"'(.*?)'", lambda m: '"' + m.group(1).replace('"', '\\"') + '"', cand_full)
-                        try:
-                            storyboard = json.loads(cand_full)
-                        except Exception:
-                            # Coba ekstrak blok JSON pertama berdasarkan kurung kurawal dari teks yang sudah dinormalisasi
-                            i = cand_full.find("{"); j = cand_full.rfind("}")
-                        if i != -1 and j != -1 and j > i:
-                            cand = cand_full[i:j+1]
-                            try:
-                                storyboard = json.loads(cand)
-                            except Exception as e:
-                                # Simpan debug
-                                dbg = Path(self.output_folder.get()) / "storyboard_load_error.txt"
-                                with open(dbg, "w", encoding="utf-8") as df:
-                                    df.write(raw)
-                                raise Exception(f"Gagal parsing JSON dari file storyboard. Detail: {e}. Salinan mentah disimpan ke {dbg}")
-                        else:
-                            dbg = Path(self.output_folder.get()) / "storyboard_load_error.txt"
-                            with open(dbg, "w", encoding="utf-8") as df:
-                                df.write(raw)
-                            raise Exception(f"Format file storyboard tidak berisi JSON valid. Salinan mentah disimpan ke {dbg}")
-            else:
-                # Non-YouTube path: pastikan durasi, lalu tentukan bahasa storyboard (pilihan user override deteksi)
-                if not use_youtube:
-                    mp4 = self.mp4_path.get()
-                    film_duration_sec = ffmpeg_utils.get_duration(mp4)
-                    if not film_duration_sec:
-                        raise Exception(f"ERROR: Tidak dapat membaca durasi dari file video: {mp4}")
-                    # Deteksi hanya jika 'auto'
-                    try:
-                        chosen_story_lang = self.story_lang_var.get().strip().lower() if self.story_lang_var else "auto"
-                    except Exception:
-                        chosen_story_lang = "auto"
-                    if chosen_story_lang == "auto":
-                        self.log_message(f"Mendeteksi bahasa dari {os.path.basename(self.srt_path.get())}...")
-                        language_code = language_detector.detect_language_from_srt(self.srt_path.get())
-                    else:
-                        language_code = chosen_story_lang
-                    self.log_message(f"Storyboard language: '{language_code}'.")
-                # Gunakan mode cepat jika memilih model Flash
-                if model_choice == "gemini-2.5-flash":
-                    storyboard = api_handler.get_storyboard_from_srt_fast(
-                        self.srt_path.get(), api_key, int(film_duration_sec), self.output_folder.get(), language_code,
-                        self.log_message, recap_minutes=recap_minutes, timeout_s=180
-                    )
-                else:
-                    storyboard = api_handler.get_storyboard_from_srt(
-                        self.srt_path.get(), api_key, int(film_duration_sec), self.output_folder.get(), language_code,
-                        self.log_message, recap_minutes,
-                        fast_mode=(model_choice == "gemini-2.5-flash"),
-                        storyboard_model=model_choice
-                    )
-                if not storyboard: raise Exception("Gagal mendapatkan storyboard dari API.")
-
-            # Jika tidak ada MP4 (mis. user tidak memilih download), hentikan setelah storyboard (tanpa render)
-            if not self.mp4_path.get():
-                self.log_message("Tidak ada file video MP4. Proses dihentikan setelah pembuatan storyboard. Aktifkan download video atau pilih file MP4 untuk melanjutkan render.")
-                return
-
-            vo_audio_map = {}; temp_audio_dir = Path(self.output_folder.get()) / "temp_audio"; temp_audio_dir.mkdir(exist_ok=True)
-            for segment in storyboard.get('segments', []):
-                if self.stop_event.is_set(): raise InterruptedError("Proses dihentikan oleh pengguna.")
-                label = segment['label']
-                if label not in selected_segments: continue
-
-                script = segment['vo_script']
-                vo_lang = segment.get('vo_language', language_code)
-                output_path = temp_audio_dir / f"vo_{label}.mp3"
-
-                # VO override: jika user menyediakan file, gunakan dan lewati TTS
-                if self.vo_override_enabled.get(label, ctk.BooleanVar(value=False)).get():
-                    candidate = self.vo_override_files.get(label).get()
-                    if candidate and os.path.isfile(candidate):
-                        self.log_message(f"Menggunakan VO override untuk segmen '{label}': {os.path.basename(candidate)}")
-                        vo_audio_map[label] = candidate
-                        continue
-
-                voice_name = self.voice_name_entry.get().strip()
-                # Coba rotasi semua API key yang tersimpan jika terjadi quota/429
-                keys = self.api_manager.get_keys() or [api_key]
-                audio_success = False
-                # Bahasa TTS mengikuti storyboard (vo_language)
-                final_tts_lang = vo_lang
-                # Baca konfigurasi chunk durasi (detik)
-                try:
-                    max_chunk_sec = int(self.tts_chunk_entry.get().strip()) if self.tts_chunk_entry.get().strip() else 180
-                except Exception:
-                    max_chunk_sec = 180
-
-                for idx, k in enumerate(keys, start=1):
-                    if self.stop_event.is_set(): raise InterruptedError("Proses dihentikan oleh pengguna.")
-                    self.log_message(f"Mencoba TTS untuk segmen '{label}' dengan API key #{idx}/{len(keys)}...")
-                    if api_handler.generate_vo_audio(
-                        vo_script=script,
-                        api_key=k,
-                        output_path=str(output_path),
-                        language_code=final_tts_lang,
-                        voice_name=voice_name,
-                        progress_callback=self.log_message,
-                        tts_device=self.tts_device_var.get(),
-                        voice_prompt_path="",
-                        speech_rate_wpm=(segment.get('vo_meta', {}).get('speech_rate_wpm') if isinstance(segment.get('vo_meta'), dict) else None),
-                        max_chunk_sec=max_chunk_sec,
-                    ):
-                        audio_success = True
-                        break
-                if not audio_success:
-                    raise Exception(f"Gagal total saat menghasilkan audio untuk segmen '{label}'. Semua API key kehabisan kuota atau gagal.")
-
-                vo_audio_map[label] = str(output_path)
-
-            # Sisipkan peta VO ke user_settings agar processor bisa menghitung timing BGM
-            user_settings["_vo_audio_map"] = vo_audio_map
-            final_path = video_processor.process_video(storyboard, self.mp4_path.get(), vo_audio_map, user_settings, film_duration_sec, self.stop_event, self.log_message)
-            if not final_path: raise Exception("Pemrosesan video gagal.")
-            if isinstance(final_path, list):
-                self.log_message("SUKSES: Proses selesai. Video per-segmen:")
-                for p in final_path:
-                    self.log_message(f"  - {p}")
-            else:
-                self.log_message(f"SUKSES: Proses selesai. Video akhir di: {final_path}")
-        except InterruptedError as e: self.log_message(f"STOPPED: {e}")
-        except Exception as e: import traceback; self.log_message(f"FATAL ERROR: {e}"); self.log_message(traceback.format_exc())
+            summary = job_runner.run_job(job, self.stop_event, self.log_message, am=self.api_manager)
+            # Tampilkan SRT/MP4 hasil YouTube di field editor
+            if summary.get("srt_path"):
+                self.after(0, self.srt_path.set, summary["srt_path"])
+            if summary.get("video_path"):
+                self.after(0, self.mp4_path.set, summary["video_path"])
         finally: self.after(0, lambda: (self.start_button.configure(state="normal"), self.stop_button.configure(state="disabled")))
 
     def setup_api_tab(self):
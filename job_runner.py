@@ -0,0 +1,593 @@
+# job_runner.py
+# Orkestrasi satu job recap tanpa GUI: subtitle/transkrip -> storyboard -> VO -> render.
+# Dipakai oleh GUI (satu job) dan CLI restorymaker.py (run/batch). Konfigurasi job
+# berupa dict (atau file JSON) dengan kunci seperti JOB_DEFAULTS; hasilnya ringkasan
+# dict (status, output, error, durasi per tahap) yang bisa ditulis sebagai JSON.
+
+import contextlib
+import json
+import os
+import re
+import threading
+import time
+import traceback
+from pathlib import Path
+
+import api_handler
+import api_manager
+import ffmpeg_utils
+import language_detector
+import speech_rate
+import storyboard_schema
+import video_processor
+
+SEGMENT_LABELS = ["Intro", "Rising", "Mid-conflict", "Climax", "Ending"]
+
+JOB_DEFAULTS = {
+    "name": "",
+    "video": "",                 # file MP4 sumber
+    "srt": "",                   # SRT sumber (tidak perlu jika storyboard atau youtube_url)
+    "youtube_url": "",
+    "download_video": True,
+    "output_folder": "",
+    "storyboard": "",            # storyboard JSON siap pakai (melewati Gemini)
+    "language": "auto",          # bahasa storyboard/VO; auto = deteksi dari SRT
+    "extra_languages": [],
+    "multi_audio_tracks": False,
+    "recap_minutes": 10,
+    "model": "gemini-2.5-flash",
+    "segments": list(SEGMENT_LABELS),
+    "process_all": True,
+    "main_vo_volume": 1.0,
+    "bgm_path": "",
+    "bgm_volume": 0.1,
+    "bgm_segment": "",
+    "tts_backend": "auto",
+    "tts_device": "cpu",
+    "voice_name": "",
+    "voice_prompt": "",
+    "tts_chunk_sec": 180,
+    "vo_overrides": {},          # {label: path audio}
+    "vertical": False,           # tambah profil 9:16
+    "output_profiles": [],
+    "delivery": None,            # True atau {"ladder": [...], "formats": [...]}
+    "snap_to_shots": True,
+}
+
+STATUS_OK = "ok"
+STATUS_FAILED = "failed"
+STATUS_STOPPED = "stopped"
+
+
+def load_job(path: str) -> dict:
+    """Job dict from a JSON file, merged over JOB_DEFAULTS; relative paths resolve against the file."""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        raise ValueError(f"{path}: job harus object JSON")
+    base = Path(path).resolve().parent
+    for key in ("video", "srt", "output_folder", "storyboard", "bgm_path", "voice_prompt"):
+        if data.get(key) and not os.path.isabs(str(data[key])):
+            data[key] = str(base / data[key])
+    for label, p in list((data.get("vo_overrides") or {}).items()):
+        if p and not os.path.isabs(str(p)):
+            data["vo_overrides"][label] = str(base / p)
+    job = normalize_job(data)
+    job["name"] = job["name"] or Path(path).stem
+    return job
+
+
+def normalize_job(data: dict) -> dict:
+    unknown = sorted(set(data) - set(JOB_DEFAULTS))
+    if unknown:
+        raise ValueError(f"Kunci job tidak dikenal: {', '.join(unknown)}")
+    job = json.loads(json.dumps(JOB_DEFAULTS))
+    job.update(data)
+    if isinstance(job["extra_languages"], str):
+        job["extra_languages"] = [x for x in re.split(r"[,;\s]+", job["extra_languages"]) if x]
+    job["segments"] = [s for s in (job["segments"] or SEGMENT_LABELS) if s in SEGMENT_LABELS]
+    return job
+
+
+def validate_job(job: dict, api_key: str | None) -> str | None:
+    """Error message for a job that cannot start, or None (same rules as the editor's Start button)."""
+    if not job.get("output_folder"):
+        return "Silakan pilih Folder Output."
+    if not job.get("segments"):
+        return "No segments selected for processing."
+    if not job.get("youtube_url"):
+        has_storyboard = bool(job.get("storyboard") and os.path.isfile(job["storyboard"]))
+        if not job.get("video"):
+            return "Silakan pilih file MP4 atau gunakan YouTube URL."
+        if any(job.get("vo_overrides", {}).values()) and not has_storyboard:
+            return "Jika menggunakan VO Override, wajib memilih Storyboard JSON terlebih dahulu."
+        if not has_storyboard:
+            if not job.get("srt"):
+                return "Tidak ada SRT. Pilih SRT atau berikan Storyboard JSON, atau gunakan YouTube URL."
+            if not api_key:
+                return "Tambahkan API Key untuk generate storyboard dari Gemini, atau berikan Storyboard JSON."
+    return None
+
+
+class Budget:
+    """Global limits shared by concurrently running jobs: render slots (CPU) and API-stage slots (quota).
+
+    One CPU slot is one whole render (video_processor.process_video): shot analysis followed by the
+    ffmpeg encodes, which run one after another and use ffmpeg's own threading. With cpu_slots set,
+    the parallel shot analysis inside a slot is limited to cpu_workers threads so that concurrent
+    renders share the cores instead of each taking half of them.
+    """
+
+    def __init__(self, cpu_slots: int | None = None, api_slots: int | None = None):
+        self._cpu = threading.BoundedSemaphore(max(1, int(cpu_slots))) if cpu_slots else None
+        self._api = threading.BoundedSemaphore(max(1, int(api_slots))) if api_slots else None
+        self.cpu_workers = max(1, (os.cpu_count() or 2) // max(1, int(cpu_slots))) if cpu_slots else None
+
+    @contextlib.contextmanager
+    def _slot(self, sem):
+        if sem is None:
+            yield
+            return
+        sem.acquire()
+        try:
+            yield
+        finally:
+            sem.release()
+
+    def cpu(self):
+        return self._slot(self._cpu)
+
+    def api(self):
+        return self._slot(self._api)
+
+
+def _strip_fences(txt: str) -> str:
+    for fence in ("```json", "```JSON", "```"):
+        if txt.startswith(fence):
+            txt = txt[len(fence):].strip()
+    if txt.endswith("```"):
+        txt = txt[:-3].strip()
+    return txt
+
+
+def load_storyboard_file(storyboard_file: str, output_folder: str, language_code: str, log) -> dict:
+    """Robust storyboard JSON loader (code fences, JSON5, comments, trailing commas), then schema validation."""
+    with open(storyboard_file, "r", encoding="utf-8", errors="ignore") as f:
+        raw = f.read()
+    txt = raw.lstrip("﻿").strip()
+    if not txt:
+        raise Exception("File storyboard kosong atau tidak dapat dibaca.")
+    # Hilangkan code fence markdown jika ada
+    txt = _strip_fences(txt)
+    # Coba parse langsung (JSON) atau JSON5 jika tersedia
+    try:
+        storyboard = json.loads(txt)
+    except Exception:
+        try:
+            import json5  # type: ignore
+            storyboard = json5.loads(txt)
+        except Exception:
+            # Normalisasi: hapus komentar // ... atau /* ... */ dan trailing commas, lalu quote key tak ber-quote, dan ubah string single-quote -> double-quote jika aman
+            cand_full = txt
+            # Hapus tag citation khusus dari model (di luar/di dalam string)
+            cand_full = re.sub(r"\[cite_start\]", "", cand_full)
+            cand_full = re.sub(r"\[cite_end\]", "", cand_full)
+            cand_full = re.sub(r"\[cite:[^\]]+\]", "", cand_full)
+            # Hapus komentar blok /* ... */
+            cand_full = re.sub(r"/\*.*?\*/", "", cand_full, flags=re.S)
+            # Hapus komentar single-line //...
+            cand_full = re.sub(r"(^|\s)//.*$", "", cand_full, flags=re.M)
+            # Hapus trailing comma sebelum } atau ]
+            cand_full = re.sub(r",\s*([}\]])", r"\1", cand_full)
+            # Quote key yang tak ber-quote: cari setelah { atau ,
+            cand_full = re.sub(r'([\{,]\s*)([A-Za-z_][\w\-]*)\s*:', r'\1"\2":', cand_full)
+            # Ubah string single-quoted menjadi double-quoted (hindari yang sudah dalam tanda kutip ganda)
+            cand_full = re.sub(r"'(.*?)'", lambda m: '"' + m.group(1).replace('"', '\\"') + '"', cand_full)
+            try:
+                storyboard = json.loads(cand_full)
+            except Exception:
+                # Coba ekstrak blok JSON pertama berdasarkan kurung kurawal dari teks yang sudah dinormalisasi
+                i = cand_full.find("{"); j = cand_full.rfind("}")
+                dbg = Path(output_folder) / "storyboard_load_error.txt"
+                if i != -1 and j != -1 and j > i:
+                    try:
+                        storyboard = json.loads(cand_full[i:j + 1])
+                    except Exception as e:
+                        # Simpan debug
+                        with open(dbg, "w", encoding="utf-8") as df:
+                            df.write(raw)
+                        raise Exception(f"Gagal parsing JSON dari file storyboard. Detail: {e}. Salinan mentah disimpan ke {dbg}")
+                else:
+                    with open(dbg, "w", encoding="utf-8") as df:
+                        df.write(raw)
+                    raise Exception(f"Format file storyboard tidak berisi JSON valid. Salinan mentah disimpan ke {dbg}")
+    # Validasi skema: laporkan field yang salah secara tepat, perbaiki yang aman
+    storyboard, issues = storyboard_schema.validate_storyboard(storyboard, language_code)
+    if issues:
+        log(f"Validasi storyboard ({len(issues)} temuan):\n{storyboard_schema.format_issues(issues, limit=20)}")
+    errs = storyboard_schema.errors_only(issues)
+    if errs:
+        raise Exception(f"Storyboard tidak valid ({len(errs)} field): " + "; ".join(f"{e.path}: {e.message}" for e in errs[:5]))
+    return storyboard
+
+
+def make_segment_vo(segment, job: dict, api_key, language_code, temp_audio_dir, log, stop_event,
+                    gain=1.0, suffix=""):
+    """VO audio for one segment: the job's override file, or TTS (generate_vo_audio rotates over the stored keys)."""
+    label = segment['label']
+    script = segment['vo_script']
+    vo_lang = segment.get('vo_language', language_code)
+    # WAV 48 kHz stereo dengan gain sudah diterapkan: ditulis sekali, tanpa MP3 perantara
+    output_path = Path(temp_audio_dir) / f"vo_{label}{suffix}.wav"
+
+    # VO override: jika user menyediakan file, gunakan dan lewati TTS (hanya bahasa utama)
+    candidate = (job.get("vo_overrides") or {}).get(label)
+    if not suffix and candidate and os.path.isfile(candidate):
+        log(f"Menggunakan VO override untuk segmen '{label}': {os.path.basename(candidate)}")
+        return candidate
+
+    # Baca konfigurasi chunk durasi (detik)
+    try:
+        max_chunk_sec = int(job.get("tts_chunk_sec") or 180)
+    except Exception:
+        max_chunk_sec = 180
+
+    if stop_event.is_set(): raise InterruptedError("Proses dihentikan oleh pengguna.")
+    log(f"Memulai TTS untuk segmen '{label}'...")
+    # Rotasi key (quota/429, cooldown) sudah ditangani scheduler di dalam generate_vo_audio
+    if api_handler.generate_vo_audio(
+        vo_script=script,
+        api_key=api_key,
+        output_path=str(output_path),
+        language_code=vo_lang,
+        voice_name=(job.get("voice_name") or "").strip(),
+        progress_callback=log,
+        tts_device=job.get("tts_device", "cpu"),
+        voice_prompt_path=job.get("voice_prompt", ""),
+        speech_rate_wpm=(segment.get('vo_meta', {}).get('speech_rate_wpm') if isinstance(segment.get('vo_meta'), dict) else None),
+        max_chunk_sec=max_chunk_sec,
+        backend=job.get("tts_backend", "auto"),
+        gain=gain,
+    ):
+        return str(output_path)
+    raise Exception(f"Gagal total saat menghasilkan audio untuk segmen '{label}'. Semua API key kehabisan kuota atau gagal.")
+
+
+def _story_language(job: dict, srt_path: str, log) -> str:
+    """Job language, or detected from the SRT when 'auto'."""
+    chosen = (job.get("language") or "auto").strip().lower()
+    if chosen != "auto":
+        return chosen
+    log(f"Mendeteksi bahasa dari {os.path.basename(srt_path)}...")
+    return language_detector.detect_language_from_srt(srt_path)
+
+
+def run_job(job: dict, stop_event: threading.Event | None = None, progress_callback=None,
+            am: api_manager.APIManager | None = None, budget: Budget | None = None) -> dict:
+    """Runs one job end to end. Never raises; returns a summary dict:
+    {name, status (ok/failed/stopped), outputs, error, srt_path, video_path, storyboard_path, stages, elapsed_sec}."""
+    job = normalize_job(job)
+    stop_event = stop_event or threading.Event()
+    budget = budget or Budget()
+    log = progress_callback or print
+    am = am or api_manager.APIManager()
+    t_start = time.time()
+    summary = {"name": job.get("name") or Path(job.get("video") or job.get("youtube_url") or "job").stem,
+               "status": STATUS_FAILED, "outputs": [], "error": None, "srt_path": job.get("srt") or "",
+               "video_path": job.get("video") or "", "storyboard_path": "", "stages": {}}
+    # TTS yang dimulai selama storyboard di-stream; ditutup di finally juga saat job gagal/dihentikan
+    vo_executor = None
+
+    @contextlib.contextmanager
+    def stage(name, slot=None):
+        t0 = time.time()
+        with (slot if slot is not None else contextlib.nullcontext()):
+            try:
+                yield
+            finally:
+                summary["stages"][name] = round(summary["stages"].get(name, 0.0) + time.time() - t0, 2)
+
+    try:
+        api_key = am.get_key()
+        err = validate_job(job, api_key)
+        if err:
+            raise ValueError(err)
+        output_folder = job["output_folder"]
+        Path(output_folder).mkdir(parents=True, exist_ok=True)
+        youtube_url = (job.get("youtube_url") or "").strip()
+        srt_path = job.get("srt") or ""
+        mp4 = job.get("video") or ""
+        film_duration_sec = 0
+        language_code = "en"
+
+        # Jika YouTube digunakan: coba ambil subtitle via yt-dlp dulu; jika tidak ada, transkrip via Gemini
+        if youtube_url:
+            with stage("subtitle", budget.api()):
+                srt_path = None
+                try:
+                    log("Mencoba mengambil subtitle dari YouTube (json3/srv3/vtt/srt)...")
+                    from youtube_utils import fetch_caption_cues
+                    import subtitle_utils
+                    # Track dibaca langsung ke memori dan di-parse saat di-stream (preferensi id,id-*,en,en-*)
+                    cues, sub_meta = fetch_caption_cues(youtube_url, progress_callback=log)
+                    if cues:
+                        target_srt = str(Path(output_folder) / "youtube_transcript_wordlevel.srt")
+                        subtitle_utils.write_srt(cues, target_srt)
+                        srt_path = target_srt
+                        log(f"Subtitle siap digunakan: {sub_meta.get('lang')} ({sub_meta.get('ext')}), {len(cues)} cue.")
+                    else:
+                        log("Subtitle YouTube tidak tersedia. Akan coba transkrip via Gemini.")
+                except Exception as e:
+                    log(f"Subtitle YouTube tidak tersedia atau gagal: {e}")
+
+                # Fallback ke Gemini jika tidak ada
+                if not srt_path:
+                    log("Memulai transkripsi YouTube (word-level SRT) via Gemini...")
+                    # Per jendela audio bertumpuk (paralel lintas key): film panjang tidak melebihi batas output
+                    srt_path, _ = api_handler.transcribe_youtube_to_srt(youtube_url, api_key, output_folder, progress_callback=log, chunked=True)
+                    if not srt_path:
+                        raise Exception("Gagal membuat SRT dari YouTube.")
+            summary["srt_path"] = srt_path
+            # Deteksi bahasa dari SRT hasil (sebagai fallback jika 'auto')
+            language_code = _story_language(job, srt_path, log)
+            log(f"Storyboard language: '{language_code}'.")
+
+            # Download video jika diminta; jika tidak, kita akan coba ambil durasi dari metadata
+            mp4 = None
+            if job.get("download_video", True):
+                with stage("download"):
+                    try:
+                        log("Mengunduh video kualitas terbaik...")
+                        from youtube_utils import download_video_best
+                        mp4 = download_video_best(youtube_url, output_folder, progress_callback=log)
+                    except Exception as e:
+                        raise Exception(f"Gagal mengunduh video: {e}")
+                summary["video_path"] = mp4 or ""
+
+            # Durasi film: dari file jika ada, kalau tidak gunakan info yt
+            if mp4:
+                dur = ffmpeg_utils.get_duration(mp4)
+                if not dur:
+                    raise Exception(f"Tidak dapat membaca durasi dari video: {mp4}")
+                film_duration_sec = dur
+            else:
+                try:
+                    from youtube_utils import get_video_info
+                    yinfo = get_video_info(youtube_url) or {}
+                    film_duration_sec = int(yinfo.get("duration") or 0)
+                except Exception:
+                    film_duration_sec = 0
+                if not film_duration_sec:
+                    log("Peringatan: Durasi video tidak tersedia dari metadata. Sebaiknya aktifkan download video untuk akurasi.")
+
+        selected_segments = list(job["segments"])
+        # Validasi BGM segment: hanya izinkan dari segmen yang dipilih
+        chosen_bgm_segment = job.get("bgm_segment") or ""
+        if chosen_bgm_segment and chosen_bgm_segment not in selected_segments:
+            # Jika segmen BGM tidak aktif, fallback ke segmen pertama aktif
+            chosen_bgm_segment = selected_segments[0]
+
+        user_settings = {
+            "main_vo_volume": float(job.get("main_vo_volume", 1.0)),
+            "bgm_path": job.get("bgm_path") or "",
+            "bgm_volume": float(job.get("bgm_volume", 0.1)),
+            "bgm_segment": chosen_bgm_segment,
+            "output_path": str(Path(output_folder) / f"{Path(mp4 or 'recap').stem}_recap.mp4"),
+            "selected_segments": selected_segments,
+            "process_all": bool(job.get("process_all", True)),
+            "snap_to_shots": bool(job.get("snap_to_shots", True)),
+            # Direktori kerja di folder output (bukan di folder film): job untuk film-film yang berada di
+            # folder sumber yang sama tidak saling menimpa. Satu folder output tetap hanya untuk satu job.
+            "work_dir": str(Path(output_folder) / "temp_restory_work"),
+        }
+        if budget.cpu_workers:
+            user_settings["cpu_workers"] = budget.cpu_workers
+        if job.get("delivery"):
+            user_settings["delivery"] = job["delivery"]
+        profiles = [dict(p) for p in (job.get("output_profiles") or [])]
+        if job.get("vertical") and not profiles:
+            profiles = [dict(video_processor.DEFAULT_OUTPUT_PROFILE), dict(video_processor.VERTICAL_OUTPUT_PROFILE)]
+        if profiles:
+            user_settings["output_profiles"] = profiles
+
+        temp_audio_dir = Path(output_folder) / "temp_audio"; temp_audio_dir.mkdir(exist_ok=True)
+        vo_futures = {}
+
+        storyboard_file = job.get("storyboard") or ""
+        if storyboard_file and os.path.isfile(storyboard_file):
+            log(f"Memuat storyboard dari file: {os.path.basename(storyboard_file)} (melewati Gemini)")
+            if not youtube_url and (job.get("language") or "auto") != "auto":
+                language_code = job["language"].strip().lower()
+            storyboard = load_storyboard_file(storyboard_file, output_folder, language_code, log)
+            summary["storyboard_path"] = storyboard_file
+        else:
+            # Non-YouTube path: pastikan durasi, lalu tentukan bahasa storyboard (pilihan user override deteksi)
+            if not youtube_url:
+                film_duration_sec = ffmpeg_utils.get_duration(mp4)
+                if not film_duration_sec:
+                    raise Exception(f"ERROR: Tidak dapat membaca durasi dari file video: {mp4}")
+                language_code = _story_language(job, srt_path, log)
+                log(f"Storyboard language: '{language_code}'.")
+            # Target kata mengikuti model kecepatan bicara voice TTS yang akan dipakai
+            if job.get("tts_backend") == "local":
+                voice_key = speech_rate.voice_key("local", job.get("voice_prompt", ""), language_code)
+            else:
+                voice_key = speech_rate.voice_key("gemini", (job.get("voice_name") or "").strip(), language_code)
+            model_choice = job.get("model") or "gemini-2.5-flash"
+            recap_minutes = int(job.get("recap_minutes") or 10)
+            with stage("storyboard", budget.api()):
+                # Gunakan mode cepat jika memilih model Flash
+                if model_choice == "gemini-2.5-flash":
+                    if mp4:
+                        # Mulai TTS per segmen begitu segmen itu selesai di-stream (satu worker, urut)
+                        from concurrent.futures import ThreadPoolExecutor
+                        vo_executor = ThreadPoolExecutor(max_workers=1)
+                        def on_segment(seg):
+                            if seg.get('label') in selected_segments and seg.get('vo_script'):
+                                vo_futures[seg['label']] = vo_executor.submit(
+                                    make_segment_vo, seg, job, api_key, language_code, temp_audio_dir, log, stop_event,
+                                    user_settings["main_vo_volume"])
+                    else:
+                        on_segment = None
+                    storyboard = api_handler.get_storyboard_from_srt_fast(
+                        srt_path, api_key, int(film_duration_sec), output_folder, language_code,
+                        log, recap_minutes=recap_minutes, timeout_s=180, on_segment=on_segment,
+                        voice_key=voice_key
+                    )
+                else:
+                    storyboard = api_handler.get_storyboard_from_srt(
+                        srt_path, api_key, int(film_duration_sec), output_folder, language_code,
+                        log, recap_minutes,
+                        fast_mode=False,
+                        storyboard_model=model_choice,
+                        voice_key=voice_key
+                    )
+            if not storyboard: raise Exception("Gagal mendapatkan storyboard dari API.")
+            summary["storyboard_path"] = str(Path(output_folder) / "storyboard_output.json")
+
+        # Jika tidak ada MP4 (mis. user tidak memilih download), hentikan setelah storyboard (tanpa render)
+        if not mp4:
+            log("Tidak ada file video MP4. Proses dihentikan setelah pembuatan storyboard. Aktifkan download video atau pilih file MP4 untuk melanjutkan render.")
+            summary["status"] = STATUS_OK
+            return summary
+
+        with stage("vo", budget.api()):
+            vo_audio_map = {}
+            for segment in storyboard.get('segments', []):
+                if stop_event.is_set(): raise InterruptedError("Proses dihentikan oleh pengguna.")
+                label = segment['label']
+                if label not in selected_segments: continue
+                fut = vo_futures.get(label)
+                if fut is not None:
+                    # VO sudah disintesis selama storyboard masih di-stream
+                    vo_audio_map[label] = fut.result()
+                else:
+                    vo_audio_map[label] = make_segment_vo(segment, job, api_key, language_code, temp_audio_dir, log,
+                                                          stop_event, user_settings["main_vo_volume"])
+
+            # Mode multi-bahasa: naskah VO diterjemahkan, TTS per bahasa; video dipakai ulang oleh processor
+            extra_langs = []
+            for lang in job.get("extra_languages") or []:
+                lang = str(lang).strip().lower()
+                if lang and lang != (language_code or "").lower() and lang not in extra_langs:
+                    extra_langs.append(lang)
+            language_vo_maps = {}
+            for lang in extra_langs:
+                if stop_event.is_set(): raise InterruptedError("Proses dihentikan oleh pengguna.")
+                log(f"Menyiapkan VO bahasa tambahan '{lang}'...")
+                scripts = api_handler.translate_vo_scripts(storyboard, lang, api_key, log, labels=selected_segments)
+                lang_map = {}
+                for segment in storyboard.get('segments', []):
+                    label = segment['label']
+                    if label not in selected_segments: continue
+                    lang_seg = dict(segment, vo_script=scripts.get(label) or "", vo_language=lang, vo_meta={})
+                    lang_map[label] = make_segment_vo(lang_seg, job, api_key, lang, temp_audio_dir, log, stop_event,
+                                                      user_settings["main_vo_volume"], suffix=f"_{lang}")
+                language_vo_maps[lang] = lang_map
+
+        # Sisipkan peta VO ke user_settings agar processor bisa menghitung timing BGM
+        user_settings["_vo_audio_map"] = vo_audio_map
+        # VO hasil TTS sudah membawa gain VO utama; override dari user belum
+        user_settings["_vo_gain_applied"] = [
+            label for label, path in vo_audio_map.items() if str(path) == str(temp_audio_dir / f"vo_{label}.wav")
+        ]
+        if language_vo_maps:
+            user_settings["primary_language"] = language_code
+            user_settings["multi_audio_tracks"] = bool(job.get("multi_audio_tracks"))
+            user_settings["_vo_gain_applied_by_lang"] = {lang: list(m) for lang, m in language_vo_maps.items()}
+        with stage("render", budget.cpu()):
+            if stop_event.is_set(): raise InterruptedError("Proses dihentikan oleh pengguna.")
+            final_path = video_processor.process_video(storyboard, mp4, vo_audio_map, user_settings, stop_event, log,
+                                                       language_vo_maps=language_vo_maps or None)
+        if stop_event.is_set(): raise InterruptedError("Proses dihentikan oleh pengguna.")
+        if not final_path: raise Exception("Pemrosesan video gagal.")
+        summary["outputs"] = list(final_path) if isinstance(final_path, list) else [final_path]
+        delivery_out = user_settings.get("_delivery_outputs")
+        if delivery_out:
+            summary["delivery"] = delivery_out
+        if isinstance(final_path, list):
+            log("SUKSES: Proses selesai. Video per-bahasa:" if language_vo_maps else "SUKSES: Proses selesai. Video per-segmen:")
+            for p in final_path:
+                log(f"  - {p}")
+        else:
+            log(f"SUKSES: Proses selesai. Video akhir di: {final_path}")
+        summary["status"] = STATUS_OK
+    except InterruptedError as e:
+        log(f"STOPPED: {e}")
+        summary["status"] = STATUS_STOPPED
+        summary["error"] = str(e)
+    except Exception as e:
+        log(f"FATAL ERROR: {e}")
+        log(traceback.format_exc())
+        summary["status"] = STATUS_FAILED
+        summary["error"] = str(e)
+    finally:
+        if vo_executor is not None:
+            # Batalkan TTS yang belum mulai dan tunggu yang sedang jalan: tidak ada thread job yang tertinggal
+            vo_executor.shutdown(cancel_futures=True)
+        summary["elapsed_sec"] = round(time.time() - t_start, 2)
+    return summary
+
+
+def write_summary(summary: dict, path: str):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def output_folder_conflicts(jobs: list) -> dict:
+    """{index: message} for jobs whose output folder is already used by an earlier job in the list.
+
+    storyboard_output.json, temp_audio, the work dir and YouTube downloads all live directly in the
+    output folder, so two jobs sharing one would overwrite each other's files.
+    """
+    seen, conflicts = {}, {}
+    for i, job in enumerate(jobs):
+        key = os.path.normcase(os.path.abspath(job.get("output_folder") or "."))
+        if key in seen:
+            conflicts[i] = f"output_folder sama dengan job '{seen[key]}' ({job.get('output_folder')})"
+        else:
+            seen[key] = job.get("name") or f"#{i + 1}"
+    return conflicts
+
+
+def run_batch(jobs: list, max_jobs: int = 2, budget: Budget | None = None, stop_event: threading.Event | None = None,
+              log_factory=None) -> list:
+    """Runs jobs concurrently (at most max_jobs at a time) under a shared Budget.
+
+    log_factory(job) returns the progress callback for a job (default: print with a [name] prefix).
+    Each job's summary is also written to <output_folder>/<name>_summary.json. Returns summaries in job order.
+    A job whose output folder is already used by an earlier job is not run and is reported as failed.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    budget = budget or Budget()
+    stop_event = stop_event or threading.Event()
+    am = api_manager.APIManager()
+    print_lock = threading.Lock()
+
+    def default_log(job):
+        def log(msg):
+            with print_lock:
+                print(f"[{job['name']}] {msg}", flush=True)
+        return log
+
+    conflicts = output_folder_conflicts(jobs)
+
+    def one(i, job):
+        if i in conflicts:
+            return {"name": job.get("name"), "status": STATUS_FAILED, "outputs": [], "error": conflicts[i],
+                    "stages": {}, "elapsed_sec": 0.0}
+        if stop_event.is_set():
+            return {"name": job.get("name"), "status": STATUS_STOPPED, "outputs": [], "error": "Batch dihentikan.",
+                    "stages": {}, "elapsed_sec": 0.0}
+        summary = run_job(job, stop_event, (log_factory or default_log)(job), am=am, budget=budget)
+        try:
+            if job.get("output_folder"):
+                write_summary(summary, str(Path(job["output_folder"]) / f"{job['name']}_summary.json"))
+        except OSError:
+            pass
+        return summary
+
+    with ThreadPoolExecutor(max_workers=max(1, int(max_jobs))) as ex:
+        return list(ex.map(one, range(len(jobs)), jobs))
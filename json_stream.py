@@ -0,0 +1,127 @@
+# json_stream.py
+# Parser JSON inkremental untuk respons storyboard yang di-stream.
+# Setiap objek di dalam array "segments" dikeluarkan begitu kurung penutupnya
+# diterima, sehingga pekerjaan hilir (VO, render) bisa mulai lebih awal dan
+# stream yang terpotong tetap menyisakan segmen yang sudah lengkap.
+
+import json
+import re
+
+
+class SegmentStreamParser:
+    """Scans streamed text for ``{"<array_key>": [ {...}, {...} ]}`` and yields items as they close.
+
+    Only the characters that arrive are scanned, once. Code fences or chatter around the JSON
+    are ignored because nothing outside the top-level object is tracked.
+    """
+
+    def __init__(self, array_key: str = "segments"):
+        self.array_key = array_key
+        self.items: list[dict] = []
+        self.fields: dict = {}      # nilai object/array top-level lain yang sudah lengkap (mis. film_meta)
+        self._text = []             # potongan teks mentah (digabung saat dibutuhkan)
+        self._joined = ""
+        self._pos = 0
+        self._stack = []            # frame: [kind('{'|'['), key_in_parent, expect_key, last_key, start]
+        self._in_str = False
+        self._esc = False
+        self._str_start = -1
+        self._done = False
+
+    @property
+    def text(self) -> str:
+        if self._text:
+            self._joined += "".join(self._text)
+            self._text = []
+        return self._joined
+
+    def feed(self, chunk: str) -> list[dict]:
+        """Adds streamed text and returns the items completed by it (possibly empty)."""
+        if not chunk:
+            return []
+        self._text.append(chunk)
+        if self._done:
+            return []
+        buf = self.text
+        out = []
+        stack = self._stack
+        i = self._pos
+        n = len(buf)
+        while i < n:
+            ch = buf[i]
+            if self._in_str:
+                if self._esc:
+                    self._esc = False
+                elif ch == "\\":
+                    self._esc = True
+                elif ch == '"':
+                    self._in_str = False
+                    if stack and stack[-1][0] == "{" and stack[-1][2]:
+                        try:
+                            stack[-1][3] = json.loads(buf[self._str_start:i + 1])
+                        except Exception:
+                            stack[-1][3] = None
+                        stack[-1][2] = False
+                i += 1
+                continue
+            if ch == '"':
+                if stack:
+                    self._in_str = True
+                    self._str_start = i
+            elif ch in "{[":
+                parent_key = stack[-1][3] if stack and stack[-1][0] == "{" else None
+                if stack or ch == "{":
+                    stack.append([ch, parent_key, ch == "{", None, i])
+            elif ch in "}]":
+                if stack:
+                    frame = stack.pop()
+                    depth = len(stack)
+                    if frame[0] == "{" and depth == 2 and stack[1][0] == "[" and stack[1][1] == self.array_key:
+                        item = self._load(buf[frame[4]:i + 1])
+                        if isinstance(item, dict):
+                            self.items.append(item)
+                            out.append(item)
+                    elif depth == 1 and frame[1] is not None and frame[1] != self.array_key:
+                        val = self._load(buf[frame[4]:i + 1])
+                        if val is not None:
+                            self.fields[frame[1]] = val
+                    elif depth == 0:
+                        self._done = True
+                        i += 1
+                        break
+            elif ch == "," and stack and stack[-1][0] == "{":
+                stack[-1][2] = True
+            i += 1
+        self._pos = i
+        return out
+
+    @staticmethod
+    def _load(s: str):
+        try:
+            return json.loads(s)
+        except Exception:
+            return None
+
+    @property
+    def complete(self) -> bool:
+        """True once the top-level object has been closed."""
+        return self._done
+
+    def result(self) -> dict | None:
+        """Full document when parseable, otherwise what has been completed so far."""
+        txt = self.text.strip()
+        txt = txt.removeprefix("```json").removeprefix("```").removesuffix("```").strip()
+        for cand in (txt, (re.search(r"\{[\s\S]*\}", txt) or [None])[0]):
+            if not cand:
+                continue
+            try:
+                data = json.loads(cand)
+            except Exception:
+                continue
+            if isinstance(data, dict):
+                return data
+        if not self.items and not self.fields:
+            return None
+        data = dict(self.fields)
+        data[self.array_key] = list(self.items)
+        return data
@@ -0,0 +1,176 @@
+# local_tts.py
+# Backend TTS lokal (Chatterbox) sebagai pool worker.
+# Setiap worker memuat model sekali dan tetap hangat antar segmen/job; beberapa kalimat
+# dipaketkan per panggilan generate; conditioning pembicara dari voice_prompt_path
+# di-cache (di memori worker dan di disk) sehingga tidak dihitung ulang per chunk.
+
+import hashlib
+import importlib.util
+import os
+import re
+import threading
+from pathlib import Path
+
+# Chatterbox paling stabil untuk teks pendek; kalimat dipaketkan sampai batas ini
+SENTENCE_PACK_CHARS = 280
+DEFAULT_EXAGGERATION = 0.5
+DEFAULT_CFG_WEIGHT = 0.5
+CONDS_CACHE_DIR = Path.home() / ".restorymaker_tts_conds"
+
+
+def is_available() -> bool:
+    """True when chatterbox-tts (and torch) can be imported."""
+    return importlib.util.find_spec("chatterbox") is not None and importlib.util.find_spec("torch") is not None
+
+
+def pack_sentences(text: str, max_chars: int = SENTENCE_PACK_CHARS) -> list[str]:
+    """Groups whole sentences into pieces of at most ~max_chars (one generate call each)."""
+    sentences = [s.strip() for s in re.split(r"(?<=[.!?…])\s+", (text or "").strip()) if s.strip()]
+    packs, buf = [], ""
+    for s in sentences:
+        while len(s) > max_chars:
+            # Kalimat sangat panjang: potong di koma/spasi terdekat
+            cut = max(s.rfind(",", 0, max_chars), s.rfind(" ", 0, max_chars))
+            cut = cut if cut > max_chars // 3 else max_chars
+            if buf:
+                packs.append(buf); buf = ""
+            packs.append(s[:cut + 1].strip()); s = s[cut + 1:].strip()
+        if buf and len(buf) + 1 + len(s) > max_chars:
+            packs.append(buf); buf = s
+        else:
+            buf = f"{buf} {s}".strip()
+    if buf:
+        packs.append(buf)
+    return packs
+
+
+# ---- sisi worker (berjalan di proses worker) ----
+_models = {}
+_conds = {}
+
+
+def _worker_init(device: str, threads: int):
+    try:
+        import torch
+        if threads:
+            torch.set_num_threads(max(1, int(threads)))
+    except Exception:
+        pass
+
+
+def _get_model(device: str, multilingual: bool):
+    key = (device, multilingual)
+    model = _models.get(key)
+    if model is None:
+        if multilingual:
+            from chatterbox.mtl_tts import ChatterboxMultilingualTTS
+            model = ChatterboxMultilingualTTS.from_pretrained(device=device)
+        else:
+            from chatterbox.tts import ChatterboxTTS
+            model = ChatterboxTTS.from_pretrained(device=device)
+        _models[key] = model
+    return model
+
+
+def _conds_file(voice_prompt_path: str, exaggeration: float, multilingual: bool) -> Path:
+    st = os.stat(voice_prompt_path)
+    ident = f"{os.path.abspath(voice_prompt_path)}|{st.st_size}|{int(st.st_mtime)}|{exaggeration}|{int(multilingual)}"
+    return CONDS_CACHE_DIR / (hashlib.sha256(ident.encode("utf-8")).hexdigest()[:24] + ".pt")
+
+
+def _apply_conds(model, device: str, voice_prompt_path: str, exaggeration: float, multilingual: bool):
+    """Sets model.conds for the voice prompt, computing it at most once per voice (per disk cache)."""
+    if not voice_prompt_path:
+        return
+    fpath = _conds_file(voice_prompt_path, exaggeration, multilingual)
+    key = (device, multilingual, str(fpath))
+    conds = _conds.get(key)
+    if conds is None:
+        cls = type(model.conds) if getattr(model, "conds", None) is not None else None
+        if cls is not None and fpath.exists():
+            try:
+                conds = cls.load(fpath, map_location=device)
+            except Exception:
+                conds = None
+        if conds is None:
+            model.prepare_conditionals(voice_prompt_path, exaggeration=exaggeration)
+            conds = model.conds
+            try:
+                CONDS_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+                conds.save(fpath)
+            except Exception:
+                pass
+        _conds[key] = conds
+    model.conds = conds
+
+
+def _synthesize(text: str, device: str, voice_prompt_path: str, language: str,
+                exaggeration: float, cfg_weight: float):
+    """Worker task: one packed text -> (sample_rate, float32 mono numpy array)."""
+    import numpy as np
+    lang = (language or "en").split("-")[0].lower()
+    multilingual = lang != "en"
+    model = _get_model(device, multilingual)
+    _apply_conds(model, device, voice_prompt_path, exaggeration, multilingual)
+    kwargs = {"exaggeration": exaggeration, "cfg_weight": cfg_weight}
+    if multilingual:
+        kwargs["language_id"] = lang
+    wav = model.generate(text, **kwargs)
+    pcm = wav.squeeze(0).detach().cpu().numpy().astype(np.float32)
+    return int(model.sr), pcm
+
+
+# ---- sisi pemanggil ----
+class LocalTTSPool:
+    """Process pool of warm Chatterbox workers. Thread-safe; shared per device."""
+
+    def __init__(self, device: str = "cpu", workers: int | None = None):
+        import multiprocessing as mp
+        from concurrent.futures import ProcessPoolExecutor
+        self.device = device or "cpu"
+        if workers is None:
+            # CUDA: satu worker per GPU; CPU: sedikit worker, masing-masing dengan beberapa thread torch
+            workers = 1 if self.device != "cpu" else max(1, min(2, (os.cpu_count() or 2) // 4))
+        self.workers = int(workers)
+        threads = max(1, (os.cpu_count() or 1) // self.workers) if self.device == "cpu" else 0
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=mp.get_context("spawn"),
+            initializer=_worker_init,
+            initargs=(self.device, threads),
+        )
+
+    def synthesize(self, text: str, voice_prompt_path: str = "", language: str = "en",
+                   exaggeration: float = DEFAULT_EXAGGERATION, cfg_weight: float = DEFAULT_CFG_WEIGHT,
+                   progress_callback=None):
+        """Synthesizes text (packed by sentence) and returns (sample_rate, [pcm pieces in order])."""
+        packs = pack_sentences(text)
+        futures = [
+            self._executor.submit(_synthesize, p, self.device, voice_prompt_path or "", language, exaggeration, cfg_weight)
+            for p in packs
+        ]
+        sr, pieces = 24000, []
+        for i, fut in enumerate(futures, 1):
+            sr, pcm = fut.result()
+            pieces.append(pcm)
+            if progress_callback:
+                progress_callback(f"[Local TTS] paket {i}/{len(packs)} selesai ({len(pcm) / float(sr):.1f}s)")
+        return sr, pieces
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_pools: dict[str, LocalTTSPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(device: str = "cpu") -> LocalTTSPool:
+    """Process-wide warm pool per device."""
+    device = device or "cpu"
+    with _pools_lock:
+        pool = _pools.get(device)
+        if pool is None:
+            pool = LocalTTSPool(device)
+            _pools[device] = pool
+        return pool
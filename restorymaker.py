@@ -0,0 +1,168 @@
+# restorymaker.py
+# Entry point headless (tanpa GUI) untuk produksi recap tanpa pengawasan.
+#
+#   python -m restorymaker run job.json
+#   python -m restorymaker batch jobs/*.json --jobs 3 --cpu 2 --api 4
+#
+# Job JSON memakai kunci job_runner.JOB_DEFAULTS. Setiap job menulis log ke
+# <output_folder>/<name>.log dan ringkasan ke <output_folder>/<name>_summary.json.
+# Exit code: 0 semua sukses, 1 ada job gagal, 2 argumen/job tidak valid, 130 dihentikan.
+
+import argparse
+import glob
+import os
+import sys
+import threading
+from pathlib import Path
+
+import job_runner
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_STOPPED = 130
+
+_print_lock = threading.Lock()
+
+
+def _job_logger(job: dict, quiet: bool = False):
+    """Progress callback: prints with a [name] prefix and appends to the job's log file."""
+    log_path = None
+    if job.get("output_folder"):
+        try:
+            Path(job["output_folder"]).mkdir(parents=True, exist_ok=True)
+            log_path = Path(job["output_folder"]) / f"{job['name']}.log"
+        except OSError:
+            log_path = None
+    file_lock = threading.Lock()
+
+    def log(msg):
+        msg = str(msg)
+        if not quiet:
+            with _print_lock:
+                print(f"[{job['name']}] {msg}", flush=True)
+        if log_path is not None:
+            try:
+                with file_lock, open(log_path, "a", encoding="utf-8") as f:
+                    f.write(msg + "\n")
+            except OSError:
+                pass
+    return log
+
+
+def _expand(patterns) -> list:
+    # Glob diekspansi di sini juga (shell Windows tidak melakukannya)
+    paths = []
+    for pat in patterns:
+        hits = sorted(glob.glob(pat)) if glob.has_magic(pat) else [pat]
+        for p in hits:
+            if p not in paths:
+                paths.append(p)
+    return paths
+
+
+def _load_jobs(paths) -> tuple[list, list]:
+    jobs, errors = [], []
+    for p in paths:
+        try:
+            jobs.append(job_runner.load_job(p))
+        except (OSError, ValueError) as e:
+            errors.append(f"{p}: {e}")
+    # Dua job dengan folder output sama akan saling menimpa file (run_batch juga menolaknya)
+    for i, msg in job_runner.output_folder_conflicts(jobs).items():
+        errors.append(f"{jobs[i]['name']}: {msg}")
+    names = [j["name"] for j in jobs]
+    for n in sorted({n for n in names if names.count(n) > 1}):
+        errors.append(f"Nama job duplikat: {n}")
+    return jobs, errors
+
+
+def _exit_code(summaries) -> int:
+    statuses = [s.get("status") for s in summaries]
+    if any(st == job_runner.STATUS_STOPPED for st in statuses):
+        return EXIT_STOPPED
+    if any(st != job_runner.STATUS_OK for st in statuses):
+        return EXIT_FAILED
+    return EXIT_OK
+
+
+def _print_table(summaries):
+    with _print_lock:
+        print("\n=== Ringkasan batch ===")
+        for s in summaries:
+            outs = ", ".join(s.get("outputs") or []) or "-"
+            line = f"{s.get('status', '?'):8} {s.get('name')}  ({s.get('elapsed_sec', 0):.0f}s)  {outs}"
+            if s.get("error"):
+                line += f"\n         error: {s['error']}"
+            print(line)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="restorymaker", description="RestoryMaker headless runner")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_run = sub.add_parser("run", help="jalankan satu job JSON")
+    p_run.add_argument("job")
+    p_run.add_argument("--quiet", action="store_true", help="hanya tulis log ke file job")
+
+    p_batch = sub.add_parser("batch", help="jalankan beberapa job JSON bersamaan")
+    p_batch.add_argument("jobs", nargs="+", help="file atau pola glob (mis. jobs/*.json)")
+    p_batch.add_argument("--jobs", "-j", dest="max_jobs", type=int, default=2, help="jumlah film diproses bersamaan")
+    p_batch.add_argument("--cpu", type=int, default=max(1, (os.cpu_count() or 4) // 4),
+                         help="jumlah render bersamaan (satu slot = satu render utuh: analisis shot + encode ffmpeg)")
+    p_batch.add_argument("--api", type=int, default=None,
+                         help="jumlah tahap API (transkrip/storyboard/TTS) bersamaan (default: tanpa batas tambahan)")
+    p_batch.add_argument("--summary", default="", help="tulis ringkasan batch (JSON) ke path ini")
+    p_batch.add_argument("--quiet", action="store_true", help="hanya tulis log ke file job")
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        paths = [args.job]
+        max_jobs, budget = 1, job_runner.Budget()
+    else:
+        paths = _expand(args.jobs)
+        if not paths:
+            print("Tidak ada file job yang cocok.", file=sys.stderr)
+            return EXIT_USAGE
+        max_jobs, budget = args.max_jobs, job_runner.Budget(args.cpu, args.api)
+
+    jobs, errors = _load_jobs(paths)
+    api_key = job_runner.api_manager.APIManager().get_key()
+    for job in jobs:
+        err = job_runner.validate_job(job, api_key)
+        if err:
+            errors.append(f"{job['name']}: {err}")
+    if errors:
+        for e in errors:
+            print(f"ERROR: {e}", file=sys.stderr)
+        return EXIT_USAGE
+
+    stop_event = threading.Event()
+    result = {}
+    worker = threading.Thread(
+        target=lambda: result.setdefault("summaries", job_runner.run_batch(
+            jobs, max_jobs, budget, stop_event, log_factory=lambda job: _job_logger(job, args.quiet))),
+        daemon=True)
+    worker.start()
+    try:
+        # join dengan timeout agar Ctrl+C tetap diterima di thread utama
+        while worker.is_alive():
+            worker.join(0.5)
+    except KeyboardInterrupt:
+        print("\nDihentikan: menunggu job berhenti dengan rapi (Ctrl+C lagi untuk keluar paksa)...", file=sys.stderr)
+        stop_event.set()
+        try:
+            while worker.is_alive():
+                worker.join(0.5)
+        except KeyboardInterrupt:
+            return EXIT_STOPPED
+    summaries = result.get("summaries") or []
+    if args.command == "batch":
+        _print_table(summaries)
+        if args.summary:
+            job_runner.write_summary({"jobs": summaries, "exit_code": _exit_code(summaries)}, args.summary)
+    return _exit_code(summaries) if summaries else EXIT_STOPPED
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,221 @@
+# shot_index.py
+# Indeks batas shot (cut) film sumber, dihitung sekali lalu di-cache.
+# Film di-decode sangat kecil (64x36 gray, 10 fps) lewat pipe ffmpeg dalam beberapa
+# chunk paralel; batas shot dicari dengan frame differencing numpy. Hasilnya array
+# int64 (ms) terurut yang disimpan di home dengan kunci hash konten film, sehingga
+# perencanaan klip bisa "snap" ke batas shot dengan searchsorted di setiap run.
+
+import hashlib
+import os
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+ANALYSIS_FPS = 10
+ANALYSIS_SIZE = (64, 36)
+CHUNK_SEC = 300.0
+MIN_SHOT_SEC = 0.4
+DIFF_THRESHOLD = 0.12       # beda rata-rata piksel minimum (0..1) untuk dianggap cut
+DIFF_CONTRAST = 3.0         # dan harus >= kelipatan ini dari median beda di sekitarnya
+SNAP_TOLERANCE_SEC = 0.6
+_HASH_SAMPLES = 16
+_HASH_BLOCK = 1 << 16
+_CACHE_DIR = Path.home() / ".restorymaker_shots"
+_INDEX_VERSION = 1
+
+
+def content_hash(path: str) -> str:
+    """Sampled content hash: file size + 16 blocks of 64 KiB spread over the file."""
+    size = os.path.getsize(path)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{_INDEX_VERSION}:{size}".encode())
+    with open(path, "rb") as f:
+        for i in range(_HASH_SAMPLES):
+            f.seek(max(0, (size - _HASH_BLOCK) * i // max(1, _HASH_SAMPLES - 1)))
+            h.update(f.read(_HASH_BLOCK))
+    return h.hexdigest()
+
+
+class ShotIndex:
+    """Sorted shot boundary times (ms) with O(log n) snapping."""
+
+    def __init__(self, boundaries_ms, duration_sec: float = 0.0):
+        self.boundaries_ms = np.unique(np.asarray(boundaries_ms, dtype=np.int64))
+        self.duration = float(duration_sec or 0.0)
+
+    def __len__(self) -> int:
+        return len(self.boundaries_ms)
+
+    def nearest(self, t_sec: float, lo_sec: float = 0.0, hi_sec: float | None = None) -> float | None:
+        """Boundary closest to t_sec within [lo_sec, hi_sec], or None."""
+        b = self.boundaries_ms
+        hi_sec = self.duration if hi_sec is None else hi_sec
+        i = int(np.searchsorted(b, int(round(t_sec * 1000))))
+        best = None
+        for j in (i - 1, i):
+            if 0 <= j < len(b):
+                s = b[j] / 1000.0
+                if lo_sec <= s <= hi_sec and (best is None or abs(s - t_sec) < abs(best - t_sec)):
+                    best = s
+        return best
+
+    def snap(self, t_sec: float, tolerance_sec: float = SNAP_TOLERANCE_SEC, lo_sec: float = 0.0,
+             hi_sec: float | None = None) -> float:
+        """t_sec moved onto the nearest boundary when one lies within tolerance (and [lo, hi])."""
+        s = self.nearest(t_sec, lo_sec, hi_sec)
+        return s if s is not None and abs(s - t_sec) <= tolerance_sec else t_sec
+
+    def snap_cut(self, start_sec: float, dur_sec: float, lo_sec: float = 0.0, hi_sec: float | None = None,
+                 min_dur_sec: float = 0.5, tolerance_sec: float = SNAP_TOLERANCE_SEC) -> tuple[float, float]:
+        """(start, dur) of a cut with both ends snapped to shot boundaries inside [lo, hi] where possible."""
+        hi_sec = self.duration if hi_sec is None else hi_sec
+        if not len(self):
+            return start_sec, dur_sec
+        start = self.snap(start_sec, tolerance_sec, lo_sec, hi_sec)
+        end = self.snap(start_sec + dur_sec, tolerance_sec, start + min_dur_sec, hi_sec)
+        if end - start < min_dur_sec:
+            return start_sec, dur_sec
+        return start, end - start
+
+    def boundaries_between(self, start_sec: float, end_sec: float) -> np.ndarray:
+        b = self.boundaries_ms
+        lo = np.searchsorted(b, int(round(start_sec * 1000)), side="left")
+        hi = np.searchsorted(b, int(round(end_sec * 1000)), side="right")
+        return b[lo:hi] / 1000.0
+
+    # ---- cache ----
+    def save(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, np.concatenate([[int(self.duration * 1000)], self.boundaries_ms]).astype("<i8"))
+        os.replace(tmp, path)
+
+    @classmethod
+    def read(cls, path: Path) -> "ShotIndex":
+        arr = np.load(path, allow_pickle=False)
+        return cls(arr[1:], float(arr[0]) / 1000.0)
+
+
+def _decode_gray(path: str, start: float, length: float) -> np.ndarray:
+    w, h = ANALYSIS_SIZE
+    cmd = ["ffmpeg", "-v", "error", "-nostdin", "-ss", f"{start:.3f}", "-t", f"{length:.3f}", "-i", str(path),
+           "-an", "-sn", "-vf", f"fps={ANALYSIS_FPS},scale={w}:{h}:flags=area,format=gray",
+           "-f", "rawvideo", "pipe:1"]
+    out = subprocess.run(cmd, capture_output=True, check=True).stdout
+    n = len(out) // (w * h)
+    return np.frombuffer(out[:n * w * h], dtype=np.uint8).reshape(n, h, w)
+
+
+def detect_boundaries(frames: np.ndarray, fps: float = ANALYSIS_FPS) -> np.ndarray:
+    """Frame indices that start a new shot (frame differencing with a local-median contrast test)."""
+    if len(frames) < 2:
+        return np.zeros(0, dtype=np.int64)
+    f = frames.astype(np.float32) / 255.0
+    # Beda piksel + beda histogram (tahan gerakan kamera yang menggeser piksel)
+    pix = np.abs(f[1:] - f[:-1]).mean(axis=(1, 2))
+    hist = np.stack([np.histogram(x, bins=16, range=(0.0, 1.0))[0] for x in f]).astype(np.float32)
+    hist /= max(1.0, float(f.shape[1] * f.shape[2]))
+    hd = 0.5 * np.abs(hist[1:] - hist[:-1]).sum(axis=1)
+    d = 0.5 * pix + 0.5 * hd
+    win = max(3, int(fps))
+    pad = np.pad(d, win, mode="edge")
+    local = np.median(np.lib.stride_tricks.sliding_window_view(pad, 2 * win + 1), axis=1)
+    peak = (d >= np.roll(d, 1)) & (d >= np.roll(d, -1))
+    cand = np.nonzero((d > DIFF_THRESHOLD) & (d >= DIFF_CONTRAST * (local + 1e-3)) & peak)[0] + 1
+    # Buang cut yang terlalu rapat (flash/strobe): pertahankan yang terkuat
+    keep = []
+    min_gap = max(1, int(MIN_SHOT_SEC * fps))
+    for i in cand:
+        if keep and i - keep[-1] < min_gap:
+            if d[i - 1] > d[keep[-1] - 1]:
+                keep[-1] = i
+            continue
+        keep.append(i)
+    return np.asarray(keep, dtype=np.int64)
+
+
+def analyze(path: str, duration_sec: float, progress_callback=None, chunk_sec: float = CHUNK_SEC,
+            workers: int | None = None) -> ShotIndex:
+    """Decodes the film in parallel chunks and returns its ShotIndex."""
+    duration_sec = float(duration_sec or 0.0)
+    if duration_sec <= 0:
+        return ShotIndex([], 0.0)
+    step = 1.0 / ANALYSIS_FPS
+    starts = list(np.arange(0.0, duration_sec, chunk_sec))
+    workers = workers or max(1, min(len(starts), (os.cpu_count() or 2) // 2))
+    done = [0]
+    lock = threading.Lock()
+
+    def run(start):
+        # Mulai satu frame lebih awal agar cut tepat di batas chunk tetap terdeteksi
+        seek = max(0.0, start - step)
+        frames = _decode_gray(path, seek, min(chunk_sec, duration_sec - start) + (start - seek))
+        idx = detect_boundaries(frames)
+        times = seek + idx * step
+        with lock:
+            done[0] += 1
+            if progress_callback:
+                try:
+                    progress_callback(f"[Shots] Analisis chunk {done[0]}/{len(starts)} selesai")
+                except Exception:
+                    pass
+        return times[(times >= start) & (times < start + chunk_sec)]
+
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        parts = list(ex.map(run, starts))
+    times = np.concatenate(parts) if parts else np.zeros(0)
+    return ShotIndex(np.round(times * 1000).astype(np.int64), duration_sec)
+
+
+_memo: dict = {}
+_memo_lock = threading.Lock()
+
+
+def load_or_build(path: str, duration_sec: float, progress_callback=None, workers: int | None = None) -> ShotIndex | None:
+    """ShotIndex for a film from memory, the cache in ~/.restorymaker_shots, or a fresh analysis.
+    workers caps the decode threads of a fresh analysis (default: half the cores).
+    Returns None when the film cannot be analysed (e.g. ffmpeg missing)."""
+    try:
+        key = content_hash(path)
+    except OSError:
+        return None
+    with _memo_lock:
+        if key in _memo:
+            return _memo[key]
+    cpath = _CACHE_DIR / f"{key}.npy"
+    index = None
+    try:
+        index = ShotIndex.read(cpath)
+    except (OSError, ValueError):
+        index = None
+    if index is None:
+        if progress_callback:
+            try:
+                progress_callback("[Shots] Indeks batas shot belum ada; menganalisis film (sekali saja)...")
+            except Exception:
+                pass
+        try:
+            index = analyze(path, duration_sec, progress_callback, workers=workers)
+        except Exception as e:
+            if progress_callback:
+                try:
+                    progress_callback(f"[Shots] Analisis batas shot gagal: {e}")
+                except Exception:
+                    pass
+            return None
+        try:
+            index.save(cpath)
+        except OSError:
+            pass
+    if progress_callback:
+        try:
+            progress_callback(f"[Shots] {len(index)} batas shot tersedia untuk snapping")
+        except Exception:
+            pass
+    with _memo_lock:
+        _memo[key] = index
+    return index
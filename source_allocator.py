@@ -0,0 +1,160 @@
+# source_allocator.py
+# Pencatat rentang video sumber yang sudah dipakai, supaya filler tidak mengulang
+# menit-menit awal film. Timeline film dikuantisasi (default 100 ms) dan disimpan
+# dalam segment tree (interval) dengan info run kosong (prefix/suffix/terpanjang),
+# sehingga "rentang kosong >= d detik terdekat setelah t" dijawab dalam O(log n).
+
+import copy
+import math
+import threading
+
+QUANTUM_SEC = 0.1
+
+
+class SourceAllocator:
+    """Tracks used source ranges on a quantized timeline. Thread-safe."""
+
+    def __init__(self, duration_sec: float, quantum_sec: float = QUANTUM_SEC):
+        self.q = float(quantum_sec)
+        self.duration = max(0.0, float(duration_sec or 0.0))
+        self.n = max(1, int(math.ceil(self.duration / self.q - 1e-9)))
+        size = 4 * self.n
+        # per node: run kosong terpanjang, run kosong di awal, run kosong di akhir, lazy (None/0 bebas/1 dipakai)
+        self._best = [0] * size
+        self._pref = [0] * size
+        self._suf = [0] * size
+        self._lazy = [None] * size
+        self._lock = threading.RLock()
+        self._build(1, 0, self.n)
+
+    # ---- segment tree ----
+    def _build(self, node, l, r):
+        ln = r - l
+        self._best[node] = self._pref[node] = self._suf[node] = ln
+        if ln > 1:
+            m = (l + r) // 2
+            self._build(2 * node, l, m)
+            self._build(2 * node + 1, m, r)
+
+    def _apply(self, node, l, r, used):
+        v = 0 if used else r - l
+        self._best[node] = self._pref[node] = self._suf[node] = v
+        self._lazy[node] = 1 if used else 0
+
+    def _push(self, node, l, r):
+        lz = self._lazy[node]
+        if lz is not None and r - l > 1:
+            m = (l + r) // 2
+            self._apply(2 * node, l, m, lz == 1)
+            self._apply(2 * node + 1, m, r, lz == 1)
+        self._lazy[node] = None
+
+    def _pull(self, node, l, r):
+        m = (l + r) // 2
+        a, b = 2 * node, 2 * node + 1
+        lw, rw = m - l, r - m
+        self._pref[node] = self._pref[a] + (self._pref[b] if self._pref[a] == lw else 0)
+        self._suf[node] = self._suf[b] + (self._suf[a] if self._suf[b] == rw else 0)
+        self._best[node] = max(self._best[a], self._best[b], self._suf[a] + self._pref[b])
+
+    def _assign(self, node, l, r, a, b, used):
+        if b <= l or r <= a:
+            return
+        if a <= l and r <= b:
+            self._apply(node, l, r, used)
+            return
+        self._push(node, l, r)
+        m = (l + r) // 2
+        self._assign(2 * node, l, m, a, b, used)
+        self._assign(2 * node + 1, m, r, a, b, used)
+        self._pull(node, l, r)
+
+    def _find(self, node, l, r, lo, k, carry):
+        """Leftmost free window of k units starting at >= lo. Returns (start|None, carry)."""
+        if r <= lo:
+            return None, 0
+        if lo <= l:
+            if carry + self._pref[node] >= k:
+                return l - carry, carry
+            if self._best[node] < k:
+                full = self._pref[node] == r - l
+                return None, (carry + (r - l)) if full else self._suf[node]
+        if r - l == 1:
+            return None, 0
+        self._push(node, l, r)
+        m = (l + r) // 2
+        pos, carry = self._find(2 * node, l, m, lo, k, carry)
+        if pos is not None:
+            return pos, carry
+        return self._find(2 * node + 1, m, r, lo, k, carry)
+
+    # ---- API ----
+    def _units(self, sec: float) -> int:
+        return min(self.n, max(0, int(round(float(sec) / self.q))))
+
+    def mark_used(self, start_sec: float, end_sec: float):
+        a, b = self._units(start_sec), self._units(end_sec)
+        if b > a:
+            with self._lock:
+                self._assign(1, 0, self.n, a, b, True)
+
+    def mark_free(self, start_sec: float, end_sec: float):
+        a, b = self._units(start_sec), self._units(end_sec)
+        if b > a:
+            with self._lock:
+                self._assign(1, 0, self.n, a, b, False)
+
+    def find_free(self, dur_sec: float, near_sec: float = 0.0, wrap: bool = True) -> float | None:
+        """Start (sec) of the first unused range of >= dur_sec at/after near_sec (wrapping to 0)."""
+        k = max(1, int(math.ceil(float(dur_sec) / self.q - 1e-9)))
+        lo = self._units(near_sec)
+        with self._lock:
+            if self._best[1] < k:
+                return None
+            pos, _ = self._find(1, 0, self.n, lo, k, 0)
+            if pos is None and wrap and lo > 0:
+                pos, _ = self._find(1, 0, self.n, 0, k, 0)
+        return None if pos is None else pos * self.q
+
+    def allocate(self, dur_sec: float, near_sec: float = 0.0, min_sec: float | None = None):
+        """Reserves dur_sec (or, failing that, the largest fit down to min_sec) near near_sec.
+        Returns (start_sec, dur_sec) or None when nothing of at least min_sec is left."""
+        want = float(dur_sec)
+        floor = float(min_sec) if min_sec else want
+        with self._lock:
+            while want >= floor - 1e-9:
+                start = self.find_free(want, near_sec)
+                if start is not None:
+                    dur = min(want, max(0.0, self.duration - start))
+                    # Tandai kuantum utuh yang ditemukan find_free (mark_used membulatkan ujungnya)
+                    a = self._units(start)
+                    k = max(1, int(math.ceil(want / self.q - 1e-9)))
+                    self._assign(1, 0, self.n, a, min(self.n, a + k), True)
+                    return start, dur
+                if want <= floor:
+                    break
+                want = max(floor, want / 2.0)
+        return None
+
+    @property
+    def longest_free_sec(self) -> float:
+        return self._best[1] * self.q
+
+    def reset(self):
+        with self._lock:
+            self._apply(1, 0, self.n, False)
+
+    def restricted_to(self, ranges) -> "SourceAllocator":
+        """Copy whose free space is limited to ranges [(start_sec, end_sec)] (current usage kept)."""
+        with self._lock:
+            other = copy.copy(self)
+            other._best, other._pref, other._suf = list(self._best), list(self._pref), list(self._suf)
+            other._lazy = list(self._lazy)
+        other._lock = threading.RLock()
+        cursor = 0.0
+        for s, e in sorted((float(s), float(e)) for s, e in ranges if e > s):
+            if s > cursor:
+                other.mark_used(cursor, s)
+            cursor = max(cursor, e)
+        other.mark_used(cursor, other.duration if other.duration > 0 else other.n * other.q)
+        return other
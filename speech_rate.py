@@ -0,0 +1,163 @@
+# speech_rate.py
+# Model kecepatan bicara yang mengkalibrasi diri per voice/bahasa.
+# Setiap chunk TTS yang selesai dicatat (kata, kalimat, koma, durasi nyata) ke file
+# JSON di home; dari catatan itu di-fit model linear (least squares) sehingga
+# words_target dan ukuran chunk TTS mengikuti durasi nyata, bukan WPM tetap.
+
+import json
+import re
+import threading
+import time
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+
+# Rumus prompt storyboard (dipakai sampai cukup data): kata/(wpm/60) + kalimat*0.30 + koma*0.12
+DEFAULT_WPM = 195
+DEFAULT_SEC_PER_SENTENCE = 0.30
+DEFAULT_SEC_PER_COMMA = 0.12
+MIN_SAMPLES = 4             # minimal chunk tercatat sebelum model dianggap terkalibrasi
+MAX_RECORDS_PER_VOICE = 400
+MIN_CHUNK_SEC = 1.0         # chunk sangat pendek terlalu bising untuk fit
+
+
+def text_counts(text: str) -> tuple[int, int, int]:
+    """(words, sentences, commas) counted the same way as vo_meta."""
+    text = text or ""
+    words = len(text.split())
+    sentences = len(re.findall(r"[.!?…]+(?:\s|$)", text)) or (1 if words else 0)
+    return words, sentences, text.count(",")
+
+
+def voice_key(backend: str, voice: str = "", language: str = "") -> str:
+    """Stable id for a voice: backend + voice (name or prompt file) + base language."""
+    lang = (language or "").split("-")[0].lower() or "xx"
+    return f"{(backend or 'gemini').lower()}:{Path(voice).name if voice else 'default'}:{lang}"
+
+
+class RateModel(NamedTuple):
+    sec_per_word: float
+    sec_per_sentence: float
+    sec_per_comma: float
+    intercept: float
+    sentences_per_word: float
+    commas_per_word: float
+    samples: int
+
+    @property
+    def calibrated(self) -> bool:
+        return self.samples >= MIN_SAMPLES
+
+    @property
+    def effective_wpm(self) -> float:
+        """Words per minute including sentence/comma pauses at the voice's typical punctuation density."""
+        per_word = self.sec_per_word + self.sec_per_sentence * self.sentences_per_word + self.sec_per_comma * self.commas_per_word
+        return 60.0 / max(1e-3, per_word)
+
+    def predict(self, words: int, sentences: int = 0, commas: int = 0) -> float:
+        return max(0.0, self.intercept + self.sec_per_word * words
+                   + self.sec_per_sentence * sentences + self.sec_per_comma * commas)
+
+    def predict_text(self, text: str) -> float:
+        return self.predict(*text_counts(text))
+
+    def words_for(self, target_sec: float) -> int:
+        """Word count expected to land on target_sec at typical punctuation density."""
+        return max(1, int(round(max(0.0, float(target_sec) - self.intercept) * self.effective_wpm / 60.0)))
+
+
+def default_model(wpm: float = DEFAULT_WPM) -> RateModel:
+    return RateModel(60.0 / max(1.0, float(wpm)), DEFAULT_SEC_PER_SENTENCE, DEFAULT_SEC_PER_COMMA, 0.0, 1 / 15.0, 1 / 20.0, 0)
+
+
+def fit_model(records: list, wpm: float = DEFAULT_WPM) -> RateModel:
+    """Least-squares fit of duration = a*words + b*sentences + c*commas + d.
+
+    Falls back to scaling the default formula by one factor when the full fit gives
+    non-physical (negative) coefficients, e.g. when punctuation barely varies.
+    """
+    base = default_model(wpm)
+    rows = [r for r in records if r.get("words", 0) > 0 and r.get("duration", 0) >= MIN_CHUNK_SEC]
+    if len(rows) < MIN_SAMPLES:
+        return base._replace(samples=len(rows))
+    X = np.array([[r["words"], r["sentences"], r["commas"], 1.0] for r in rows], dtype=np.float64)
+    y = np.array([r["duration"] for r in rows], dtype=np.float64)
+    spw = float(X[:, 1].sum() / X[:, 0].sum())
+    cpw = float(X[:, 2].sum() / X[:, 0].sum())
+    coef = None
+    if len(rows) >= 8:
+        try:
+            coef, *_ = np.linalg.lstsq(X, y, rcond=None)
+        except np.linalg.LinAlgError:
+            coef = None
+        if coef is not None and (coef[0] <= 0 or coef[1] < 0 or coef[2] < 0 or abs(coef[3]) > 5.0):
+            coef = None
+    if coef is None:
+        # Satu faktor skala untuk rumus default (lebih stabil dengan sedikit data)
+        pred = X[:, :3] @ np.array([base.sec_per_word, base.sec_per_sentence, base.sec_per_comma])
+        k = float(pred @ y / max(1e-9, pred @ pred))
+        coef = [base.sec_per_word * k, base.sec_per_sentence * k, base.sec_per_comma * k, 0.0]
+    return RateModel(float(coef[0]), float(coef[1]), float(coef[2]), float(coef[3]), spw, cpw, len(rows))
+
+
+class SpeechRateStore:
+    def __init__(self, filename: str = ".restorymaker_speech_rate.json"):
+        self.filepath = Path.home() / filename
+        self._lock = threading.Lock()
+        self.records = {}   # voice_key -> [{words, sentences, commas, duration, t}]
+        self._models = {}   # voice_key -> RateModel (dibuang saat ada catatan baru)
+        self.load()
+
+    def load(self):
+        with self._lock:
+            try:
+                with open(self.filepath, 'r', encoding='utf-8') as f:
+                    self.records = json.load(f) or {}
+            except (OSError, json.JSONDecodeError):
+                self.records = {}
+            self._models = {}
+
+    def _save_locked(self):
+        try:
+            with open(self.filepath, 'w', encoding='utf-8') as f:
+                json.dump(self.records, f)
+        except OSError:
+            pass
+
+    def record(self, key: str, text: str, duration_sec: float):
+        """Stores one synthesized chunk (text + measured audio duration)."""
+        words, sentences, commas = text_counts(text)
+        if not words or not duration_sec or duration_sec < MIN_CHUNK_SEC:
+            return
+        with self._lock:
+            rows = self.records.setdefault(key, [])
+            rows.append({"words": words, "sentences": sentences, "commas": commas,
+                         "duration": round(float(duration_sec), 3), "t": int(time.time())})
+            del rows[:-MAX_RECORDS_PER_VOICE]
+            self._models.pop(key, None)
+            self._save_locked()
+
+    def model(self, key: str | None, wpm: float = DEFAULT_WPM) -> RateModel:
+        """Fitted model for a voice, or the default formula (samples < MIN_SAMPLES) when uncalibrated."""
+        if not key:
+            return default_model(wpm)
+        with self._lock:
+            m = self._models.get(key)
+            if m is None:
+                m = fit_model(self.records.get(key) or [], wpm)
+                self._models[key] = m
+            return m if m.calibrated else default_model(wpm)._replace(samples=m.samples)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> SpeechRateStore:
+    """Process-wide store shared by TTS and storyboard code."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SpeechRateStore()
+        return _store
@@ -0,0 +1,291 @@
+# storyboard_schema.py
+# Skema storyboard/segmen yang dideklarasikan sekali: dikirim ke Gemini sebagai
+# response_schema (structured output) dan dipakai validator lokal untuk melaporkan
+# field yang salah secara tepat (dan memperbaikinya bila aman) tanpa generate ulang.
+
+import copy
+from typing import NamedTuple
+
+SEGMENT_LABELS = ["Intro", "Rising", "Mid-conflict", "Climax", "Ending"]
+
+BEAT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "at_ms": {"type": "integer", "description": "posisi ms di timeline segmen"},
+        "src_at_ms": {"type": "integer", "description": "posisi ms di video sumber"},
+        "src_length_ms": {"type": "integer", "description": "durasi klip ms (600-4000)"},
+        "note": {"type": "string"},
+    },
+    "required": ["at_ms", "src_at_ms", "src_length_ms"],
+}
+
+VO_META_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "speech_rate_wpm": {"type": "integer"},
+        "fill_ratio": {"type": "number"},
+        "words_target": {"type": "integer"},
+        "words_actual": {"type": "integer"},
+        "sentences": {"type": "integer"},
+        "commas": {"type": "integer"},
+        "predicted_duration_sec": {"type": "number"},
+        "delta_sec": {"type": "number"},
+        "fit": {"type": "string", "enum": ["OK", "REWRITE"]},
+    },
+    "required": ["speech_rate_wpm", "fit"],
+}
+
+TIMEBLOCK_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "start": {"type": "string", "description": "HH:MM:SS.mmm"},
+        "end": {"type": "string", "description": "HH:MM:SS.mmm"},
+        "reason": {"type": "string"},
+    },
+    "required": ["start", "end"],
+}
+
+EDIT_RULES_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "cut_length_sec": {
+            "type": "object",
+            "properties": {"min": {"type": "number"}, "max": {"type": "number"}},
+        },
+        "transition_every_sec": {"type": "number"},
+        "transition_type": {"type": "string"},
+        "transition_duration_sec": {"type": "number"},
+    },
+}
+
+SEGMENT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "label": {"type": "string", "enum": SEGMENT_LABELS},
+        "vo_language": {"type": "string"},
+        "target_vo_duration_sec": {"type": "number"},
+        "vo_script": {"type": "string"},
+        "vo_meta": VO_META_SCHEMA,
+        "edit_rules": EDIT_RULES_SCHEMA,
+        "source_timeblocks": {"type": "array", "items": TIMEBLOCK_SCHEMA},
+        "beats": {"type": "array", "items": BEAT_SCHEMA},
+    },
+    "required": ["label", "vo_language", "target_vo_duration_sec", "vo_script", "vo_meta", "beats"],
+}
+
+STORYBOARD_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "film_meta": {
+            "type": "object",
+            "properties": {"title": {"type": "string"}, "duration_sec": {"type": "number"}},
+        },
+        "recap": {
+            "type": "object",
+            "properties": {k: {"type": "string"} for k in ("intro", "rising", "mid_conflict", "climax", "ending")},
+        },
+        "segments": {"type": "array", "items": SEGMENT_SCHEMA},
+    },
+    "required": ["segments"],
+}
+
+# Planner: hanya label (+ timeblocks opsional)
+PLAN_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "segments": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "label": {"type": "string", "enum": SEGMENT_LABELS},
+                    "source_timeblocks": {"type": "array", "items": TIMEBLOCK_SCHEMA},
+                },
+                "required": ["label"],
+            },
+        },
+    },
+    "required": ["segments"],
+}
+
+# Perbaikan panjang VO: hanya vo_script baru
+VO_REPAIR_SCHEMA = {
+    "type": "object",
+    "properties": {"vo_script": {"type": "string"}},
+    "required": ["vo_script"],
+}
+
+# Mode multi-bahasa: terjemahan vo_script per label (bahasa tambahan)
+VO_TRANSLATION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "segments": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "label": {"type": "string", "enum": SEGMENT_LABELS},
+                    "vo_script": {"type": "string"},
+                },
+                "required": ["label", "vo_script"],
+            },
+        },
+    },
+    "required": ["segments"],
+}
+
+# Nilai pengganti untuk field wajib yang hilang (path relatif terhadap segmen, indeks -> [])
+SEGMENT_DEFAULTS = {
+    "target_vo_duration_sec": 180,
+    "vo_meta": {},
+    "vo_meta.speech_rate_wpm": 160,
+    "vo_meta.fit": "OK",
+    "beats": [],
+}
+
+
+class Issue(NamedTuple):
+    path: str
+    message: str
+    fixed: bool
+
+
+def _num(val):
+    if isinstance(val, bool):
+        return None
+    if isinstance(val, (int, float)):
+        return val
+    if isinstance(val, str):
+        try:
+            return float(val.strip().replace(",", "."))
+        except ValueError:
+            return None
+    return None
+
+
+def _walk(val, sch: dict, path: str, rel: str, issues: list, defaults: dict):
+    t = sch.get("type")
+    if t == "object":
+        if not isinstance(val, dict):
+            issues.append(Issue(path, f"harus object, bukan {type(val).__name__}", False))
+            return val
+        out = dict(val)
+        required = set(sch.get("required") or ())
+        for name, sub in (sch.get("properties") or {}).items():
+            p = f"{path}.{name}" if path else name
+            r = f"{rel}.{name}" if rel else name
+            if out.get(name) is not None:
+                out[name] = _walk(out[name], sub, p, r, issues, defaults)
+            elif name in required:
+                if r in defaults:
+                    out[name] = _walk(copy.deepcopy(defaults[r]), sub, p, r, issues, defaults)
+                    issues.append(Issue(p, "wajib tetapi tidak ada; diisi default", True))
+                else:
+                    issues.append(Issue(p, "wajib tetapi tidak ada", False))
+        return out
+    if t == "array":
+        if isinstance(val, dict) and sch.get("items", {}).get("type") == "object":
+            issues.append(Issue(path, "object tunggal dibungkus menjadi array", True))
+            val = [val]
+        if not isinstance(val, list):
+            issues.append(Issue(path, f"harus array, bukan {type(val).__name__}", False))
+            return val
+        sub = sch.get("items") or {}
+        return [_walk(v, sub, f"{path}[{i}]", f"{rel}[]", issues, defaults) for i, v in enumerate(val)]
+    if t == "string":
+        if not isinstance(val, str):
+            if isinstance(val, (int, float)) and not isinstance(val, bool):
+                issues.append(Issue(path, f"angka {val!r} diubah menjadi string", True))
+                val = str(val)
+            else:
+                issues.append(Issue(path, f"harus string, bukan {type(val).__name__}", False))
+                return val
+        enum = sch.get("enum")
+        if enum and val not in enum:
+            match = next((e for e in enum if e.lower() == val.strip().lower()), None)
+            if match is None:
+                issues.append(Issue(path, f"nilai {val!r} tidak dikenal (harus salah satu dari {enum})", False))
+            else:
+                issues.append(Issue(path, f"{val!r} dinormalisasi menjadi {match!r}", True))
+                val = match
+        return val
+    if t in ("integer", "number"):
+        n = _num(val)
+        if n is None:
+            issues.append(Issue(path, f"harus {t}, bukan {val!r}", False))
+            return val
+        if t == "integer":
+            if isinstance(n, float) and not n.is_integer():
+                issues.append(Issue(path, f"{val!r} dibulatkan ke integer", True))
+            elif isinstance(val, str):
+                issues.append(Issue(path, f"string {val!r} diubah menjadi integer", True))
+            return int(round(n))
+        if isinstance(val, str):
+            issues.append(Issue(path, f"string {val!r} diubah menjadi angka", True))
+        return n
+    return val
+
+
+def validate_segment(seg, path: str = "", language: str | None = None) -> tuple[dict, list]:
+    """Checks one segment against SEGMENT_SCHEMA and coerces what can be fixed safely.
+
+    Returns (segment, issues). Issues with fixed=False are real errors (e.g. missing
+    vo_script, beats not a list); the rest were corrected in the returned copy.
+    """
+    issues: list = []
+    defaults = dict(SEGMENT_DEFAULTS)
+    if language:
+        defaults["vo_language"] = language
+    if isinstance(seg, dict) and isinstance(seg.get("beats"), list):
+        # at_ms hilang: lanjutkan dari beat sebelumnya (at_ms + src_length_ms)
+        seg = dict(seg)
+        beats, pos = [], 0
+        for i, b in enumerate(seg["beats"]):
+            if isinstance(b, dict) and b.get("at_ms") is None:
+                b = dict(b, at_ms=pos)
+                issues.append(Issue(f"{path}.beats[{i}].at_ms" if path else f"beats[{i}].at_ms",
+                                    "tidak ada; diisi dari beat sebelumnya", True))
+            if isinstance(b, dict):
+                a, ln = _num(b.get("at_ms")), _num(b.get("src_length_ms"))
+                pos = int((a or 0) + (ln or 0))
+            beats.append(b)
+        seg["beats"] = beats
+    out = _walk(seg, SEGMENT_SCHEMA, path, "", issues, defaults)
+    return out, issues
+
+
+def validate_storyboard(sb, language: str | None = None) -> tuple[dict, list]:
+    """Checks a whole storyboard; segment problems are reported as segments[i].field."""
+    issues: list = []
+    if not isinstance(sb, dict):
+        return sb, [Issue("", f"storyboard harus object, bukan {type(sb).__name__}", False)]
+    top = {k: v for k, v in STORYBOARD_SCHEMA["properties"].items() if k != "segments"}
+    out = _walk(sb, {"type": "object", "properties": top}, "", "", issues, {})
+    segs = out.get("segments")
+    if segs is None:
+        issues.append(Issue("segments", "wajib tetapi tidak ada", False))
+        return out, issues
+    if isinstance(segs, dict):
+        issues.append(Issue("segments", "object tunggal dibungkus menjadi array", True))
+        segs = [segs]
+    if not isinstance(segs, list):
+        issues.append(Issue("segments", f"harus array, bukan {type(segs).__name__}", False))
+        return out, issues
+    checked = []
+    for i, seg in enumerate(segs):
+        seg, seg_issues = validate_segment(seg, f"segments[{i}]", language)
+        checked.append(seg)
+        issues.extend(seg_issues)
+    out["segments"] = checked
+    return out, issues
+
+
+def errors_only(issues: list) -> list:
+    return [i for i in issues if not i.fixed]
+
+
+def format_issues(issues: list, limit: int = 10) -> str:
+    lines = [f"{'diperbaiki' if i.fixed else 'ERROR'}: {i.path or '<root>'} - {i.message}" for i in issues[:limit]]
+    if len(issues) > limit:
+        lines.append(f"... ({len(issues) - limit} lainnya)")
+    return "\n".join(lines)
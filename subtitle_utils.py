@@ -0,0 +1,388 @@
+# subtitle_utils.py
+# Parsing SRT dan kompaksi subtitle untuk prompt Gemini.
+# SRT mentah (nomor urut, "HH:MM:SS,mmm --> HH:MM:SS,mmm", tag HTML, CRLF, cue per kata,
+# caption YouTube yang bergulir) memakan banyak token input. Modul ini menggabungkannya
+# menjadi satu baris per kalimat "[m:ss] teks" dan menyimpan pemetaan balik ke ms asli.
+
+import bisect
+import re
+from pathlib import Path
+from typing import NamedTuple
+
+
+class Cue(NamedTuple):
+    start_ms: int
+    end_ms: int
+    text: str
+
+
+_TIME_RE = re.compile(
+    r"(?:(\d+):)?(\d{1,2}):(\d{1,2})(?:[,.](\d{1,3}))?\s*-->\s*(?:(\d+):)?(\d{1,2}):(\d{1,2})(?:[,.](\d{1,3}))?"
+)
+_TAG_RE = re.compile(r"<[^>]+>|\{\\[^}]*\}")
+_SENTENCE_END_RE = re.compile(r"[.!?…。！？]['\"”’)\]]*$")
+
+
+def _ms(h, m, s, frac) -> int:
+    frac = (frac or "0").ljust(3, "0")[:3]
+    return ((int(h or 0) * 60 + int(m)) * 60 + int(s)) * 1000 + int(frac)
+
+
+def parse_timestamp(ts: str) -> int | None:
+    """'HH:MM:SS,mmm', 'HH:MM:SS.mmm', 'MM:SS' atau 'm:ss' -> ms. None jika tidak terbaca."""
+    m = re.fullmatch(r"\s*(?:(\d+):)?(\d{1,2}):(\d{1,2})(?:[,.](\d{1,3}))?\s*", str(ts or ""))
+    if not m:
+        return None
+    return _ms(*m.groups())
+
+
+def format_srt_time(ms: int) -> str:
+    ms = max(0, int(ms))
+    h, rem = divmod(ms, 3600_000)
+    m, rem = divmod(rem, 60_000)
+    s, ms = divmod(rem, 1000)
+    return f"{h:02d}:{m:02d}:{s:02d},{ms:03d}"
+
+
+def format_compact_time(ms: int) -> str:
+    """Second-resolution stamp: m:ss, or h:mm:ss from one hour on."""
+    sec = max(0, int(ms)) // 1000
+    h, rem = divmod(sec, 3600)
+    m, s = divmod(rem, 60)
+    return f"{h}:{m:02d}:{s:02d}" if h else f"{m}:{s:02d}"
+
+
+def clean_cue_text(text: str) -> str:
+    """Strips HTML/ASS markup and collapses whitespace/line breaks."""
+    text = _TAG_RE.sub("", text or "")
+    text = text.replace("&nbsp;", " ").replace("&amp;", "&").replace("&lt;", "<").replace("&gt;", ">")
+    return " ".join(text.split())
+
+
+def parse_srt(content: str) -> list[Cue]:
+    """Parses SRT text (CRLF/BOM tolerant). Cues without text are skipped."""
+    content = (content or "").lstrip("\ufeff").replace("\r\n", "\n").replace("\r", "\n")
+    cues = []
+    for block in re.split(r"\n\s*\n", content):
+        lines = [ln for ln in block.split("\n") if ln.strip()]
+        for i, ln in enumerate(lines[:2]):
+            m = _TIME_RE.search(ln)
+            if not m:
+                continue
+            g = m.groups()
+            st, et = _ms(*g[:4]), _ms(*g[4:])
+            text = clean_cue_text(" ".join(lines[i + 1:]))
+            if text:
+                cues.append(Cue(st, max(st, et), text))
+            break
+    cues.sort(key=lambda c: c.start_ms)
+    return cues
+
+
+def load_srt(path: str) -> list[Cue]:
+    """Cues of an SRT file via the shared cue store (parsed once, cached beside the SRT)."""
+    import cue_store
+    return cue_store.load(path).cues()
+
+
+def format_srt(cues: list[Cue]) -> str:
+    """Renumbered SRT text (LF line ends; write with newline="\\r\\n" for CRLF)."""
+    out = []
+    for n, c in enumerate(cues, start=1):
+        out += [str(n), f"{format_srt_time(c.start_ms)} --> {format_srt_time(max(c.end_ms, c.start_ms))}", c.text, ""]
+    return "\n".join(out)
+
+
+def write_srt(cues: list[Cue], path: str):
+    with open(path, "w", encoding="utf-8", newline="\r\n") as f:
+        f.write(format_srt(cues))
+
+
+def shift_cues(cues: list[Cue], offset_ms: int) -> list[Cue]:
+    return [Cue(c.start_ms + offset_ms, c.end_ms + offset_ms, c.text) for c in cues]
+
+
+def _norm_word(w: str) -> str:
+    return "".join(re.findall(r"\w+", w.lower()))
+
+
+def _same_word_at(c: Cue, pool: list[Cue], used: set) -> int | None:
+    """Index of the unused cue in pool with the same word overlapping c in time (one audio moment),
+    closest in start time when several do."""
+    w = _norm_word(c.text)
+    c_end = max(c.end_ms, c.start_ms + 1)
+    best = None
+    for j, t in enumerate(pool):
+        if j not in used and _norm_word(t.text) == w and t.start_ms < c_end and c.start_ms < max(t.end_ms, t.start_ms + 1):
+            if best is None or abs(t.start_ms - c.start_ms) < abs(pool[best].start_ms - c.start_ms):
+                best = j
+    return best
+
+
+def stitch_windows(windows: list, max_seam_words: int = 12, seam_slack_ms: int = 1500) -> list[Cue]:
+    """Joins transcripts of overlapping audio windows into one cue list.
+
+    windows: [(win_start_ms, win_end_ms, cues with absolute times)]. Each overlap is cut at its
+    midpoint: the earlier window owns words before the cut, the later one words after it. A word
+    both windows transcribed near the cut (same word, overlapping in time) is kept once, so
+    timestamps that drift across the cut neither duplicate nor drop it, while real repeats
+    ("no no") are separate moments and stay.
+    """
+    out: list[Cue] = []
+    prev_end = None
+    for win_start, win_end, cues in sorted(windows, key=lambda w: w[0]):
+        cues = sorted(cues, key=lambda c: c.start_ms)
+        if prev_end is None:
+            out.extend(c for c in cues if c.start_ms < win_end)
+            prev_end = win_end
+            continue
+        cut = (win_start + prev_end) // 2 if prev_end > win_start else win_start
+        moved = []
+        while out and out[-1].start_ms >= cut:
+            moved.append(out.pop())
+        # Kata kiri di sekitar cut: yang tetap dipakai (sebelum cut) dan yang dibuang (setelah cut)
+        kept = [c for c in out[-max_seam_words:] if c.start_ms >= cut - seam_slack_ms]
+        seam = kept + moved
+        used = set()
+        for c in cues:
+            if c.start_ms < cut - seam_slack_ms:
+                continue
+            if c.start_ms < cut + seam_slack_ms:
+                j = _same_word_at(c, seam, used)
+                if j is not None:
+                    used.add(j)
+                    # Kata yang sama: jendela kiri sudah memakainya, atau versi kiri jatuh setelah cut
+                    if j >= len(kept):
+                        out.append(c)
+                    continue
+                if c.start_ms < cut:
+                    continue
+            out.append(c)
+        prev_end = max(prev_end, win_end)
+    out.sort(key=lambda c: c.start_ms)
+    return out
+
+
+ROLLING_MIN_WORDS = 2
+
+
+def dedupe_rolling(cues: list[Cue], max_overlap_words: int = 40, min_words: int = ROLLING_MIN_WORDS) -> list[Cue]:
+    """Removes text repeated from the previous cue (YouTube rolling captions, duplicates).
+
+    Only cues that touch or overlap the previous one in time count as rolling captions: the
+    longest run of at least min_words words that ends the previous cue and starts the current
+    one is cut from the current cue; cues left empty only extend the previous one. Single-word
+    cues (word-level SRT) are never trimmed, so real repeats like "no no" survive; an exact
+    duplicate (same start and text) is still dropped.
+    """
+    out: list[Cue] = []
+    prev = None
+    for c in cues:
+        words = c.text.split()
+        cut = 0
+        if prev is not None and c.start_ms == prev.start_ms and c.text.strip().lower() == prev.text.strip().lower():
+            cut = len(words)
+        elif prev is not None and c.start_ms <= prev.end_ms:
+            prev_words = prev.text.split()
+            if len(words) > 1 and len(prev_words) > 1:
+                lw = [w.lower() for w in words]
+                plw = [w.lower() for w in prev_words[-max_overlap_words:]]
+                for k in range(min(len(plw), len(lw)), max(1, min_words) - 1, -1):
+                    if plw[-k:] == lw[:k]:
+                        cut = k
+                        break
+        rest = words[cut:]
+        if rest:
+            out.append(Cue(c.start_ms, c.end_ms, " ".join(rest)))
+        elif out:
+            last = out[-1]
+            out[-1] = Cue(last.start_ms, max(last.end_ms, c.end_ms), last.text)
+        prev = c
+    return out
+
+
+def merge_sentences(cues: list[Cue], max_gap_ms: int = 1500, max_len_ms: int = 15000, max_chars: int = 280) -> list[Cue]:
+    """Joins consecutive cues into sentence-level lines.
+
+    A line ends at sentence punctuation, at a pause longer than max_gap_ms, or when it
+    would exceed max_len_ms / max_chars (word-level transcripts often have no punctuation).
+    """
+    out: list[Cue] = []
+    cur: list[Cue] = []
+
+    def flush():
+        if cur:
+            out.append(Cue(cur[0].start_ms, cur[-1].end_ms, " ".join(c.text for c in cur)))
+            cur.clear()
+
+    for c in cues:
+        if cur:
+            gap = c.start_ms - cur[-1].end_ms
+            length = c.end_ms - cur[0].start_ms
+            chars = sum(len(x.text) + 1 for x in cur) + len(c.text)
+            if gap > max_gap_ms or length > max_len_ms or chars > max_chars:
+                flush()
+        cur.append(c)
+        if _SENTENCE_END_RE.search(c.text):
+            flush()
+    flush()
+    return out
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text or "") // 4)
+
+
+class CompactSrt:
+    """Sentence-level subtitle lines plus the exact mapping back to source milliseconds."""
+
+    HEADER = "# Subtitle ringkas: satu baris per kalimat. [m:ss] = waktu mulai kalimat di film."
+
+    def __init__(self, lines: list[Cue], raw_chars: int = 0):
+        self.lines = lines
+        self.starts = [c.start_ms for c in lines]
+        self.raw_chars = int(raw_chars)
+        self.text = self.HEADER + "\n" + "\n".join(f"[{format_compact_time(c.start_ms)}] {c.text}" for c in lines) + "\n"
+        # detik yang ditampilkan -> indeks baris pertama pada detik itu
+        self._by_second = {}
+        for i, c in enumerate(lines):
+            self._by_second.setdefault(c.start_ms // 1000, i)
+
+    @property
+    def raw_tokens(self) -> int:
+        return self.raw_chars // 4
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.text)
+
+    def reduction_summary(self) -> str:
+        raw, comp = self.raw_tokens, self.tokens
+        pct = (1.0 - comp / raw) * 100.0 if raw else 0.0
+        return f"{len(self.lines)} baris, ~{raw:,} -> ~{comp:,} token ({pct:.0f}% lebih kecil)"
+
+    def to_source_ms(self, ms) -> int:
+        """Maps a timestamp read off the compact text back to exact source ms.
+
+        The model only sees whole seconds, so a whole-second value equal to a displayed
+        line start gets that line's sub-second offset: for a line shown as "[1:23]" that
+        really starts at 83420, 83000 -> 83420. Values that are not whole seconds are
+        already exact (e.g. copied from timeblocks given in real ms) and are returned as-is.
+        """
+        try:
+            ms = int(round(float(ms)))
+        except (TypeError, ValueError):
+            return 0
+        if ms % 1000:
+            return ms
+        sec = ms // 1000
+        i = self._by_second.get(sec)
+        if i is None:
+            return ms
+        start = self.starts[i]
+        return start
+
+    def line_at(self, ms: int) -> Cue | None:
+        i = bisect.bisect_right(self.starts, int(ms)) - 1
+        return self.lines[i] if i >= 0 else None
+
+
+def compact_cues(cues: list[Cue], raw_chars: int = 0) -> CompactSrt:
+    return CompactSrt(merge_sentences(dedupe_rolling(cues)), raw_chars=raw_chars)
+
+
+def compact_srt_file(srt_path: str, out_path: str | None = None) -> tuple[str, CompactSrt]:
+    """Writes '<stem>.compact.txt' next to the SRT (only when the content changed)."""
+    import cue_store
+    store = cue_store.load(srt_path)
+    compact = compact_cues(store.cues(), raw_chars=store.source_size)
+    out = Path(out_path) if out_path else Path(srt_path).with_suffix(".compact.txt")
+    try:
+        same = out.exists() and out.read_text(encoding="utf-8") == compact.text
+    except OSError:
+        same = False
+    if not same:
+        out.write_text(compact.text, encoding="utf-8")
+    return str(out), compact
+
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def score_cues(cues: list[Cue], density_window_ms: int = 30000, tfidf_weight: float = 0.6):
+    """Per-cue informativeness in [0, 1]: local TF-IDF mixed with dialogue density.
+
+    TF-IDF treats each cue as a document and averages idf over its tokens (rare names
+    and plot words score high, "yeah"/"okay" low). Density is words per second in a
+    +-density_window_ms window around the cue. Both are rank-normalised before mixing.
+    """
+    import numpy as np
+    n = len(cues)
+    if n == 0:
+        return np.zeros(0)
+    vocab: dict[str, int] = {}
+    term_ids, doc_ids = [], []
+    n_words = np.zeros(n)
+    for i, c in enumerate(cues):
+        toks = [t.lower() for t in _WORD_RE.findall(c.text)]
+        n_words[i] = len(toks)
+        for t in toks:
+            term_ids.append(vocab.setdefault(t, len(vocab)))
+            doc_ids.append(i)
+    if not term_ids:
+        return np.zeros(n)
+    term_ids = np.asarray(term_ids, dtype=np.int64)
+    doc_ids = np.asarray(doc_ids, dtype=np.int64)
+    # document frequency: pasangan (cue, term) unik
+    pairs = np.unique(doc_ids * len(vocab) + term_ids)
+    df = np.bincount(pairs % len(vocab), minlength=len(vocab)).astype(float)
+    idf = np.log((1.0 + n) / (1.0 + df)) + 1.0
+    tfidf = np.bincount(doc_ids, weights=idf[term_ids], minlength=n) / np.maximum(n_words, 1.0)
+    tfidf *= np.log1p(n_words)  # cue satu kata jangan menang hanya karena langka
+
+    starts = np.fromiter((c.start_ms for c in cues), dtype=np.int64, count=n)
+    cum = np.concatenate(([0.0], np.cumsum(n_words)))
+    lo = np.searchsorted(starts, starts - density_window_ms, side="left")
+    hi = np.searchsorted(starts, starts + density_window_ms, side="right")
+    density = (cum[hi] - cum[lo]) / (2.0 * density_window_ms / 1000.0)
+
+    def rank01(x):
+        if len(x) < 2:
+            return np.ones_like(x, dtype=float)
+        return np.argsort(np.argsort(x, kind="stable"), kind="stable") / float(len(x) - 1)
+
+    return tfidf_weight * rank01(tfidf) + (1.0 - tfidf_weight) * rank01(density)
+
+
+def stratified_excerpt(cues: list[Cue], token_budget: int = 3000, strata: int = 12) -> str:
+    """Whole-cue excerpt covering the film evenly, in '[m:ss] text' lines.
+
+    The timeline is cut into equal time strata; each stratum gets an equal share of the
+    token budget (unused share carries over to the next) and is filled with its highest
+    scoring cues. Output keeps chronological order and real start times.
+    """
+    import numpy as np
+    if not cues:
+        return ""
+    lines = [f"[{format_compact_time(c.start_ms)}] {c.text}" for c in cues]
+    costs = np.array([estimate_tokens(ln) + 1 for ln in lines])
+    if int(costs.sum()) <= token_budget:
+        return "\n".join(lines)
+    scores = score_cues(cues)
+    starts = np.array([c.start_ms for c in cues], dtype=np.int64)
+    t0, t1 = int(starts[0]), int(max(c.end_ms for c in cues))
+    strata = max(1, min(int(strata), len(cues)))
+    edges = np.linspace(t0, t1 + 1, strata + 1)
+    bins = np.clip(np.searchsorted(edges, starts, side="right") - 1, 0, strata - 1)
+    share = token_budget / float(strata)
+    carry = 0.0
+    chosen = np.zeros(len(cues), dtype=bool)
+    for b in range(strata):
+        idx = np.nonzero(bins == b)[0]
+        budget = share + carry
+        for i in idx[np.argsort(-scores[idx], kind="stable")]:
+            if costs[i] <= budget:
+                chosen[i] = True
+                budget -= costs[i]
+        carry = budget
+    return "\n".join(ln for ln, keep in zip(lines, chosen) if keep)
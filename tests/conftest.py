@@ -0,0 +1,65 @@
+# tests/conftest.py
+# Modul aplikasi berupa file datar di root repo; state global (file JSON di home,
+# scheduler key, memo cue store) diisolasi per test.
+
+import os
+import sys
+import warnings
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for p in (ROOT, os.path.dirname(os.path.abspath(__file__))):
+    if p not in sys.path:
+        sys.path.insert(0, p)
+
+# google-generativeai 0.8.x mencetak FutureWarning (SDK EOL) saat diimpor
+warnings.filterwarnings("ignore", category=FutureWarning)
+
+import pytest  # noqa: E402
+
+from gemini_stub import GeminiStub  # noqa: E402
+
+
+@pytest.fixture
+def isolated_home(tmp_path, monkeypatch):
+    """HOME sementara: api_keys.json, status key, registry upload dan speech-rate tidak menyentuh milik pengguna."""
+    home = tmp_path / "home"
+    home.mkdir()
+    monkeypatch.setenv("HOME", str(home))
+    monkeypatch.setenv("USERPROFILE", str(home))
+    import api_manager
+    import cue_store
+    import shot_index
+    import speech_rate
+    import upload_registry
+    monkeypatch.setattr(api_manager, "_schedulers", {})
+    monkeypatch.setattr(api_manager, "_shared_am", None)
+    monkeypatch.setattr(upload_registry, "_registry", None)
+    monkeypatch.setattr(speech_rate, "_store", None)
+    monkeypatch.setattr(cue_store, "_memo", {})
+    # Direktori cache shot dihitung saat import (Path.home() asli)
+    monkeypatch.setattr(shot_index, "_CACHE_DIR", home / ".restorymaker_shots")
+    monkeypatch.setattr(shot_index, "_memo", {})
+    return home
+
+
+@pytest.fixture(params=["internals", "public"])
+def gemini_stub(request, isolated_home, monkeypatch):
+    """Factory: gemini_stub(generate, cache_enabled=True) -> GeminiStub yang sudah jalan, di GEMINI_API_ENDPOINT.
+    Setiap test jalan dua kali: lewat internal SDK dan lewat fallback API publik _GeminiClientPool."""
+    import api_handler
+    stubs = []
+
+    def start(generate=None, cache_enabled: bool = True):
+        stub = GeminiStub(generate, cache_enabled).__enter__()
+        stubs.append(stub)
+        monkeypatch.setenv(api_handler.GEMINI_ENDPOINT_ENV, stub.endpoint)
+        # Pool baru: client per key dibuat ulang untuk endpoint stub ini
+        pool = api_handler._GeminiClientPool()
+        if request.param == "public":
+            pool._internals = False
+        monkeypatch.setattr(api_handler, "_client_pool", pool)
+        return stub
+
+    yield start
+    for stub in stubs:
+        stub.__exit__(None, None, None)
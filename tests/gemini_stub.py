@@ -0,0 +1,154 @@
+# tests/gemini_stub.py
+# Endpoint Gemini tiruan (REST v1beta) untuk pengujian lokal: generateContent dan
+# cachedContents (create/get/patch/delete). Dipakai lewat GEMINI_API_ENDPOINT, sama
+# seperti menjalankan aplikasi terhadap server stand-in.
+
+import base64
+import datetime
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+def text_response(text: str, finish_reason: str = "STOP", tokens: int = 100) -> dict:
+    return {
+        "candidates": [{"content": {"role": "model", "parts": [{"text": text}]},
+                        "finishReason": finish_reason, "index": 0}],
+        "usageMetadata": {"promptTokenCount": tokens, "candidatesTokenCount": 1, "totalTokenCount": tokens + 1},
+    }
+
+
+def error_response(code: int, message: str, status: str = "INVALID_ARGUMENT") -> tuple[int, dict]:
+    return code, {"error": {"code": code, "message": message, "status": status}}
+
+
+def request_text(body: dict) -> str:
+    """All text parts of a generateContent request (system instruction included)."""
+    out = []
+    for content in (body.get("contents") or []) + [body.get("systemInstruction") or body.get("system_instruction") or {}]:
+        for part in (content or {}).get("parts") or []:
+            if "text" in part:
+                out.append(part["text"])
+    return "\n".join(out)
+
+
+def inline_data(body: dict) -> list[bytes]:
+    out = []
+    for content in body.get("contents") or []:
+        for part in content.get("parts") or []:
+            data = part.get("inlineData") or part.get("inline_data")
+            if data:
+                out.append(base64.b64decode(data["data"]))
+    return out
+
+
+class GeminiStub:
+    """Threaded local server. generate(model, body) -> dict | (status, dict) answers generateContent;
+    cache_enabled=False makes cachedContents.create fail the way a too-small or unsupported cache does."""
+
+    def __init__(self, generate=None, cache_enabled: bool = True):
+        self.generate = generate or (lambda model, body: text_response("ok"))
+        self.cache_enabled = cache_enabled
+        self.requests = []      # (method, path, body)
+        self.api_keys = []      # API key per request (header x-goog-api-key atau ?key=), sejajar dengan requests
+        self.caches = {}        # name -> cachedContent resource
+        self._lock = threading.Lock()
+        self._server = None
+
+    # ---- helpers for assertions ----
+    def calls(self, method: str, contains: str = "") -> list:
+        with self._lock:
+            return [(p, b) for m, p, b in self.requests if m == method and contains in p]
+
+    def generate_calls(self) -> list:
+        return [b for _, b in self.calls("POST", ":generateContent")]
+
+    # ---- server ----
+    @property
+    def endpoint(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _handle(self, method):
+                n = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(n) or b"{}") if n else {}
+                path, _, query = self.path.partition("?")
+                key = self.headers.get("x-goog-api-key") or (parse_qs(query).get("key") or [None])[0]
+                with stub._lock:
+                    stub.requests.append((method, path, body))
+                    stub.api_keys.append(key)
+                status, payload = stub.dispatch(method, path, body)
+                self._reply(status, payload)
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_POST(self):
+                self._handle("POST")
+
+            def do_PATCH(self):
+                self._handle("PATCH")
+
+            def do_DELETE(self):
+                self._handle("DELETE")
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def dispatch(self, method: str, path: str, body: dict):
+        if path.endswith(":generateContent"):
+            model = path.rsplit("/", 1)[-1].split(":", 1)[0]
+            result = self.generate(model, body)
+            return result if isinstance(result, tuple) else (200, result)
+        if path.endswith("/cachedContents") and method == "POST":
+            if not self.cache_enabled:
+                return error_response(400, "Cached content is too small. total_token_count=10, min_total_token_count=1024")
+            with self._lock:
+                name = f"cachedContents/stub{len(self.caches) + 1}"
+                now = datetime.datetime.now(datetime.timezone.utc)
+                ttl = float(str(body.get("ttl") or "1800s").rstrip("s"))
+                self.caches[name] = {
+                    "name": name, "model": body.get("model", ""), "displayName": body.get("displayName", ""),
+                    "createTime": now.isoformat().replace("+00:00", "Z"),
+                    "updateTime": now.isoformat().replace("+00:00", "Z"),
+                    "expireTime": (now + datetime.timedelta(seconds=ttl)).isoformat().replace("+00:00", "Z"),
+                    "usageMetadata": {"totalTokenCount": 5000},
+                }
+                return 200, self.caches[name]
+        if "/cachedContents/" in path:
+            name = path.split("/v1beta/", 1)[-1]
+            with self._lock:
+                cache = self.caches.get(name)
+                if cache is None:
+                    return error_response(404, f"{name} not found", "NOT_FOUND")
+                if method == "DELETE":
+                    del self.caches[name]
+                    return 200, {}
+                if method == "PATCH" and body.get("ttl"):
+                    now = datetime.datetime.now(datetime.timezone.utc)
+                    ttl = float(str(body["ttl"]).rstrip("s"))
+                    cache["expireTime"] = (now + datetime.timedelta(seconds=ttl)).isoformat().replace("+00:00", "Z")
+                return 200, cache
+        return error_response(404, f"stub: {method} {path} tidak didukung", "NOT_FOUND")
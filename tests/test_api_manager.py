@@ -0,0 +1,202 @@
+# tests/test_api_manager.py
+# KeyScheduler: token bucket RPM/TPM/RPD per key, backoff cooldown, dan cooldown harian per (model, key) di disk.
+
+import time as _real_time
+
+import pytest
+
+import api_manager
+from api_manager import APIManager, KeyScheduler
+
+
+class FakeTime:
+    """Jam palsu untuk modul api_manager: monotonic() dan time() maju bersama lewat advance()."""
+
+    def __init__(self):
+        self.mono = 1000.0
+        self.offset = 0.0
+
+    def monotonic(self):
+        return self.mono
+
+    def time(self):
+        return _real_time.time() + self.offset
+
+    def advance(self, sec):
+        self.mono += sec
+        self.offset += sec
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeTime()
+    monkeypatch.setattr(api_manager, "time", fake)
+    return fake
+
+
+@pytest.fixture
+def am(isolated_home):
+    m = APIManager()
+    for k in ("KEY-A", "KEY-B"):
+        m.add_key(k)
+    return m
+
+
+def _sched(am, model="gemini-2.5-flash", **limits):
+    return KeyScheduler(am, dict({"rpm": 1000, "tpm": 10_000_000, "rpd": 100_000}, **limits), model=model)
+
+
+def test_rpm_bucket_refills_over_time(am, clock):
+    am.keys = ["KEY-A"]
+    s = _sched(am, rpm=2)
+    assert s.acquire(max_wait=0) == "KEY-A"
+    assert s.acquire(max_wait=0) == "KEY-A"
+    assert s.acquire(max_wait=0) is None
+    clock.advance(29)
+    assert s.acquire(max_wait=0) is None
+    clock.advance(1)  # 2 req / 60 dtk -> 1 token setelah 30 dtk
+    assert s.acquire(max_wait=0) == "KEY-A"
+
+
+def test_tpm_bucket_uses_estimate_and_actual_usage(am, clock):
+    am.keys = ["KEY-A"]
+    s = _sched(am, tpm=1200)
+    k = s.acquire(est_tokens=800, max_wait=0)
+    assert k == "KEY-A"
+    assert s.acquire(est_tokens=800, max_wait=0) is None
+    # Pemakaian nyata lebih kecil dari estimasi: sisanya dikembalikan
+    s.release(k, tokens_used=200, est_tokens=800)
+    k = s.acquire(est_tokens=800, max_wait=0)
+    assert k == "KEY-A"
+    # Pemakaian nyata melebihi estimasi: bucket boleh negatif, lalu terisi lagi 20 token/dtk
+    s.release(k, tokens_used=1200, est_tokens=800)
+    assert s.acquire(est_tokens=100, max_wait=0) is None
+    clock.advance(14)  # -200 + 14 * 20 = 80 token
+    assert s.acquire(est_tokens=100, max_wait=0) is None
+    clock.advance(1)
+    assert s.acquire(est_tokens=100, max_wait=0) == "KEY-A"
+
+
+def test_rpd_bucket_lasts_a_day(am, clock):
+    am.keys = ["KEY-A"]
+    s = _sched(am, rpd=2)
+    assert s.acquire(max_wait=0) and s.acquire(max_wait=0)
+    assert s.acquire(max_wait=0) is None
+    clock.advance(3600)
+    assert s.acquire(max_wait=0) is None
+    clock.advance(11 * 3600)  # 2 req / 24 jam -> 1 token setelah 12 jam
+    assert s.acquire(max_wait=0) == "KEY-A"
+
+
+def test_spreads_load_and_moves_to_key_with_budget(am, clock):
+    s = _sched(am, rpm=1)
+    first = s.acquire(max_wait=0)
+    second = s.acquire(max_wait=0)
+    assert {first, second} == {"KEY-A", "KEY-B"}
+    assert s.acquire(max_wait=0) is None
+    assert s.acquire(exclude=[first], max_wait=0) is None
+    clock.advance(60)
+    assert s.acquire(exclude=[first], max_wait=0) == second
+
+
+def test_quota_backoff_doubles_and_honours_retry_delay(am, clock):
+    am.keys = ["KEY-A"]
+    s = _sched(am)
+    got = []
+    for _ in range(3):
+        k = s.acquire(max_wait=0)
+        assert k == "KEY-A"
+        kind, cd = s.report_error(k, "429 Resource has been exhausted (e.g. check quota).")
+        got.append((kind, cd))
+        assert s.acquire(max_wait=0) is None
+        clock.advance(cd - 0.5)
+        assert s.acquire(max_wait=0) is None
+        clock.advance(0.5)
+    assert got == [("quota", 5.0), ("quota", 10.0), ("quota", 20.0)]
+
+    k = s.acquire(max_wait=0)
+    assert s.report_error(k, '429 quota {"retryDelay": "45s"}') == ("quota", 45.0)
+    clock.advance(45)
+    # Sukses mereset hitungan: 429 berikutnya kembali ke backoff dasar
+    k = s.acquire(max_wait=0)
+    s.release(k)
+    k = s.acquire(max_wait=0)
+    assert s.report_error(k, "429 quota") == ("quota", 5.0)
+
+
+def test_transient_backoff_is_capped(am, clock):
+    am.keys = ["KEY-A"]
+    s = _sched(am)
+    cds = []
+    for _ in range(8):
+        k = s.acquire(max_wait=0)
+        kind, cd = s.report_error(k, "503 The service is currently unavailable.")
+        assert kind == "transient"
+        cds.append(cd)
+        clock.advance(cd)
+    assert cds == [2.0, 4.0, 8.0, 16.0, 32.0, 60.0, 60.0, 60.0]
+    k = s.acquire(max_wait=0)
+    assert s.report_error(k, "400 invalid argument") == ("other", 0.0)
+    assert s.acquire(max_wait=0) == "KEY-A"
+
+
+def test_daily_cooldown_is_persisted_per_model_and_key(am, clock):
+    flash, pro = _sched(am, "gemini-2.5-flash"), _sched(am, "gemini-2.5-pro")
+    k = flash.acquire(preferred="KEY-A", max_wait=0)
+    assert k == "KEY-A"
+    kind, cd = flash.report_error(k, "429 Quota exceeded for metric: generate_content_free_tier_requests per day")
+    assert (kind, cd) == ("daily", api_manager.DAILY_COOLDOWN_SEC)
+
+    # Model lain tetap memakai key yang sama; model ini pindah ke key lain
+    assert pro.acquire(preferred="KEY-A", max_wait=0) == "KEY-A"
+    assert flash.acquire(preferred="KEY-A", max_wait=0) == "KEY-B"
+
+    # Proses baru membaca cooldown dari disk, hanya untuk model itu
+    fresh = APIManager()
+    assert fresh.get_available_keys("gemini-2.5-flash") == ["KEY-B"]
+    assert fresh.get_available_keys("gemini-2.5-pro") == ["KEY-A", "KEY-B"]
+    assert fresh.get_available_keys() == ["KEY-A", "KEY-B"]
+    assert fresh.is_key_on_cooldown("KEY-A", "gemini-2.5-flash")
+    assert not fresh.is_key_on_cooldown("KEY-A")
+    status = dict(fresh.get_status_list())
+    assert status["KEY-B"] == 0 and 0 < status["KEY-A"] <= api_manager.DAILY_COOLDOWN_SEC
+
+    clock.advance(api_manager.DAILY_COOLDOWN_SEC + 1)
+    fresh = APIManager()
+    assert fresh.get_available_keys("gemini-2.5-flash") == ["KEY-A", "KEY-B"]
+    assert fresh.status["model_cooldowns"] == {}
+
+
+def test_repeated_quota_errors_escalate_to_daily(am, clock):
+    am.keys = ["KEY-A"]
+    s = _sched(am, "gemini-2.5-pro")
+    cds = []
+    for _ in range(api_manager.DAILY_COOLDOWN_AFTER):
+        if cds:
+            clock.advance(cds[-1])
+        k = s.acquire(max_wait=0)
+        cds.append(s.report_error(k, "429 quota")[1])
+    assert cds == [5.0, 10.0, 20.0, 40.0, api_manager.DAILY_COOLDOWN_SEC]
+    assert am.get_cooldown_remaining("KEY-A", "gemini-2.5-pro") > 0
+    assert s.acquire(max_wait=0) is None
+
+
+def test_all_model_cooldown_still_applies(am, clock):
+    am.set_key_cooldown("KEY-A", 3600)
+    s = _sched(am)
+    assert s.acquire(preferred="KEY-A", max_wait=0) == "KEY-B"
+
+
+def test_get_scheduler_shares_one_manager_and_reloads_keys(isolated_home):
+    flash = api_manager.get_scheduler("text")
+    pro = api_manager.get_scheduler("text", "gemini-2.5-pro")
+    tts = api_manager.get_scheduler("tts")
+    assert flash is api_manager.get_scheduler("text", "gemini-2.5-flash")
+    assert flash.am is pro.am is tts.am
+    assert (flash.model, tts.model) == ("gemini-2.5-flash", "gemini-2.5-flash-preview-tts")
+    assert tts.limits == api_manager.MODEL_LIMITS["gemini-2.5-flash-preview-tts"]
+    assert flash.key_count() == 0
+
+    APIManager().add_key("KEY-NEW")
+    assert api_manager.get_scheduler("text", "gemini-2.5-pro").key_count() == 1
+    assert flash.key_count() == 1
@@ -0,0 +1,98 @@
+# tests/test_caption_stream.py
+# Parser caption YouTube yang di-stream: hasil harus sama berapa pun potongan bytes-nya,
+# termasuk potongan di tengah karakter UTF-8 multi-byte.
+
+import json
+import random
+
+import pytest
+
+from caption_stream import parse_caption_stream, parser_for
+from subtitle_utils import Cue, format_srt
+
+EXPECTED = [
+    Cue(0, 1500, "Halo semua"),
+    Cue(1500, 3200, "Café ☃ naïve — “kutip”"),
+    Cue(3200, 5200, "A & B < C"),
+    Cue(65000, 66250, "baris dua"),
+]
+
+JSON3 = json.dumps({
+    "wireMagic": "pb3",
+    "events": [
+        {"tStartMs": 0, "dDurationMs": 1500, "segs": [{"utf8": "Halo"}, {"utf8": " semua"}]},
+        {"tStartMs": 1000, "dDurationMs": 500, "id": 1, "wWinId": 1},
+        {"tStartMs": 1500, "dDurationMs": 1700, "segs": [{"utf8": "Café ☃ naïve"}, {"utf8": "— “kutip”"}]},
+        {"tStartMs": 3200, "dDurationMs": 2000, "segs": [{"utf8": "A & B < C"}]},
+        {"tStartMs": 65000, "dDurationMs": 1250, "segs": [{"utf8": "baris\ndua"}]},
+        {"tStartMs": 70000, "dDurationMs": 10, "segs": [{"utf8": "\n"}]},
+    ],
+}, ensure_ascii=False)
+
+SRV3 = (
+    '<?xml version="1.0" encoding="utf-8" ?><timedtext format="3"><body>\n'
+    '<p t="0" d="1500">Halo <s>semua</s></p>\n'
+    '<p t="1500" d="1700">Café ☃ naïve — “kutip”</p>\n'
+    '<p t="3200" d="2000">A &amp; B &lt; C</p>\n'
+    '<p t="65000" d="1250">baris\ndua</p>\n'
+    '<p t="70000" d="10"> </p>\n'
+    '</body></timedtext>\n'
+)
+
+VTT = (
+    "WEBVTT\nKind: captions\nLanguage: id\n\n"
+    "NOTE komentar -> bukan cue\n\n"
+    "STYLE\n::cue { color: white }\n\n"
+    "00:00.000 --> 00:01.500 align:start position:0%\nHalo <c>semua</c>\n\n"
+    "cue-2\n00:00:01.500 --> 00:00:03.200\nCafé ☃ naïve — “kutip”\n\n"
+    "00:00:03.200 --> 00:00:05.200\nA &amp; B &lt; C\n\n"
+    "00:01:05.000 --> 00:01:06.250\nbaris\ndua\n"
+)
+
+SRT = "﻿" + format_srt(EXPECTED).replace("\n", "\r\n")
+
+DOCS = {"json3": JSON3, "srv3": SRV3, "vtt": VTT, "srt": SRT}
+
+
+def _random_chunks(data: bytes, rng: random.Random) -> list[bytes]:
+    chunks, i = [], 0
+    while i < len(data):
+        n = rng.choice([1, 1, 2, 3, 5, 13, 64, 512])
+        chunks.append(data[i:i + n])
+        i += n
+    return chunks
+
+
+@pytest.mark.parametrize("ext", sorted(DOCS))
+def test_whole_document(ext):
+    assert parse_caption_stream([DOCS[ext].encode("utf-8")], ext) == EXPECTED
+
+
+@pytest.mark.parametrize("seed", range(40))
+@pytest.mark.parametrize("ext", sorted(DOCS))
+def test_random_chunking_gives_same_cues(ext, seed):
+    rng = random.Random(seed)
+    data = DOCS[ext].encode("utf-8")
+    assert parse_caption_stream(_random_chunks(data, rng), ext) == EXPECTED
+
+
+@pytest.mark.parametrize("ext", ["json3", "srv3", "vtt"])
+def test_cues_are_emitted_before_close(ext):
+    # Parser inkremental: sebagian besar cue sudah keluar sebelum stream berakhir
+    parser = parser_for(ext)
+    early = []
+    for chunk in _random_chunks(DOCS[ext].encode("utf-8"), random.Random(1)):
+        early.extend(parser.feed(chunk))
+    assert len(early) >= 3
+    assert early + parser.close() == EXPECTED
+
+
+def test_truncated_srv3_keeps_complete_paragraphs():
+    data = SRV3.encode("utf-8")
+    cut = data.index(b'<p t="65000"') + 12
+    assert parse_caption_stream([data[:cut]], "srv3") == EXPECTED[:3]
+
+
+def test_unknown_format():
+    with pytest.raises(ValueError):
+        parser_for("ttml")
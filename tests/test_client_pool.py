@@ -0,0 +1,49 @@
+# tests/test_client_pool.py
+# _GeminiClientPool: internal SDK hanya pada versi yang dipin, dan setiap entri pool memakai key-nya
+# sendiri walaupun dipakai bersamaan dari banyak thread.
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import api_handler
+from gemini_stub import request_text, text_response
+
+KEYS = ["KEY-A", "KEY-B", "KEY-C"]
+
+
+@pytest.mark.parametrize("version, expected", [(api_handler.GENAI_INTERNALS_VERSION, True), ("0.8.7", False),
+                                               ("0.7.2", False), (None, False)])
+def test_internals_only_on_pinned_sdk_version(monkeypatch, version, expected):
+    if version is None:
+        monkeypatch.delattr(api_handler.genai, "__version__", raising=False)
+    else:
+        monkeypatch.setattr(api_handler.genai, "__version__", version, raising=False)
+    pool = api_handler._GeminiClientPool()
+    assert pool.uses_internals() is expected
+    # Dicek sekali per pool
+    monkeypatch.setattr(api_handler.genai, "__version__", "0.0.0", raising=False)
+    assert pool.uses_internals() is expected
+
+
+def test_each_pool_entry_keeps_its_own_key(gemini_stub):
+    stub = gemini_stub(lambda model, body: text_response(request_text(body)))
+    pool = api_handler._client_pool
+
+    def call(i):
+        key = KEYS[i % len(KEYS)]
+        resp = pool.model(key, "gemini-2.5-flash").generate_content(f"dari {key} #{i}",
+                                                                     request_options={"timeout": 30})
+        return key, resp.text
+
+    with ThreadPoolExecutor(max_workers=6) as ex:
+        results = list(ex.map(call, range(30)))
+    assert all(text.startswith(f"dari {key} ") for key, text in results)
+
+    gens = [(key, body) for (m, p, body), key in zip(stub.requests, stub.api_keys) if p.endswith(":generateContent")]
+    assert len(gens) == 30
+    for key, body in gens:
+        assert request_text(body).startswith(f"dari {key} "), (key, request_text(body))
+    if pool.uses_internals():
+        # Satu client set per (key, transport), dipakai ulang
+        assert sorted(k for k, _ in pool._managers) == KEYS
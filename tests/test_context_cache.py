@@ -0,0 +1,107 @@
+# tests/test_context_cache.py
+# Storyboard terhadap stub Gemini lokal: context cache SRT dibuat sekali, dipakai ulang
+# oleh planner dan semua segmen, dan fallback ke prompt penuh bila caching tidak tersedia.
+
+import json
+import re
+
+import pytest
+
+from gemini_stub import request_text, text_response
+
+SEGMENTS = ["Intro", "Rising", "Mid-conflict", "Climax", "Ending"]
+FILE_PART = {"file_data": {"mime_type": "text/plain", "file_uri": "https://stub.local/files/srt-1"}}
+
+
+def _write_srt(path, n=120, step_ms=5000):
+    lines = []
+    for i in range(n):
+        st, en = i * step_ms, i * step_ms + step_ms - 500
+        lines.append(f"{i + 1}\n{_ts(st)} --> {_ts(en)}\nKalimat dialog nomor {i + 1} di film ini.\n")
+    path.write_text("\n".join(lines), encoding="utf-8")
+    return str(path)
+
+
+def _ts(ms):
+    return f"{ms // 3600000:02d}:{ms // 60000 % 60:02d}:{ms // 1000 % 60:02d},{ms % 1000:03d}"
+
+
+def storyboard_model(model, body):
+    """Planner -> 5 label; segmen -> vo_script tepat words_target kata + beats."""
+    text = request_text(body)
+    if "Planner Timeblocks" in text:
+        return text_response(json.dumps({"segments": [{"label": lab} for lab in SEGMENTS]}))
+    m = re.search(r"# Segmen Storyboard.*?Label: (\S+).*?words_target=(\d+)", text, re.S)
+    if m:
+        label, words = m.group(1), int(m.group(2))
+        seg = {
+            "label": label,
+            "vo_language": "id",
+            "target_vo_duration_sec": 7,
+            "vo_script": " ".join(["kata"] * (words - 1) + ["akhir."]),
+            "vo_meta": {"speech_rate_wpm": 190, "fit": "OK"},
+            "beats": [{"at_ms": i * 2000, "src_at_ms": 60000 + i * 2000, "src_length_ms": 2000, "note": "klip"}
+                      for i in range(4)],
+        }
+        return text_response(json.dumps(seg))
+    return text_response("{}")
+
+
+@pytest.fixture
+def srt_job(tmp_path, monkeypatch):
+    import api_handler
+    # Upload file memakai discovery Files API; cukup kembalikan part file yang sudah "terunggah"
+    monkeypatch.setattr(api_handler, "_get_srt_file_part", lambda api_key, srt_path, log=None: dict(FILE_PART))
+    out = tmp_path / "out"
+    out.mkdir()
+    return _write_srt(tmp_path / "film.srt"), str(out)
+
+
+def _run(srt_path, out_dir, logs):
+    import api_handler
+    return api_handler.get_storyboard_from_srt(
+        srt_path, "KEY-TEST", 600, out_dir, language="id", progress_callback=logs.append,
+        recap_minutes=1, storyboard_model="gemini-2.5-flash",
+    )
+
+
+def test_cache_created_once_and_reused(gemini_stub, srt_job):
+    stub = gemini_stub(storyboard_model)
+    logs = []
+    sb = _run(*srt_job, logs)
+
+    assert sb is not None, "\n".join(logs)
+    assert [s["label"] for s in sb["segments"]] == SEGMENTS
+    created = stub.calls("POST", "/cachedContents")
+    assert len(created) == 1
+    cache_name = "cachedContents/stub1"
+    # Cache memuat system prompt + SRT; permintaan berikutnya hanya mereferensikannya
+    body = created[0][1]
+    assert body["contents"][0]["parts"][0]["fileData"]["fileUri"] == FILE_PART["file_data"]["file_uri"]
+    calls = stub.generate_calls()
+    assert len(calls) == 1 + len(SEGMENTS)
+    assert all(c.get("cachedContent") == cache_name for c in calls)
+    assert not any("systemInstruction" in c for c in calls)
+    assert request_text(calls[0]).startswith("# Planner Timeblocks")
+    # Cache milik job ini dihapus di akhir
+    assert stub.calls("DELETE", cache_name)
+    assert cache_name not in stub.caches
+
+
+def test_falls_back_to_full_prompt_when_cache_unavailable(gemini_stub, srt_job):
+    stub = gemini_stub(storyboard_model, cache_enabled=False)
+    logs = []
+    sb = _run(*srt_job, logs)
+
+    assert sb is not None, "\n".join(logs)
+    assert [s["label"] for s in sb["segments"]] == SEGMENTS
+    # Satu percobaan per key; setelah ditolak key ini tidak mencoba membuat cache lagi
+    assert len(stub.calls("POST", "/cachedContents")) == 1
+    assert any("Context cache tidak tersedia" in m for m in logs)
+    calls = stub.generate_calls()
+    assert calls and not any(c.get("cachedContent") for c in calls)
+    planner = calls[0]
+    assert "Planner Timeblocks" in request_text(planner)
+    parts = planner["contents"][0]["parts"]
+    assert any(p.get("fileData", {}).get("fileUri") == FILE_PART["file_data"]["file_uri"] for p in parts)
+    assert not stub.calls("DELETE")
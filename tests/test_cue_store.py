@@ -0,0 +1,85 @@
+# tests/test_cue_store.py
+# Cue store: query rentang (binary search) dibandingkan dengan scan linear, dan cache biner.
+
+import os
+import random
+
+import pytest
+
+import cue_store
+from cue_store import CueStore
+from subtitle_utils import Cue, format_srt
+
+
+def _random_cues(rng, n=300):
+    cues = []
+    for _ in range(n):
+        st = rng.randrange(0, 600000)
+        cues.append(Cue(st, st + rng.choice([0, 50, 400, 2500, 15000]), rng.choice(["halo", "kata", "ĉu ☃", "x y z"])))
+    return cues
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_range_matches_linear_scan(seed):
+    rng = random.Random(seed)
+    cues = _random_cues(rng)
+    store = CueStore.from_cues(cues)
+    ordered = sorted(cues, key=lambda c: c.start_ms)
+    assert list(store) == ordered
+    for _ in range(200):
+        a = rng.randrange(-1000, 620000)
+        b = a + rng.choice([0, 1, 300, 5000, 60000])
+        expected = [c for c in ordered if c.start_ms < b and c.end_ms > a]
+        assert store.range(a, b) == expected
+        assert store.text_between(a, b) == " ".join(c.text for c in expected)
+
+
+def test_text_between_max_chars():
+    store = CueStore.from_cues([Cue(i * 1000, i * 1000 + 900, f"kalimat{i}") for i in range(10)])
+    assert store.text_between(0, 10000, max_chars=20) == "kalimat0 kalimat1 ka"
+    assert store.sample_text(max_chars=12) == "kalimat0 kalimat1"
+
+
+def test_empty_store():
+    store = CueStore.from_cues([])
+    assert len(store) == 0 and store.duration_ms == 0
+    assert store.range(0, 10000) == [] and store.text_between(0, 10000) == ""
+
+
+def test_binary_cache_round_trip(tmp_path):
+    cues = _random_cues(random.Random(3), 50)
+    store = CueStore.from_cues(cues, source_size=123, source_mtime_ns=456)
+    path = str(tmp_path / "x.cues")
+    store.save(path)
+    back = CueStore.read(path)
+    assert list(back) == list(store)
+    assert (back.source_size, back.source_mtime_ns) == (123, 456)
+
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - 3)
+    with pytest.raises(ValueError):
+        CueStore.read(path)
+
+
+def test_load_parses_once_and_invalidates_on_change(tmp_path, isolated_home, monkeypatch):
+    srt = tmp_path / "film.srt"
+    cues = [Cue(0, 1000, "satu"), Cue(1000, 2000, "dua")]
+    srt.write_text(format_srt(cues), encoding="utf-8")
+    parsed = []
+    real_parse = cue_store.parse_srt
+    monkeypatch.setattr(cue_store, "parse_srt", lambda text: parsed.append(1) or real_parse(text))
+
+    first = cue_store.load(str(srt))
+    assert first.cues() == cues and cue_store.cache_path(str(srt)).exists()
+    assert cue_store.load(str(srt)) is first
+    # Proses baru (memo kosong): dibaca dari cache biner, tanpa parse ulang
+    monkeypatch.setattr(cue_store, "_memo", {})
+    assert cue_store.load(str(srt)).cues() == cues
+    assert len(parsed) == 1
+
+    cues2 = cues + [Cue(2000, 3000, "tiga")]
+    srt.write_text(format_srt(cues2), encoding="utf-8")
+    st = os.stat(srt)
+    os.utime(srt, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    assert cue_store.load(str(srt)).cues() == cues2
+    assert len(parsed) == 2
@@ -0,0 +1,51 @@
+# tests/test_delivery.py
+# Delivery: parsing bitrate, pemilihan ladder sesuai tinggi sumber, dan perintah encode satu-decode
+# dengan GOP sejajar di semua rendisi.
+
+import pytest
+
+import delivery
+from delivery import DEFAULT_LADDER, _kbps, _ladder_for
+
+
+@pytest.mark.parametrize("rate, kbps", [("5000k", 5000), (" 128K ", 128), ("2.5M", 2500), ("5m", 5000),
+                                        ("1500000", 1500), (3000000, 3000), ("96.0k", 96)])
+def test_kbps(rate, kbps):
+    assert _kbps(rate) == kbps
+
+
+def _names(rungs):
+    return [r["name"] for r in rungs]
+
+
+def test_ladder_drops_rungs_taller_than_source():
+    assert _names(_ladder_for(None, None)) == ["1080p", "720p", "480p"]
+    assert _names(_ladder_for(None, 1080)) == ["1080p", "720p", "480p"]
+    assert _names(_ladder_for(None, 800)) == ["720p", "480p"]
+    # Sumber lebih kecil dari semua rendisi: rendisi terkecil tetap dibuat
+    assert _names(_ladder_for(None, 360)) == ["480p"]
+
+
+def test_custom_ladder_is_sorted_and_copied():
+    ladder = [{"name": "sd", "height": "360"}, {"name": "fhd", "height": 1080}, {"name": "hd", "height": 720}]
+    rungs = _ladder_for(ladder, 720)
+    assert _names(rungs) == ["hd", "sd"]
+    rungs[0]["height"] = 1
+    assert ladder[2]["height"] == 720 and DEFAULT_LADDER[0]["height"] == 1080
+
+
+def test_encode_ladder_single_decode_aligned_gop(tmp_path, monkeypatch):
+    commands = []
+    monkeypatch.setattr(delivery, "get_video_size", lambda path: (1280, 720))
+    monkeypatch.setattr(delivery, "run_ffmpeg_command", lambda cmd, progress_callback=None: commands.append(cmd) or True)
+    paths = delivery.encode_ladder(str(tmp_path / "final.mp4"), str(tmp_path / "out"))
+    assert [(r["name"], p.name) for r, p in paths] == [("720p", "final_720p.mp4"), ("480p", "final_480p.mp4")]
+    (cmd,) = commands
+    assert cmd.count(" -i ") == 1
+    assert '-filter_complex "[0:v]split=2[s0][s1];[s0]scale=-2:720,setsar=1[v0];[s1]scale=-2:480,setsar=1[v1]"' in cmd
+    gop = delivery.SEGMENT_SEC * delivery.FRAME_RATE
+    assert cmd.count(f"-g {gop} -keyint_min {gop} -sc_threshold 0") == 2
+    assert "-b:v 2800k -maxrate 2996k -bufsize 5600k" in cmd and "-b:a 96k" in cmd
+
+    monkeypatch.setattr(delivery, "run_ffmpeg_command", lambda cmd, progress_callback=None: False)
+    assert delivery.encode_ladder(str(tmp_path / "final.mp4"), str(tmp_path / "out")) == []
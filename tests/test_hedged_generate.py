@@ -0,0 +1,170 @@
+# tests/test_hedged_generate.py
+# Hedged request: hedge setelah persentil latensi, jatah hedge, panggilan yang kalah diselesaikan
+# belakangan, dan reservasi key di scheduler selalu dilepas.
+
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import api_handler
+from api_handler import _hedged_generate, _LatencyStats
+from api_manager import APIManager, KeyScheduler
+
+DELAY = 0.1
+STATS = "test"
+
+
+class FakeModel:
+    """Model palsu per key: menunggu `latency` detik lalu mengembalikan respons atau melempar error."""
+
+    def __init__(self, key, latency, error=None, log=None):
+        self.key, self.latency, self.error, self.log = key, latency, error, log
+        self.done = threading.Event()
+
+    def generate_content(self, prompt, request_options=None):
+        self.log.append((self.key, time.time()))
+        try:
+            time.sleep(self.latency)
+            if self.error:
+                raise RuntimeError(self.error)
+            return SimpleNamespace(text=f"dari {self.key}", usage_metadata=SimpleNamespace(total_token_count=42))
+        finally:
+            self.done.set()
+
+
+@pytest.fixture
+def stats(monkeypatch):
+    s = _LatencyStats()
+    monkeypatch.setattr(api_handler, "_latency_stats", s)
+    monkeypatch.setattr(api_handler, "HEDGE_MIN_DELAY_SEC", DELAY)
+    return s
+
+
+@pytest.fixture
+def sched(isolated_home):
+    am = APIManager()
+    for k in ("K1", "K2"):
+        am.add_key(k)
+    return KeyScheduler(am, {"rpm": 1000, "tpm": 10_000_000, "rpd": 100_000}, model="gemini-2.5-flash")
+
+
+def _models(spec):
+    started = []
+    models = {k: FakeModel(k, lat, err, started) for k, (lat, err) in spec.items()}
+    return models, started
+
+
+def _prime(stats, n=5, sec=0.01):
+    for _ in range(n):
+        stats.record(STATS, sec)
+
+
+def _in_flight(sched):
+    return {k: sched._st(k).in_flight for k in ("K1", "K2")}
+
+
+def _call(sched, models, **kw):
+    key = sched.acquire(est_tokens=100, exclude={"K2"}, max_wait=0)
+    assert key == "K1"
+    return _hedged_generate(sched, key, lambda k: models[k], "prompt", 30, 100, STATS, **kw)
+
+
+def test_percentile_needs_samples_and_has_a_floor(stats):
+    assert stats.percentile(STATS, 90) is None
+    for v in (0.01, 0.02, 0.03, 0.04, 5.0):
+        stats.record(STATS, v)
+    assert stats.percentile(STATS, 50) == DELAY
+    assert stats.percentile(STATS, 100) == 5.0
+
+
+def test_no_hedge_without_samples(stats, sched):
+    models, started = _models({"K1": (0.3, None), "K2": (0.0, None)})
+    resp, k, _ = _call(sched, models, hedge_percentile=90)
+    assert (resp.text, k) == ("dari K1", "K1")
+    assert [s[0] for s in started] == ["K1"]
+    assert _in_flight(sched) == {"K1": 0, "K2": 0}
+    assert stats.percentile(STATS, 50) is None and len(stats._samples[STATS]) == 1
+
+
+def test_fast_primary_is_not_hedged(stats, sched):
+    _prime(stats)
+    models, started = _models({"K1": (0.0, None), "K2": (0.0, None)})
+    assert _call(sched, models, hedge_percentile=90)[1] == "K1"
+    assert [s[0] for s in started] == ["K1"] and stats.hedges == 0
+
+
+def test_hedge_fires_after_percentile_and_loser_is_released(stats, sched):
+    _prime(stats)
+    logs = []
+    models, started = _models({"K1": (0.6, None), "K2": (0.0, None)})
+    resp, k, dt = _call(sched, models, hedge_percentile=90, log=logs.append)
+    assert (resp.text, k) == ("dari K2", "K2")
+    (k1, t1), (k2, t2) = started
+    assert (k1, k2) == ("K1", "K2") and t2 - t1 >= DELAY * 0.9
+    assert dt < 0.6 and any("hedge ke key lain" in m for m in logs)
+    assert stats.hedges == 1
+    # Panggilan yang kalah tidak bisa dibatalkan SDK: reservasinya dilepas begitu selesai
+    assert _in_flight(sched)["K1"] == 1
+    assert models["K1"].done.wait(2)
+    time.sleep(0.05)
+    assert _in_flight(sched) == {"K1": 0, "K2": 0}
+
+
+def test_losing_call_error_is_reported(stats, sched):
+    _prime(stats)
+    errors = []
+    models, _ = _models({"K1": (0.4, "500 Internal error"), "K2": (0.0, None)})
+    assert _call(sched, models, hedge_percentile=90, on_error=lambda k, e: errors.append(k))[1] == "K2"
+    assert models["K1"].done.wait(2)
+    time.sleep(0.05)
+    assert _in_flight(sched) == {"K1": 0, "K2": 0}
+    assert sched._st("K1").transient_failures == 1
+    # on_error hanya untuk kegagalan yang masih ditunggu pemanggil
+    assert errors == []
+
+
+def test_both_fail_raises_and_releases(stats, sched):
+    _prime(stats)
+    errors = []
+    models, _ = _models({"K1": (0.3, "500 primary"), "K2": (0.0, "500 hedge")})
+    with pytest.raises(RuntimeError, match="primary"):
+        _call(sched, models, hedge_percentile=90, on_error=lambda k, e: errors.append(k))
+    assert errors == ["K2", "K1"]
+    assert _in_flight(sched) == {"K1": 0, "K2": 0}
+
+
+def test_unhedged_error_is_reported(stats, sched):
+    errors = []
+    models, _ = _models({"K1": (0.0, "429 quota"), "K2": (0.0, None)})
+    with pytest.raises(RuntimeError):
+        _call(sched, models, on_error=lambda k, e: errors.append(k))
+    assert errors == ["K1"] and _in_flight(sched)["K1"] == 0
+    assert sched._st("K1").quota_failures == 1
+
+
+def test_hedge_budget_is_capped(stats, sched):
+    n_hedged = 0
+    for _ in range(12):
+        # Sampel lambat yang tidak di-hedge ikut menaikkan persentil; di sini hanya jatahnya yang diuji
+        stats._samples.clear()
+        _prime(stats)
+        models, started = _models({"K1": (0.2, None), "K2": (0.0, None)})
+        _call(sched, models, hedge_percentile=90)
+        n_hedged += len(started) == 2
+        assert models["K1"].done.wait(2)
+        time.sleep(0.02)
+    # 1 jatah awal + 10% dari panggilan
+    assert n_hedged == stats.hedges == 2
+    assert stats.calls == 12
+    assert _in_flight(sched) == {"K1": 0, "K2": 0}
+
+
+def test_no_idle_second_key_gives_hedge_back(stats, sched):
+    _prime(stats)
+    sched.am.keys = ["K1"]
+    models, started = _models({"K1": (0.3, None), "K2": (0.0, None)})
+    assert _call(sched, models, hedge_percentile=90)[1] == "K1"
+    assert [s[0] for s in started] == ["K1"] and stats.hedges == 0
+    assert _in_flight(sched)["K1"] == 0
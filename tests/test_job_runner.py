@@ -0,0 +1,186 @@
+# tests/test_job_runner.py
+# Runner headless: run_job (VO, executor TTS, budget), run_batch dan exit code restorymaker.
+# TTS, storyboard Gemini dan render diganti fungsi palsu; yang diuji alur dan ringkasannya.
+
+import json
+import os
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("langdetect")  # job_runner -> language_detector
+
+import api_handler  # noqa: E402
+import job_runner  # noqa: E402
+import restorymaker  # noqa: E402
+import video_processor  # noqa: E402
+from api_manager import APIManager  # noqa: E402
+
+LABELS = ["Intro", "Ending"]
+
+
+def _segment(label):
+    return {"label": label, "vo_language": "id", "target_vo_duration_sec": 10, "vo_script": f"Narasi {label}.",
+            "vo_meta": {"speech_rate_wpm": 190, "fit": "OK"},
+            "beats": [{"at_ms": 0, "src_at_ms": 1000, "src_length_ms": 2000}]}
+
+
+@pytest.fixture
+def env(isolated_home, tmp_path, monkeypatch):
+    """Key tersimpan, video + storyboard di tmp, TTS dan render palsu yang mencatat panggilannya."""
+    APIManager().add_key("KEY-1")
+    video = tmp_path / "film.mp4"
+    video.write_bytes(b"\0" * 16)
+    sb = tmp_path / "storyboard.json"
+    sb.write_text(json.dumps({"segments": [_segment(lab) for lab in LABELS]}), encoding="utf-8")
+    calls = {"tts": [], "render": []}
+
+    def fake_tts(vo_script, api_key, output_path, **kw):
+        calls["tts"].append((vo_script, api_key))
+        with open(output_path, "wb") as f:
+            f.write(b"RIFF")
+        return True
+
+    def fake_render(storyboard, mp4, vo_audio_map, user_settings, stop_event, log, language_vo_maps=None):
+        calls["render"].append(dict(user_settings))
+        return user_settings["output_path"]
+
+    monkeypatch.setattr(api_handler, "generate_vo_audio", fake_tts)
+    monkeypatch.setattr(video_processor, "process_video", fake_render)
+    return {"tmp": tmp_path, "video": str(video), "storyboard": str(sb), "calls": calls}
+
+
+def _job(env, name="film", **over):
+    job = {"name": name, "video": env["video"], "storyboard": env["storyboard"], "language": "id",
+           "segments": LABELS, "output_folder": str(env["tmp"] / f"out_{name}")}
+    job.update(over)
+    return job
+
+
+def test_run_job_renders_from_storyboard_file(env):
+    logs = []
+    summary = job_runner.run_job(_job(env), progress_callback=logs.append, budget=job_runner.Budget(2, 1))
+    assert summary["status"] == job_runner.STATUS_OK, logs
+    assert summary["outputs"] == [str(env["tmp"] / "out_film" / "film_recap.mp4")]
+    assert set(summary["stages"]) == {"vo", "render"}
+    # Satu panggilan TTS per segmen; rotasi key terjadi di dalam generate_vo_audio
+    assert env["calls"]["tts"] == [("Narasi Intro.", "KEY-1"), ("Narasi Ending.", "KEY-1")]
+    settings = env["calls"]["render"][0]
+    assert settings["cpu_workers"] == max(1, (os.cpu_count() or 2) // 2)
+    assert sorted(settings["_vo_gain_applied"]) == sorted(LABELS)
+
+
+def test_run_job_never_raises(env, monkeypatch):
+    summary = job_runner.run_job(_job(env, video=""), progress_callback=lambda m: None)
+    assert summary["status"] == job_runner.STATUS_FAILED and "MP4" in summary["error"]
+
+    monkeypatch.setattr(api_handler, "generate_vo_audio", lambda *a, **kw: False)
+    summary = job_runner.run_job(_job(env), progress_callback=lambda m: None)
+    assert summary["status"] == job_runner.STATUS_FAILED and "Intro" in summary["error"]
+    assert "elapsed_sec" in summary
+
+
+def test_run_job_stopped(env):
+    stop = threading.Event()
+    stop.set()
+    summary = job_runner.run_job(_job(env), stop, progress_callback=lambda m: None)
+    assert summary["status"] == job_runner.STATUS_STOPPED
+    assert env["calls"]["render"] == []
+
+
+def test_streamed_vo_executor_is_shut_down_when_storyboard_fails(env, monkeypatch):
+    import concurrent.futures
+    executors = []
+
+    class RecordingExecutor(concurrent.futures.ThreadPoolExecutor):
+        def __init__(self, *a, **kw):
+            super().__init__(*a, **kw)
+            executors.append(self)
+
+    started = threading.Event()
+
+    def slow_tts(vo_script, api_key, output_path, **kw):
+        started.set()
+        time.sleep(0.2)
+        env["calls"]["tts"].append(vo_script)
+        return True
+
+    def storyboard_then_fail(*a, on_segment=None, **kw):
+        for lab in LABELS:
+            on_segment(_segment(lab))
+        started.wait(5)
+        raise RuntimeError("stream putus")
+
+    monkeypatch.setattr(concurrent.futures, "ThreadPoolExecutor", RecordingExecutor)
+    monkeypatch.setattr(api_handler, "generate_vo_audio", slow_tts)
+    monkeypatch.setattr(api_handler, "get_storyboard_from_srt_fast", storyboard_then_fail)
+    monkeypatch.setattr(job_runner.ffmpeg_utils, "get_duration", lambda p: 600.0)
+    srt = env["tmp"] / "film.srt"
+    srt.write_text("1\n00:00:01,000 --> 00:00:02,000\nHalo.\n", encoding="utf-8")
+
+    summary = job_runner.run_job(_job(env, storyboard="", srt=str(srt)), progress_callback=lambda m: None)
+    assert summary["status"] == job_runner.STATUS_FAILED and "stream putus" in summary["error"]
+    (ex,) = executors
+    assert ex._shutdown
+    # TTS yang sedang jalan ditunggu, yang belum mulai dibatalkan
+    assert env["calls"]["tts"] == ["Narasi Intro."]
+
+
+def test_run_batch_reports_conflicts_and_writes_summaries(env):
+    jobs = [job_runner.normalize_job(_job(env, "a")), job_runner.normalize_job(_job(env, "b")),
+            job_runner.normalize_job(_job(env, "c", output_folder=str(env["tmp"] / "out_a")))]
+    summaries = job_runner.run_batch(jobs, max_jobs=2, budget=job_runner.Budget(1, 1), log_factory=lambda j: lambda m: None)
+    assert [s["status"] for s in summaries] == [job_runner.STATUS_OK, job_runner.STATUS_OK, job_runner.STATUS_FAILED]
+    assert "output_folder sama" in summaries[2]["error"]
+    with open(env["tmp"] / "out_b" / "b_summary.json", encoding="utf-8") as f:
+        assert json.load(f)["status"] == job_runner.STATUS_OK
+
+
+def test_run_batch_stopped_before_start(env):
+    stop = threading.Event()
+    stop.set()
+    summaries = job_runner.run_batch([job_runner.normalize_job(_job(env))], stop_event=stop,
+                                     log_factory=lambda j: lambda m: None)
+    assert summaries[0]["status"] == job_runner.STATUS_STOPPED
+
+
+# ---- restorymaker CLI ----
+
+def _write_job(env, name, **over):
+    path = env["tmp"] / f"{name}.json"
+    path.write_text(json.dumps(_job(env, name, **over)), encoding="utf-8")
+    return str(path)
+
+
+def test_cli_run_ok(env):
+    assert restorymaker.main(["run", _write_job(env, "ok"), "--quiet"]) == restorymaker.EXIT_OK
+    assert (env["tmp"] / "out_ok" / "ok.log").exists()
+
+
+def test_cli_usage_errors(env, capsys):
+    assert restorymaker.main(["batch", str(env["tmp"] / "nothing-*.json")]) == restorymaker.EXIT_USAGE
+    assert restorymaker.main(["run", str(env["tmp"] / "missing.json")]) == restorymaker.EXIT_USAGE
+    bad = env["tmp"] / "bad.json"
+    bad.write_text(json.dumps({"name": "bad", "typo_key": 1}), encoding="utf-8")
+    assert restorymaker.main(["run", str(bad)]) == restorymaker.EXIT_USAGE
+    assert restorymaker.main(["run", _write_job(env, "nofolder", output_folder="")]) == restorymaker.EXIT_USAGE
+    dup = [_write_job(env, "d1"), _write_job(env, "d2", output_folder=str(env["tmp"] / "out_d1"))]
+    assert restorymaker.main(["batch", *dup]) == restorymaker.EXIT_USAGE
+    assert "output_folder sama" in capsys.readouterr().err
+
+
+def test_cli_batch_exit_codes_follow_job_status(env, monkeypatch):
+    paths = [_write_job(env, "j1"), _write_job(env, "j2")]
+    summary_path = env["tmp"] / "batch.json"
+    assert restorymaker.main(["batch", *paths, "--quiet", "--summary", str(summary_path)]) == restorymaker.EXIT_OK
+    assert json.loads(summary_path.read_text(encoding="utf-8"))["exit_code"] == restorymaker.EXIT_OK
+
+    def fake_run_job(status):
+        return lambda job, *a, **kw: {"name": job["name"], "status": status if job["name"] == "j2" else "ok",
+                                      "outputs": [], "error": None, "stages": {}, "elapsed_sec": 0.0}
+
+    monkeypatch.setattr(job_runner, "run_job", fake_run_job(job_runner.STATUS_FAILED))
+    assert restorymaker.main(["batch", *paths, "--quiet"]) == restorymaker.EXIT_FAILED
+    monkeypatch.setattr(job_runner, "run_job", fake_run_job(job_runner.STATUS_STOPPED))
+    assert restorymaker.main(["batch", *paths, "--quiet"]) == restorymaker.EXIT_STOPPED
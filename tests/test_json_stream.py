@@ -0,0 +1,82 @@
+# tests/test_json_stream.py
+# SegmentStreamParser: hasil harus sama berapa pun potongan stream-nya.
+
+import json
+import random
+
+import pytest
+
+from json_stream import SegmentStreamParser
+
+DOC = {
+    "film_meta": {"title": "Judul \"kutip\" {kurung} [siku]", "duration_sec": 5400},
+    "recap": {"intro": "a, b: c", "ending": "\\ backslash é ☃"},
+    "segments": [
+        {"label": "Intro", "vo_script": "Kalimat } dengan ] kurung, dan \"kutip\".",
+         "beats": [{"at_ms": 0, "src_at_ms": 1200, "src_length_ms": 2000, "note": "{[ ]}"}]},
+        {"label": "Rising", "vo_script": "Dua", "vo_meta": {"speech_rate_wpm": 200, "fit": "OK"}, "beats": []},
+        {"label": "Ending", "vo_script": "Tiga\nbaris", "beats": [{"at_ms": 0, "src_at_ms": 0, "src_length_ms": 900}]},
+    ],
+}
+
+
+def _random_chunks(text: str, rng: random.Random) -> list[str]:
+    chunks, i = [], 0
+    while i < len(text):
+        n = rng.choice([1, 1, 2, 3, 7, 16, 64])
+        chunks.append(text[i:i + n])
+        i += n
+    return chunks
+
+
+def _feed(text: str, chunks: list[str]):
+    parser = SegmentStreamParser()
+    emitted = []
+    for ch in chunks:
+        emitted.extend(parser.feed(ch))
+    return parser, emitted
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_random_chunking_yields_same_segments(seed):
+    rng = random.Random(seed)
+    text = json.dumps(DOC, ensure_ascii=rng.random() < 0.5, indent=rng.choice([None, 2]))
+    if rng.random() < 0.3:
+        text = "```json\n" + text + "\n```"
+    parser, emitted = _feed(text, _random_chunks(text, rng))
+
+    assert emitted == DOC["segments"]
+    assert parser.items == DOC["segments"]
+    assert parser.complete
+    assert parser.fields["film_meta"] == DOC["film_meta"]
+    assert parser.fields["recap"] == DOC["recap"]
+    assert parser.result() == DOC
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_truncated_stream_keeps_closed_segments(seed):
+    rng = random.Random(seed)
+    text = json.dumps(DOC)
+    cut = rng.randrange(1, len(text))
+    parser, emitted = _feed(text[:cut], _random_chunks(text[:cut], rng))
+
+    # Segmen yang dikeluarkan adalah tepat segmen yang sudah lengkap sebelum titik potong
+    closed = [s for s in DOC["segments"] if text.find(json.dumps(s)) + len(json.dumps(s)) <= cut]
+    assert emitted == closed
+    assert not parser.complete
+    res = parser.result()
+    if closed:
+        assert res["segments"] == closed
+
+
+def test_text_after_document_is_ignored():
+    parser = SegmentStreamParser()
+    out = parser.feed(json.dumps(DOC) + '\n{"segments": [{"label": "Bonus"}]}')
+    assert out == DOC["segments"]
+    assert parser.feed('{"segments": [{"label": "Lagi"}]}') == []
+
+
+def test_custom_array_key():
+    parser = SegmentStreamParser(array_key="events")
+    out = parser.feed('{"wireMagic": "pb3", "events": [{"tStartMs": 0}, {"tStartMs": 10, "segs": [{"utf8": "}"}]}]}')
+    assert out == [{"tStartMs": 0}, {"tStartMs": 10, "segs": [{"utf8": "}"}]}]
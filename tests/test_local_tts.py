@@ -0,0 +1,82 @@
+# tests/test_local_tts.py
+# Backend TTS lokal tanpa chatterbox: paket kalimat per panggilan generate dan cache conditioning
+# pembicara (memori worker + disk).
+
+import random
+
+import pytest
+
+import local_tts
+from local_tts import pack_sentences
+
+
+def test_pack_sentences_keeps_whole_sentences_under_limit():
+    text = "Satu dua tiga. Empat lima enam! Tujuh delapan? Sembilan sepuluh… Sebelas."
+    assert pack_sentences(text, max_chars=32) == ["Satu dua tiga. Empat lima enam!", "Tujuh delapan? Sembilan sepuluh…",
+                                                  "Sebelas."]
+    assert pack_sentences("", 50) == [] and pack_sentences("  \n ", 50) == []
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_pack_sentences_loses_nothing_and_respects_limit(seed):
+    rng = random.Random(seed)
+    words = ["kata", "panjang", "sekali,", "dia", "pergi", "ke", "kota"]
+    sentences = [" ".join(rng.choice(words) for _ in range(rng.randrange(1, 80))) + rng.choice(".!?")
+                 for _ in range(rng.randrange(1, 15))]
+    text = " ".join(sentences)
+    packs = pack_sentences(text, max_chars=120)
+    assert all(0 < len(p) <= 120 for p in packs)
+    assert " ".join(packs).split() == text.split()
+
+
+class FakeConds:
+    loads = 0
+
+    def __init__(self, voice):
+        self.voice = voice
+
+    def save(self, path):
+        path.write_text(self.voice, encoding="utf-8")
+
+    @classmethod
+    def load(cls, path, map_location=None):
+        cls.loads += 1
+        return cls(path.read_text(encoding="utf-8"))
+
+
+class FakeModel:
+    def __init__(self):
+        self.conds = FakeConds("default")
+        self.prepared = []
+
+    def prepare_conditionals(self, path, exaggeration=0.5):
+        self.prepared.append(path)
+        self.conds = FakeConds(f"voice:{path}")
+
+
+def test_speaker_conditioning_is_computed_once_per_voice(tmp_path, monkeypatch):
+    monkeypatch.setattr(local_tts, "CONDS_CACHE_DIR", tmp_path / "conds")
+    monkeypatch.setattr(local_tts, "_conds", {})
+    monkeypatch.setattr(FakeConds, "loads", 0)
+    voice = tmp_path / "voice.wav"
+    voice.write_bytes(b"RIFF")
+
+    model = FakeModel()
+    for _ in range(3):
+        local_tts._apply_conds(model, "cpu", str(voice), 0.5, False)
+    assert model.prepared == [str(voice)] and model.conds.voice == f"voice:{voice}"
+    assert len(list((tmp_path / "conds").iterdir())) == 1
+
+    # Worker baru (memori kosong): conditioning dibaca dari disk, bukan dihitung ulang
+    monkeypatch.setattr(local_tts, "_conds", {})
+    fresh = FakeModel()
+    local_tts._apply_conds(fresh, "cpu", str(voice), 0.5, False)
+    assert fresh.prepared == [] and fresh.conds.voice == f"voice:{voice}" and FakeConds.loads == 1
+
+    # Exaggeration lain = conditioning lain
+    local_tts._apply_conds(fresh, "cpu", str(voice), 0.8, False)
+    assert fresh.prepared == [str(voice)]
+    # Tanpa voice prompt: conditioning bawaan model tidak disentuh
+    plain = FakeModel()
+    local_tts._apply_conds(plain, "cpu", "", 0.5, False)
+    assert plain.conds.voice == "default" and plain.prepared == []
@@ -0,0 +1,116 @@
+# tests/test_shot_index.py
+# Indeks shot: snap titik potong ke batas terdekat di dalam [lo, hi], deteksi cut pada frame
+# sintetis, dan kunci cache ~/.restorymaker_shots yang mengikuti isi film.
+
+import numpy as np
+import pytest
+
+import shot_index
+from shot_index import ShotIndex, content_hash, detect_boundaries
+
+W, H = shot_index.ANALYSIS_SIZE
+
+
+@pytest.fixture
+def index():
+    return ShotIndex([20000, 10000, 12000, 15000, 15000], 30.0)
+
+
+def test_boundaries_are_sorted_and_unique(index):
+    assert index.boundaries_ms.tolist() == [10000, 12000, 15000, 20000]
+    assert index.boundaries_between(11.0, 15.0).tolist() == [12.0, 15.0]
+
+
+def test_snap_cut_snaps_both_ends_to_nearest_boundary(index):
+    assert index.snap_cut(10.3, 4.5) == (10.0, 5.0)
+    assert index.snap_cut(11.7, 3.1) == (12.0, 3.0)
+
+
+def test_no_snap_when_nearest_boundary_is_out_of_range(index):
+    # 10.0 di bawah lo: start tetap; akhir tetap snap ke 15.0
+    start, dur = index.snap_cut(10.3, 4.5, lo_sec=10.2)
+    assert start == 10.3 and round(start + dur, 6) == 15.0
+    # 15.0 di atas hi dan 12.0 di luar toleransi: akhir tidak dipindah
+    start, dur = index.snap_cut(10.3, 4.5, hi_sec=14.9)
+    assert start == 10.0 and round(start + dur, 6) == 14.8
+
+
+def test_no_snap_beyond_tolerance_or_below_min_duration(index):
+    assert index.snap_cut(16.5, 2.0) == (16.5, 2.0)
+    # Kedua ujung ke batas yang sama -> klip kolaps: nilai asli dipakai
+    assert index.snap_cut(11.8, 0.3, min_dur_sec=0.5) == (11.8, 0.3)
+    assert ShotIndex([], 30.0).snap_cut(10.3, 4.5) == (10.3, 4.5)
+
+
+def _scene(rng, n, level, drift=0.0):
+    base = np.clip(level + rng.normal(0, 4, size=(H, W)), 0, 255)
+    return [np.clip(base + drift * i + rng.normal(0, 2, size=(H, W)), 0, 255) for i in range(n)]
+
+
+def test_detect_boundaries_on_synthetic_hard_cuts():
+    rng = np.random.default_rng(0)
+    # Scene gelap, cut ke scene terang, cut ke gradasi; di dalam scene hanya noise dan perubahan pelan
+    grad = np.tile(np.linspace(0, 255, W), (H, 1))
+    frames = _scene(rng, 30, 40, drift=0.5) + _scene(rng, 25, 200) + [grad + rng.normal(0, 2, size=(H, W)) for _ in range(20)]
+    frames = np.clip(np.stack(frames), 0, 255).astype(np.uint8)
+    assert detect_boundaries(frames).tolist() == [30, 55]
+
+
+def test_detect_boundaries_ignores_gradual_fade_and_short_input():
+    rng = np.random.default_rng(1)
+    # Fade pelan pada gambar bertekstur (gradasi + noise): tidak ada cut
+    grad = np.tile(np.linspace(0, 160, W), (H, 1))
+    frames = np.stack([grad + 2 * i + rng.normal(0, 2, size=(H, W)) for i in range(50)])
+    assert detect_boundaries(np.clip(frames, 0, 255).astype(np.uint8)).tolist() == []
+    assert detect_boundaries(np.zeros((1, H, W), dtype=np.uint8)).tolist() == []
+
+
+def test_content_hash_follows_sampled_content(tmp_path):
+    film = tmp_path / "film.mp4"
+    data = bytearray(np.random.default_rng(2).integers(0, 256, 4 << 20, dtype=np.uint8).tobytes())
+    film.write_bytes(bytes(data))
+    h0 = content_hash(str(film))
+    assert content_hash(str(film)) == h0
+    data[0] ^= 0xFF  # blok sampel pertama
+    film.write_bytes(bytes(data))
+    assert content_hash(str(film)) != h0
+    film.write_bytes(bytes(data) + b"\0")
+    assert content_hash(str(film)) != h0
+
+
+def test_load_or_build_caches_by_content(isolated_home, tmp_path, monkeypatch):
+    film = tmp_path / "film.mp4"
+    film.write_bytes(b"A" * 1000)
+    calls = []
+
+    def fake_analyze(path, duration_sec, progress_callback=None, workers=None):
+        calls.append(workers)
+        return ShotIndex([1000 * (len(calls) + 1)], duration_sec)
+
+    monkeypatch.setattr(shot_index, "analyze", fake_analyze)
+    first = shot_index.load_or_build(str(film), 30.0, workers=3)
+    assert first.boundaries_ms.tolist() == [2000] and calls == [3]
+    cache_dir = isolated_home / ".restorymaker_shots"
+    assert [p.name for p in cache_dir.iterdir()] == [f"{content_hash(str(film))}.npy"]
+    assert shot_index.load_or_build(str(film), 30.0) is first
+
+    # Proses baru: dibaca dari cache, tanpa analisis ulang
+    monkeypatch.setattr(shot_index, "_memo", {})
+    again = shot_index.load_or_build(str(film), 30.0)
+    assert again.boundaries_ms.tolist() == [2000] and again.duration == 30.0 and len(calls) == 1
+
+    # Isi berubah (ukuran sama): kunci baru, analisis ulang, cache lama tidak dipakai
+    film.write_bytes(b"B" * 1000)
+    changed = shot_index.load_or_build(str(film), 30.0)
+    assert changed.boundaries_ms.tolist() == [3000] and len(calls) == 2
+    assert len(list(cache_dir.glob("*.npy"))) == 2
+
+
+def test_load_or_build_returns_none_when_analysis_fails(isolated_home, tmp_path, monkeypatch):
+    film = tmp_path / "film.mp4"
+    film.write_bytes(b"x" * 10)
+    monkeypatch.setattr(shot_index, "analyze", lambda *a, **kw: (_ for _ in ()).throw(OSError("ffmpeg tidak ada")))
+    logs = []
+    assert shot_index.load_or_build(str(film), 30.0, logs.append) is None
+    assert any("gagal" in m for m in logs)
+    assert shot_index.load_or_build(str(tmp_path / "missing.mp4"), 30.0) is None
@@ -0,0 +1,87 @@
+# tests/test_speech_rate.py
+# Model kecepatan bicara: fit least squares dari chunk TTS yang tercatat, dan fallback ke rumus
+# default yang diskalakan saat fit penuh menghasilkan koefisien yang tidak masuk akal.
+
+import numpy as np
+import pytest
+
+import speech_rate
+from speech_rate import SpeechRateStore, default_model, fit_model
+
+
+def _rows(a, b, c, d, n=40, seed=0, noise=0.05):
+    rng = np.random.default_rng(seed)
+    rows = []
+    for _ in range(n):
+        w, s, k = int(rng.integers(10, 60)), int(rng.integers(1, 6)), int(rng.integers(0, 6))
+        rows.append({"words": w, "sentences": s, "commas": k,
+                     "duration": a * w + b * s + c * k + d + float(rng.normal(0, noise))})
+    return rows
+
+
+def _is_scaled_default(m, wpm=speech_rate.DEFAULT_WPM):
+    base = default_model(wpm)
+    k = m.sec_per_word / base.sec_per_word
+    return (m.intercept == 0.0 and k > 0
+            and m.sec_per_sentence == pytest.approx(base.sec_per_sentence * k)
+            and m.sec_per_comma == pytest.approx(base.sec_per_comma * k))
+
+
+def test_uncalibrated_until_enough_usable_rows():
+    rows = _rows(0.3, 0.3, 0.1, 0.2, n=3)
+    rows += [{"words": 0, "sentences": 0, "commas": 0, "duration": 2.0},
+             {"words": 2, "sentences": 1, "commas": 0, "duration": 0.6}]  # terlalu pendek untuk fit
+    m = fit_model(rows)
+    assert m.samples == 3 and not m.calibrated
+    assert m._replace(samples=0) == default_model()
+
+
+def test_full_fit_recovers_coefficients():
+    m = fit_model(_rows(0.28, 0.35, 0.15, 0.4))
+    assert m.calibrated and m.samples == 40
+    assert m.sec_per_word == pytest.approx(0.28, abs=0.01)
+    assert m.sec_per_sentence == pytest.approx(0.35, abs=0.05)
+    assert m.sec_per_comma == pytest.approx(0.15, abs=0.05)
+    assert m.intercept == pytest.approx(0.4, abs=0.3)
+    assert m.predict_text("Satu dua tiga, empat. Lima enam.") == pytest.approx(
+        0.4 + 6 * 0.28 + 2 * 0.35 + 0.15, abs=0.3)
+
+
+def test_few_rows_use_scaled_default():
+    # 4..7 baris: hanya satu faktor skala, tanpa intercept
+    slow = fit_model(_rows(0.4, 0.3, 0.12, 0.0, n=6, noise=0.0))
+    assert slow.calibrated and _is_scaled_default(slow)
+    assert slow.sec_per_word > default_model().sec_per_word
+
+
+@pytest.mark.parametrize("coefs", [
+    (0.3, -0.6, 0.1, 0.0),   # kalimat "memperpendek" durasi
+    (0.3, 0.3, -0.4, 0.0),   # koma negatif
+    (0.3, 0.3, 0.1, 9.0),    # intercept tidak wajar
+])
+def test_non_physical_fit_falls_back_to_scaled_default(coefs):
+    rows = _rows(*coefs, n=30)
+    a, b, c, d = np.linalg.lstsq(np.array([[r["words"], r["sentences"], r["commas"], 1.0] for r in rows]),
+                                 np.array([r["duration"] for r in rows]), rcond=None)[0]
+    assert b < 0 or c < 0 or abs(d) > 5.0  # fit penuh memang tidak fisis
+    m = fit_model(rows)
+    assert _is_scaled_default(m)
+    assert m.sec_per_sentence >= 0 and m.sec_per_comma >= 0
+    assert m.words_for(10.0) >= 1 and m.predict(0) == 0.0
+
+
+def test_store_records_persist_and_invalidate_model(isolated_home):
+    store = SpeechRateStore()
+    key = speech_rate.voice_key("gemini", "Kore", "id-ID")
+    assert store.model(key).samples == 0
+    text = "Dia berjalan pelan ke pasar, lalu berhenti. Semua orang menoleh."
+    for dur in (4.0, 4.2, 3.9):
+        store.record(key, text, dur)
+    store.record(key, text, 0.5)  # di bawah MIN_CHUNK_SEC: diabaikan
+    assert not store.model(key).calibrated and store.model(key).samples == 3
+    store.record(key, text, 4.1)
+    m = store.model(key)
+    assert m.calibrated and m.predict_text(text) == pytest.approx(4.05, abs=0.2)
+    # Proses baru membaca catatan dari home
+    assert SpeechRateStore().model(key) == m
+    assert store.model(None) == default_model()
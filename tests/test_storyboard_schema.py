@@ -0,0 +1,96 @@
+# tests/test_storyboard_schema.py
+# Validator storyboard: koreksi yang aman dilaporkan sebagai fixed, kesalahan nyata sebagai error.
+
+from storyboard_schema import SEGMENT_LABELS, errors_only, format_issues, validate_segment, validate_storyboard
+
+
+def _segment(**over):
+    seg = {
+        "label": "Intro",
+        "vo_language": "id",
+        "target_vo_duration_sec": 60,
+        "vo_script": "Narasi pembuka.",
+        "vo_meta": {"speech_rate_wpm": 190, "fit": "OK"},
+        "beats": [{"at_ms": 0, "src_at_ms": 1000, "src_length_ms": 2000}],
+    }
+    seg.update(over)
+    return seg
+
+
+def test_valid_segment_has_no_issues():
+    seg, issues = validate_segment(_segment())
+    assert issues == []
+    assert seg == _segment()
+
+
+def test_coercions_are_fixed_not_errors():
+    seg, issues = validate_segment(_segment(
+        label="intro",
+        target_vo_duration_sec="60,5",
+        vo_meta={"speech_rate_wpm": "190", "fit": "ok"},
+        beats={"at_ms": 0.0, "src_at_ms": 1000.4, "src_length_ms": 2000},
+    ))
+    assert issues and not errors_only(issues)
+    assert seg["label"] == "Intro"
+    assert seg["target_vo_duration_sec"] == 60.5
+    assert seg["vo_meta"] == {"speech_rate_wpm": 190, "fit": "OK"}
+    assert seg["beats"] == [{"at_ms": 0, "src_at_ms": 1000, "src_length_ms": 2000}]
+    paths = {i.path for i in issues}
+    assert {"label", "target_vo_duration_sec", "vo_meta.speech_rate_wpm", "vo_meta.fit", "beats"} <= paths
+
+
+def test_missing_required_fields_use_defaults_except_vo_script():
+    seg = _segment(vo_language=None)
+    for k in ("target_vo_duration_sec", "vo_meta", "beats", "vo_script"):
+        seg.pop(k)
+    out, issues = validate_segment(seg, language="en")
+    errs = errors_only(issues)
+    assert [e.path for e in errs] == ["vo_script"]
+    assert out["vo_language"] == "en"
+    assert out["target_vo_duration_sec"] == 180
+    assert out["vo_meta"] == {"speech_rate_wpm": 160, "fit": "OK"}
+    assert out["beats"] == []
+
+
+def test_missing_at_ms_continues_from_previous_beat():
+    seg, issues = validate_segment(_segment(beats=[
+        {"at_ms": 0, "src_at_ms": 0, "src_length_ms": 1500},
+        {"src_at_ms": 9000, "src_length_ms": 800},
+        {"src_at_ms": 12000, "src_length_ms": 1000},
+    ]))
+    assert not errors_only(issues)
+    assert [b["at_ms"] for b in seg["beats"]] == [0, 1500, 2300]
+    assert [i.path for i in issues] == ["beats[1].at_ms", "beats[2].at_ms"]
+
+
+def test_real_errors_are_reported_with_paths():
+    seg, issues = validate_segment(_segment(label="Prolog", beats="none", vo_script=["x"]))
+    errs = errors_only(issues)
+    assert {e.path for e in errs} == {"label", "beats", "vo_script"}
+    assert "ERROR: label" in format_issues(issues)
+
+
+def test_bad_beat_values_are_errors():
+    seg, issues = validate_segment(_segment(beats=[{"at_ms": 0, "src_at_ms": "awal", "src_length_ms": 900}]))
+    assert [e.path for e in errors_only(issues)] == ["beats[0].src_at_ms"]
+
+
+def test_storyboard_prefixes_segment_paths():
+    sb = {"film_meta": {"title": 7, "duration_sec": "5400"},
+          "segments": [_segment(label=lab) for lab in SEGMENT_LABELS[:2]] + [_segment(vo_script=None)]}
+    out, issues = validate_storyboard(sb, language="id")
+    assert out["film_meta"] == {"title": "7", "duration_sec": 5400.0}
+    assert [e.path for e in errors_only(issues)] == ["segments[2].vo_script"]
+
+
+def test_storyboard_shape_errors():
+    assert errors_only(validate_storyboard([])[1])[0].path == ""
+    assert [e.path for e in errors_only(validate_storyboard({"recap": {}})[1])] == ["segments"]
+    out, issues = validate_storyboard({"segments": _segment()})
+    assert not errors_only(issues) and len(out["segments"]) == 1
+
+
+def test_format_issues_limit():
+    issues = validate_segment(_segment(beats=[{"src_at_ms": i, "src_length_ms": 1} for i in range(15)]))[1]
+    text = format_issues(issues, limit=3)
+    assert text.count("\n") == 3 and text.endswith("(12 lainnya)")
@@ -0,0 +1,146 @@
+# tests/test_subtitle_utils.py
+# Kompaksi SRT untuk prompt (dedupe caption bergulir, gabung kalimat, pemetaan balik ke ms)
+# dan penjahitan transkrip jendela audio bertumpuk.
+
+import random
+
+import pytest
+
+from subtitle_utils import (
+    Cue,
+    compact_cues,
+    compact_srt_file,
+    dedupe_rolling,
+    format_srt,
+    merge_sentences,
+    parse_srt,
+    stitch_windows,
+)
+
+
+def test_dedupe_rolling_trims_youtube_rolling_captions():
+    cues = [
+        Cue(0, 2000, "we have to leave"),
+        Cue(2000, 4000, "we have to leave right now"),
+        Cue(4000, 6000, "right now before they come"),
+    ]
+    assert [c.text for c in dedupe_rolling(cues)] == ["we have to leave", "right now", "before they come"]
+
+
+def test_dedupe_rolling_fully_repeated_cue_extends_previous():
+    cues = [Cue(0, 2000, "hold on"), Cue(1500, 3500, "hold on")]
+    assert dedupe_rolling(cues) == [Cue(0, 3500, "hold on")]
+
+
+def test_dedupe_rolling_keeps_real_word_repeats():
+    # Regresi: SRT word-level dengan pengulangan asli tidak boleh kehilangan kata
+    words = [Cue(0, 300, "no"), Cue(300, 600, "no"), Cue(700, 1000, "go,"), Cue(1000, 1300, "go")]
+    assert dedupe_rolling(words) == words
+    assert [c.text for c in compact_cues(words).lines] == ["no no go, go"]
+
+
+def test_dedupe_rolling_ignores_repeats_that_do_not_overlap_in_time():
+    cues = [Cue(0, 2000, "go, go"), Cue(5000, 7000, "go, go now")]
+    assert dedupe_rolling(cues) == cues
+
+
+def test_dedupe_rolling_single_shared_word_is_not_a_rolling_run():
+    cues = [Cue(0, 2000, "I said no"), Cue(2000, 4000, "no way out")]
+    assert dedupe_rolling(cues) == cues
+
+
+def test_dedupe_rolling_drops_exact_duplicate():
+    cues = [Cue(0, 500, "no"), Cue(0, 500, "No")]
+    assert dedupe_rolling(cues) == [Cue(0, 500, "no")]
+
+
+def test_merge_sentences_splits_on_punctuation_and_gaps():
+    cues = [Cue(0, 500, "Halo"), Cue(500, 900, "semua."), Cue(1000, 1400, "Apa"), Cue(5000, 5400, "kabar")]
+    assert merge_sentences(cues) == [Cue(0, 900, "Halo semua."), Cue(1000, 1400, "Apa"), Cue(5000, 5400, "kabar")]
+
+
+def test_compact_maps_displayed_seconds_back_to_source_ms():
+    compact = compact_cues([Cue(83420, 85000, "Satu."), Cue(3723900, 3725000, "Dua.")])
+    assert "[1:23] Satu." in compact.text
+    assert "[1:02:03] Dua." in compact.text
+    assert compact.to_source_ms(83000) == 83420
+    assert compact.to_source_ms(3723000) == 3723900
+    assert compact.to_source_ms(90000) == 90000
+    assert compact.line_at(84000).text == "Satu."
+    assert compact.line_at(1000) is None
+
+
+def test_compact_exact_ms_passes_through_unchanged():
+    # Timeblock rencana lokal dikirim dalam ms asli; model yang menyalinnya tidak boleh digeser
+    compact = compact_cues([Cue(83420, 85000, "Satu.")])
+    assert compact.to_source_ms(83420) == 83420
+    assert compact.to_source_ms(83500) == 83500
+    assert compact.to_source_ms("83001") == 83001
+
+
+def test_compact_srt_file_round_trip(tmp_path, isolated_home):
+    cues = [Cue(i * 1000, i * 1000 + 900, w) for i, w in enumerate(["Kita", "harus", "pergi.", "Sekarang", "juga."])]
+    srt = tmp_path / "film.srt"
+    srt.write_text("﻿" + format_srt(cues).replace("\n", "\r\n"), encoding="utf-8")
+    assert parse_srt(srt.read_text(encoding="utf-8")) == cues
+
+    path, compact = compact_srt_file(str(srt))
+    assert [c.text for c in compact.lines] == ["Kita harus pergi.", "Sekarang juga."]
+    assert open(path, encoding="utf-8").read() == compact.text
+    assert compact.tokens < compact.raw_tokens
+
+
+# ---- stitch_windows: transkrip jendela audio bertumpuk ----
+
+def _words(seed, total_ms=300000):
+    rng = random.Random(seed)
+    t, words = 0, []
+    while t < total_ms:
+        gap = rng.randint(200, 900)
+        # Kosakata kecil: banyak pengulangan asli ("no no") di sekitar seam
+        words.append(Cue(t, t + min(400, gap), rng.choice(["no", "go,", "ya", "a", "b"])))
+        t += gap
+    return words
+
+
+def _windows(words, total_ms, window_ms, overlap_ms, rng, jitter_ms):
+    """Each window transcribes the words that start inside it; timestamps drift by up to jitter_ms."""
+    out, start = [], 0
+    while True:
+        end = min(total_ms, start + window_ms)
+        cues = []
+        for c in words:
+            if start <= c.start_ms < end:
+                j = rng.randint(-jitter_ms, jitter_ms)
+                cues.append(Cue(c.start_ms + j, c.end_ms + j, c.text))
+        out.append((start, end, cues))
+        if end >= total_ms:
+            return out
+        start += window_ms - overlap_ms
+
+
+@pytest.mark.parametrize("seed", range(60))
+@pytest.mark.parametrize("jitter_ms", [0, 50])
+def test_stitch_windows_keeps_every_word_once(seed, jitter_ms):
+    rng = random.Random(seed * 7 + jitter_ms)
+    words = _words(seed)
+    windows = _windows(words, 300000, 60000, rng.choice([5000, 10000, 15000]), rng, jitter_ms)
+    rng.shuffle(windows)
+    stitched = stitch_windows(windows)
+
+    assert [c.text for c in stitched] == [c.text for c in words]
+    assert all(abs(a.start_ms - b.start_ms) <= jitter_ms for a, b in zip(stitched, words))
+
+
+def test_stitch_windows_keeps_repeat_at_the_cut():
+    # Cut di 55000: "no" 54600 milik kiri, "no" 55100 milik kanan; keduanya kata nyata
+    left = (0, 60000, [Cue(54600, 55000, "no"), Cue(55100, 55500, "no"), Cue(59000, 59400, "ya")])
+    right = (50000, 110000, [Cue(54620, 55020, "no"), Cue(55080, 55480, "no"), Cue(59010, 59410, "ya")])
+    assert [c.start_ms for c in stitch_windows([left, right])] == [54600, 55080, 59010]
+
+
+def test_stitch_windows_word_drifting_across_the_cut_is_not_lost():
+    # Jendela kiri menaruh kata setelah cut, jendela kanan sebelum cut
+    left = (0, 60000, [Cue(54000, 54400, "a"), Cue(55020, 55400, "go")])
+    right = (50000, 110000, [Cue(54010, 54410, "a"), Cue(54960, 55350, "go"), Cue(56000, 56300, "b")])
+    assert [(c.start_ms, c.text) for c in stitch_windows([left, right])] == [(54000, "a"), (54960, "go"), (56000, "b")]
@@ -0,0 +1,70 @@
+# tests/test_transcribe_windows.py
+# Transkripsi per jendela terhadap stub Gemini lokal: satu jendela gagal (500) lalu
+# diulang sendiri, dan tumpang tindih antar jendela dijahit tanpa kata ganda.
+
+import re
+import threading
+
+from gemini_stub import error_response, inline_data, text_response
+
+DURATION_SEC = 1200
+WORD_EVERY_MS = 2500
+
+
+def _ts(ms):
+    return f"{ms // 3600000:02d}:{ms // 60000 % 60:02d}:{ms // 1000 % 60:02d},{ms % 1000:03d}"
+
+
+def _window_srt(start_ms, end_ms):
+    """Word-level SRT for one window, times relative to the window (kata = posisi absolutnya)."""
+    out, n = [], 0
+    t = -(-start_ms // WORD_EVERY_MS) * WORD_EVERY_MS
+    while t < end_ms:
+        n += 1
+        rel = t - start_ms
+        out.append(f"{n}\n{_ts(rel)} --> {_ts(rel + 400)}\nw{t // WORD_EVERY_MS}\n")
+        t += WORD_EVERY_MS
+    return "\n".join(out)
+
+
+def test_failed_window_is_retried_and_stitched(gemini_stub, tmp_path, monkeypatch):
+    import api_handler
+    import api_manager
+    import ffmpeg_utils
+
+    seen = []
+    lock = threading.Lock()
+
+    def transcribe(model, body):
+        (audio,) = inline_data(body)
+        start_ms, end_ms = map(int, re.match(rb"win:(\d+)-(\d+)", audio).groups())
+        with lock:
+            seen.append(start_ms)
+            first_try = seen.count(start_ms) == 1
+        if start_ms == 585000 and first_try:
+            # 500, bukan 503: 503 sudah diulang oleh retry bawaan SDK sebelum sampai ke sini
+            return error_response(500, "An internal error has occurred.", "INTERNAL")
+        return text_response(_window_srt(start_ms, end_ms))
+
+    stub = gemini_stub(transcribe)
+    monkeypatch.setattr(ffmpeg_utils, "get_duration", lambda path: float(DURATION_SEC))
+    # Penanda jendela sebagai "audio": stub tahu jendela mana yang diminta
+    monkeypatch.setattr(api_handler, "_audio_window_bytes",
+                        lambda path, st, dur: f"win:{int(st * 1000)}-{int((st + dur) * 1000)}".encode())
+    monkeypatch.setattr(api_manager, "TRANSIENT_COOLDOWN_BASE_SEC", 0.05)
+
+    logs = []
+    srt_path = api_handler.transcribe_audio_to_srt_chunked(
+        str(tmp_path / "film.m4a"), "KEY-TEST", str(tmp_path), language="id", progress_callback=logs.append,
+    )
+
+    assert srt_path, "\n".join(logs)
+    # 3 jendela (0-600, 585-1185, 1170-1200 detik); hanya jendela kedua diminta dua kali
+    assert sorted(seen) == [0, 585000, 585000, 1170000]
+    assert len(stub.generate_calls()) == 4
+    assert any("Mengulang 1 jendela" in m for m in logs), "\n".join(logs)
+    import subtitle_utils
+    cues = subtitle_utils.load_srt(srt_path)
+    expected = [f"w{i}" for i in range(DURATION_SEC * 1000 // WORD_EVERY_MS)]
+    assert [c.text for c in cues] == expected
+    assert [c.start_ms for c in cues] == [i * WORD_EVERY_MS for i in range(len(expected))]
@@ -0,0 +1,97 @@
+# tests/test_upload_registry.py
+# Registry upload SRT: hit/miss per (key, isi file), kedaluwarsa, dan invalidasi setelah error
+# yang menandakan file remote sudah hilang.
+
+import datetime
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import api_handler
+import upload_registry
+from upload_registry import UploadRegistry, file_sha256, key_fingerprint
+
+
+@pytest.fixture
+def srt(tmp_path):
+    path = tmp_path / "film.srt"
+    path.write_text("1\n00:00:01,000 --> 00:00:02,000\nHalo.\n", encoding="utf-8")
+    return path
+
+
+@pytest.fixture
+def uploads(isolated_home, monkeypatch):
+    """upload_file palsu pada pool: mencatat (key, path) dan mengembalikan handle bergaya SDK."""
+    calls = []
+
+    def fake_upload(api_key, path):
+        calls.append((api_key, path))
+        n = len(calls)
+        exp = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=48)
+        return SimpleNamespace(name=f"files/f{n}", uri=f"https://stub.local/files/f{n}", mime_type="text/plain",
+                               expiration_time=exp)
+
+    monkeypatch.setattr(api_handler._client_pool, "upload_file", fake_upload)
+    return calls
+
+
+def test_registry_hit_miss_and_persistence(isolated_home):
+    reg = UploadRegistry()
+    reg.put("KEY-A", "abc", "files/1", "https://x/files/1", None)
+    assert reg.get("KEY-A", "abc")["uri"] == "https://x/files/1"
+    assert reg.get("KEY-B", "abc") is None
+    assert reg.get("KEY-A", "def") is None
+    # Key mentah tidak pernah ditulis ke disk
+    raw = (isolated_home / "gemini_uploads.json").read_text()
+    assert "KEY-A" not in raw and key_fingerprint("KEY-A") in raw
+    assert UploadRegistry().get("KEY-A", "abc")["name"] == "files/1"
+
+    reg.put("KEY-A", "", "", "https://x", None)  # entri tanpa nama/uri diabaikan
+    assert len(reg.entries) == 1
+
+
+def test_registry_drops_entries_near_expiry(isolated_home):
+    reg = UploadRegistry()
+    now = time.time()
+    reg.put("KEY-A", "old", "files/1", "https://x/1", None, expires_at=now + upload_registry.EXPIRY_MARGIN_SEC - 5)
+    reg.put("KEY-A", "new", "files/2", "https://x/2", None, expires_at=now + 3600)
+    assert reg.get("KEY-A", "old") is None
+    assert reg.get("KEY-A", "new") is not None
+    assert list(UploadRegistry().entries) == [f"{key_fingerprint('KEY-A')}:new"]
+
+
+def test_srt_part_uploads_once_per_key_and_content(srt, uploads):
+    logs = []
+    first = api_handler._get_srt_file_part("KEY-A", str(srt), logs.append)
+    assert first.uri == "https://stub.local/files/f1"
+    again = api_handler._get_srt_file_part("KEY-A", str(srt), logs.append)
+    assert again == {"file_data": {"mime_type": "text/plain", "file_uri": "https://stub.local/files/f1"}}
+    assert uploads == [("KEY-A", str(srt))]
+    assert any("Memakai ulang" in m for m in logs)
+
+    # File hanya bisa dibaca oleh key pengunggahnya; isi baru berarti hash baru
+    api_handler._get_srt_file_part("KEY-B", str(srt))
+    srt.write_text("1\n00:00:01,000 --> 00:00:02,000\nHalo lagi.\n", encoding="utf-8")
+    api_handler._get_srt_file_part("KEY-A", str(srt))
+    assert [k for k, _ in uploads] == ["KEY-A", "KEY-B", "KEY-A"]
+
+    # Proses baru (registry dimuat dari disk): tetap hit
+    upload_registry._registry = None
+    assert api_handler._get_srt_file_part("KEY-A", str(srt))["file_data"]["file_uri"] == "https://stub.local/files/f3"
+    assert len(uploads) == 3
+
+
+@pytest.mark.parametrize("message, forgotten", [
+    ("404 File files/f1 not found.", True),
+    ("403 You do not have permission to access the File files/f1 or it may not exist.", True),
+    ("429 Resource has been exhausted (e.g. check quota).", False),
+    ("500 Internal error", False),
+])
+def test_upload_error_invalidates_entry(srt, uploads, message, forgotten):
+    api_handler._get_srt_file_part("KEY-A", str(srt))
+    api_handler._forget_srt_upload_on_error("KEY-A", str(srt), Exception(message))
+    api_handler._get_srt_file_part("KEY-A", str(srt))
+    assert len(uploads) == (2 if forgotten else 1)
+    entry = upload_registry.get_registry().get("KEY-A", file_sha256(str(srt)))
+    assert entry["name"] == ("files/f2" if forgotten else "files/f1")
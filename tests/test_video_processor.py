@@ -0,0 +1,162 @@
+# tests/test_video_processor.py
+# Bagian murni video_processor: normalisasi beats, filter reframe per profil output, dan perintah
+# mux trek audio multi-bahasa.
+
+import math
+import re
+
+import pytest
+
+import video_processor
+from video_processor import (BEAT_MERGE_GAP_SEC, DEFAULT_OUTPUT_PROFILE, VERTICAL_OUTPUT_PROFILE, _normalize_beats,
+                             _mux_audio_tracks, _parse_aspect, _profile_video_filter)
+
+
+def _beat(at, src, length, **kw):
+    return dict(at_ms=at, src_at_ms=src, src_length_ms=length, **kw)
+
+
+def test_zero_source_beats_are_not_merged():
+    # Mayoritas src_at_ms = 0: posisi sumber disebar belakangan, setiap slot timeline harus tetap ada
+    beats = [_beat(i * 1200, 0, 1200) for i in range(20)]
+    out, stats = _normalize_beats(beats, 5400.0, [], None)
+    assert len(out) == 20 and stats["merged"] == 0
+    assert [b["at_ms"] for b in out] == [i * 1200 for i in range(20)]
+
+
+def test_duplicate_source_ranges_stay_separate():
+    beats = [_beat(0, 60000, 1500), _beat(1500, 60000, 1500), _beat(3000, 60000, 1500)]
+    out, stats = _normalize_beats(beats, 5400.0)
+    assert len(out) == 3 and stats["merged"] == 0
+
+
+def test_overlapping_source_ranges_stay_separate():
+    beats = [_beat(0, 60000, 2000), _beat(2000, 61000, 2000)]
+    out, stats = _normalize_beats(beats, 5400.0)
+    assert [(b["src_at_ms"], b["src_length_ms"]) for b in out] == [(60000, 2000), (61000, 2000)]
+    assert stats["merged"] == 0
+
+
+def test_abutting_source_ranges_merge_up_to_max_len():
+    gap_ms = int(BEAT_MERGE_GAP_SEC * 1000) // 2
+    beats = [_beat(0, 60000, 1000), _beat(1000, 61000 + gap_ms, 1000), _beat(2000, 62000 + gap_ms, 1500),
+             _beat(3500, 63500 + gap_ms, 1000)]
+    out, stats = _normalize_beats(beats, 5400.0, edit_rules={"cut_length_sec": {"min": 3, "max": 4}})
+    assert stats["merged"] == 2
+    assert [(b["at_ms"], b["src_at_ms"], b["src_length_ms"]) for b in out] == [
+        (0, 60000, 3500 + gap_ms), (3500, 63500 + gap_ms, 1000)]
+
+
+def test_small_backward_step_at_the_seam_still_merges():
+    beats = [_beat(0, 60000, 1000), _beat(1000, 60970, 1000)]
+    out, stats = _normalize_beats(beats, 5400.0)
+    # Gabungan = union kedua rentang
+    assert stats["merged"] == 1 and out[0]["src_length_ms"] == 1970
+
+
+def test_gap_larger_than_threshold_does_not_merge():
+    beats = [_beat(0, 60000, 1000), _beat(1000, 61000 + int(BEAT_MERGE_GAP_SEC * 1000) + 50, 1000)]
+    assert _normalize_beats(beats, 5400.0)[1]["merged"] == 0
+
+
+def test_beats_are_clamped_and_degenerate_ones_dropped():
+    beats = [_beat(0, 5399000, 5000), _beat(1000, 5400500, 1000), _beat(2000, 1000, 100), "x"]
+    out, stats = _normalize_beats(beats, 5400.0)
+    assert [(b["src_at_ms"], b["src_length_ms"]) for b in out] == [(5399000, 1000)]
+    assert stats["dropped"] == 3
+
+
+def test_timeblock_relative_positions():
+    tbs = [{"start": "00:01:00.000", "end": "00:01:10.000"}, {"start": "00:05:00.000", "end": "00:05:03.000"}]
+    beats = [_beat(0, 2000, 1000, block_index=0), _beat(1000, 3000, 1000, block_index=0),
+             _beat(2000, 2500, 2000, block_index=1), _beat(4000, 0, 1000, block_index=5)]
+    out, stats = _normalize_beats(beats, 5400.0, tbs)
+    # Dua beat pertama bersambung di blok 0; beat blok 1 dijepit ke akhir blok (0.5 dtk tersisa)
+    assert [(b["src_at_ms"], b["src_length_ms"]) for b in out] == [(2000, 2000), (2500, 500)]
+    assert stats["dropped"] == 1
+
+
+@pytest.mark.parametrize("aspect, ratio", [("9:16", 0.5625), ("16/9", 16 / 9), ("4x3", 4 / 3), ("1.85", 1.85),
+                                           (0.5625, 0.5625), (2, 2.0), (0, None), (-1.0, None), ("", None),
+                                           (None, None)])
+def test_parse_aspect(aspect, ratio):
+    assert _parse_aspect(aspect) == (pytest.approx(ratio) if ratio else None)
+
+
+def _filters(chain):
+    # Koma di dalam ekspresi berkutip bukan pemisah filter
+    return re.findall(r"(?:[^,']|'[^']*')+", chain)
+
+
+def _eval_box(chain, name, iw, ih):
+    """Evaluates the w/h/x/y expressions of a crop/pad filter for a given input size."""
+    spec = next(f for f in _filters(chain) if f.startswith(f"{name}="))
+    args = dict(re.findall(r"(\w+)='([^']*)'", spec))
+    env = {"iw": iw, "ih": ih, "trunc": math.trunc, "min": min, "max": max}
+    env["ow"] = w = eval(args["w"], env)
+    env["oh"] = h = eval(args["h"], env)
+    return w, h, eval(args["x"], env), eval(args["y"], env)
+
+
+def test_default_profile_is_letterbox_only():
+    f = _profile_video_filter(DEFAULT_OUTPUT_PROFILE)
+    assert [p.split("=", 1)[0] for p in _filters(f)] == ["drawbox", "drawbox"] and "h=ih*0.12" in f
+    assert _profile_video_filter({}) == f
+    assert _profile_video_filter({"letterbox": False}) == "null"
+
+
+def test_vertical_profile_center_crops_then_scales():
+    f = _profile_video_filter(VERTICAL_OUTPUT_PROFILE)
+    parts = _filters(f)
+    assert parts[0].startswith("crop=") and parts[1:] == ["scale=1080:1920", "setsar=1"]
+    # 1920x1080 -> potongan 9:16 setinggi frame, di tengah, dimensi genap
+    assert _eval_box(f, "crop", 1920, 1080) == (606, 1080, (1920 - 606) * 0.5, 0)
+    # Sumber yang sudah lebih sempit dari 9:16 dipotong di tinggi, bukan lebar
+    w, h, _, _ = _eval_box(f, "crop", 600, 1200)
+    assert w == 600 and h == 1066
+
+
+def test_crop_anchor_is_clamped():
+    f = _profile_video_filter({"aspect": "1:1", "anchor_x": 1.7, "anchor_y": -3, "letterbox": False})
+    assert _eval_box(f, "crop", 1920, 1080) == (1080, 1080, 840.0, 0.0)
+    assert f.endswith(",setsar=1") and "scale=" not in f
+
+
+def test_pad_profile_and_partial_scale():
+    f = _profile_video_filter({"aspect": "9:16", "fit": "pad", "width": 720, "letterbox": False})
+    assert _filters(f)[1:] == ["scale=720:-2", "setsar=1"]
+    w, h, x, y = _eval_box(f, "pad", 1920, 1080)
+    assert (w, h) == (1920, 3412) and x == 0 and y == (3412 - 1080) / 2
+    assert _profile_video_filter({"height": 480, "letterbox": False}) == "scale=-2:480,setsar=1"
+
+
+@pytest.fixture
+def ffmpeg_commands(monkeypatch):
+    commands = []
+
+    def fake_run(command, **kwargs):
+        commands.append((command, kwargs))
+        return True
+
+    monkeypatch.setattr(video_processor, "run_ffmpeg_command", fake_run)
+    return commands
+
+
+def test_mux_audio_tracks_copies_streams_and_tags_languages(ffmpeg_commands):
+    log = []
+    assert _mux_audio_tracks("film.mp4", [("en-US", "en.m4a"), ("pt-BR", "pt.m4a"), ("xx", "xx.m4a")], "out.mp4",
+                             keep_video_audio_as="id", progress_callback=log.append)
+    (cmd, kwargs), = ffmpeg_commands
+    assert kwargs == {"progress_callback": log.append}
+    assert cmd.startswith('ffmpeg -i "film.mp4" -i "en.m4a" -i "pt.m4a" -i "xx.m4a" '
+                          '-map 0:v -map 0:a -map 1:a -map 2:a -map 3:a -c copy ')
+    assert re.findall(r"language=(\w+)", cmd) == ["ind", "eng", "por", "xx"]
+    assert re.findall(r"-disposition:a:(\d) (\w+)", cmd) == [("0", "default"), ("1", "0"), ("2", "0"), ("3", "0")]
+    assert cmd.endswith('-movflags +faststart "out.mp4"') and "-c:v" not in cmd and "-c:a" not in cmd
+
+
+def test_mux_single_track_without_original_audio(ffmpeg_commands):
+    _mux_audio_tracks("film.mp4", [("", "vo.m4a")], "out.mp4")
+    (cmd, _), = ffmpeg_commands
+    assert "-map 0:v -map 1:a -c copy" in cmd and "-map 0:a" not in cmd
+    assert "-metadata:s:a:0 language=und" in cmd and "-disposition:a:0 default" in cmd
@@ -0,0 +1,157 @@
+# tests/test_vo_repair.py
+# Perbaikan panjang VO: beats diskalakan lokal (_rescale_beats) dan loop perbaikan di
+# get_storyboard_from_srt memakai satuan ms sumber yang sama dengan ranges segmen.
+
+import json
+import re
+
+import pytest
+
+import api_handler
+from api_handler import BEAT_MAX_MS, BEAT_MIN_MS, _rescale_beats
+from gemini_stub import request_text, text_response
+
+SEGMENTS = ["Intro", "Rising", "Mid-conflict", "Climax", "Ending"]
+
+
+def _beats(lengths, src0=10000):
+    out, at, src = [], 0, src0
+    for ln in lengths:
+        out.append({"at_ms": at, "src_at_ms": src, "src_length_ms": ln, "note": "x"})
+        at += ln
+        src += ln
+    return out
+
+
+def _gapless(beats):
+    return all(b["at_ms"] == a["at_ms"] + a["src_length_ms"] for a, b in zip(beats, beats[1:]))
+
+
+def _end(beats):
+    return beats[-1]["at_ms"] + beats[-1]["src_length_ms"]
+
+
+def test_shrink_keeps_timeline_gapless_and_hits_target():
+    out = _rescale_beats(_beats([2000, 3000, 2500, 2500]), 0.7)
+    assert _gapless(out) and out[0]["at_ms"] == 0
+    assert _end(out) == 7000
+    assert all(BEAT_MIN_MS <= b["src_length_ms"] <= BEAT_MAX_MS for b in out)
+
+
+def test_shrink_below_min_drops_trailing_clips():
+    out = _rescale_beats(_beats([1000] * 10), 0.2)
+    assert _end(out) == 2000 and len(out) < 10
+    assert all(b["src_length_ms"] >= BEAT_MIN_MS for b in out)
+
+
+def test_stretch_adds_continuation_clips():
+    beats = _beats([3000, 3000])
+    out = _rescale_beats(beats, 3.0)
+    assert _gapless(out) and _end(out) == 18000
+    assert all(b["src_length_ms"] <= BEAT_MAX_MS for b in out)
+    added = [b for b in out if b["note"] == "auto (perpanjangan VO)"]
+    assert added and added[0]["src_at_ms"] == out[1]["src_at_ms"] + out[1]["src_length_ms"]
+    assert beats[0]["src_length_ms"] == 3000  # input tidak diubah
+
+
+def test_stretch_is_clamped_to_source_ranges():
+    ranges = [{"start": "00:00:10.000", "end": "00:00:15.000"}, {"start": "00:01:00.000", "end": "00:01:08.000"}]
+    out = _rescale_beats(_beats([2000, 2000]), 2.5, ranges)
+    spans = [(10000, 15000), (60000, 68000)]
+    assert _gapless(out) and _end(out) == 10000
+    for b in out:
+        s, e = b["src_at_ms"], b["src_at_ms"] + b["src_length_ms"]
+        assert any(st <= s and e <= en for st, en in spans), b
+    # Rentang pertama habis: perpanjangan pindah ke rentang berikutnya
+    assert out[-1]["src_at_ms"] >= 60000
+
+
+def test_explicit_target_ms():
+    out = _rescale_beats(_beats([2000, 2000, 2000]), 1.0, target_ms=9000)
+    assert _gapless(out) and _end(out) == 9000
+
+
+def test_noop_factor_returns_input():
+    beats = _beats([2000, 2000])
+    assert _rescale_beats(beats, 1.0) is beats
+    assert _rescale_beats([], 2.0) == []
+
+
+# ---- loop perbaikan di get_storyboard_from_srt (stub Gemini) ----
+
+def _ts(ms):
+    return f"{ms // 3600000:02d}:{ms // 60000 % 60:02d}:{ms // 1000 % 60:02d},{ms % 1000:03d}"
+
+
+def _write_srt(path):
+    # Scene 3 kalimat (start di x,500 ms) dipisah jeda 6 dtk: timeblocks planner lokal ~14,5 dtk
+    lines, n, t = [], 0, 500
+    while t < 600000:
+        for _ in range(3):
+            n += 1
+            lines.append(f"{n}\n{_ts(t)} --> {_ts(t + 4000)}\nKalimat dialog nomor {n} di film.\n")
+            t += 5000
+        t += 6000
+    path.write_text("\n".join(lines), encoding="utf-8")
+    return str(path)
+
+
+_RANGE_RE = re.compile(r"^- (\d\d:\d\d:\d\d\.\d{3}) --> (\d\d:\d\d:\d\d\.\d{3})", re.M)
+
+
+def test_repair_rescales_beats_in_source_ms(gemini_stub, tmp_path, monkeypatch):
+    from subtitle_utils import parse_timestamp
+    ranges_seen = {}
+
+    def model(name, body):
+        text = request_text(body)
+        if "Planner Timeblocks" in text:
+            return text_response(json.dumps({"segments": [{"label": lab} for lab in SEGMENTS]}))
+        m = re.search(r"# Perbaiki panjang VO.*?Label: (\S+).*?target (\d+) kata", text, re.S)
+        if m:
+            return text_response(json.dumps({"vo_script": " ".join(["kata"] * (int(m.group(2)) - 1) + ["akhir."])}))
+        m = re.search(r"# Segmen Storyboard.*?Label: (\S+).*?words_target=(\d+)", text, re.S)
+        label, words = m.group(1), int(m.group(2))
+        spans = [(parse_timestamp(a), parse_timestamp(b)) for a, b in _RANGE_RE.findall(text)]
+        ranges_seen[label] = spans
+        # Model menulis src_at_ms dalam detik utuh dari prompt ringkas ([m:ss]), VO setengah target
+        src = spans[0][0] // 1000 * 1000
+        seg = {
+            "label": label, "vo_language": "id", "target_vo_duration_sec": 7,
+            "vo_script": " ".join(["kata"] * (words // 2 - 1) + ["akhir."]),
+            "vo_meta": {"speech_rate_wpm": 190, "fit": "OK"},
+            "beats": [{"at_ms": i * 2000, "src_at_ms": src + i * 2000, "src_length_ms": 2000} for i in range(4)],
+        }
+        return text_response(json.dumps(seg))
+
+    import api_manager
+    # 11 panggilan (planner, 5 segmen, 5 perbaikan): jangan menunggu batas RPM flash
+    monkeypatch.setitem(api_manager.MODEL_LIMITS, "gemini-2.5-flash", {"rpm": 1000, "tpm": 10_000_000, "rpd": 10_000})
+    gemini_stub(model, cache_enabled=False)
+    monkeypatch.setattr(api_handler, "_get_srt_file_part", lambda api_key, srt_path, log=None:
+                        {"file_data": {"mime_type": "text/plain", "file_uri": "https://stub.local/files/srt-1"}})
+    out = tmp_path / "out"
+    out.mkdir()
+    logs = []
+    sb = api_handler.get_storyboard_from_srt(
+        _write_srt(tmp_path / "film.srt"), "KEY-TEST", 600, str(out), language="id", progress_callback=logs.append,
+        recap_minutes=1, storyboard_model="gemini-2.5-flash")
+
+    assert sb is not None, "\n".join(logs)
+    assert any("Perbaikan panjang VO" in m for m in logs)
+    for seg in sb["segments"]:
+        spans = ranges_seen[seg["label"]]
+        beats = seg["beats"]
+        assert _gapless(beats)
+        assert seg["vo_meta"]["fit"] == "OK"
+        # Beat pertama dipetakan ke ms asli awal scene, semua klip tetap di dalam timeblock
+        assert beats[0]["src_at_ms"] == spans[0][0]
+        for b in beats:
+            s, e = b["src_at_ms"], b["src_at_ms"] + b["src_length_ms"]
+            assert any(st <= s and e <= en for st, en in spans), (seg["label"], b, spans)
+
+
+@pytest.fixture(autouse=True)
+def _clean_latency_stats(monkeypatch):
+    # Statistik latensi proses-global jangan bocor antar test
+    monkeypatch.setattr(api_handler, "_latency_stats", api_handler._LatencyStats(), raising=False)
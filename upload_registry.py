@@ -0,0 +1,108 @@
+# upload_registry.py
+# Remembers files uploaded to the Gemini File API so the same SRT is not
+# re-uploaded for every attempt, retry, or run.
+
+import hashlib
+import json
+import threading
+import time
+from pathlib import Path
+
+# Gemini keeps uploaded files for ~48h; treat handles as dead a little earlier.
+DEFAULT_TTL_SEC = 47 * 3600
+EXPIRY_MARGIN_SEC = 10 * 60
+
+
+def key_fingerprint(api_key: str) -> str:
+    """Short, non-reversible id for an API key (never store raw keys here)."""
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class UploadRegistry:
+    def __init__(self, filename: str = 'gemini_uploads.json'):
+        self.filepath = Path.home() / filename
+        self._lock = threading.Lock()
+        self.entries = {}  # "<key_fp>:<sha256>" -> {name, uri, mime_type, expires_at}
+        self.load()
+
+    def load(self):
+        with self._lock:
+            if self.filepath.exists():
+                try:
+                    with open(self.filepath, 'r') as f:
+                        self.entries = json.load(f) or {}
+                except (json.JSONDecodeError, OSError):
+                    self.entries = {}
+            else:
+                self.entries = {}
+
+    def save(self):
+        with self._lock:
+            self._save_locked()
+
+    def _save_locked(self):
+        try:
+            with open(self.filepath, 'w') as f:
+                json.dump(self.entries, f, indent=2)
+        except OSError:
+            pass
+
+    def _collect_expired_locked(self) -> bool:
+        now = time.time()
+        dead = [k for k, e in self.entries.items()
+                if not isinstance(e, dict) or float(e.get("expires_at", 0)) - EXPIRY_MARGIN_SEC <= now]
+        for k in dead:
+            self.entries.pop(k, None)
+        return bool(dead)
+
+    @staticmethod
+    def _entry_key(api_key: str, content_hash: str) -> str:
+        return f"{key_fingerprint(api_key)}:{content_hash}"
+
+    def get(self, api_key: str, content_hash: str) -> dict | None:
+        """Returns a live entry for (key, content) or None. Expired entries are dropped lazily."""
+        with self._lock:
+            if self._collect_expired_locked():
+                self._save_locked()
+            entry = self.entries.get(self._entry_key(api_key, content_hash))
+            return dict(entry) if entry else None
+
+    def put(self, api_key: str, content_hash: str, name: str, uri: str, mime_type: str | None, expires_at: float | None = None):
+        if not name or not uri:
+            return
+        with self._lock:
+            self.entries[self._entry_key(api_key, content_hash)] = {
+                "name": name,
+                "uri": uri,
+                "mime_type": mime_type or "text/plain",
+                "expires_at": float(expires_at or (time.time() + DEFAULT_TTL_SEC)),
+            }
+            self._collect_expired_locked()
+            self._save_locked()
+
+    def forget(self, api_key: str, content_hash: str):
+        """Drops an entry, e.g. when the server no longer recognises the file."""
+        with self._lock:
+            if self.entries.pop(self._entry_key(api_key, content_hash), None) is not None:
+                self._save_locked()
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> UploadRegistry:
+    """Process-wide registry instance shared by all callers."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = UploadRegistry()
+        return _registry
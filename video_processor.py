@@ -8,6 +8,10 @@ import shutil
 import random
 import threading
 from ffmpeg_utils import run_ffmpeg_command, get_duration
+from source_allocator import SourceAllocator
+from shot_index import load_or_build as load_shot_index
+import delivery
+import audio_utils
 import math
 
 def _meta_flags() -> str:
@@ -93,12 +97,11 @@ def _apply_effects(clip_path, effects, output_path, **kwargs):
     )
     return run_ffmpeg_command(command, **kwargs)
 
-def _apply_final_effects(input_path, output_path, user_settings, **kwargs):
-    """Applies final user-defined effects like BGM, volume changes, etc."""
-    inputs = f'-i "{input_path}"'
-    video_filters = []; audio_filters = []
-    video_stream = "[0:v]"; audio_stream = "[0:a]"
-
+def _final_audio_graph(audio_stream: str, user_settings: dict, bgm_input: int):
+    """Main VO gain + BGM (global, or looped/trimmed/delayed to one segment) on top of audio_stream.
+    Returns (extra ffmpeg inputs, filter list, output label); the BGM becomes input #bgm_input."""
+    inputs = ""
+    audio_filters = []
     main_vol = user_settings.get("main_vo_volume", 1.0)
     if main_vol != 1.0:
         # audio_stream already includes brackets, e.g., "[0:a]"
@@ -117,16 +120,70 @@ def _apply_final_effects(input_path, output_path, user_settings, **kwargs):
             start_ms = int(round(timing["start_sec"] * 1000))
             duration_sec = max(0.0, float(timing["duration_sec"]))
             audio_filters.append(
-                f"[1:a]atrim=0:{duration_sec},asetpts=PTS-STARTPTS,volume={bgm_vol},adelay={start_ms}|{start_ms}[bgm]"
+                f"[{bgm_input}:a]atrim=0:{duration_sec},asetpts=PTS-STARTPTS,volume={bgm_vol},adelay={start_ms}|{start_ms}[bgm]"
             )
             audio_filters.append(f"{audio_stream}[bgm]amix=inputs=2:duration=longest[a_out]")
             audio_stream = "[a_out]"
         else:
             # Global BGM sepanjang video (fallback lama)
             inputs += f' -i "{bgm_path}"'
-            audio_filters.append(f"[1:a]volume={bgm_vol}[bgm]")
+            audio_filters.append(f"[{bgm_input}:a]volume={bgm_vol}[bgm]")
             audio_filters.append(f"{audio_stream}[bgm]amix=inputs=2:duration=longest[a_out]")
             audio_stream = "[a_out]"
+    return inputs, audio_filters, audio_stream
+
+def _needs_audio_mix(user_settings: dict) -> bool:
+    return bool(user_settings.get("bgm_path")) or user_settings.get("main_vo_volume", 1.0) != 1.0
+
+def _mix_final_audio(voice_source, output_audio, user_settings: dict, **kwargs) -> bool:
+    """Narration + BGM through the streaming NumPy mixer (gain, BGM loop/seek, ducking, limiter).
+    Returns False when the mix could not be made; callers then fall back to the ffmpeg graph."""
+    cb = kwargs.get("progress_callback") or print
+    timing = user_settings.get("bgm_timing") if user_settings.get("bgm_segment") else None
+    if timing and not ("start_sec" in timing and "duration_sec" in timing):
+        timing = None
+    try:
+        secs = audio_utils.mix_to_file(
+            str(voice_source), str(output_audio),
+            voice_gain=float(user_settings.get("main_vo_volume", 1.0)),
+            bgm_path=user_settings.get("bgm_path") or None,
+            bgm_gain=float(user_settings.get("bgm_volume", 0.1)),
+            bgm_start_sec=float(timing["start_sec"]) if timing else 0.0,
+            bgm_duration_sec=float(timing["duration_sec"]) if timing else None,
+            bgm_seek_sec=float(user_settings.get("bgm_offset_sec", 0.0) or 0.0),
+            duck_db=float(user_settings.get("bgm_duck_db", audio_utils.DUCK_DEPTH_DB)),
+        )
+    except Exception as e:
+        cb(f"[Audio] Mixer NumPy gagal ({e}); memakai filter ffmpeg")
+        return False
+    cb(f"[Audio] Mix VO+BGM selesai ({secs:.1f}s, ducking {float(user_settings.get('bgm_duck_db', audio_utils.DUCK_DEPTH_DB)):.0f} dB, limiter)")
+    return secs > 0
+
+def _apply_final_effects(input_path, output_path, user_settings, **kwargs):
+    """Applies final user-defined effects like BGM, volume changes, etc."""
+    letterbox = ("[0:v]drawbox=x=0:y=0:w=iw:h=ih*0.12:color=black:t=fill,"
+                 "drawbox=x=0:y=ih-ih*0.12:w=iw:h=ih*0.12:color=black:t=fill[v_out]")
+    # Audio dimix sekali oleh mixer NumPy lalu di-copy; tanpa BGM/gain audio asli langsung di-copy
+    mixed = None
+    if _needs_audio_mix(user_settings):
+        mixed = pathlib.Path(input_path).with_name(f"{pathlib.Path(output_path).stem}_mix.m4a")
+        if not _mix_final_audio(input_path, mixed, user_settings, **kwargs):
+            mixed = None
+    if mixed is not None or not _needs_audio_mix(user_settings):
+        audio_in = f' -i "{mixed}"' if mixed is not None else ""
+        command = (f'ffmpeg -i "{input_path}"{audio_in} -filter_complex "{letterbox}" '
+                   f'-map "[v_out]" -map {1 if mixed is not None else 0}:a -r 25 -c:v libx264 -preset veryfast '
+                   f'-c:a copy "{output_path}"')
+        ok = run_ffmpeg_command(command, **kwargs)
+        if mixed is not None:
+            mixed.unlink(missing_ok=True)
+        return ok
+
+    inputs = f'-i "{input_path}"'
+    video_filters = []
+    video_stream = "[0:v]"
+    extra_inputs, audio_filters, audio_stream = _final_audio_graph("[0:a]", user_settings, 1)
+    inputs += extra_inputs
 
     # Selalu tambahkan letterbox (movie bars) default di atas & bawah sebagai overlay
     # Menggunakan 12% tinggi frame untuk tiap bar.
@@ -150,6 +207,231 @@ def _apply_final_effects(input_path, output_path, user_settings, **kwargs):
                f'-c:a aac -b:a 128k -ar 48000 -ac 2 "{output_path}"')
     return run_ffmpeg_command(command, **kwargs)
 
+# Profil output: satu decode timeline, di-split ke beberapa aspek/resolusi dalam satu proses ffmpeg.
+# Profil default = perilaku lama (resolusi sumber, letterbox 12%).
+DEFAULT_OUTPUT_PROFILE = {"name": "landscape", "letterbox": True}
+VERTICAL_OUTPUT_PROFILE = {"name": "vertical", "aspect": "9:16", "width": 1080, "height": 1920,
+                           "fit": "crop", "letterbox": False, "suffix": "_9x16"}
+LETTERBOX_RATIO = 0.12
+
+def _parse_aspect(aspect) -> float | None:
+    """'9:16' / '9/16' / 0.5625 -> width/height ratio."""
+    if not aspect:
+        return None
+    if isinstance(aspect, (int, float)):
+        return float(aspect) if aspect > 0 else None
+    for sep in (":", "/", "x"):
+        if sep in str(aspect):
+            w, h = str(aspect).split(sep, 1)
+            return float(w) / float(h)
+    return float(aspect)
+
+def _output_profiles(user_settings: dict) -> list:
+    profiles = [dict(p) for p in (user_settings.get("output_profiles") or []) if isinstance(p, dict)]
+    return profiles or [dict(DEFAULT_OUTPUT_PROFILE)]
+
+def _profile_video_filter(profile: dict) -> str:
+    """Reframe (center crop or pad) to the profile aspect, scale, and optional letterbox bars."""
+    f = []
+    ar = _parse_aspect(profile.get("aspect"))
+    w, h = profile.get("width"), profile.get("height")
+    if ar:
+        if profile.get("fit", "crop") == "pad":
+            f.append(f"pad=w='trunc(max(iw,ih*{ar:.6f})/2)*2':h='trunc(max(ih,iw/{ar:.6f})/2)*2':x='(ow-iw)/2':y='(oh-ih)/2':color=black")
+        else:
+            # Titik fokus crop (0..1); default tengah frame
+            ax = min(1.0, max(0.0, float(profile.get("anchor_x", 0.5))))
+            ay = min(1.0, max(0.0, float(profile.get("anchor_y", 0.5))))
+            f.append(f"crop=w='trunc(min(iw,ih*{ar:.6f})/2)*2':h='trunc(min(ih,iw/{ar:.6f})/2)*2':x='(iw-ow)*{ax:.3f}':y='(ih-oh)*{ay:.3f}'")
+    if w and h:
+        f.append(f"scale={int(w)}:{int(h)}")
+    elif w or h:
+        f.append(f"scale={int(w) if w else -2}:{int(h) if h else -2}")
+    if ar or w or h:
+        f.append("setsar=1")
+    if profile.get("letterbox", True):
+        r = LETTERBOX_RATIO
+        f.append(f"drawbox=x=0:y=0:w=iw:h=ih*{r}:color=black:t=fill,drawbox=x=0:y=ih-ih*{r}:w=iw:h=ih*{r}:color=black:t=fill")
+    return ",".join(f) or "null"
+
+def _profile_output_path(output_path, profile: dict, index: int) -> pathlib.Path:
+    out = pathlib.Path(output_path)
+    if index == 0:
+        return out
+    suffix = profile.get("suffix") or f"_{profile.get('name') or index}"
+    return out.with_name(f"{out.stem}{suffix}{out.suffix}")
+
+def _apply_output_profiles(input_path, output_path, user_settings, **kwargs):
+    """Final effects for every output profile from one decode of input_path.
+
+    The video is split once per profile (reframe/scale/letterbox each), the audio graph
+    (main gain + BGM) is built once and asplit, and all encodes run as outputs of a single
+    ffmpeg process. The first profile writes output_path. Returns the written paths or None.
+    """
+    profiles = _output_profiles(user_settings)
+    if len(profiles) == 1 and profiles[0] == DEFAULT_OUTPUT_PROFILE:
+        return [str(output_path)] if _apply_final_effects(input_path, output_path, user_settings, **kwargs) else None
+    n = len(profiles)
+    paths = [_profile_output_path(output_path, p, i) for i, p in enumerate(profiles)]
+    cb = kwargs.get("progress_callback")
+    if cb:
+        try:
+            cb(f"[Profiles] {n} output: " + ", ".join(f"{p.get('name') or i} ({p.get('aspect') or 'asli'})" for i, p in enumerate(profiles)))
+        except Exception:
+            pass
+    mixed = None
+    if _needs_audio_mix(user_settings):
+        mixed = pathlib.Path(input_path).with_name(f"{pathlib.Path(output_path).stem}_mix.m4a")
+        if not _mix_final_audio(input_path, mixed, user_settings, **kwargs):
+            mixed = None
+    if mixed is not None or not _needs_audio_mix(user_settings):
+        # Audio sudah final: semua output memakai -c:a copy; profil tanpa filter video memakai -c:v copy
+        audio_map = f"{1 if mixed is not None else 0}:a"
+        filters = [(i, _profile_video_filter(p)) for i, p in enumerate(profiles)]
+        filtered = [(i, f) for i, f in filters if f != "null"]
+        graph = []
+        if filtered:
+            graph.append("[0:v]split=" + str(len(filtered)) + "".join(f"[vs{i}]" for i, _ in filtered))
+            graph += [f"[vs{i}]{f}[vo{i}]" for i, f in filtered]
+        outputs = []
+        for i, f in filters:
+            if f == "null":
+                outputs.append(f'-map 0:v -map {audio_map} -c:v copy -c:a copy "{paths[i]}"')
+            else:
+                outputs.append(f'-map "[vo{i}]" -map {audio_map} -r 25 -c:v libx264 -preset veryfast -c:a copy "{paths[i]}"')
+        audio_in = f' -i "{mixed}"' if mixed is not None else ""
+        fc = f' -filter_complex "{";".join(graph)}"' if graph else ""
+        ok = run_ffmpeg_command(f'ffmpeg -i "{input_path}"{audio_in}{fc} {" ".join(outputs)}', **kwargs)
+        if mixed is not None:
+            mixed.unlink(missing_ok=True)
+        return [str(p) for p in paths] if ok else None
+
+    extra_inputs, audio_filters, audio_stream = _final_audio_graph("[0:a]", user_settings, 1)
+    graph = ["[0:v]split=" + str(n) + "".join(f"[vs{i}]" for i in range(n))]
+    graph += [f"[vs{i}]{_profile_video_filter(p)}[vo{i}]" for i, p in enumerate(profiles)]
+    graph += audio_filters
+    graph.append(f"{audio_stream}asplit={n}" + "".join(f"[ao{i}]" for i in range(n)))
+    outputs = " ".join(
+        f'-map "[vo{i}]" -map "[ao{i}]" -r 25 -c:v libx264 -preset veryfast -c:a aac -b:a 128k -ar 48000 -ac 2 "{paths[i]}"'
+        for i in range(n))
+    command = f'ffmpeg -i "{input_path}"{extra_inputs} -filter_complex "{";".join(graph)}" {outputs}'
+    return [str(p) for p in paths] if run_ffmpeg_command(command, **kwargs) else None
+
+# Normalisasi beats: klip lebih sedikit & lebih panjang = lebih sedikit ffmpeg/seek per segmen
+BEAT_MIN_SEC = 0.3            # lebih pendek dari ini dilewati oleh _process_segment
+BEAT_MERGE_GAP_SEC = 0.08     # celah/overlap sumber yang masih dianggap bersambung
+BEAT_MERGE_MAX_SEC = 4.0      # batas panjang klip gabungan jika edit_rules tidak menyebutkan
+BEAT_ZERO_SRC_RATIO = 0.6     # mayoritas src_at_ms <= 0: posisi sumber disebar di _process_segment
+
+def _normalize_beats(beats, film_duration_sec: float = 0.0, timeblocks=None, edit_rules=None):
+    """Clamps beats to the source, drops degenerate ones and merges contiguous source ranges.
+
+    Source positions are absolute (src_at_ms) or, when timeblocks are given, relative to
+    timeblocks[block_index] and clamped to that block. Consecutive beats (timeline order)
+    whose source ranges touch or overlap in the same block are merged while the merged clip
+    stays within edit_rules.cut_length_sec.max. Returns (beats, stats).
+
+    Only abutting ranges merge (the next beat starts within BEAT_MERGE_GAP_SEC of this one's
+    end); duplicates and overlaps are separate timeline slots. When most src_at_ms are <= 0 the
+    positions are placeholders that _process_segment spreads over the film, so nothing merges.
+    """
+    import numpy as np
+    rows = []
+    for b in beats or []:
+        if not isinstance(b, dict):
+            continue
+        try:
+            rows.append((float(b.get('at_ms', 0) or 0), float(b.get('src_at_ms', 0) or 0),
+                         float(b.get('src_length_ms', 0) or 0), int(b.get('block_index', 0) or 0), b))
+        except (TypeError, ValueError):
+            continue
+    stats = {"in": len(beats or []), "dropped": 0, "merged": 0, "out": 0}
+    if not rows:
+        stats["dropped"] = stats["in"]
+        return [], stats
+    rows.sort(key=lambda r: r[0])
+    at = np.array([r[0] for r in rows])
+    src = np.array([r[1] for r in rows]) / 1000.0
+    ln = np.array([r[2] for r in rows]) / 1000.0
+    blk = np.array([r[3] for r in rows], dtype=np.int64)
+    if timeblocks:
+        tb_start = np.array([_ts_to_seconds(str(tb.get('start', ''))) for tb in timeblocks])
+        tb_end = np.array([_ts_to_seconds(str(tb.get('end', ''))) for tb in timeblocks])
+        valid = (blk >= 0) & (blk < len(timeblocks))
+        safe = np.clip(blk, 0, len(timeblocks) - 1)
+        base, limit = tb_start[safe], tb_end[safe]
+    else:
+        valid = np.ones(len(rows), dtype=bool)
+        base = np.zeros(len(rows))
+        limit = np.full(len(rows), float(film_duration_sec) if film_duration_sec and film_duration_sec > 0 else np.inf)
+    # Posisi absolut, dijepit ke [awal blok/film, akhir blok/film]
+    start = np.clip(base + np.maximum(src, 0.0), base, limit)
+    end = np.minimum(start + np.maximum(ln, 0.0), limit)
+    # Beat tanpa panjang sumber dibiarkan (cabang beats-only memakai jarak at_ms); sisanya wajib >= BEAT_MIN_SEC
+    no_len = ln <= 0.0
+    keep = valid & (start < limit) & (no_len | (end - start >= BEAT_MIN_SEC))
+    stats["dropped"] = int(stats["in"] - keep.sum())
+    idx = np.flatnonzero(keep)
+    at, start, end, blk, no_len = at[idx], start[idx], end[idx], blk[idx], no_len[idx]
+    rows = [rows[i] for i in idx]
+    if not len(idx):
+        return [], stats
+
+    try:
+        max_len = float(((edit_rules or {}).get('cut_length_sec') or {}).get('max') or BEAT_MERGE_MAX_SEC)
+    except (TypeError, ValueError, AttributeError):
+        max_len = BEAT_MERGE_MAX_SEC
+    # Kandidat gabung: beat berikutnya mulai tepat di ujung beat ini (± celah kecil), di blok yang sama
+    contig = np.zeros(len(idx), dtype=bool)
+    zero_src = np.mean(src[idx] <= 0.0) >= BEAT_ZERO_SRC_RATIO
+    if len(idx) > 1 and not zero_src:
+        contig[1:] = ((blk[1:] == blk[:-1]) & ~no_len[1:] & ~no_len[:-1]
+                      & (np.abs(start[1:] - end[:-1]) <= BEAT_MERGE_GAP_SEC))
+    out = []
+    g_first, g_start, g_end = 0, start[0], end[0]
+
+    def flush(first, s0, e0):
+        b = dict(rows[first][4])
+        if not no_len[first]:
+            b['src_at_ms'] = int(round((s0 - (base[idx[first]] if timeblocks else 0.0)) * 1000))
+            b['src_length_ms'] = int(round((e0 - s0) * 1000))
+        out.append(b)
+
+    for i in range(1, len(idx)):
+        if contig[i] and max(g_end, end[i]) - g_start <= max_len + 1e-6:
+            g_end = max(g_end, end[i])
+            stats["merged"] += 1
+            continue
+        flush(g_first, g_start, g_end)
+        g_first, g_start, g_end = i, start[i], end[i]
+    flush(g_first, g_start, g_end)
+    stats["out"] = len(out)
+    return out, stats
+
+def _take_source(alloc: SourceAllocator, dur: float, near_sec: float, pool: SourceAllocator = None, **kwargs):
+    """Reserves an unused source range of ~dur seconds near near_sec: first inside pool
+    (e.g. the segment's timeblocks), then anywhere in the film. Once the whole film has
+    been used the allocator is reset, so long recaps degrade to reuse instead of failing."""
+    for a in ((pool, alloc) if pool is not None else (alloc,)):
+        got = a.allocate(dur, near_sec, min_sec=0.5)
+        if got:
+            if a is not alloc:
+                alloc.mark_used(got[0], got[0] + got[1])
+            return got
+    if kwargs.get("progress_callback"):
+        try:
+            kwargs["progress_callback"]("[Alloc] Seluruh video sumber sudah terpakai; rentang lama dipakai ulang")
+        except Exception:
+            pass
+    alloc.reset()
+    return alloc.allocate(dur, near_sec, min_sec=0.5)
+
+def _snap_cut(shots, start: float, dur: float, lo: float, hi: float):
+    """Moves a cut's in/out points onto shot boundaries within [lo, hi] when a shot index is available."""
+    if shots is None:
+        return start, dur
+    return shots.snap_cut(start, dur, lo, hi)
+
 def _process_segment(segment_data, vo_audio_path, source_video_path, work_dir, stop_event, **kwargs):
     """Processes a single video segment from cutting to VO syncing."""
     segment_label = segment_data['label']
@@ -161,6 +443,20 @@ def _process_segment(segment_data, vo_audio_path, source_video_path, work_dir, s
     selected = []
     beats = segment_data.get('beats', []) or []
     source_tbs = segment_data.get('source_timeblocks', []) or []
+    src_total = get_duration(str(source_video_path)) or 0.0
+    # Rentang sumber yang sudah dipakai (dibagi antar segmen lewat process_video)
+    alloc = kwargs.get("source_allocator") or SourceAllocator(src_total)
+    shots = kwargs.get("shot_index")
+    if beats:
+        # Jepit ke durasi film, buang beat degenerate, gabungkan rentang sumber yang bersambung
+        beats, bstats = _normalize_beats(beats, src_total, source_tbs, segment_data.get('edit_rules'))
+        if kwargs.get("progress_callback") and (bstats["dropped"] or bstats["merged"]):
+            try:
+                kwargs["progress_callback"](
+                    f"[Beats] {segment_label}: {bstats['in']} → {bstats['out']} beats "
+                    f"({bstats['merged']} digabung, {bstats['dropped']} dibuang)")
+            except Exception:
+                pass
     # Build readable names for timeblocks to improve logs
     tb_names = []
     for i, tb in enumerate(source_tbs):
@@ -220,6 +516,7 @@ def _process_segment(segment_data, vo_audio_path, source_video_path, work_dir, s
             if remaining > 0.1:
                 desired = rng.uniform(3.0, 4.0)
                 dur = min(remaining, desired)
+                cur, dur = _snap_cut(shots, cur, dur, tb_start, tb_end)
                 if dur >= 0.5:
                     out_clip = beat_clips_dir / f"beat_{bi:03d}_{len(selected):03d}.mp4"
                     cmd = (
@@ -229,6 +526,7 @@ def _process_segment(segment_data, vo_audio_path, source_video_path, work_dir, s
                     )
                     if not run_ffmpeg_command(cmd, **kwargs): return None
                     selected.append(out_clip)
+                    alloc.mark_used(cur, cur + dur)
                     if kwargs.get("progress_callback"):
                         try:
                             kwargs["progress_callback"](f"  · clip @{cur-tb_start:.2f}s dur={dur:.2f}s from {tb_name}")
@@ -247,34 +545,37 @@ def _process_segment(segment_data, vo_audio_path, source_video_path, work_dir, s
                     kwargs["progress_callback"](f"[Beats] Filler needed: {float(vo_duration)-acc:.2f}s; adding extra 3-4s cuts from timeblocks")
                 except Exception:
                     pass
-            # iterate all TBs to create additional random cuts until VO covered
-            for i, tb in enumerate(source_tbs):
+            # Ambil potongan 3-4s yang belum terpakai: dulu di dalam timeblocks, lalu di luar
+            tb_ranges = [(_ts_to_seconds(str(tb['start']).replace(',', '.')),
+                          _ts_to_seconds(str(tb['end']).replace(',', '.'))) for tb in source_tbs]
+            tb_pool = alloc.restricted_to(tb_ranges)
+            pos = min((s for s, e in tb_ranges if e > s), default=0.0)
+            while acc < float(vo_duration):
                 if stop_event.is_set(): return None
-                start_sec = _ts_to_seconds(str(tb['start']).replace(',', '.'))
-                end_sec = _ts_to_seconds(str(tb['end']).replace(',', '.'))
-                pos = start_sec
-                while pos < end_sec - 0.05 and acc < float(vo_duration):
-                    dur = rng.uniform(3.0, 4.0)
-                    if pos + dur > end_sec:
-                        dur = max(0.1, end_sec - pos)
-                    if dur < 0.5:
-                        break
-                    out_clip = segment_work_dir / f"filler_tb{i:02d}_{len(selected):03d}.mp4"
-                    cmd = (
-                        f"ffmpeg -ss {pos:.3f} -t {dur:.3f} -i \"{source_video_path}\" "
-                        f"-r 25 -c:v libx264 -preset ultrafast -pix_fmt yuv420p -c:a aac -b:a 128k -ar 48000 -ac 2 "
-                        f"{_meta_flags()} \"{out_clip}\""
-                    )
-                    if not run_ffmpeg_command(cmd, **kwargs): return None
-                    selected.append(out_clip)
-                    acc += float(get_duration(str(out_clip)) or dur)
-                    pos += dur
-                    if kwargs.get("progress_callback"):
-                        try:
+                got = _take_source(alloc, rng.uniform(3.0, 4.0), pos, tb_pool, **kwargs)
+                if not got:
+                    break
+                pos, dur = _snap_cut(shots, *got, got[0], got[0] + got[1])
+                i = next((k for k, (s, e) in enumerate(tb_ranges) if s <= pos < e), -1)
+                out_clip = segment_work_dir / (f"filler_tb{i:02d}_{len(selected):03d}.mp4" if i >= 0 else f"filler_src_{len(selected):03d}.mp4")
+                cmd = (
+                    f"ffmpeg -ss {pos:.3f} -t {dur:.3f} -i \"{source_video_path}\" "
+                    f"-r 25 -c:v libx264 -preset ultrafast -pix_fmt yuv420p -c:a aac -b:a 128k -ar 48000 -ac 2 "
+                    f"{_meta_flags()} \"{out_clip}\""
+                )
+                if not run_ffmpeg_command(cmd, **kwargs): return None
+                selected.append(out_clip)
+                acc += float(get_duration(str(out_clip)) or dur)
+                if kwargs.get("progress_callback"):
+                    try:
+                        if i >= 0:
                             tb_name = tb_names[i] if i < len(tb_names) else f"TB{i:02d}"
-                            kwargs["progress_callback"](f"  · filler from {tb_name} @{pos-start_sec:.2f}s dur={dur:.2f}s")
-                        except Exception:
-                            pass
+                            kwargs["progress_callback"](f"  · filler from {tb_name} @{pos-tb_ranges[i][0]:.2f}s dur={dur:.2f}s")
+                        else:
+                            kwargs["progress_callback"](f"  · filler from source @{pos:.2f}s dur={dur:.2f}s (timeblocks habis)")
+                    except Exception:
+                        pass
+                pos += dur
         # Trim klip terakhir agar pas VO
         if selected:
             overshoot = acc - float(vo_duration)
@@ -320,7 +621,6 @@ def _process_segment(segment_data, vo_audio_path, source_video_path, work_dir, s
                 pass
         rng = random.Random()
         acc = 0.0
-        src_total = get_duration(str(source_video_path)) or 0.0
         # Tentukan target durasi per beat berdasarkan jarak antar beat
         vo_duration = get_duration(vo_audio_path)
         if not vo_duration or vo_duration <= 0:
@@ -340,6 +640,7 @@ def _process_segment(segment_data, vo_audio_path, source_video_path, work_dir, s
         except Exception:
             zero_src_ratio = 1.0
         min_dur = 0.6; max_dur = 4.0
+        last_end = 0.0
         for bi in range(len(times_ms) - 1):
             if stop_event.is_set(): return None
             start_ms = times_ms[bi]
@@ -349,7 +650,7 @@ def _process_segment(segment_data, vo_audio_path, source_video_path, work_dir, s
             b = beats_sorted[min(bi, len(beats_sorted) - 1)]
             src_off = float(b.get('src_at_ms', 0) or 0) / 1000.0
             src_len = float(b.get('src_length_ms', 0) or 0) / 1000.0
-            if (zero_src_ratio >= 0.6) and src_total > 0.1:
+            if (zero_src_ratio >= BEAT_ZERO_SRC_RATIO) and src_total > 0.1:
                 # Map progres beat ke posisi video sumber agar tersebar merata
                 try:
                     prog = min(1.0, max(0.0, (float(b.get('at_ms', 0) or 0) / 1000.0) / float(vo_duration)))
@@ -370,6 +671,7 @@ def _process_segment(segment_data, vo_audio_path, source_video_path, work_dir, s
                 dur = min(dur, max(0.1, src_total - src_off))
             if dur < 0.3:
                 continue
+            src_off, dur = _snap_cut(shots, src_off, dur, 0.0, src_total or src_off + dur)
             out_clip = beat_clips_dir / f"beat_{bi:03d}_{len(selected):03d}.mp4"
             cmd = (
                 f"ffmpeg -ss {src_off:.3f} -t {dur:.3f} -i \"{source_video_path}\" "
@@ -378,6 +680,8 @@ def _process_segment(segment_data, vo_audio_path, source_video_path, work_dir, s
             )
             if not run_ffmpeg_command(cmd, **kwargs): return None
             selected.append(out_clip)
+            alloc.mark_used(src_off, src_off + dur)
+            last_end = src_off + dur
             acc += float(get_duration(str(out_clip)) or dur)
         # Jika beats total < VO, tambahkan filler langsung dari video sumber
         if acc < float(vo_duration) and src_total > 0.1:
@@ -386,12 +690,14 @@ def _process_segment(segment_data, vo_audio_path, source_video_path, work_dir, s
                     kwargs["progress_callback"](f"[BeatsOnly] Filler needed: {float(vo_duration)-acc:.2f}s; sampling extra 3-4s from source")
                 except Exception:
                     pass
-            pos = 0.0
+            # Lanjut dari beat terakhir ke rentang yang belum terpakai (bukan kembali ke 0s)
+            pos = last_end
             while acc < float(vo_duration):
                 if stop_event.is_set(): return None
-                dur = rng.uniform(3.0, 4.0)
-                if pos + dur > src_total:
-                    pos = 0.0  # wrap around
+                got = _take_source(alloc, rng.uniform(3.0, 4.0), pos, **kwargs)
+                if not got:
+                    break
+                pos, dur = _snap_cut(shots, *got, got[0], got[0] + got[1])
                 out_clip = segment_work_dir / f"filler_src_{len(selected):03d}.mp4"
                 cmd = (
                     f"ffmpeg -ss {pos:.3f} -t {dur:.3f} -i \"{source_video_path}\" "
@@ -442,7 +748,6 @@ def _process_segment(segment_data, vo_audio_path, source_video_path, work_dir, s
         # Abaikan timeblocks; potong langsung dari video sumber sampai menutup VO
         vo_duration = get_duration(vo_audio_path)
         if not vo_duration or vo_duration <= 0: return None
-        src_total = get_duration(str(source_video_path)) or 0.0
         if src_total <= 0.1: return None
         rng = random.Random()
         acc = 0.0
@@ -451,10 +756,10 @@ def _process_segment(segment_data, vo_audio_path, source_video_path, work_dir, s
         selected = []
         while acc < float(vo_duration):
             if stop_event.is_set(): return None
-            dur = rng.uniform(3.0, 4.0)
-            if pos + dur > src_total:
-                pos = 0.0
-                continue
+            got = _take_source(alloc, rng.uniform(3.0, 4.0), pos, **kwargs)
+            if not got:
+                break
+            pos, dur = _snap_cut(shots, *got, got[0], got[0] + got[1])
             out_clip = segment_work_dir / f"src_{len(selected):03d}.mp4"
             cmd = (
                 f"ffmpeg -ss {pos:.3f} -t {dur:.3f} -i \"{source_video_path}\" "
@@ -568,14 +873,207 @@ def _process_segment(segment_data, vo_audio_path, source_video_path, work_dir, s
     if not run_ffmpeg_command(command, **kwargs): return None
     return final_segment_path
 
-def process_video(storyboard: dict, source_video_path: str, vo_audio_map: dict, user_settings: dict, stop_event: threading.Event, progress_callback=None):
+# Mode multi-bahasa: VO bahasa lain yang durasinya dalam toleransi ini memakai ulang video
+# segmen yang sudah dirender (dipercepat sedikit dengan atempo atau dipadding hening)
+MULTILANG_TEMPO_TOLERANCE = 0.06
+_ISO639_2 = {"id": "ind", "en": "eng", "ms": "msa", "es": "spa", "fr": "fra", "de": "deu", "it": "ita", "pt": "por",
+             "ru": "rus", "ja": "jpn", "ko": "kor", "zh": "zho", "ar": "ara", "hi": "hin", "tr": "tur", "nl": "nld"}
+
+def _language_tag(lang: str) -> str:
+    base = (lang or "").split("-")[0].lower()
+    return _ISO639_2.get(base, base or "und")
+
+def _build_language_audio(pieces, output_path, user_settings, **kwargs):
+    """One audio track from per-segment VO files fitted to their segment durations.
+
+    pieces: [(vo_path, segment_sec, gain)]. A VO longer than its segment is sped up with
+    atempo, a shorter one is padded with silence; then main gain and BGM are applied the
+    same way as _apply_final_effects so every language sounds alike.
+    """
+    inputs, chain, labels = [], [], []
+    for i, (vo_path, seg_sec, gain) in enumerate(pieces):
+        inputs.append(f'-i "{vo_path}"')
+        vo_len = get_duration(str(vo_path)) or seg_sec
+        f = [f"[{i}:a]aresample=48000", "aformat=sample_fmts=fltp:channel_layouts=stereo"]
+        if vo_len > seg_sec + 0.01:
+            f.append(f"atempo={vo_len / seg_sec:.5f}")
+        if gain and gain != 1.0:
+            f.append(f"volume={gain}")
+        f += [f"apad=whole_dur={seg_sec:.3f}", f"atrim=0:{seg_sec:.3f}", "asetpts=PTS-STARTPTS"]
+        chain.append(",".join(f) + f"[s{i}]")
+        labels.append(f"[s{i}]")
+    chain.append("".join(labels) + f"concat=n={len(labels)}:v=0:a=1[vo]")
+    total = sum(p[1] for p in pieces)
+    if _needs_audio_mix(user_settings):
+        # Rakit trek narasi (WAV) dulu, lalu BGM/ducking/limiter lewat mixer NumPy
+        voice_wav = pathlib.Path(output_path).with_name(f"{pathlib.Path(output_path).stem}_voice.wav")
+        command = (f'ffmpeg {" ".join(inputs)} -filter_complex "{";".join(chain)}" -map "[vo]" -t {total:.3f} '
+                   f'-c:a pcm_s16le -ar 48000 -ac 2 "{voice_wav}"')
+        ok = run_ffmpeg_command(command, **kwargs) and _mix_final_audio(voice_wav, output_path, user_settings, **kwargs)
+        voice_wav.unlink(missing_ok=True)
+        if ok:
+            return True
+    extra_inputs, audio_filters, audio_stream = _final_audio_graph("[vo]", user_settings, len(pieces))
+    command = (f'ffmpeg {" ".join(inputs)}{extra_inputs} -filter_complex "{";".join(chain + audio_filters)}" '
+               f'-map "{audio_stream}" -t {total:.3f} -c:a aac -b:a 128k -ar 48000 -ac 2 "{output_path}"')
+    return run_ffmpeg_command(command, **kwargs)
+
+def _mux_audio_tracks(video_path, tracks, output_path, keep_video_audio_as: str | None = None, **kwargs):
+    """Video stream copied as-is plus one audio track per (language, audio_path); no re-encode."""
+    inputs = [f'-i "{video_path}"'] + [f'-i "{a}"' for _, a in tracks]
+    maps = ["-map 0:v"]
+    langs = []
+    if keep_video_audio_as:
+        maps.append("-map 0:a")
+        langs.append(keep_video_audio_as)
+    for i, (lang, _) in enumerate(tracks, start=1):
+        maps.append(f"-map {i}:a")
+        langs.append(lang)
+    meta = " ".join(f"-metadata:s:a:{i} language={_language_tag(l)}" for i, l in enumerate(langs))
+    dispo = " ".join(f"-disposition:a:{i} {'default' if i == 0 else '0'}" for i in range(len(langs)))
+    command = (f'ffmpeg {" ".join(inputs)} {" ".join(maps)} -c copy {meta} {dispo} '
+               f'-movflags +faststart "{output_path}"')
+    return run_ffmpeg_command(command, **kwargs)
+
+def _render_languages(storyboard, source_video_path, primary_video, segment_order, segment_paths,
+                      vo_audio_map, language_vo_maps, user_settings, work_dir, stop_event, **kwargs):
+    """Outputs for the additional languages, reusing rendered segment video wherever the VO fits.
+
+    Each segment keeps a list of rendered (VO duration, video) plans; a language reuses the
+    first plan within MULTILANG_TEMPO_TOLERANCE and only re-renders segments that fit none.
+    Languages whose every segment reuses the primary render share the primary video stream
+    (-c:v copy), as separate files or as extra audio tracks (user_settings["multi_audio_tracks"]).
+    """
+    log = kwargs.get("progress_callback") or print
+    seg_by_label = {s['label']: s for s in storyboard.get('segments', [])}
+    gain_by_lang = user_settings.get("_vo_gain_applied_by_lang") or {}
+    main_vol = user_settings.get("main_vo_volume", 1.0)
+    out_path = pathlib.Path(user_settings["output_path"])
+    primary_lang = user_settings.get("primary_language") or next(
+        (s.get('vo_language') for s in storyboard.get('segments', []) if s.get('vo_language')), "und")
+    renders = {}
+    for label, p in zip(segment_order, segment_paths):
+        renders[label] = [(get_duration(str(vo_audio_map.get(label))) or get_duration(str(p)) or 0.0, p)]
+    shared, outputs = [], []
+    for lang, vo_map in language_vo_maps.items():
+        if stop_event.is_set(): raise InterruptedError("Processing stopped by user.")
+        applied = set(gain_by_lang.get(lang) or ())
+        pieces, videos, rerendered = [], [], 0
+        for label in segment_order:
+            vo = (vo_map or {}).get(label)
+            if not vo:
+                raise Exception(f"No voice-over audio found for segment '{label}' in language '{lang}'.")
+            vo_len = get_duration(str(vo)) or 0.0
+            plan = next(((d, p) for d, p in renders[label]
+                         if d > 0 and abs(vo_len / d - 1.0) <= MULTILANG_TEMPO_TOLERANCE), None)
+            if plan is None:
+                # Durasi VO terlalu berbeda dari semua render yang ada: render ulang segmen ini saja
+                log(f"[Lang] {lang}/{label}: VO {vo_len:.2f}s tidak cocok dengan render yang ada; render ulang segmen")
+                lang_dir = work_dir / f"lang_{lang}"
+                lang_dir.mkdir(exist_ok=True)
+                seg_kwargs = dict(kwargs, main_vo_volume=1.0 if label in applied else main_vol)
+                p = _process_segment(seg_by_label[label], vo, source_video_path, lang_dir, stop_event, **seg_kwargs)
+                if not p:
+                    raise Exception(f"Segment '{label}' ({lang}) failed or was stopped.")
+                shutil.rmtree(lang_dir / label, ignore_errors=True)
+                plan = (vo_len, p)
+                renders[label].append(plan)
+            if plan[1] != renders[label][0][1]:
+                rerendered += 1
+            videos.append(plan[1])
+            pieces.append((vo, plan[0], 1.0 if label in applied else main_vol))
+
+        lang_settings = dict(user_settings)
+        lang_settings.pop("bgm_timing", None)
+        bgm_segment = user_settings.get("bgm_segment")
+        if user_settings.get("bgm_path") and bgm_segment in segment_order:
+            idx = segment_order.index(bgm_segment)
+            lang_settings["bgm_timing"] = {"start_sec": float(sum(p[1] for p in pieces[:idx])),
+                                           "duration_sec": float(pieces[idx][1])}
+        audio_path = work_dir / f"audio_{lang}.m4a"
+        if not _build_language_audio(pieces, audio_path, lang_settings, **kwargs):
+            raise Exception(f"Failed to build audio track for language '{lang}'.")
+        if not rerendered:
+            log(f"[Lang] {lang}: timeline video sama dengan bahasa utama; hanya audio yang dibuat")
+            shared.append((lang, audio_path))
+            continue
+        # Sebagian segmen dirender ulang: gabung (copy), letterbox sekali, lalu pasang audio bahasa ini
+        log(f"[Lang] {lang}: {rerendered} segmen dirender ulang; {len(videos) - rerendered} dipakai ulang")
+        concat_list = work_dir / f"concat_{lang}.txt"
+        with open(concat_list, "w", encoding="utf-8") as f:
+            for v in videos:
+                f.write(f"file '{_ffconcat_escape(v)}'\n")
+        joined = work_dir / f"concat_{lang}.mp4"
+        if not run_ffmpeg_command(f"ffmpeg -f concat -safe 0 -i \"{concat_list}\" -c copy \"{joined}\"", **kwargs):
+            raise Exception(f"Concatenation failed for language '{lang}'.")
+        video = work_dir / f"video_{lang}.mp4"
+        first_profile = _output_profiles(user_settings)[:1]
+        if not _apply_output_profiles(joined, video, dict(user_settings, bgm_path="", main_vo_volume=1.0,
+                                                          output_profiles=first_profile), **kwargs):
+            raise Exception(f"Failed to apply final effects for language '{lang}'.")
+        lang_out = out_path.with_name(f"{out_path.stem}_{lang}{out_path.suffix}")
+        if not _mux_audio_tracks(video, [(lang, audio_path)], lang_out, **kwargs):
+            raise Exception(f"Muxing failed for language '{lang}'.")
+        outputs.append(str(lang_out))
+
+    if shared and user_settings.get("multi_audio_tracks"):
+        tmp = out_path.with_name(f"{out_path.stem}_multi{out_path.suffix}")
+        if not _mux_audio_tracks(primary_video, shared, tmp, keep_video_audio_as=primary_lang, **kwargs):
+            raise Exception("Muxing multi-audio output failed.")
+        os.replace(tmp, primary_video)
+        log(f"[Lang] {primary_video}: {1 + len(shared)} track audio ({primary_lang}, {', '.join(l for l, _ in shared)})")
+    else:
+        for lang, audio_path in shared:
+            lang_out = out_path.with_name(f"{out_path.stem}_{lang}{out_path.suffix}")
+            if not _mux_audio_tracks(primary_video, [(lang, audio_path)], lang_out, **kwargs):
+                raise Exception(f"Muxing failed for language '{lang}'.")
+            outputs.append(str(lang_out))
+    return outputs
+
+def _run_delivery(final_video_path, user_settings: dict, progress_callback):
+    """Optional delivery ladder (user_settings["delivery"]: True or {"ladder": [...], "formats": [...]}).
+    Failure is logged but does not fail the render: the recap itself is already written."""
+    cfg = user_settings.get("delivery")
+    if not cfg:
+        return
+    cfg = cfg if isinstance(cfg, dict) else {}
+    out = pathlib.Path(final_video_path)
+    progress_callback("--- Delivery: encode ladder ---")
+    try:
+        result = delivery.deliver(str(out), str(out.with_name(f"{out.stem}_delivery")), cfg.get("ladder"),
+                                  cfg.get("formats") or ("mp4",), progress_callback)
+    except Exception as e:
+        progress_callback(f"[Delivery] Gagal: {e}")
+        return
+    user_settings["_delivery_outputs"] = result
+    for fmt, val in result.items():
+        for p in (val if isinstance(val, list) else [val]):
+            progress_callback(f"[Delivery] {fmt}: {p or 'gagal'}")
+
+def process_video(storyboard: dict, source_video_path: str, vo_audio_map: dict, user_settings: dict, stop_event: threading.Event, progress_callback=None,
+                  language_vo_maps: dict | None = None):
+    """Renders the selected segments and the final recap.
+
+    language_vo_maps ({language: {label: vo_path}}) adds outputs in other languages that
+    reuse the rendered video wherever possible (see _render_languages); the result is then
+    a list of paths with the primary output first.
+    """
     base_dir = pathlib.Path(source_video_path).parent
-    work_dir = base_dir / "temp_restory_work"
+    # user_settings["work_dir"] memisahkan direktori kerja job yang berjalan bersamaan untuk film yang sama
+    work_dir = pathlib.Path(user_settings.get("work_dir") or base_dir / "temp_restory_work")
     kwargs = {"progress_callback": progress_callback, "main_vo_volume": user_settings.get("main_vo_volume", 1.0)}
 
     try:
+        # Satu allocator untuk semua segmen: filler tidak mengulang rentang yang sudah dipakai segmen lain
+        src_total = get_duration(str(source_video_path)) or 0.0
+        if src_total > 0:
+            kwargs["source_allocator"] = SourceAllocator(src_total)
+            # Batas shot (dianalisis sekali per film, lalu dari cache) untuk snap titik potong
+            if user_settings.get("snap_to_shots", True):
+                kwargs["shot_index"] = load_shot_index(str(source_video_path), src_total, progress_callback,
+                                                       workers=user_settings.get("cpu_workers"))
         if work_dir.exists(): shutil.rmtree(work_dir)
-        work_dir.mkdir()
+        work_dir.mkdir(parents=True)
         progress_callback(f"Created temporary working directory at: {work_dir}")
 
         processed_segment_paths = []
@@ -583,6 +1081,7 @@ def process_video(storyboard: dict, source_video_path: str, vo_audio_map: dict,
         selected_segments = user_settings.get("selected_segments", [])
 
         selected_set = set(selected_segments)
+        vo_gain_applied = set(user_settings.get("_vo_gain_applied") or ())
         for segment_data in storyboard.get('segments', []):
             if stop_event.is_set(): raise InterruptedError("Processing stopped by user.")
             segment_label = segment_data['label']
@@ -592,7 +1091,11 @@ def process_video(storyboard: dict, source_video_path: str, vo_audio_map: dict,
 
             vo_path = vo_audio_map.get(segment_label)
             if vo_path:
-                segment_path = _process_segment(segment_data, vo_path, source_video_path, work_dir, stop_event, **kwargs)
+                seg_kwargs = kwargs
+                if segment_label in vo_gain_applied:
+                    # Gain VO sudah diterapkan saat TTS dirakit; jangan diulang di mix segmen
+                    seg_kwargs = dict(kwargs, main_vo_volume=1.0)
+                segment_path = _process_segment(segment_data, vo_path, source_video_path, work_dir, stop_event, **seg_kwargs)
                 if segment_path:
                     processed_segment_paths.append(segment_path)
                     segment_order.append(segment_label)
@@ -652,11 +1155,24 @@ def process_video(storyboard: dict, source_video_path: str, vo_audio_map: dict,
 
             final_video_path = user_settings.get("output_path")
             progress_callback("--- Applying final effects (BGM, Volume, etc.) ---")
-            if not _apply_final_effects(concat_video_path, final_video_path, user_settings, **kwargs):
+            profile_paths = _apply_output_profiles(concat_video_path, final_video_path, user_settings, **kwargs)
+            if not profile_paths:
                 raise Exception("Failed to apply final effects.")
 
-            return final_video_path
+            _run_delivery(final_video_path, user_settings, progress_callback)
+
+            if language_vo_maps:
+                progress_callback(f"--- Output bahasa tambahan: {', '.join(language_vo_maps)} ---")
+                if len(profile_paths) > 1:
+                    progress_callback("[Lang] Bahasa tambahan dibuat dari profil output pertama.")
+                extra = _render_languages(storyboard, source_video_path, final_video_path, segment_order,
+                                          processed_segment_paths, vo_audio_map, language_vo_maps, user_settings,
+                                          work_dir, stop_event, **kwargs)
+                return profile_paths + extra
+            return profile_paths if len(profile_paths) > 1 else final_video_path
         else:
+            if language_vo_maps:
+                progress_callback("[Lang] Bahasa tambahan hanya dibuat untuk output gabungan (Process All); dilewati.")
             # Export per segment without concatenation
             out_paths = []
             out_dir = pathlib.Path(user_settings.get("output_path")).parent
@@ -682,9 +1198,10 @@ def process_video(storyboard: dict, source_video_path: str, vo_audio_map: dict,
                     local_settings.pop("bgm_timing", None)
 
                 progress_callback(f"--- Applying final effects for segment '{seg_label}' ---")
-                if not _apply_final_effects(seg_path, str(per_out), local_settings, **kwargs):
+                seg_outputs = _apply_output_profiles(seg_path, str(per_out), local_settings, **kwargs)
+                if not seg_outputs:
                     raise Exception(f"Failed to apply final effects for segment {seg_label}.")
-                out_paths.append(str(per_out))
+                out_paths.extend(seg_outputs)
 
             return out_paths
 
@@ -133,67 +133,70 @@ def download_video_best(url: str, output_dir: str, progress_callback=None) -> st
     raise RuntimeError("Failed to locate downloaded video file.")
 
 
-def download_subtitles(
+def _pick_caption_track(info: dict, languages: list[str], allow_auto: bool):
+    """Chooses (lang, ext, url, is_auto) from the info dict: manual subtitles before automatic
+    captions, then language preference order ('id-*' = any id variant), then format order."""
+    from caption_stream import CAPTION_FORMATS
+    pools = [(info.get("subtitles") or {}, False)]
+    if allow_auto:
+        pools.append((info.get("automatic_captions") or {}, True))
+    for tracks_by_lang, is_auto in pools:
+        for pref in languages:
+            if pref.endswith("-*"):
+                base = pref[:-2].lower()
+                cands = [l for l in tracks_by_lang if l.lower().startswith(base + "-")]
+            else:
+                cands = [l for l in tracks_by_lang if l.lower() == pref.lower()]
+            for lang in cands:
+                by_ext = {t.get("ext"): t for t in (tracks_by_lang.get(lang) or []) if t.get("url")}
+                for ext in CAPTION_FORMATS:
+                    if ext in by_ext:
+                        return lang, ext, by_ext[ext]["url"], is_auto
+    return None
+
+
+def fetch_caption_cues(
     url: str,
-    output_dir: str,
     languages: list[str] | None = None,
     allow_auto: bool = True,
     progress_callback=None,
-) -> tuple[str | None, str | None]:
-    """Download subtitles only using yt-dlp.
-    Returns (subtitle_path, ext) or (None, None) when not available.
-    Prefers json3 > srv3 > vtt > srt.
+    info: dict | None = None,
+):
+    """Fetches the best caption track straight into memory and parses it while it streams.
+    Returns (cues, meta) where meta has lang/ext/auto/title/duration; ([], meta) when none.
+    Prefers json3 > srv3 > vtt > srt. No files are written and ffmpeg is not used.
     """
     try:
         import yt_dlp
     except Exception as e:
         raise RuntimeError("yt-dlp not installed. Please install it to use YouTube features.") from e
-    Path(output_dir).mkdir(parents=True, exist_ok=True)
-    # Prepare preferred languages; default prefers id then en
+    from caption_stream import parser_for
+    # Default preferensi bahasa: id lalu en
     langs = languages or ["id", "id-*", "en", "en-*"]
-    ydl_opts = _make_opts(output_dir, out_tmpl="%(title)s.%(ext)s")
-    ydl_opts.update({
-        "skip_download": True,
-        "writesubtitles": True,
-        "writeautomaticsub": allow_auto,
-        "subtitleslangs": langs,
-        # Minta format yang tersedia, lalu konversi ke SRT via postprocessor FFmpeg
-        "subtitlesformat": "best",
-    })
-    # Konversi subtitle ke SRT langsung (butuh ffmpeg)
-    pp = ydl_opts.get("postprocessors", [])
-    pp.append({"key": "FFmpegSubtitlesConvertor", "format": "srt"})
-    ydl_opts["postprocessors"] = pp
+    with yt_dlp.YoutubeDL(_make_opts(".")) as ydl:
+        if info is None:
+            info = ydl.extract_info(url, download=False) or {}
+        meta = {"title": info.get("title"), "duration": info.get("duration")}
+        track = _pick_caption_track(info, langs, allow_auto)
+        if not track:
+            return [], meta
+        lang, ext, track_url, is_auto = track
+        meta.update({"lang": lang, "ext": ext, "auto": is_auto})
+        if progress_callback:
+            progress_callback(f"[Subtitle] Mengambil track {lang} ({ext}{', otomatis' if is_auto else ''})...")
+        parser = parser_for(ext)
+        cues = []
+        resp = ydl.urlopen(track_url)
+        try:
+            while True:
+                chunk = resp.read(1 << 16)
+                if not chunk:
+                    break
+                cues.extend(parser.feed(chunk))
+        finally:
+            resp.close()
+        cues.extend(parser.close())
+    cues.sort(key=lambda c: c.start_ms)
     if progress_callback:
-        def _hook(d: dict):
-            try:
-                if d.get('status') == 'finished':
-                    progress_callback("[Subtitle] Unduh subtitle selesai.")
-            except Exception:
-                pass
-        ydl_opts['progress_hooks'] = [_hook]
-    created_before = set(Path(output_dir).glob("*"))
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        info = ydl.extract_info(url, download=True)
-    created_after = set(Path(output_dir).glob("*"))
-    # Cari SRT hasil konversi terlebih dahulu
-    srt_files = sorted([p for p in (created_after - created_before) if p.suffix.lower() == ".srt"], key=lambda p: p.stat().st_mtime, reverse=True)
-    if srt_files:
-        p = srt_files[0]
-        return str(p), "srt"
-    # Jika tidak ada SRT, cek format lain sebagai fallback
-    new_files = sorted([p for p in (created_after - created_before) if p.suffix.lower() in (".json3", ".srv3", ".vtt", ".srt")], key=lambda p: p.stat().st_mtime, reverse=True)
-    if not new_files:
-        # try to find by known title
-        title = (info or {}).get("title") or (info or {}).get("id")
-        if title:
-            srt_cand = Path(output_dir) / f"{title}.srt"
-            if srt_cand.exists():
-                return str(srt_cand), "srt"
-            for ext in (".json3", ".srv3", ".vtt", ".srt"):
-                cand = Path(output_dir) / f"{title}{ext}"
-                if cand.exists():
-                    return str(cand), cand.suffix.lstrip('.')
-        return None, None
-    p = new_files[0]
-    return str(p), p.suffix.lstrip('.')
+        progress_callback(f"[Subtitle] {len(cues)} cue diterima.")
+    return cues, meta